@@ -109,7 +109,7 @@ tmux send-keys -t "$SESSION:$PANE" Enter
 
 echo -e "${GREEN}✅ 送信完了${NC}"
 
-# メモリシステムに記録
-if [ -f "scripts/memory_manager.py" ]; then
-    python3 scripts/memory_manager.py save --agent "$AGENT" --message "Received: $MESSAGE" 2>/dev/null || true
+# メモリシステムに記録（デーモン稼働中はソケット経由、停止中は直接保存）
+if [ -f "scripts/memory_client.py" ]; then
+    python3 scripts/memory_client.py save --agent "$AGENT" --message "Received: $MESSAGE" >/dev/null 2>&1 || true
 fi
\ No newline at end of file
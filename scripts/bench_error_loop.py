@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+CCTeam Error Loop Detector ベンチマーク
+error_loop_detector.py の改善前後の性能を計測する
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_memory import _report
+from error_loop_detector import ErrorClusterer, ErrorLoopDetector, ErrorNormalizer
+from error_loop_helper import ErrorLoopHelper
+
+
+# ---------------------------------------------------------------------------
+# check_error の1回あたりのコスト（追跡中のエラー署名数に対して）
+# ---------------------------------------------------------------------------
+
+class _LegacyDetector:
+    """改善前の check_error：キーのリストを作り直し、JSON全体を indent=2 で書き直す"""
+
+    def __init__(self, error_file: Path, threshold: int = 3, time_window: int = 300):
+        self.error_file = error_file
+        self.threshold = threshold
+        self.time_window = time_window
+        self.error_history: Dict[str, List[float]] = {}
+
+    def check_error(self, key: str) -> bool:
+        current_time = time.time()
+        if key in self.error_history:
+            self.error_history[key] = [
+                ts for ts in self.error_history[key]
+                if current_time - ts <= self.time_window
+            ]
+        else:
+            self.error_history[key] = []
+        self.error_history[key].append(current_time)
+        with open(self.error_file, 'w') as f:
+            json.dump(self.error_history, f, indent=2)
+        return len(self.error_history[key]) >= self.threshold
+
+
+def bench_detector(sizes=(1_000, 10_000, 100_000), checks: int = 2_000,
+                   quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """check_error のレイテンシ（追跡中の署名数を増やしても一定であること）"""
+    if quick:
+        sizes, checks = (1_000, 100_000), 500
+    print(f"\n🔁 check_error with N tracked error signatures ({checks:,} checks)")
+    results = {}
+    now = time.time()
+    for size in sizes:
+        keys = [f"worker{n % 4}:{hashlib.md5(str(n).encode()).hexdigest()[:16]}" for n in range(size)]
+        rng = random.Random(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy = _LegacyDetector(Path(tmp) / "error_loops.json", threshold=10**9)
+            legacy.error_history = {key: [now] for key in keys}
+            # 改善前は署名数に比例するため回数を抑える
+            legacy_checks = max(10, min(checks, 2_000_000 // size))
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(legacy_checks):
+                key = rng.choice(keys)
+                t0 = time.perf_counter()
+                legacy.check_error(key)
+                latencies.append(time.perf_counter() - t0)
+            results[f"legacy/{size}"] = _report(f"legacy N={size:,}", latencies, time.perf_counter() - start)
+
+            detector = ErrorLoopDetector(threshold=10**9, log_dir=os.path.join(tmp, "logs"))
+            for key in keys:
+                detector._record(key, now)
+            detector.save_history()
+            latencies = []
+            start = time.perf_counter()
+            for n in range(checks):
+                # 既存の署名と新規の署名を半分ずつ
+                message = f"error {rng.randrange(size)}" if n % 2 else f"new error {n}"
+                t0 = time.perf_counter()
+                detector.check_error(f"worker{n % 4}", message)
+                latencies.append(time.perf_counter() - t0)
+            detector.save_history()
+            results[f"deque/{size}"] = _report(f"deque+journal N={size:,}", latencies,
+                                               time.perf_counter() - start)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# エラーメッセージ正規化（normalizations/sec）
+# ---------------------------------------------------------------------------
+
+_ERROR_TEMPLATES = [
+    "{ts} ConnectionRefusedError: connect ECONNREFUSED 127.0.0.1:{port} (pid {pid}) after {ms}ms",
+    "Traceback (most recent call last): File \"/tmp/build-{uuid}/app.py\", line {line}, in main",
+    "TypeError: Cannot read properties of undefined (reading 'id') at Object.<anonymous> (index.js:{line}:{col})",
+    "Segmentation fault at address {addr} in worker process {pid}",
+    "{ts} request {uuid} failed: upstream localhost:{port} timed out after {ms}ms",
+    "SyntaxError: Unexpected token '}}' at line {line} column {col}",
+    "ModuleNotFoundError: No module named 'pkg_{n}'",
+]
+
+
+def _legacy_normalize(error_msg: str) -> str:
+    """改善前の _normalize_error（呼び出し毎に import と4回の re.sub）"""
+    import re
+    normalized = re.sub(r'\d{4}-\d{2}-\d{2}T?\d{2}:\d{2}:\d{2}', '', error_msg)
+    normalized = re.sub(r'\d+ms', '', normalized)
+    normalized = re.sub(r'line \d+', 'line X', normalized)
+    normalized = re.sub(r'column \d+', 'column X', normalized)
+    normalized = ' '.join(normalized.split())
+    return normalized.lower()
+
+
+def _error_messages(count: int, distinct: int = 500, repeat_ratio: float = 0.5, seed: int = 3) -> List[str]:
+    """再試行で同じ文字列が繰り返されるエラーと、毎回値が変わるエラーの混在"""
+    rng = random.Random(seed)
+
+    def fresh() -> str:
+        return rng.choice(_ERROR_TEMPLATES).format(
+            ts=time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(rng.randrange(2**31))),
+            port=rng.randrange(1024, 65536), pid=rng.randrange(1, 99999), ms=rng.randrange(1, 5000),
+            uuid=str(uuid.UUID(int=rng.getrandbits(128))), line=rng.randrange(1, 2000),
+            col=rng.randrange(1, 120), addr=hex(rng.getrandbits(48)), n=rng.randrange(50),
+        )
+
+    pool = [fresh() for _ in range(distinct)]
+    return [rng.choice(pool) if rng.random() < repeat_ratio else fresh() for _ in range(count)]
+
+
+def bench_normalize(count: int = 200_000, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """_normalize_error のスループット（改善前 / 1パス正規表現 / 1パス+LRU）"""
+    if quick:
+        count = 20_000
+    messages = _error_messages(count)
+    print(f"\n🧹 error normalization ({count:,} messages, 50% exact repeats)")
+    rules = [(re.compile(rule["pattern"]), rule["replace"]) for rule in ErrorNormalizer.DEFAULT_RULES]
+
+    def sequential(error_msg: str) -> str:
+        # 同じルール数を1つずつ re.sub した場合（1パス化の効果の比較用）
+        for compiled, replacement in rules:
+            error_msg = compiled.sub(replacement, error_msg)
+        return ' '.join(error_msg.split()).lower()
+
+    results = {}
+    for label, normalize in (("legacy 4x re.sub", _legacy_normalize),
+                             (f"sequential {len(rules)} rules", sequential),
+                             ("single pass", ErrorNormalizer(cache_size=0).normalize),
+                             ("single pass + LRU", ErrorNormalizer().normalize)):
+        start = time.perf_counter()
+        for message in messages:
+            normalize(message)
+        elapsed = time.perf_counter() - start
+        results[label] = {"ops_per_sec": count / elapsed}
+        print(f"  {label:<28} {count / elapsed:>10.0f} normalizations/s")
+    return results
+
+# ---------------------------------------------------------------------------
+# ErrorLoopHelper のパターン照合（パターン数に対するスケーリング）
+# ---------------------------------------------------------------------------
+
+# エラーコードで始まる実在の形式を模した合成パターン
+_CODE_FORMATS = [
+    (r"TS{n}: .*{word}", "TS{n}: Cannot find name '{word}'"),
+    (r"ERR_{WORD}_{n}\b", "npm ERR! code ERR_{WORD}_{n} while installing"),
+    (r"E{n} duplicate key .*{word}", "MongoServerError: E{n} duplicate key error collection: {word}"),
+    (r"ORA-{n}: .*{word}", "ORA-{n}: table or view {word} does not exist"),
+    (r"SQLSTATE\[{n}\]", "PDOException: SQLSTATE[{n}] General error"),
+    (r"{Word}Exception: {word} (?:failed|timed out)", "java.lang.{Word}Exception: {word} timed out"),
+]
+_WORDS = ["alpha", "bravo", "cargo", "delta", "ember", "flint", "gamma", "harbor", "ivory", "jolt",
+          "karma", "lumen", "mango", "nylon", "orbit", "pixel", "quartz", "raven", "sigma", "tango"]
+
+
+class _LegacyHelper(ErrorLoopHelper):
+    """改善前の analyze_error：パターンを1つずつ re.search し、最初の一致で返す"""
+
+    def analyze_error(self, error_message: str):
+        for pattern, info in self.error_patterns.items():
+            if re.search(pattern, error_message, re.IGNORECASE):
+                match = re.search(pattern, error_message, re.IGNORECASE)
+                context = self._extract_context(error_message, info['type'])
+                return {"error_type": info['type'], "context": context}
+        return None
+
+
+def _helper_corpus(pattern_count: int, messages: int, seed: int = 15):
+    """既定パターン + 合成パターン（計 pattern_count 件）と、一致/不一致が混在するメッセージ"""
+    rng = random.Random(seed)
+    patterns = ErrorLoopHelper.default_patterns()
+    samples = [message for message in _error_messages(200, seed=seed)]
+    samples += ["Error: Cannot find module 'express'", "fatal: not a git repository (or any parent)",
+                "EACCES: Permission denied, open '/etc/hosts'"]
+    number = 0
+    while len(patterns) < pattern_count:
+        regex, example = _CODE_FORMATS[number % len(_CODE_FORMATS)]
+        word = _WORDS[number % len(_WORDS)] + str(number)
+        values = {"n": 1000 + number, "word": word, "Word": word.capitalize(), "WORD": word.upper()}
+        patterns[regex.format(**values)] = {"type": f"synthetic_{number}", "docs": [], "tips": [],
+                                            "priority": number % 3}
+        samples.append(example.format(**values))
+        number += 1
+    traceback = "\n".join(f'  File "/srv/app/module_{n}.py", line {n}, in handler_{n}' for n in range(30))
+    corpus = []
+    for _ in range(messages):
+        message = rng.choice(samples)
+        if rng.random() < 0.2:
+            # 長いスタックトレース付き
+            message = f"Traceback (most recent call last):\n{traceback}\n{message}"
+        corpus.append(message)
+    return patterns, corpus
+
+
+def bench_helper(pattern_counts=(9, 100, 500), messages: int = 5_000,
+                 quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """analyze_error / 全一致の照合コスト：パターンを1つずつ vs まとめた1パス+リテラル索引"""
+    if quick:
+        messages = 1_000
+    print(f"\n📚 error pattern matching ({messages:,} messages, 20% with 30-frame tracebacks)")
+    results = {}
+    for count in pattern_counts:
+        patterns, corpus = _helper_corpus(count, messages)
+        legacy, helper = _LegacyHelper(patterns), ErrorLoopHelper(patterns)
+        compiled = [(re.compile(pattern, re.IGNORECASE), info["type"]) for pattern, info in patterns.items()]
+
+        def naive_all(message: str):
+            # 全カテゴリを報告するために全パターンを1つずつ照合した場合
+            return {error_type for regex, error_type in compiled if regex.search(message)}
+
+        # 結果が一致することを確認
+        for message in corpus[:500]:
+            assert naive_all(message) == {match["error_type"] for match in helper.match_all(message)}, message
+
+        for label, analyze in ((f"N={count} legacy first match", legacy.analyze_error),
+                               (f"N={count} re.search all", naive_all),
+                               (f"N={count} 1 pass all", helper.match_all),
+                               (f"N={count} analyze_error", helper.analyze_error)):
+            latencies = []
+            start = time.perf_counter()
+            for message in corpus:
+                t0 = time.perf_counter()
+                analyze(message)
+                latencies.append(time.perf_counter() - t0)
+            results[label] = _report(label, latencies, time.perf_counter() - start)
+    return results
+
+# ---------------------------------------------------------------------------
+# 類似エラーのクラスタリング（毎回少しずつ違うスタックトレース）
+# ---------------------------------------------------------------------------
+
+_EXCEPTIONS = [
+    "KeyError: '{name}'",
+    "TypeError: unsupported operand type(s) for +: 'int' and '{name}'",
+    "ValueError: invalid literal for int() with base 10: '{name}'",
+    "AttributeError: 'NoneType' object has no attribute '{name}'",
+    "ConnectionError: HTTPSConnectionPool(host='{name}.internal', port=443): Max retries exceeded",
+    "FileNotFoundError: [Errno 2] No such file or directory: '/tmp/{name}/{uuid}.json'",
+    "sqlite3.OperationalError: no such column: {name}",
+    "RuntimeError: task {name} failed after {n} attempts",
+]
+
+
+def _mutated_tracebacks(families: int = 40, per_family: int = 25, seed: int = 16):
+    """
+    エラーの系統ごとに基本のスタックトレースを作り、再試行のたびに変わる部分を変異させる
+    
+    Returns:
+        [(系統番号, トレースバック)]（系統はフレームの一部を共有する）
+    """
+    rng = random.Random(seed)
+    modules = [f"{rng.choice(['api', 'core', 'jobs', 'db', 'net', 'util'])}/{_WORDS[n % len(_WORDS)]}_{n}"
+               for n in range(150)]
+    frames = [(rng.choice(modules), f"{rng.choice(['handle', 'load', 'run', 'parse', 'fetch'])}_{n}",
+               f"{rng.choice(['result', 'data', 'row', 'payload'])} = {rng.choice(_WORDS)}_{n}(ctx, item)")
+              for n in range(400)]
+    # 同じエントリポイントから呼ばれる系統はフレームの前半が共通
+    entrypoints = [rng.sample(frames, 4) for _ in range(5)]
+    corpus = []
+    for family in range(families):
+        stack = rng.choice(entrypoints) + rng.sample(frames, rng.randint(3, 10))
+        exception = rng.choice(_EXCEPTIONS)
+        name = f"{rng.choice(_WORDS)}_{family}"
+        for _ in range(per_family):
+            mutated = list(stack)
+            if rng.random() < 0.3:
+                # 再帰の深さが変わる
+                position = rng.randrange(len(mutated))
+                mutated.insert(position, mutated[position])
+            if rng.random() < 0.3:
+                mutated.pop(rng.randrange(len(mutated)))
+            if rng.random() < 0.2:
+                # 別の経路から呼ばれる
+                mutated.insert(rng.randrange(len(mutated)), rng.choice(frames))
+            lines = ["Traceback (most recent call last):"]
+            for module, function, code in mutated:
+                lines.append(f'  File "/srv/app/{module}.py", line {rng.randint(1, 900)}, in {function}')
+                lines.append(f"    {code}")
+            lines.append(exception.format(name=name if rng.random() < 0.7 else f"{name}_{rng.randrange(1000)}",
+                                          uuid=uuid.UUID(int=rng.getrandbits(128)), n=rng.randint(1, 9)))
+            corpus.append((family, "\n".join(lines)))
+    rng.shuffle(corpus)
+    return corpus
+
+
+def _pair_scores(truth: List, predicted: List) -> Dict[str, float]:
+    """同じクラスタに入ったペアの precision / recall"""
+    def pairs(counts: Counter) -> int:
+        return sum(n * (n - 1) // 2 for n in counts.values())
+
+    together = pairs(Counter(zip(truth, predicted)))
+    predicted_pairs, true_pairs = pairs(Counter(predicted)), pairs(Counter(truth))
+    return {
+        "precision": together / predicted_pairs if predicted_pairs else 1.0,
+        "recall": together / true_pairs if true_pairs else 1.0,
+        "clusters": len(set(predicted)),
+    }
+
+
+def cluster_corpus(corpus, threshold=None, normalizer=None) -> List[str]:
+    """コーパスの各トレースバックのクラスタキー（threshold=None なら完全一致）"""
+    normalizer = normalizer or ErrorNormalizer()
+    clusterer = ErrorClusterer(threshold) if threshold is not None else None
+    keys = []
+    for _, text in corpus:
+        normalized = normalizer.normalize(text)
+        key = f"worker1:{hashlib.md5(normalized.encode()).hexdigest()[:16]}"
+        if clusterer:
+            key, _ = clusterer.assign("worker1", clusterer.signature(normalized), key)
+        keys.append(key)
+    return keys
+
+
+def bench_cluster(families: int = 400, per_family: int = 25, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """類似度モードの精度（系統ごとにまとまるか）とスループット"""
+    if quick:
+        families = 80
+    corpus = _mutated_tracebacks(families, per_family)
+    truth = [family for family, _ in corpus]
+    print(f"\n🧬 near-duplicate clustering ({len(corpus):,} mutated tracebacks, {families} families)")
+    results = {}
+    for label, threshold in (("exact md5", None), ("minhash-lsh 0.5", 0.5),
+                             ("minhash-lsh 0.6", 0.6), ("minhash-lsh 0.7", 0.7)):
+        start = time.perf_counter()
+        keys = cluster_corpus(corpus, threshold, ErrorNormalizer(cache_size=0))
+        elapsed = time.perf_counter() - start
+        scores = _pair_scores(truth, keys)
+        scores["ops_per_sec"] = len(corpus) / elapsed
+        results[label] = scores
+        print(f"  {label:<18} precision={scores['precision']:.3f}  recall={scores['recall']:.3f}  "
+              f"clusters={scores['clusters']:>6,}  {scores['ops_per_sec']:>8.0f} errors/s")
+
+    # check_error 全体（ロック・ジャーナル込み）
+    for label, clusterer in (("check_error exact", None), ("check_error similarity", ErrorClusterer())):
+        with tempfile.TemporaryDirectory() as tmp:
+            detector = ErrorLoopDetector(threshold=10**9, log_dir=os.path.join(tmp, "logs"), clusterer=clusterer)
+            latencies = []
+            start = time.perf_counter()
+            for _, text in corpus:
+                t0 = time.perf_counter()
+                detector.check_error("worker1", text)
+                latencies.append(time.perf_counter() - t0)
+            detector.save_history()
+            results[label] = _report(label, latencies, time.perf_counter() - start)
+    return results
+
+
+SUITES = {
+    "detector": bench_detector,
+    "normalize": bench_normalize,
+    "helper": bench_helper,
+    "cluster": bench_cluster,
+}
+
+
+def main():
+    """CLI インターフェース"""
+    parser = argparse.ArgumentParser(description='CCTeam Error Loop Detector Benchmarks')
+    parser.add_argument('suite', nargs='?', default='all', choices=['all'] + list(SUITES),
+                        help='Benchmark suite to run')
+    parser.add_argument('--quick', action='store_true', help='Run with reduced data sizes')
+    args = parser.parse_args()
+
+    suites = SUITES.values() if args.suite == 'all' else [SUITES[args.suite]]
+    for suite in suites:
+        suite(quick=args.quick)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,618 @@
+#!/usr/bin/env python3
+"""
+CCTeam Structured Logger ベンチマーク
+structured_logger.py / error_loop_detector.py の改善前後の性能を計測する
+"""
+
+import argparse
+import datetime
+import inspect
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
+from pathlib import Path
+from typing import Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_memory import _report
+from error_loop_detector import ErrorLoopService
+from log_archive import archive_format, compact
+from log_follow import LogFollower
+from log_scan import scan
+from log_segments import LogRotator, load_manifest
+from log_serializer import available_serializers, get_serializer
+from log_store import LogStore
+from structured_logger import LogAnalyzer, LogLevel, LogWriter, StructuredLogger
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+
+@contextmanager
+def _quiet_workdir():
+    """一時ディレクトリに移動し、ロガーのコンソール出力を捨てる"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        os.chdir(tmp)
+        try:
+            with redirect_stdout(devnull), redirect_stderr(devnull):
+                yield Path(tmp)
+        finally:
+            os.chdir(cwd)
+
+
+class _LegacyLogger(StructuredLogger):
+    """改善前の error()：エラー毎に検出スクリプトを os.system で起動"""
+
+    def _check_error_loop(self, message: str, error: Exception):
+        error_msg = f"{type(error).__name__}: {str(error)}"
+        os.system(f'python3 {SCRIPTS_DIR}/error_loop_detector.py check '
+                  f'--agent {self.agent_name} '
+                  f'--error "{error_msg}" >/dev/null')
+
+
+# ---------------------------------------------------------------------------
+# エラーループ検出の連携（logger.error の呼び出し側レイテンシ）
+# ---------------------------------------------------------------------------
+
+def bench_error(calls: int = 500, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """logger.error のレイテンシ：os.system で検出器を起動 vs プロセス内サービスへ投入"""
+    if quick:
+        calls = 100
+    print(f"\n🚨 logger.error with error-loop detection ({calls:,} calls)")
+    results = {}
+    for label, logger_class, count in (("os.system per error", _LegacyLogger, max(calls // 10, 10)),
+                                       ("in-process service", StructuredLogger, calls)):
+        with _quiet_workdir() as tmp:
+            logger = logger_class("bench", log_dir=str(tmp / "logs"))
+            latencies = []
+            start = time.perf_counter()
+            for n in range(count):
+                # 毎回異なるエラーにしてループ検出（停止指示の送信）を起こさない
+                error = ValueError(f"invalid value {n}")
+                t0 = time.perf_counter()
+                logger.error("validation failed", error)
+                latencies.append(time.perf_counter() - t0)
+            elapsed = time.perf_counter() - start
+            service = ErrorLoopService.shared(logger.log_dir)
+            drain_start = time.perf_counter()
+            service.drain(timeout=60)
+            drained = time.perf_counter() - drain_start
+        results[label] = _report(label, latencies, elapsed)
+        if logger_class is StructuredLogger:
+            print(f"  detector backlog drained in {drained * 1000:.1f}ms "
+                  f"({len(service.detector.error_history):,} signatures, {service.dropped} dropped)")
+    return results
+
+# ---------------------------------------------------------------------------
+# ファイル書き込み（呼び出し毎に open/close vs バックグラウンドでまとめて書き込み）
+# ---------------------------------------------------------------------------
+
+def bench_write(calls: int = 20_000, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """info / error の呼び出し側レイテンシと、ファイルに書き終わるまでの行数/秒（ops/s は書き出し完了まで）"""
+    if quick:
+        calls = 2_000
+    print(f"\n📝 log writes ({calls:,} calls per level)")
+    results = {}
+    for level in ("info", "error"):
+        for label, make_writer in (("sync open/close", None),
+                                   ("async block", lambda: LogWriter(overflow="block")),
+                                   ("async drop", lambda: LogWriter(queue_size=1000, overflow="drop"))):
+            with _quiet_workdir() as tmp:
+                writer = make_writer() if make_writer else None
+                logger = StructuredLogger("bench", log_dir=str(tmp / "logs"), async_write=writer is not None,
+                                          writer=writer)
+                log = getattr(logger, level)
+                latencies = []
+                start = time.perf_counter()
+                for n in range(calls):
+                    t0 = time.perf_counter()
+                    # error は例外なしで呼び、ループ検出を計測に含めない
+                    log(f"processed item {n}", context={"item": n, "status": "ok"})
+                    latencies.append(time.perf_counter() - t0)
+                logger.flush()
+                elapsed = time.perf_counter() - start
+                lines = sum(1 for _ in open(logger.structured_log_file))
+            name = f"{level} {label}"
+            results[name] = _report(name, latencies, elapsed)
+            results[name]["lines_per_sec"] = lines / elapsed
+            dropped = f", {writer.dropped:,} dropped" if writer and writer.dropped else ""
+            print(f"    {lines:,} lines in file after flush{dropped}")
+    return results
+
+# ---------------------------------------------------------------------------
+# ログ呼び出しのホットパス（1呼び出しあたりの CPU コスト）
+# ---------------------------------------------------------------------------
+
+class _LegacyEntryLogger(StructuredLogger):
+    """改善前のエントリ作成：inspect で呼び出し元を取得、時刻を2回取得、format_exc を常に呼ぶ"""
+
+    def _get_caller_info(self):
+        frame = inspect.currentframe()
+        if frame and frame.f_back and frame.f_back.f_back:
+            caller_frame = frame.f_back.f_back
+            return {
+                "file": os.path.basename(caller_frame.f_code.co_filename),
+                "function": caller_frame.f_code.co_name,
+                "line": caller_frame.f_lineno
+            }
+        return {}
+
+    def _format_traceback(self, error):
+        return traceback.format_exc().splitlines()
+
+    def _plain_line(self, level, message, timestamp):
+        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return f"[{timestamp}] [{level.value}] {message}\n"
+
+
+def _per_call_ns(function, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def bench_hotpath(calls: int = 200_000, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """無効なレベルの呼び出し、呼び出し元の取得、エントリ作成のコスト（ns/呼び出し）"""
+    if quick:
+        calls = 20_000
+    print(f"\n🔥 logging hot path ({calls:,} calls, ns per call)")
+    results = {}
+    with _quiet_workdir() as tmp:
+        legacy = _LegacyEntryLogger("bench", log_dir=str(tmp / "logs"))
+        logger = StructuredLogger("bench", log_dir=str(tmp / "logs"))
+        gated = StructuredLogger("bench", log_dir=str(tmp / "logs"), level="INFO")
+        try:
+            raise ValueError("invalid value")
+        except ValueError as e:
+            raised = e
+        # ファイル書き込みを除いたエントリ作成 + プレーンテキスト行
+        cases = (
+            # 改善前はレベル設定がなく、debug() も毎回ファイルに書き込んでいた
+            ("debug() at level INFO", lambda: legacy.debug("cache miss", {"key": "k"}),
+             lambda: gated.debug("cache miss", {"key": "k"})),
+            ("caller info", legacy._get_caller_info, logger._get_caller_info),
+            ("entry + plain line", lambda: legacy._plain_line(LogLevel.INFO, "m", legacy._create_log_entry(
+                LogLevel.INFO, "m", {"n": 1})["timestamp"]),
+             lambda: logger._plain_line(LogLevel.INFO, "m", logger._create_log_entry(
+                 LogLevel.INFO, "m", {"n": 1})["timestamp"])),
+            ("error entry, repeated raise", lambda: legacy._create_log_entry(LogLevel.ERROR, "m", None, raised),
+             lambda: logger._create_log_entry(LogLevel.ERROR, "m", None, raised)),
+        )
+        rows = [(label, _per_call_ns(before, calls), _per_call_ns(after, calls)) for label, before, after in cases]
+    for label, before, after in rows:
+        results[label] = {"before_ns": before, "after_ns": after}
+        print(f"  {label:<30} before={before:>9,.0f}ns  after={after:>9,.0f}ns")
+    return results
+
+
+# ---------------------------------------------------------------------------
+# シリアライザ（JSONL のエンコード・デコード）
+# ---------------------------------------------------------------------------
+
+_AGENTS = ("boss", "worker1", "worker2", "worker3")
+_ERROR_TYPES = ("ValueError", "KeyError", "TimeoutError", "ConnectionError", "ZeroDivisionError")
+
+
+def _sample_entries(count: int = 1000) -> list:
+    """StructuredLogger が書き出す形のエントリ（5件に1件はトレースバック付きのエラー）"""
+    start = datetime.datetime.now() - datetime.timedelta(days=1)
+    entries = []
+    for n in range(count):
+        entry = {
+            "timestamp": (start + datetime.timedelta(seconds=n * 0.1)).isoformat(),
+            "level": "INFO",
+            "agent": _AGENTS[n % len(_AGENTS)],
+            "message": f"タスク完了: job-{n}",
+            "caller": {"file": "worker.py", "function": "run_job", "line": 40 + n % 30},
+            "context": {"task_name": f"job-{n}", "status": "completed", "result": {"items": n, "ok": True}},
+        }
+        if n % 5 == 0:
+            error_type = _ERROR_TYPES[n % len(_ERROR_TYPES)]
+            entry["level"] = "ERROR"
+            entry["error"] = {
+                "type": error_type,
+                "message": f"request {n} failed",
+                "traceback": ["Traceback (most recent call last):",
+                              '  File "worker.py", line 42, in run_job',
+                              "    result = client.fetch(job)",
+                              '  File "client.py", line 88, in fetch',
+                              "    raise error",
+                              f"{error_type}: request {n} failed"],
+                "attributes": {},
+            }
+        entries.append(entry)
+    return entries
+
+
+def bench_serialize(entries: int = 1_000_000, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """JSONL ファイルへのエンコードと、読み込み（dict に戻す / 集計用フィールドだけ / analyze_errors）の件数/秒"""
+    if quick:
+        entries = 100_000
+    samples = _sample_entries()
+    print(f"\n🧬 serializers ({entries:,} entries, available: {', '.join(available_serializers())})")
+    results = {}
+
+    def row(label: str, elapsed: float, size: int):
+        results[label] = {"entries_per_sec": entries / elapsed, "mb_per_sec": size / elapsed / 1e6}
+        print(f"  {label:<34} {entries / elapsed:>12,.0f} entries/s  {size / elapsed / 1e6:>7.1f} MB/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 改善前：行毎に json.dump と改行の write、読み込みは json.loads で全件 dict にする
+        legacy_file = Path(tmp) / "legacy.jsonl"
+        start = time.perf_counter()
+        with open(legacy_file, "w", encoding="utf-8") as f:
+            for n in range(entries):
+                json.dump(samples[n % len(samples)], f, ensure_ascii=False)
+                f.write("\n")
+        row("encode json.dump (before)", time.perf_counter() - start, legacy_file.stat().st_size)
+
+        for name in available_serializers():
+            serializer = get_serializer(name)
+            path = Path(tmp) / f"{name}.jsonl"
+            dumps = serializer.dumps
+            start = time.perf_counter()
+            with open(path, "wb") as f:
+                for n in range(entries):
+                    f.write(dumps(samples[n % len(samples)]))
+            row(f"encode {name}", time.perf_counter() - start, path.stat().st_size)
+
+        size = legacy_file.stat().st_size
+        start = time.perf_counter()
+        with open(legacy_file, "r", encoding="utf-8") as f:
+            decoded = [json.loads(line) for line in f]
+        row("decode json.loads (before)", time.perf_counter() - start, size)
+        del decoded
+
+        for name in available_serializers():
+            serializer = get_serializer(name)
+            path = Path(tmp) / f"{name}.jsonl"
+            size = path.stat().st_size
+            for mode in ("loads", "summarize"):
+                decode = getattr(serializer, mode)
+                start = time.perf_counter()
+                with open(path, "rb") as f:
+                    for line in f:
+                        decode(line)
+                row(f"decode {name} {mode}", time.perf_counter() - start, size)
+
+        # analyze_errors を通した集計（全件がエラーログにある場合）
+        log_dir = Path(tmp) / "logs"
+        log_dir.mkdir()
+        os.replace(Path(tmp) / f"{available_serializers()[0]}.jsonl", log_dir / "errors_all.jsonl")
+        size = (log_dir / "errors_all.jsonl").stat().st_size
+        for name in available_serializers():
+            analyzer = LogAnalyzer(str(log_dir), serializer=name)
+            start = time.perf_counter()
+            total = analyzer.analyze_errors()["total"]
+            row(f"analyze_errors {name}", time.perf_counter() - start, size)
+            assert total == entries, total
+    return results
+
+
+# ---------------------------------------------------------------------------
+# 索引を使った時間範囲の集計（--hours 24 の analyze）
+# ---------------------------------------------------------------------------
+
+def _write_week_log(path: Path, size: int) -> int:
+    """7日分に均等に散らばったエラーログを size バイトまで書く（書き込み順に timestamp が数秒前後する）"""
+    samples = [get_serializer().dumps(entry) for entry in _sample_entries(200)]
+    # timestamp の後ろ（固定部分）を使い回し、timestamp だけ差し替える
+    tails = [line[line.index(b'"level"'):] for line in samples]
+    per_line = sum(len(t) for t in tails) / len(tails) + 45
+    count = int(size / per_line)
+    start = datetime.datetime.now() - datetime.timedelta(days=7)
+    step = 7 * 86400 / count
+    with open(path, "wb") as f:
+        chunk = []
+        for n in range(count):
+            jitter = (n * 7919 % 11) - 5
+            timestamp = (start + datetime.timedelta(seconds=n * step + jitter)).isoformat()
+            chunk.append(b'{"timestamp":"%s",%s' % (timestamp.encode(), tails[n % len(tails)]))
+            if len(chunk) >= 10000:
+                f.write(b"".join(chunk))
+                chunk = []
+        f.write(b"".join(chunk))
+    return count
+
+
+def bench_index(size: int = 5 * 1024 ** 3, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """7日分のエラーログに対する analyze_errors(24時間)：全行を読む vs 索引（初回・2回目・追記後）"""
+    if quick:
+        size = 200 * 1024 ** 2
+    print(f"\n🗂️  analyze_errors(--hours 24) on a {size / 1024 ** 3:.1f}GB errors_all.jsonl (7 days)")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = Path(tmp) / "logs"
+        log_dir.mkdir()
+        log_file = log_dir / "errors_all.jsonl"
+        entries = _write_week_log(log_file, size)
+        print(f"  {entries:,} entries, {log_file.stat().st_size / 1024 ** 2:,.0f}MB")
+
+        def run(label: str, analyzer: LogAnalyzer):
+            start = time.perf_counter()
+            result = analyzer.analyze_errors(24 * 3600)
+            elapsed = time.perf_counter() - start
+            results[label] = {"seconds": elapsed, "total": result["total"]}
+            print(f"  {label:<34} {elapsed:>9.3f}s  total={result['total']:,}")
+
+        # 実行の間にも時間が進むので、total は範囲の端の数件ずれることがある
+        run("full scan (no index)", LogAnalyzer(str(log_dir), indexed=False))
+        run("indexed, first run (builds index)", LogAnalyzer(str(log_dir)))
+        run("indexed, repeat", LogAnalyzer(str(log_dir)))
+        # 1分間分（約 entries / 10080 行）の追記
+        with open(log_file, "ab") as f:
+            now = datetime.datetime.now().isoformat()
+            for entry in _sample_entries(max(entries // 10080, 1)):
+                entry["timestamp"] = now
+                f.write(get_serializer().dumps(entry))
+        run("indexed, after 1 minute of appends", LogAnalyzer(str(log_dir)))
+        index_size = sum(p.stat().st_size for p in (log_dir / "segments").glob("*.idx"))
+        print(f"  index size: {index_size / 1024:,.0f}KB")
+    return results
+
+
+# ---------------------------------------------------------------------------
+# mmap した並列スキャン（索引のないログの一度きりの分析）
+# ---------------------------------------------------------------------------
+
+def bench_scan(size: int = 2 * 1024 ** 3, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """7日分のログ全体の集計とエージェント・レベルでの絞り込み：1行ずつ読む vs 並列スキャン（プロセス数別）"""
+    if quick:
+        size = 200 * 1024 ** 2
+    cpus = os.cpu_count() or 1
+    workers = sorted({1, 2, 4, cpus})
+    print(f"\n🧵 scan of a {size / 1024 ** 3:.1f}GB errors_all.jsonl (7 days, {cpus} CPUs)")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = Path(tmp) / "logs"
+        log_dir.mkdir()
+        log_file = log_dir / "errors_all.jsonl"
+        entries = _write_week_log(log_file, size)
+        print(f"  {entries:,} entries, {log_file.stat().st_size / 1024 ** 2:,.0f}MB")
+
+        def run(label: str, function):
+            start = time.perf_counter()
+            totals = function()
+            elapsed = time.perf_counter() - start
+            results[label] = {"seconds": elapsed, "total": totals["total"]}
+            print(f"  {label:<38} {elapsed:>8.2f}s  {entries / elapsed / 1e6:>6.2f}M lines/s  "
+                  f"total={totals['total']:,}")
+
+        run("analyze_errors, line by line", lambda: LogAnalyzer(str(log_dir), indexed=False).analyze_errors())
+        for count in workers:
+            run(f"analyze_errors, scan workers={count}",
+                lambda: LogAnalyzer(str(log_dir), workers=count).analyze_errors())
+        # 7日分のうち24時間分だけをデコードする（それ以外は timestamp のバイト列比較で飛ばす）
+        run("analyze_errors(24h), line by line",
+            lambda: LogAnalyzer(str(log_dir), indexed=False).analyze_errors(24 * 3600))
+        run(f"analyze_errors(24h), scan workers={cpus}",
+            lambda: LogAnalyzer(str(log_dir), workers=cpus).analyze_errors(24 * 3600))
+        # 5% の行だけが条件に合う（それ以外はデコードしない）
+        for count in workers:
+            run(f"agent=worker1 level=ERROR, workers={count}",
+                lambda: scan([log_file], agent="worker1", level="ERROR", workers=count)[0])
+    return results
+
+
+# ---------------------------------------------------------------------------
+# ログ追跡（follow）の CPU 使用量
+# ---------------------------------------------------------------------------
+
+def bench_follow(size: int = 2 * 1024 ** 3, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """既存ログの大きさ別に、追記された行を追跡・集計する CPU 時間（追跡側のプロセス時間）"""
+    if quick:
+        size = 200 * 1024 ** 2
+    appends, batch = 20, 1000
+    print(f"\n👀 follow: CPU per appended line with existing logs of 1MB .. {size / 1024 ** 3:.1f}GB")
+    results = {}
+    entries = _sample_entries(batch)
+    now = datetime.datetime.now().isoformat()
+    for entry in entries:
+        entry["timestamp"] = now  # 時間窓に入るように
+    lines = [get_serializer().dumps(entry) for entry in entries]
+    for existing in (1024 ** 2, size):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_dir = Path(tmp) / "logs"
+            log_dir.mkdir()
+            log_file = log_dir / "worker1_structured.jsonl"
+            _write_week_log(log_file, existing)
+            follower = LogFollower(str(log_dir), window=300, poll=True)
+            idle_start = time.process_time()
+            for _ in range(appends):
+                follower.poll_once()
+            idle = (time.process_time() - idle_start) / appends
+            cpu = 0.0
+            for _ in range(appends):
+                with open(log_file, "ab") as f:
+                    f.write(b"".join(lines))
+                start = time.process_time()
+                follower.poll_once()
+                follower.snapshot()
+                cpu += time.process_time() - start
+            follower.close()
+            label = f"{existing / 1024 ** 2:,.0f}MB existing"
+            per_line = cpu / (appends * batch) * 1e6
+            results[label] = {"us_per_line": per_line, "idle_poll_ms": idle * 1e3}
+            print(f"  {label:<22} {per_line:>7.2f}us/line  idle poll {idle * 1e3:.3f}ms  "
+                  f"lines={follower.lines:,}")
+    return results
+
+
+# ---------------------------------------------------------------------------
+# ローテーション済みセグメントの列指向アーカイブ（compact）
+# ---------------------------------------------------------------------------
+
+def bench_archive(size: int = 1024 ** 3, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """7日分のセグメントを compact した圧縮率と、JSONL（1行ずつ・並列スキャン）に対するクエリ時間"""
+    if quick:
+        size = 200 * 1024 ** 2
+    segments = 8
+    print(f"\n🗜️ archive of {size / 1024 ** 3:.1f}GB of rotated segments (7 days, {segments} segments)")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = Path(tmp) / "logs"
+        log_dir.mkdir()
+        staging = Path(tmp) / "week.jsonl"
+        entries = _write_week_log(staging, size)
+        # analyze_errors は errors_all.jsonl、get_agent_activity / search は worker1_structured.jsonl を読む
+        log_files = [log_dir / "errors_all.jsonl", log_dir / "worker1_structured.jsonl"]
+        rotator = LogRotator(str(log_dir), max_bytes=0)
+        with open(staging, "rb") as source:
+            for _ in range(segments):
+                lines = source.readlines(size // segments)
+                if not lines:
+                    break
+                for log_file in log_files:
+                    log_file.write_bytes(b"".join(lines))
+                    rotator.rotate(log_file, force=True)
+                rotator.drain()
+        raw = staging.stat().st_size * len(log_files)
+        staging.unlink()
+        manifest = load_manifest(str(log_dir))
+        stored = sum(s["compressed_bytes"] or s["bytes"] for f in log_files for s in manifest[f.name]["segments"])
+        start = time.perf_counter()
+        archived = compact(str(log_dir))
+        elapsed = time.perf_counter() - start
+        archive_bytes = sum(a["archive_bytes"] for a in archived)
+        results["compact"] = {"seconds": elapsed, "raw_bytes": raw, "gzip_bytes": stored,
+                              "archive_bytes": archive_bytes, "ratio": raw / archive_bytes}
+        print(f"  {entries * len(log_files):,} entries  JSONL {raw / 1024 ** 2:,.0f}MB  gzip {stored / 1024 ** 2:,.1f}MB "
+              f"({raw / stored:.1f}x)  {archive_format()} {archive_bytes / 1024 ** 2:,.1f}MB "
+              f"({raw / archive_bytes:.1f}x)  compact {elapsed:.1f}s")
+
+        def run(label: str, function):
+            start = time.perf_counter()
+            totals = function()
+            elapsed = time.perf_counter() - start
+            results[label] = {"seconds": elapsed, "total": totals["total"]}
+            print(f"  {label:<56} {elapsed:>8.2f}s  total={totals['total']:,}")
+
+        queries = {
+            "analyze_errors": lambda analyzer: analyzer.analyze_errors(),
+            "analyze_errors(24h)": lambda analyzer: analyzer.analyze_errors(24 * 3600),
+            "get_agent_activity(worker1, 24h)": lambda analyzer: analyzer.get_agent_activity("worker1", 24 * 3600),
+            "search(agent=worker1, level=ERROR)": lambda analyzer: analyzer.search(agent="worker1", level="ERROR"),
+        }
+        for name, query in queries.items():
+            engines = {"JSONL line by line": LogAnalyzer(str(log_dir), indexed=False, archive=False),
+                       "JSONL scan workers=1": LogAnalyzer(str(log_dir), workers=1, archive=False),
+                       "archive": LogAnalyzer(str(log_dir), indexed=False)}
+            if name.startswith("search"):
+                del engines["JSONL line by line"]  # search は常に並列スキャン
+            for engine, analyzer in engines.items():
+                run(f"{name}, {engine}", lambda: query(analyzer))
+    return results
+
+
+# ---------------------------------------------------------------------------
+# SQLite のログストア（取り込みと SQL での集計）
+# ---------------------------------------------------------------------------
+
+_HOURLY_SQL = ("SELECT substr(timestamp, 1, 13) AS hour, agent, caller_function, count(*) FROM entries "
+               "WHERE level IN ('ERROR', 'CRITICAL') GROUP BY hour, agent, caller_function")
+
+
+def _hourly_errors(log_file: Path) -> Dict[tuple, int]:
+    """_HOURLY_SQL と同じ集計を JSONL を1行ずつ読んで行う"""
+    loads = get_serializer().loads
+    counts: Dict[tuple, int] = {}
+    with open(log_file, "rb") as f:
+        for line in f:
+            entry = loads(line)
+            if entry.get("level") in ("ERROR", "CRITICAL"):
+                key = (entry["timestamp"][:13], entry.get("agent"), (entry.get("caller") or {}).get("function"))
+                counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def bench_store(size: int = 1024 ** 3, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """7日分のログの取り込み（初回・追記分だけ）と、analyze / agent / 任意の集計：JSONL を読む vs SQL"""
+    if quick:
+        size = 100 * 1024 ** 2
+    print(f"\n🗃️ SQLite log store of {size / 1024 ** 3:.1f}GB errors_all.jsonl + worker1_structured.jsonl (7 days)")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = Path(tmp) / "logs"
+        log_dir.mkdir()
+        error_file = log_dir / "errors_all.jsonl"
+        agent_file = log_dir / "worker1_structured.jsonl"
+        entries = _write_week_log(error_file, size)
+        shutil.copyfile(error_file, agent_file)
+
+        def run(label: str, function, lines: int = 0):
+            start = time.perf_counter()
+            value = function()
+            elapsed = time.perf_counter() - start
+            results[label] = {"seconds": elapsed}
+            rate = f"  {lines / elapsed / 1e3:>6.0f}K lines/s" if lines else ""
+            total = f"  total={value['total']:,}" if isinstance(value, dict) and "total" in value else ""
+            print(f"  {label:<52} {elapsed:>8.3f}s{rate}{total}")
+            return value
+
+        with LogStore(str(log_dir)) as store:
+            run("ingest (first run)", store.ingest, entries * 2)
+            run("ingest (nothing new)", store.ingest)
+            appended = _sample_entries(10_000)
+            with open(error_file, "ab") as f, open(agent_file, "ab") as g:
+                for entry in appended:
+                    line = get_serializer().dumps(entry)
+                    f.write(line)
+                    g.write(line)
+            run("ingest (10,000 appended lines per file)", store.ingest, len(appended) * 2)
+            print(f"  database {store.path.stat().st_size / 1024 ** 2:,.0f}MB "
+                  f"(JSONL {(error_file.stat().st_size + agent_file.stat().st_size) / 1024 ** 2:,.0f}MB)")
+            expected = _hourly_errors(agent_file)
+            _, rows = run("errors per hour/agent/caller, SQL", lambda: store.query(_HOURLY_SQL))
+            run("errors per hour/agent/caller, JSONL line by line", lambda: _hourly_errors(agent_file))
+            assert {tuple(row[:3]): row[3] for row in rows} == expected
+
+        queries = {
+            "analyze_errors": lambda analyzer: analyzer.analyze_errors(),
+            "analyze_errors(24h)": lambda analyzer: analyzer.analyze_errors(24 * 3600),
+            "get_agent_activity(worker1, 24h)": lambda analyzer: analyzer.get_agent_activity("worker1", 24 * 3600),
+        }
+        engines = {"line by line": LogAnalyzer(str(log_dir), indexed=False),
+                   "index": LogAnalyzer(str(log_dir)),
+                   "SQL": LogAnalyzer(str(log_dir), sql=True)}
+        engines["index"].analyze_errors()  # 索引を作っておく（2回目以降の分析を計る）
+        engines["index"].get_agent_activity("worker1")
+        for name, query in queries.items():
+            for engine, analyzer in engines.items():
+                run(f"{name}, {engine}", lambda: query(analyzer))
+    return results
+
+
+SUITES = {
+    "error": bench_error,
+    "write": bench_write,
+    "hotpath": bench_hotpath,
+    "serialize": bench_serialize,
+    "index": bench_index,
+    "scan": bench_scan,
+    "follow": bench_follow,
+    "archive": bench_archive,
+    "store": bench_store,
+}
+
+
+def main():
+    """CLI インターフェース"""
+    parser = argparse.ArgumentParser(description='CCTeam Structured Logger Benchmarks')
+    parser.add_argument('suite', nargs='?', default='all', choices=['all'] + list(SUITES),
+                        help='Benchmark suite to run')
+    parser.add_argument('--quick', action='store_true', help='Run with reduced data sizes')
+    args = parser.parse_args()
+
+    suites = SUITES.values() if args.suite == 'all' else [SUITES[args.suite]]
+    for suite in suites:
+        suite(quick=args.quick)
+
+
+if __name__ == "__main__":
+    main()
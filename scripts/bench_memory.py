@@ -0,0 +1,618 @@
+#!/usr/bin/env python3
+"""
+CCTeam Memory Manager ベンチマーク
+memory_manager.py の改善前後の性能を計測する
+"""
+
+import argparse
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from memory_client import MemoryClient
+from memory_manager import CCTeamMemoryManager
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    """パーセンタイル値を取得（samplesはソート不要）"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _report(title: str, latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, float]:
+    """計測結果を表示して辞書で返す"""
+    result = {
+        "ops": len(latencies),
+        "ops_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "errors": errors,
+    }
+    print(f"  {title:<28} {result['ops_per_sec']:>10.0f} ops/s  "
+          f"p50={result['p50_ms']:.2f}ms  p99={result['p99_ms']:.2f}ms  errors={errors}")
+    return result
+
+
+# ---------------------------------------------------------------------------
+# 書き込みベンチマーク（同時書き込みプロセス）
+# ---------------------------------------------------------------------------
+
+def _legacy_save(db_path: str, agent: str, message: str):
+    """改善前の save_conversation（呼び出し毎に接続・DDL・コミット）"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            agent_name TEXT NOT NULL,
+            message_type TEXT NOT NULL,
+            content TEXT NOT NULL,
+            context_hash TEXT,
+            metadata JSON
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent ON conversations(agent_name)")
+    conn.commit()
+    conn.close()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO conversations (session_id, agent_name, message_type, content) VALUES (?, ?, ?, ?)",
+        ("bench", agent, "user", message),
+    )
+    conn.commit()
+    conn.close()
+
+
+def _writer(args) -> Dict[str, object]:
+    """1プロセス分の書き込みを実行しレイテンシを返す"""
+    mode, db_path, agent, count = args
+    latencies = []
+    errors = 0
+    sink = io.StringIO()
+
+    memory = CCTeamMemoryManager(db_path) if mode == "pooled" else None
+    with redirect_stdout(sink):
+        for i in range(count):
+            message = f"{agent} benchmark message {i} " + "x" * 120
+            start = time.perf_counter()
+            try:
+                if memory:
+                    memory.save_conversation(agent, message)
+                else:
+                    _legacy_save(db_path, agent, message)
+            except sqlite3.OperationalError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+    if memory:
+        memory.close()
+    return {"latencies": latencies, "errors": errors}
+
+
+def bench_writes(writers: int = 4, per_writer: int = 500, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """同時書き込み時のスループットとp99レイテンシ（改善前/改善後）"""
+    if quick:
+        per_writer = 100
+    print(f"\n📝 Concurrent writes ({writers} writers x {per_writer} messages)")
+    results = {}
+    for mode in ("legacy", "pooled"):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            if mode == "pooled":
+                CCTeamMemoryManager(db_path).close()  # スキーマを事前作成
+            jobs = [(mode, db_path, f"worker{i}", per_writer) for i in range(writers)]
+            start = time.perf_counter()
+            with multiprocessing.Pool(writers) as pool:
+                outputs = pool.map(_writer, jobs)
+            elapsed = time.perf_counter() - start
+        latencies = [lat for out in outputs for lat in out["latencies"]]
+        errors = sum(out["errors"] for out in outputs)
+        label = "before (connect per call)" if mode == "legacy" else "after (pooled + WAL)"
+        results[mode] = _report(label, latencies, elapsed, errors)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# 送信経路ベンチマーク（プロセス起動 vs デーモン）
+# ---------------------------------------------------------------------------
+
+def bench_daemon(messages: int = 2000, spawns: int = 20, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """agent-send の保存経路：1メッセージ1プロセス vs デーモンへのエンキュー"""
+    if quick:
+        messages, spawns = 500, 5
+    print(f"\n📨 Send-path save latency ({spawns} spawns / {messages} daemon saves)")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # 改善前：メッセージ毎に memory_manager.py save を起動
+        latencies = []
+        start = time.perf_counter()
+        for i in range(spawns):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, str(SCRIPTS_DIR / "memory_manager.py"), "save",
+                            "--agent", "boss", "--message", f"spawned message {i}"],
+                           cwd=tmp, stdout=subprocess.DEVNULL, check=True)
+            latencies.append(time.perf_counter() - t0)
+        results["spawn"] = _report("before (process per save)", latencies, time.perf_counter() - start)
+
+        # 改善後：常駐デーモンへソケット経由でエンキュー
+        daemon = subprocess.Popen([sys.executable, str(SCRIPTS_DIR / "memory_manager.py"), "serve"],
+                                  cwd=tmp, stdout=subprocess.DEVNULL)
+        socket_path = os.path.join(tmp, "memory", "ccteam_memory.sock")
+        try:
+            client = MemoryClient(socket_path)
+            deadline = time.time() + 10
+            while not client.ping():
+                if time.time() > deadline:
+                    raise RuntimeError("memory daemon did not start")
+                time.sleep(0.05)
+
+            latencies = []
+            start = time.perf_counter()
+            for i in range(messages):
+                t0 = time.perf_counter()
+                client.save("boss", f"daemon message {i}")
+                latencies.append(time.perf_counter() - t0)
+            results["daemon"] = _report("after (daemon enqueue)", latencies, time.perf_counter() - start)
+            client.close()
+        finally:
+            daemon.terminate()
+            daemon.wait()
+    return results
+
+
+# ---------------------------------------------------------------------------
+# 検索ベンチマーク（LIKE全件走査 vs FTS5）
+# ---------------------------------------------------------------------------
+
+BASE_WORDS = (
+    "build test deploy error warning module import timeout retry network database "
+    "schema migration commit merge branch review frontend backend docker container "
+    "エラー 接続 タイムアウト デプロイ テスト 完了 失敗 修正 レビュー 設計"
+).split()
+# ファイル名・エラーコード等の識別子（出現頻度はZipf分布）
+IDENTIFIERS = [f"{prefix}{n:04d}" for prefix in ("component_", "ERR", "task-") for n in range(2000)]
+
+
+def _synthetic_messages(count: int, seed: int = 42):
+    """検索対象となる合成メッセージを生成"""
+    rng = random.Random(seed)
+    agents = ["boss", "worker1", "worker2", "worker3"]
+    weights = [1 / (rank + 1) for rank in range(len(IDENTIFIERS))]
+    for i in range(count):
+        words = [rng.choice(BASE_WORDS) for _ in range(rng.randint(8, 20))]
+        words += rng.choices(IDENTIFIERS, weights=weights, k=3)
+        rng.shuffle(words)
+        yield ("bench", rng.choice(agents), "user", f"#{i} " + " ".join(words))
+
+
+def _populate(memory: CCTeamMemoryManager, count: int, seed: int = 42):
+    """合成メッセージを一括投入（FTSはトリガー経由で同期）"""
+    with memory._transaction() as cursor:
+        cursor.executemany(
+            "INSERT INTO conversations (session_id, agent_name, message_type, content) VALUES (?, ?, ?, ?)",
+            _synthetic_messages(count, seed),
+        )
+
+
+def bench_search(sizes=(10_000, 100_000, 1_000_000), queries: int = 50,
+                 quick: bool = False) -> Dict[int, Dict[str, Dict[str, float]]]:
+    """get_relevant_memories の検索レイテンシ（LIKE vs FTS5/BM25）"""
+    if quick:
+        sizes = (10_000,)
+        queries = 20
+    rng = random.Random(7)
+    # 識別子のみの選択的な検索と、頻出語を含む検索の2種類を計測
+    query_sets = {
+        "selective": [f"{rng.choice(IDENTIFIERS[50:])} {rng.choice(IDENTIFIERS[50:])}" for _ in range(queries)],
+        "mixed": [f"{rng.choice(IDENTIFIERS[50:])} {rng.choice(BASE_WORDS)}" for _ in range(queries)],
+    }
+    results = {}
+    for size in sizes:
+        print(f"\n🔍 Search latency ({size:,} rows, {queries} queries per set)")
+        with tempfile.TemporaryDirectory() as tmp:
+            memory = CCTeamMemoryManager(os.path.join(tmp, "bench.db"))
+            _populate(memory, size)
+            results[size] = {}
+            for set_name, query_set in query_sets.items():
+                for label, search in (("LIKE scan", memory._search_like),
+                                      ("FTS5 + BM25", memory.get_relevant_memories)):
+                    latencies = []
+                    start = time.perf_counter()
+                    for query in query_set:
+                        t0 = time.perf_counter()
+                        search(query, 10)
+                        latencies.append(time.perf_counter() - t0)
+                    key = f"{set_name}/{label}"
+                    results[size][key] = _report(key, latencies, time.perf_counter() - start)
+            memory.close()
+    return results
+
+
+# ---------------------------------------------------------------------------
+# 一括書き込みベンチマーク（1件ずつ vs 一括 vs 書き込みバッファ）
+# ---------------------------------------------------------------------------
+
+def bench_bulk(messages: int = 20_000, batch: int = 500, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """save_conversation の書き込みスループット（コミット単位の違い）"""
+    if quick:
+        messages = 5_000
+    print(f"\n📦 Conversation save throughput ({messages:,} messages)")
+    entries = [{"agent": agent, "message": message, "message_type": message_type}
+               for _, agent, message_type, message in _synthetic_messages(messages)]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # 1件ずつコミット
+        memory = CCTeamMemoryManager(os.path.join(tmp, "single.db"))
+        memory.verbose = False
+        latencies = []
+        start = time.perf_counter()
+        for e in entries:
+            t0 = time.perf_counter()
+            memory.save_conversation(e["agent"], e["message"], e["message_type"])
+            latencies.append(time.perf_counter() - t0)
+        results["single"] = _report("save_conversation", latencies, time.perf_counter() - start)
+        memory.close()
+
+        # 一括API（batch件ごとに1トランザクション）
+        memory = CCTeamMemoryManager(os.path.join(tmp, "bulk.db"))
+        memory.verbose = False
+        start = time.perf_counter()
+        for i in range(0, len(entries), batch):
+            memory.save_conversations_bulk(entries[i:i + batch])
+        elapsed = time.perf_counter() - start
+        results["bulk"] = _report(f"save_conversations_bulk({batch})", [elapsed / len(entries)] * len(entries), elapsed)
+        memory.close()
+
+        # 書き込みバッファ（呼び出し側のレイテンシを計測）
+        memory = CCTeamMemoryManager(os.path.join(tmp, "buffered.db"), buffer_size=batch)
+        memory.verbose = False
+        latencies = []
+        start = time.perf_counter()
+        for e in entries:
+            t0 = time.perf_counter()
+            memory.save_conversation(e["agent"], e["message"], e["message_type"])
+            latencies.append(time.perf_counter() - t0)
+        memory.close()
+        results["buffered"] = _report(f"write buffer({batch})", latencies, time.perf_counter() - start)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# エクスポートベンチマーク（行数に対するメモリ使用量）
+# ---------------------------------------------------------------------------
+
+def bench_export(sizes=(20_000, 200_000), quick: bool = False) -> Dict[int, Dict[str, float]]:
+    """export_memory_stream のスループットとピークメモリ（行数に依存しないこと）"""
+    if quick:
+        sizes = (5_000, 50_000)
+    print("\n📤 Streaming export (peak Python memory should stay flat)")
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            memory = CCTeamMemoryManager(os.path.join(tmp, "bench.db"))
+            memory.verbose = False
+            _populate(memory, size)
+            for compression in (None, "gzip"):
+                output = os.path.join(tmp, f"export.jsonl{'.gz' if compression else ''}")
+                tracemalloc.start()
+                start = time.perf_counter()
+                memory.export_memory_stream(output, compression)
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                label = f"{size:,} rows ({compression or 'plain'})"
+                results.setdefault(size, {})[compression or "plain"] = peak
+                print(f"  {label:<28} {size / elapsed:>10.0f} rows/s  peak={peak / 1024:.0f}KiB  "
+                      f"file={os.path.getsize(output) / 1024 / 1024:.1f}MiB")
+            memory.close()
+    return results
+
+
+# ---------------------------------------------------------------------------
+# パターン学習ベンチマーク（json_extract走査 vs 索引付きUPSERT）
+# ---------------------------------------------------------------------------
+
+def _legacy_learn(memory: CCTeamMemoryManager, pattern_type: str, pattern_data: Dict, success: bool):
+    """改善前の learn_pattern（json_extractで全件走査してから更新）"""
+    pattern_key = memory._generate_pattern_key(pattern_data)
+    pattern_data["key"] = pattern_key
+    with memory._transaction() as cursor:
+        existing = cursor.execute("""
+            SELECT id, success_rate, usage_count FROM learned_patterns
+            WHERE pattern_type = ? AND json_extract(pattern_data, '$.key') = ?
+        """, (pattern_type, pattern_key)).fetchone()
+        if existing:
+            pattern_id, rate, count = existing
+            cursor.execute("""
+                UPDATE learned_patterns
+                SET success_rate = ?, usage_count = usage_count + 1, last_used = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, ((rate * count + (1.0 if success else 0.0)) / (count + 1), pattern_id))
+
+
+def bench_patterns(sizes=(1_000, 10_000, 100_000), updates: int = 2_000,
+                   quick: bool = False) -> Dict[int, Dict[str, Dict[str, float]]]:
+    """learn_pattern の更新スループット（パターン数の増加に対して）"""
+    if quick:
+        sizes, updates = (1_000, 10_000), 500
+    results = {}
+    rng = random.Random(3)
+    for size in sizes:
+        print(f"\n🧩 Pattern updates ({size:,} patterns, {updates:,} updates)")
+        with tempfile.TemporaryDirectory() as tmp:
+            memory = CCTeamMemoryManager(os.path.join(tmp, "bench.db"))
+            memory.verbose = False
+            with memory._transaction() as cursor:
+                rows = []
+                for i in range(size):
+                    data = {"command": f"cmd-{i}"}
+                    key = memory._generate_pattern_key(data)
+                    data["key"] = key
+                    rows.append(("command", key, json.dumps(data), 1.0, 1))
+                cursor.executemany("""
+                    INSERT INTO learned_patterns (pattern_type, pattern_key, pattern_data, success_rate, usage_count)
+                    VALUES (?, ?, ?, ?, ?)
+                """, rows)
+            targets = [rng.randrange(size) for _ in range(updates)]
+            results[size] = {}
+            for label, learn in (("before (json_extract scan)", lambda d, ok: _legacy_learn(memory, "command", d, ok)),
+                                 ("after (indexed upsert)", lambda d, ok: memory.learn_pattern("command", d, ok))):
+                latencies = []
+                start = time.perf_counter()
+                for n, i in enumerate(targets):
+                    t0 = time.perf_counter()
+                    learn({"command": f"cmd-{i}"}, n % 3 != 0)
+                    latencies.append(time.perf_counter() - t0)
+                results[size][label] = _report(label, latencies, time.perf_counter() - start)
+            memory.close()
+    return results
+
+
+# ---------------------------------------------------------------------------
+# ページングベンチマーク（OFFSET vs キーセット）
+# ---------------------------------------------------------------------------
+
+def bench_pagination(rows: int = 200_000, page_size: int = 50, depths=(100, 1_000, 10_000, 40_000),
+                     quick: bool = False) -> Dict[int, Dict[str, float]]:
+    """深いページの取得レイテンシ（エージェント絞り込みあり）"""
+    if quick:
+        rows, depths = 50_000, (100, 1_000, 10_000)
+    print(f"\n📜 Deep-page latency ({rows:,} rows, page size {page_size}, agent=worker1)")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = CCTeamMemoryManager(os.path.join(tmp, "bench.db"))
+        _populate(memory, rows)
+        # 各深さの直前ページ末尾IDを事前に求めておく（キーセット側はそこから1ページ取得）
+        anchors = {}
+        for n, conv in enumerate(memory.iter_conversations(agent="worker1", page_size=1_000)):
+            if n + 1 in depths:
+                anchors[n + 1] = conv["id"]
+        for depth in depths:
+            if depth not in anchors:
+                continue
+            t0 = time.perf_counter()
+            with memory._reader() as cursor:
+                cursor.execute("""
+                    SELECT id, agent_name, message_type, content, timestamp, metadata
+                    FROM conversations WHERE agent_name = ?
+                    ORDER BY timestamp DESC LIMIT ? OFFSET ?
+                """, ("worker1", page_size, depth)).fetchall()
+            offset_ms = (time.perf_counter() - t0) * 1000
+            t0 = time.perf_counter()
+            list(itertools.islice(memory.iter_conversations(agent="worker1", before_id=anchors[depth],
+                                                            page_size=page_size), page_size))
+            keyset_ms = (time.perf_counter() - t0) * 1000
+            results[depth] = {"offset_ms": offset_ms, "keyset_ms": keyset_ms}
+            print(f"  depth {depth:>7,}   OFFSET {offset_ms:8.2f}ms   keyset {keyset_ms:6.2f}ms")
+        memory.close()
+    return results
+
+
+# ---------------------------------------------------------------------------
+# コンテキスト組み立てベンチマーク（キャッシュ有無）
+# ---------------------------------------------------------------------------
+
+def bench_context(rows: int = 50_000, calls: int = 1_000, write_every: int = 20,
+                  quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """build_context のレイテンシとキャッシュヒット率（write_every 回に1回書き込み）"""
+    if quick:
+        rows, calls = 10_000, 300
+    print(f"\n🧠 build_context ({rows:,} rows, {calls:,} calls, 1 write per {write_every} calls)")
+    rng = random.Random(11)
+    agents = ["boss", "worker1", "worker2", "worker3"]
+    requests = [(rng.choice(agents), rng.choice((1_000, 4_000)), rng.choice((None, "ERR0100 build")))
+                for _ in range(calls)]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = CCTeamMemoryManager(os.path.join(tmp, "bench.db"))
+        memory.verbose = False
+        _populate(memory, rows)
+        for label, build in (("uncached", lambda a, b, q: memory._assemble_context(a, b, q, ())),
+                             ("LRU cached", memory.build_context)):
+            latencies = []
+            start = time.perf_counter()
+            for n, (agent, budget, query) in enumerate(requests):
+                if n % write_every == 0:
+                    memory.save_conversation(agent, f"new message {n}")
+                t0 = time.perf_counter()
+                build(agent, budget, query)
+                latencies.append(time.perf_counter() - t0)
+            results[label] = _report(label, latencies, time.perf_counter() - start)
+        info = memory.context_cache_info()
+        print(f"  cache: {info['hits']} hits / {info['misses']} misses (hit rate {info['hit_rate']:.1%})")
+        memory.close()
+    return results
+
+
+def _populate_year(memory: CCTeamMemoryManager, per_day: int, seed: int = 42):
+    """1年分の合成トラフィックを投入（1日1セッション、時刻は過去365日に分散）"""
+    now = time.time()
+    types = ["user", "user", "user", "system", "task"]
+
+    def rows():
+        for n, (_, agent, _, content) in enumerate(_synthetic_messages(365 * per_day, seed)):
+            day = n // per_day
+            ts = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - day * 86400 - n % per_day))
+            yield (f"day{day:03d}", ts, agent, types[n % len(types)], content)
+
+    with memory._transaction() as cursor:
+        cursor.executemany(
+            "INSERT INTO conversations (session_id, timestamp, agent_name, message_type, content) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows(),
+        )
+
+
+def bench_compact(per_day: int = 1_000, queries: int = 50, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """compact 前後のDBサイズとクエリレイテンシ（1年分のトラフィック、保持30日）"""
+    if quick:
+        per_day, queries = 100, 20
+    print(f"\n🗜️  compact ({365 * per_day:,} rows over 365 days, retention 30d, boss 90d)")
+    rng = random.Random(5)
+    terms = [" ".join(rng.sample(IDENTIFIERS[:200], 1) + [rng.choice(BASE_WORDS)]) for _ in range(queries)]
+    workload = {
+        "recent window": lambda memory, n: memory.get_context_window("worker1", limit=50),
+        "search": lambda memory, n: memory.get_relevant_memories(terms[n], limit=10),
+        "stats": lambda memory, n: memory._get_statistics(),
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = CCTeamMemoryManager(os.path.join(tmp, "bench.db"))
+        memory.verbose = False
+        _populate_year(memory, per_day)
+        memory.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        for phase in ("before", "after"):
+            if phase == "after":
+                start = time.perf_counter()
+                summary = memory.compact(30, agent_retention={"boss": 90})
+                print(f"  compact: {time.perf_counter() - start:.2f}s, {summary['deleted']:,} rows archived, "
+                      f"{summary['summaries']:,} session summaries")
+            print(f"  [{phase}] db size {memory._db_size() / 1024 / 1024:.1f} MiB")
+            for label, run in workload.items():
+                latencies = []
+                start = time.perf_counter()
+                for n in range(queries):
+                    t0 = time.perf_counter()
+                    run(memory, n)
+                    latencies.append(time.perf_counter() - t0)
+                results[f"{phase}/{label}"] = _report(f"{phase}/{label}", latencies, time.perf_counter() - start)
+        memory.close()
+    return results
+
+
+def _multi_agent_corpus(rounds: int, seed: int = 21):
+    """マルチエージェントの会話を模した行（BOSSの一斉送信・長いログ付き報告・短い応答）"""
+    rng = random.Random(seed)
+    workers = ["worker1", "worker2", "worker3"]
+    weights = [1 / (rank + 1) for rank in range(len(IDENTIFIERS))]
+    traceback = "\n".join(
+        f'  File "/app/src/{rng.choice(IDENTIFIERS).lower()}.py", line {rng.randint(1, 900)}, in handler'
+        for _ in range(30)
+    )
+    for n in range(rounds):
+        task = " ".join(rng.choices(IDENTIFIERS, weights=weights, k=3))
+        instruction = f"タスク{n}: {task} を実装してください。" + " ".join(rng.choices(BASE_WORDS, k=30))
+        for worker in workers:
+            yield {"agent": worker, "message": instruction, "message_type": "broadcast"}
+        for worker in workers:
+            roll = rng.random()
+            if roll < 0.3:
+                # 同じ失敗ログを複数のワーカーが報告する
+                message = f"テスト失敗 {rng.choice(IDENTIFIERS[:20])}\nTraceback (most recent call last):\n{traceback}"
+            elif roll < 0.6:
+                message = f"完了 {task} " + " ".join(rng.choices(BASE_WORDS, k=rng.randint(5, 40)))
+            else:
+                message = rng.choice(["了解", "確認します", "レビュー待ち", "ビルド中"])
+            yield {"agent": worker, "message": message, "message_type": "report"}
+
+
+def bench_blobs(rounds: int = 20_000, reads: int = 200, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    """本文の重複排除・圧縮によるDBサイズと読み取りレイテンシ（行に直接格納する場合との比較）"""
+    if quick:
+        rounds, reads = 2_000, 100
+    print(f"\n📦 blobs ({rounds * 6:,} rows, 3 workers, broadcast + reports)")
+    rng = random.Random(8)
+    terms = [rng.choice(IDENTIFIERS[:200]) for _ in range(reads)]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, compression in (("inline", None), ("blobs", None), ("blobs+zlib", "zlib")):
+            memory = CCTeamMemoryManager(os.path.join(tmp, f"{label}.db"), compression=compression)
+            memory.verbose = False
+            corpus = _multi_agent_corpus(rounds)
+            if label == "inline":
+                # v5より前の格納形式（本文を各行に保持）
+                with memory._transaction() as cursor:
+                    cursor.executemany(
+                        "INSERT INTO conversations (session_id, agent_name, message_type, content) VALUES (?, ?, ?, ?)",
+                        (("bench", e["agent"], e["message_type"], e["message"]) for e in corpus),
+                    )
+            else:
+                memory.save_conversations_bulk(corpus)
+            memory.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            blobs = memory._get_statistics()["blobs"]
+            print(f"  [{label}] db size {memory._db_size() / 1024 / 1024:.1f} MiB, "
+                  f"message bodies {blobs['referenced_bytes'] / 1024 / 1024:.1f} MiB → "
+                  f"{blobs['stored_bytes'] / 1024 / 1024:.1f} MiB in {blobs['count']:,} blobs")
+            for name, run in (("window", lambda n: memory.get_context_window("worker1", limit=100)),
+                              ("search", lambda n: memory.get_relevant_memories(terms[n], limit=10))):
+                latencies = []
+                start = time.perf_counter()
+                for n in range(reads):
+                    t0 = time.perf_counter()
+                    run(n)
+                    latencies.append(time.perf_counter() - t0)
+                results[f"{label}/{name}"] = _report(f"{label}/{name}", latencies, time.perf_counter() - start)
+            memory.close()
+    return results
+
+
+SUITES = {
+    "writes": bench_writes,
+    "daemon": bench_daemon,
+    "search": bench_search,
+    "bulk": bench_bulk,
+    "export": bench_export,
+    "patterns": bench_patterns,
+    "pagination": bench_pagination,
+    "context": bench_context,
+    "compact": bench_compact,
+    "blobs": bench_blobs,
+}
+
+
+def main():
+    """CLI インターフェース"""
+    parser = argparse.ArgumentParser(description='CCTeam Memory Manager Benchmarks')
+    parser.add_argument('suite', nargs='?', default='all', choices=['all'] + list(SUITES),
+                        help='Benchmark suite to run')
+    parser.add_argument('--quick', action='store_true', help='Run with reduced data sizes')
+    args = parser.parse_args()
+
+    suites = SUITES.values() if args.suite == 'all' else [SUITES[args.suite]]
+    for suite in suites:
+        suite(quick=args.quick)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,9 @@ fi
 echo ""
 echo "tmuxセッションを終了しています..."
 
+# メモリデーモンを停止（SIGTERMで未書き込みの保存を完了してから終了）
+pkill -TERM -f "memory_manager.py serve" 2>/dev/null || true
+
 # tmux kill-server を実行
 tmux kill-server 2>/dev/null
 
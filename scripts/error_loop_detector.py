@@ -6,47 +6,448 @@ CCTeam エラーループ検出システム
 
 import json
 import datetime
+import operator
 import sys
 import os
+import atexit
+import bisect
+import fcntl
+import queue
+import subprocess
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
+import functools
 import hashlib
+import re
 import time
+import zlib
+
+
+class ErrorNormalizer:
+    """
+    エラーメッセージの正規化（可変部分をマスクして同じエラーを同じ文字列にする）
+    
+    全ルールを1つの正規表現（名前付きグループの選択）にまとめて1回の走査で置換し、
+    結果はLRUキャッシュに保持する
+    """
+    
+    # 先に書いたルールが同じ位置では優先される
+    #   requires: いずれかの文字列を含むメッセージにだけ適用（事前フィルタ）
+    #   starts:   マッチの先頭になりうる文字（文字クラスの中身、全ルールにあれば開始位置を絞る）
+    DEFAULT_RULES = [
+        {"name": "timestamp", "replace": "", "requires": [":"], "starts": "0-9",
+         "pattern": r"\d{4}-\d{2}-\d{2}[T ]?\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"},
+        {"name": "uuid", "replace": "<uuid>", "requires": ["-"], "starts": "0-9a-fA-F",
+         "pattern": r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"},
+        {"name": "hex_address", "replace": "<addr>", "requires": ["0x"], "starts": "0",
+         "pattern": r"\b0x[0-9a-fA-F]+\b"},
+        {"name": "temp_path", "replace": "<tmp>", "requires": ["tmp/", "/var/folders/"], "starts": "/",
+         "pattern": r"(?:/private)?/(?:var/)?tmp/[^\s'\":,)]+|/var/folders/[^\s'\":,)]+"},
+        {"name": "pid", "replace": "pid X", "requires": ["pid", "PID", "process"], "starts": "pP",
+         "pattern": r"\b(?:pid|PID|process)[ =:#]*\d+"},
+        {"name": "port", "replace": r"\1:<port>", "requires": [":"], "starts": r"0-9l\[",
+         "pattern": r"((?<![\w.])(?:localhost|\d{1,3}(?:\.\d{1,3}){3})|\[[0-9a-fA-F:]+\]):\d{1,5}\b"},
+        {"name": "port_word", "replace": "port X", "requires": ["port"], "starts": "p",
+         "pattern": r"\bport[ =:]*\d+"},
+        {"name": "duration_ms", "replace": "", "requires": ["ms"], "starts": "0-9",
+         "pattern": r"\d+ms"},
+        {"name": "line", "replace": "line X", "requires": ["line "], "starts": "l",
+         "pattern": r"line \d+"},
+        {"name": "column", "replace": "column X", "requires": ["column "], "starts": "c",
+         "pattern": r"column \d+"},
+    ]
+    # 正規化結果を保持する件数
+    CACHE_SIZE = 4096
+    
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None, cache_size: int = CACHE_SIZE):
+        """
+        Args:
+            rules: ルールのリスト（DEFAULT_RULES と同じ形式、省略時は DEFAULT_RULES）
+            cache_size: LRUキャッシュの件数（0でキャッシュなし）
+        """
+        self.rules = [dict(rule) for rule in (self.DEFAULT_RULES if rules is None else rules)]
+        self._replacements: Dict[str, tuple] = {}
+        self._filters: List[tuple] = []
+        for index, rule in enumerate(self.rules):
+            replacement = rule.get("replace", "")
+            compiled = re.compile(rule["pattern"])
+            # 後方参照を含む置換だけはマッチした部分に個別の正規表現を当て直す
+            self._replacements[f"r{index}"] = (replacement, compiled if "\\" in replacement else None)
+            self._filters.append((index, tuple(rule.get("requires") or ())))
+        # 適用するルールの組み合わせ -> まとめた正規表現
+        self._patterns: Dict[tuple, Any] = {}
+        self.normalize = functools.lru_cache(maxsize=cache_size)(self._normalize) if cache_size else self._normalize
+    
+    @classmethod
+    def from_file(cls, path: Optional[str] = None, **kwargs) -> "ErrorNormalizer":
+        """
+        ルールファイル（JSON、PyYAMLがあればYAML）で既定ルールを上書きして作成
+        
+        ファイル形式: {"replace_defaults": false, "rules": [{"name": ..., "pattern": ..., "replace": ...}]}
+        同名のルールは既定ルールを置き換え、"enabled": false で無効化できる
+        """
+        path = path or os.environ.get("CCTEAM_ERROR_RULES")
+        if not path:
+            return cls(**kwargs)
+        
+        with open(path, 'r', encoding='utf-8') as f:
+            if Path(path).suffix in (".yml", ".yaml"):
+                import yaml
+                config = yaml.safe_load(f) or {}
+            else:
+                config = json.load(f)
+        
+        rules = {} if config.get("replace_defaults") else {rule["name"]: rule for rule in cls.DEFAULT_RULES}
+        custom = []
+        for rule in config.get("rules", []):
+            if not rule.get("enabled", True):
+                rules.pop(rule["name"], None)
+            elif rule["name"] in rules:
+                rules[rule["name"]] = rule
+            else:
+                custom.append(rule)
+        # 独自ルールは既定ルールより先に評価する
+        return cls(custom + list(rules.values()), **kwargs)
+    
+    def _normalize(self, error_msg: str) -> str:
+        """1回の走査で該当しうるルールを適用し、空白を詰めて小文字化"""
+        active = tuple(
+            index for index, literals in self._filters
+            if not literals or any(literal in error_msg for literal in literals)
+        )
+        if active:
+            error_msg = self._combined(active).sub(self._replace, error_msg)
+        return ' '.join(error_msg.split()).lower()
+    
+    def _combined(self, active: tuple):
+        """ルールの組み合わせごとに選択パターンを1度だけコンパイル"""
+        pattern = self._patterns.get(active)
+        if pattern is None:
+            # 各ルールのグループ番号がずれないよう、ルール内の名前付きグループは使わない
+            alternation = "|".join(f"(?P<r{index}>{self.rules[index]['pattern']})" for index in active)
+            starts = [self.rules[index].get("starts") for index in active]
+            if all(starts):
+                # 先読みで開始位置を絞ると、どのルールにも該当しない位置を素早く飛ばせる
+                alternation = f"(?=[{''.join(starts)}])(?:{alternation})"
+            pattern = self._patterns[active] = re.compile(alternation)
+        return pattern
+    
+    def _replace(self, match: "re.Match") -> str:
+        replacement, compiled = self._replacements[match.lastgroup]
+        if compiled is None:
+            return replacement
+        return compiled.sub(replacement, match.group())
+
+
+class ErrorClusterer:
+    """
+    少しずつ変化するエラー（毎回どこかが違うスタックトレースなど）を同じクラスタにまとめる
+    
+    正規化済みメッセージのトークン3-gramから MinHash 署名を作り（1回のハッシュで全スロットを
+    埋める One Permutation Hashing）、署名を帯（band）に分けた LSH バケットで候補だけを比較する
+    """
+    
+    NUM_HASHES = 64
+    BANDS = 16
+    SHINGLE_SIZE = 3
+    # クラスタごとに保持する代表署名の数（変化が積み重なっても追従できるように）
+    MAX_REPRESENTATIVES = 4
+    # 既存の代表とここまで似ていれば代表を増やさない
+    REPRESENTATIVE_SIMILARITY = 0.9
+    _TOKEN = re.compile(r"\w+")
+    
+    def __init__(self, threshold: float = 0.6):
+        """
+        Args:
+            threshold: 同じクラスタとみなす推定Jaccard類似度（0〜1）
+        """
+        self.threshold = threshold
+        self.rows = self.NUM_HASHES // self.BANDS
+        # クラスタのキー（agent:hash）-> 代表署名
+        self.representatives: Dict[str, List[tuple]] = {}
+        # (エージェント, 帯番号, 帯の値) -> その帯を持つクラスタのキー
+        self._buckets: Dict[tuple, set] = {}
+    
+    @classmethod
+    def from_env(cls) -> Optional["ErrorClusterer"]:
+        """環境変数 CCTEAM_ERROR_SIMILARITY が設定されていれば類似度モードで作成"""
+        value = os.environ.get("CCTEAM_ERROR_SIMILARITY")
+        return cls(float(value)) if value else None
+    
+    def signature(self, normalized: str) -> tuple:
+        """MinHash 署名（32bit整数 NUM_HASHES 個）"""
+        tokens = self._TOKEN.findall(normalized)
+        size = self.SHINGLE_SIZE
+        if len(tokens) > size:
+            shingles = set(map(" ".join, zip(*(tokens[i:] for i in range(size)))))
+        else:
+            shingles = {" ".join(tokens)}
+        # crc32 を乗算で64bitに広げる（hash() と違いプロセス間で同じ値になる）
+        hashed = [(zlib.crc32(shingle.encode()) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF for shingle in shingles]
+        # 上位ビットでスロットを選び、スロットごとに最小値を残す（大きい順に上書き）
+        count = self.NUM_HASHES
+        shift = 64 - (count - 1).bit_length()
+        slots: Dict[int, int] = {value >> shift: value for value in sorted(hashed, reverse=True)}
+        
+        # 空のスロットは右隣の値を距離つきで借りる（短いメッセージでも署名が揃う）
+        filled = []
+        for index in range(count):
+            distance = 0
+            while (index + distance) % count not in slots:
+                distance += 1
+            filled.append((slots[(index + distance) % count] + distance * 0x9E3779B1) & 0xFFFFFFFF)
+        return tuple(filled)
+    
+    @staticmethod
+    def similarity(a: tuple, b: tuple) -> float:
+        """署名の一致率（Jaccard類似度の推定値）"""
+        return sum(map(operator.eq, a, b)) / len(a)
+    
+    def _bands(self, agent: str, signature: tuple):
+        rows = self.rows
+        return [(agent, band, signature[band * rows:(band + 1) * rows]) for band in range(self.BANDS)]
+    
+    def match(self, agent: str, signature: tuple) -> tuple:
+        """同じエージェントの最も似たクラスタ（閾値未満なら None）と類似度"""
+        best, best_similarity, seen = None, 0.0, set()
+        for band in self._bands(agent, signature):
+            for key in self._buckets.get(band, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                score = max(self.similarity(signature, rep) for rep in self.representatives[key])
+                if score > best_similarity:
+                    best, best_similarity = key, score
+        return (best, best_similarity) if best_similarity >= self.threshold else (None, best_similarity)
+    
+    def add(self, key: str, signature: tuple) -> bool:
+        """クラスタに代表署名を追加（上限に達していれば False）"""
+        reps = self.representatives.setdefault(key, [])
+        if len(reps) >= self.MAX_REPRESENTATIVES:
+            return False
+        reps.append(signature)
+        for band in self._bands(key.split(':', 1)[0], signature):
+            self._buckets.setdefault(band, set()).add(key)
+        return True
+    
+    def assign(self, agent: str, signature: tuple, new_key: str) -> tuple:
+        """
+        署名をクラスタに割り当てる
+        
+        Returns:
+            (クラスタのキー, 追加した代表署名または None)
+            似たクラスタがなければ new_key で新しいクラスタを作る
+        """
+        key, score = self.match(agent, signature)
+        if key is None:
+            key = new_key
+        if score < self.REPRESENTATIVE_SIMILARITY and self.add(key, signature):
+            return key, signature
+        return key, None
+    
+    def forget(self, key: str):
+        """時間枠から外れたクラスタを索引から削除"""
+        agent = key.split(':', 1)[0]
+        for signature in self.representatives.pop(key, ()):
+            for band in self._bands(agent, signature):
+                keys = self._buckets.get(band)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._buckets[band]
+    
+    def clear(self):
+        self.representatives = {}
+        self._buckets = {}
+    
+    @staticmethod
+    def encode(signature: tuple) -> str:
+        return "".join(f"{value:08x}" for value in signature)
+    
+    @staticmethod
+    def decode(text: str) -> tuple:
+        return tuple(int(text[i:i + 8], 16) for i in range(0, len(text), 8))
+
 
 class ErrorLoopDetector:
     """エラーループを検出し、暴走を防止するシステム"""
     
-    def __init__(self, threshold: int = 3, time_window: int = 300):
+    # キーごとに保持するタイムスタンプの上限（threshold を大きく超える分は不要）
+    MAX_EVENTS_PER_KEY = 1000
+    # ジャーナルの行数がこの値と前回書き直し時の2倍を超えたら書き直す
+    COMPACT_MIN_LINES = 10000
+    
+    def __init__(self, threshold: int = 3, time_window: int = 300, log_dir: str = "logs",
+                 batch_size: int = 100, flush_interval: float = 1.0,
+                 normalizer: Optional[ErrorNormalizer] = None,
+                 clusterer: Optional[ErrorClusterer] = None):
         """
         Args:
             threshold: 同じエラーが何回続いたらループと判定するか
             time_window: エラーをカウントする時間枠（秒）
+            log_dir: 履歴・検出ログの保存先
+            batch_size: ジャーナルへまとめて追記するイベント数
+                        （1なら他プロセスとの間でも件数・検出が厳密になる）
+            flush_interval: 未書き込みのイベントを保持する最大秒数
+            normalizer: エラーメッセージの正規化ルール（省略時は CCTEAM_ERROR_RULES か既定ルール）
+            clusterer: 指定すると似たエラーをクラスタ単位で数える（省略時は CCTEAM_ERROR_SIMILARITY
+                       が設定されていれば類似度モード、なければ完全一致）
         """
         self.threshold = threshold
+        self.normalizer = normalizer or ErrorNormalizer.from_file()
+        self.clusterer = clusterer if clusterer is not None else ErrorClusterer.from_env()
         self.time_window = time_window
-        self.error_history: Dict[str, List[float]] = {}
-        self.error_file = Path("logs/error_loops.json")
+        self.log_dir = Path(log_dir)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # キー -> 時間枠内のタイムスタンプ（最終発生が古い順に並ぶ）
+        self.error_history: "OrderedDict[str, deque]" = OrderedDict()
+        # 追記専用のジャーナル（1行1イベント: [timestamp, key]、類似度モードで代表署名が
+        # 増えた時は [timestamp, key, [署名, ...]]）
+        self.journal_file = self.log_dir / "error_loops.jsonl"
+        # ジャーナルは置き換えられるため、ロックは別ファイルで取る
+        self.lock_file = self.log_dir / "error_loops.lock"
+        # 旧形式（全体を毎回書き直すJSON）、初回読み込み時にジャーナルへ移行
+        self.error_file = self.log_dir / "error_loops.json"
+        self._pending: List[tuple] = []
+        self._pending_since: Optional[float] = None
+        self._journal_lines = 0
+        self._compact_at = self.COMPACT_MIN_LINES
+        # 読み込み済みの位置（他プロセスの追記分だけを読むため）
+        self._journal_offset = 0
+        self._journal_inode: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._next_eviction = 0.0
         self.load_history()
     
+    @contextmanager
+    def _locked(self):
+        """プロセス間の排他ロック（flock、同じプロセス内での入れ子は素通り）"""
+        if self._lock_fd is not None:
+            yield
+            return
+        self.log_dir.mkdir(exist_ok=True)
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            self._lock_fd = fd
+            yield
+        finally:
+            self._lock_fd = None
+            os.close(fd)  # クローズでロックも解放される
+    
     def load_history(self):
-        """過去のエラー履歴を読み込む"""
-        if self.error_file.exists():
+        """ジャーナルを再生して時間枠内のイベントを復元"""
+        with self._locked():
+            if not self.journal_file.exists() and self.error_file.exists():
+                self._import_legacy()
+            self._reload()
+    
+    def _import_legacy(self):
+        """旧形式の error_loops.json を時間枠内のイベントだけジャーナルへ移行"""
+        now = time.time()
+        try:
+            with open(self.error_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.error_history = OrderedDict()
+        events = sorted(
+            (float(ts), key) for key, stamps in data.items() for ts in stamps
+            if now - float(ts) <= self.time_window
+        )
+        for ts, key in events:
+            self._record(key, ts)
+        self._rewrite_journal()
+    
+    def _reload(self):
+        """ジャーナルを先頭から読み直す（未書き込みの自プロセス分は再適用）"""
+        self.error_history = OrderedDict()
+        if self.clusterer:
+            self.clusterer.clear()
+        self._journal_lines = 0
+        self._journal_offset = 0
+        self._journal_inode = None
+        self._sync()
+        self._compact_at = max(self.COMPACT_MIN_LINES, self._journal_lines * 2)
+        for ts, key, representatives in self._pending:
+            self._record(key, ts)
+            for signature in representatives:
+                self.clusterer.add(key, signature)
+    
+    def _sync(self):
+        """他プロセスが追記したイベントを取り込む（ロック中に呼ぶ）"""
+        try:
+            stat = os.stat(self.journal_file)
+        except FileNotFoundError:
+            return
+        if self._journal_inode is not None and (
+            stat.st_ino != self._journal_inode or stat.st_size < self._journal_offset
+        ):
+            # 他プロセスが書き直した（compact/clear）
+            self._reload()
+            return
+        self._journal_inode = stat.st_ino
+        if stat.st_size == self._journal_offset:
+            return
+        
+        with open(self.journal_file, 'rb') as f:
+            f.seek(self._journal_offset)
+            data = f.read()
+        # 行の途中（異常終了した書き込み）は次回に回す
+        complete = data.rfind(b"\n") + 1
+        self._journal_offset += complete
+        now = time.time()
+        clustered = set()
+        for line in data[:complete].splitlines():
+            self._journal_lines += 1
             try:
-                with open(self.error_file, 'r') as f:
-                    data = json.load(f)
-                    # タイムスタンプを float に変換
-                    self.error_history = {
-                        k: [float(ts) for ts in v] 
-                        for k, v in data.items()
-                    }
-            except:
-                self.error_history = {}
+                ts, key, *representatives = json.loads(line)
+            except ValueError:
+                continue
+            if now - ts <= self.time_window:
+                self._record(key, float(ts))
+            if representatives and self.clusterer:
+                # 代表署名は時間枠外の行からも取り込む（同じクラスタの後続イベントが枠内にありうる）
+                clustered.add(key)
+                for signature in representatives[0]:
+                    self.clusterer.add(key, ErrorClusterer.decode(signature))
+        for key in clustered - self.error_history.keys():
+            self.clusterer.forget(key)
     
     def save_history(self):
-        """エラー履歴を保存"""
-        self.error_file.parent.mkdir(exist_ok=True)
-        with open(self.error_file, 'w') as f:
-            json.dump(self.error_history, f, indent=2)
+        """未書き込みのイベントをジャーナルに追記（行数が増えすぎたら書き直す）"""
+        with self._locked():
+            self._sync()
+            self._flush_pending()
+    
+    def _flush_pending(self):
+        """ロック中に未書き込みのイベントを追記（直前に _sync 済みであること）"""
+        if self._pending:
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write("".join(self._journal_line(*event) for event in self._pending))
+                self._journal_offset = f.tell()
+            self._journal_inode = os.stat(self.journal_file).st_ino
+            self._journal_lines += len(self._pending)
+            self._pending = []
+            self._pending_since = None
+        
+        # 書き直しは行数が前回の2倍になった時だけなので1イベントあたり償却O(1)
+        if self._journal_lines > self._compact_at:
+            self._rewrite_journal()
+    
+    def clear(self):
+        """エラー履歴を消去"""
+        with self._locked():
+            self.error_history = OrderedDict()
+            if self.clusterer:
+                self.clusterer.clear()
+            self._pending = []
+            self._pending_since = None
+            self._rewrite_journal()
     
     def check_error(self, agent: str, error_msg: str) -> bool:
         """
@@ -55,7 +456,7 @@ class ErrorLoopDetector:
         Args:
             agent: エージェント名
             error_msg: エラーメッセージ
-            
+        
         Returns:
             bool: エラーループが検出された場合True
         """
@@ -63,54 +464,99 @@ class ErrorLoopDetector:
         normalized_error = self._normalize_error(error_msg)
         error_hash = hashlib.md5(normalized_error.encode()).hexdigest()[:16]
         key = f"{agent}:{error_hash}"
+        signature = self.clusterer.signature(normalized_error) if self.clusterer else None
         
-        current_time = time.time()
-        
-        # 時間枠外の古いエラーを削除
-        if key in self.error_history:
-            self.error_history[key] = [
-                ts for ts in self.error_history[key] 
-                if current_time - ts <= self.time_window
-            ]
-        else:
-            self.error_history[key] = []
-        
-        # 新しいエラーを追加
-        self.error_history[key].append(current_time)
-        
-        # エラー回数をチェック
-        error_count = len(self.error_history[key])
+        # 他プロセスの追記を取り込んでから数え、必要ならそのまま追記する
+        with self._locked():
+            self._sync()
+            representatives = []
+            if signature is not None:
+                # 他プロセスが作ったクラスタも取り込んだ後なので、全プロセスで同じキーになる
+                key, representative = self.clusterer.assign(agent, signature, key)
+                if representative:
+                    representatives.append(representative)
+            current_time = time.time()
+            error_count = self._record(key, current_time)
+            self._pending.append((current_time, key, representatives))
+            if self._pending_since is None:
+                self._pending_since = current_time
+            
+            if current_time >= self._next_eviction:
+                self._evict_expired(current_time)
+            
+            if (error_count >= self.threshold or len(self._pending) >= self.batch_size
+                    or current_time - self._pending_since >= self.flush_interval):
+                self._flush_pending()
         
         if error_count >= self.threshold:
             self._handle_error_loop(agent, error_msg, error_count)
-            self.save_history()
             return True
-        
-        self.save_history()
         return False
     
+    def _record(self, key: str, ts: float) -> int:
+        """キーの時間枠にイベントを追加して枠内の件数を返す"""
+        stamps = self.error_history.get(key)
+        if stamps is None:
+            stamps = self.error_history[key] = deque(maxlen=max(self.threshold, self.MAX_EVENTS_PER_KEY))
+        else:
+            self.error_history.move_to_end(key)
+        if stamps and ts < stamps[-1]:
+            # 他プロセスの書き込みが後から届いた場合も時刻順を保つ
+            if len(stamps) == stamps.maxlen:
+                stamps.popleft()
+            stamps.insert(bisect.bisect(stamps, ts), ts)
+        else:
+            stamps.append(ts)
+        # 古いものから順に並んでいるので先頭だけ見ればよい
+        newest = stamps[-1]
+        while newest - stamps[0] > self.time_window:
+            stamps.popleft()
+        return len(stamps)
+    
+    def _evict_expired(self, now: float):
+        """最終発生が時間枠外になったキーを削除（最終発生の古い順に並んでいる）"""
+        while self.error_history:
+            key, stamps = next(iter(self.error_history.items()))
+            if now - stamps[-1] <= self.time_window:
+                break
+            del self.error_history[key]
+            if self.clusterer:
+                self.clusterer.forget(key)
+        self._next_eviction = now + min(self.time_window, 60)
+    
+    def _rewrite_journal(self):
+        """時間枠内のイベントだけでジャーナルを書き直す（ロック中に一時ファイルから置き換え）"""
+        self.log_dir.mkdir(exist_ok=True)
+        events = sorted((ts, key) for key, stamps in self.error_history.items() for ts in stamps)
+        representatives = dict(self.clusterer.representatives) if self.clusterer else {}
+        tmp_file = self.journal_file.with_suffix(".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            # 代表署名はクラスタの最初のイベントにまとめて載せる
+            f.writelines(self._journal_line(ts, key, representatives.pop(key, None)) for ts, key in events)
+            offset = f.tell()
+        os.replace(tmp_file, self.journal_file)
+        self._journal_lines = len(events)
+        self._compact_at = max(self.COMPACT_MIN_LINES, len(events) * 2)
+        self._journal_offset = offset
+        self._journal_inode = os.stat(self.journal_file).st_ino
+    
+    @staticmethod
+    def _journal_line(ts: float, key: str, representatives: Optional[List[tuple]] = None) -> str:
+        """ジャーナルの1行（クラスタに追加した代表署名があれば3番目の要素に載せる）"""
+        if not representatives:
+            return json.dumps([round(ts, 3), key]) + "\n"
+        return json.dumps([round(ts, 3), key, [ErrorClusterer.encode(rep) for rep in representatives]]) + "\n"
+    
     def _normalize_error(self, error_msg: str) -> str:
         """エラーメッセージを正規化（タイムスタンプなどを除去）"""
-        # 一般的なパターンを除去
-        import re
-        
-        # タイムスタンプパターンを除去
-        normalized = re.sub(r'\d{4}-\d{2}-\d{2}T?\d{2}:\d{2}:\d{2}', '', error_msg)
-        normalized = re.sub(r'\d+ms', '', normalized)
-        normalized = re.sub(r'line \d+', 'line X', normalized)
-        normalized = re.sub(r'column \d+', 'column X', normalized)
-        
-        # 空白を正規化
-        normalized = ' '.join(normalized.split())
-        
-        return normalized.lower()
+        return self.normalizer.normalize(error_msg)
     
     def _handle_error_loop(self, agent: str, error_msg: str, count: int):
         """エラーループが検出された時の処理"""
         timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
         # エラーログに記録
-        with open('logs/error_loops_detected.log', 'a') as f:
+        with open(self.log_dir / 'error_loops_detected.log', 'a') as f:
             f.write(f"\n[{timestamp}] ERROR LOOP DETECTED\n")
             f.write(f"Agent: {agent}\n")
             f.write(f"Count: {count} times in {self.time_window} seconds\n")
@@ -121,7 +567,7 @@ class ErrorLoopDetector:
         self._send_stop_command(agent)
         
         # システムログに記録
-        with open('logs/system.log', 'a') as f:
+        with open(self.log_dir / 'system.log', 'a') as f:
             f.write(f"[{timestamp}] ⚠️ Error loop detected for {agent}. Agent stopped.\n")
     
     def _send_stop_command(self, agent: str):
@@ -149,12 +595,16 @@ class ErrorLoopDetector:
             "❌ 調査が完了するまで、コードの修正は行わないでください。"
         )
         
-        # agent-send.sh を使用してメッセージを送信
-        os.system(f'./scripts/agent-send.sh {agent} "{stop_message}"')
+        # agent-send.sh を使用してメッセージを送信（引数はシェルを経由せずに渡す）
+        try:
+            subprocess.run(['./scripts/agent-send.sh', agent, stop_message], check=False)
+        except OSError as e:
+            print(f"⚠️ Failed to send stop command to {agent}: {e}", file=sys.stderr)
     
     def get_status(self) -> Dict:
         """現在のエラー監視状況を取得"""
         current_time = time.time()
+        self._evict_expired(current_time)
         status = {
             "active_monitors": {},
             "total_errors": 0
@@ -163,7 +613,7 @@ class ErrorLoopDetector:
         for key, timestamps in self.error_history.items():
             # アクティブなエラーのみカウント
             active_errors = [
-                ts for ts in timestamps 
+                ts for ts in timestamps
                 if current_time - ts <= self.time_window
             ]
             
@@ -174,8 +624,8 @@ class ErrorLoopDetector:
                 
                 status["active_monitors"][agent][error_hash] = {
                     "count": len(active_errors),
-                    "first_seen": datetime.datetime.fromtimestamp(min(active_errors)).isoformat(),
-                    "last_seen": datetime.datetime.fromtimestamp(max(active_errors)).isoformat(),
+                    "first_seen": datetime.datetime.fromtimestamp(active_errors[0]).isoformat(),
+                    "last_seen": datetime.datetime.fromtimestamp(active_errors[-1]).isoformat(),
                     "threshold_reached": len(active_errors) >= self.threshold
                 }
                 
@@ -184,21 +634,115 @@ class ErrorLoopDetector:
         return status
 
 
+class ErrorLoopService:
+    """
+    プロセス内で共有する非同期のエラーループ検出
+    
+    submit() はキューに積むだけで即座に戻り、検出はバックグラウンドスレッドの
+    ErrorLoopDetector が順に行う（StructuredLogger から利用）
+    """
+    
+    # 未処理のエラーを保持する上限（超えた分は破棄してログ出力を優先）
+    QUEUE_SIZE = 10000
+    # 終了時に未処理のエラーを待つ最大秒数
+    DRAIN_TIMEOUT = 2.0
+    
+    _instances: Dict[Path, "ErrorLoopService"] = {}
+    _instances_lock = threading.Lock()
+    
+    @classmethod
+    def shared(cls, log_dir: str = "logs") -> "ErrorLoopService":
+        """ログディレクトリごとに1つのサービスを返す"""
+        key = Path(log_dir).resolve()
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(log_dir)
+            return cls._instances[key]
+    
+    def __init__(self, log_dir: str = "logs", threshold: int = 3, time_window: int = 300):
+        self.log_dir = Path(log_dir)
+        self.threshold = threshold
+        self.time_window = time_window
+        self.dropped = 0
+        self._detector = None
+        self._detector_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        threading.Thread(target=self._run, name="error-loop-detector", daemon=True).start()
+        atexit.register(self.drain)
+    
+    @property
+    def detector(self) -> ErrorLoopDetector:
+        """検出器（履歴の読み込みは初回使用時）"""
+        if self._detector is None:
+            self._detector = ErrorLoopDetector(self.threshold, self.time_window, self.log_dir)
+        return self._detector
+    
+    def submit(self, agent: str, error_msg: str) -> bool:
+        """エラーを検出キューに積む（キューが満杯なら破棄して False）"""
+        try:
+            self._queue.put_nowait((agent, error_msg))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+    
+    def drain(self, timeout: float = DRAIN_TIMEOUT) -> bool:
+        """キュー内のエラーの処理完了を待つ（タイムアウト時は False）"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        self._flush()
+        return True
+    
+    def _flush(self):
+        """検出器の未書き込みイベントをジャーナルへ書き出す"""
+        with self._detector_lock:
+            # 書き出すものがなければジャーナルに触れない（終了時にログディレクトリが消えていてもよい）
+            if self._detector is not None and self._detector._pending:
+                self._detector.save_history()
+    
+    def _run(self):
+        """キューからエラーを取り出して検出器に渡す（待機中に未書き込み分を書き出す）"""
+        while True:
+            try:
+                agent, error_msg = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                self._flush()
+                continue
+            try:
+                with self._detector_lock:
+                    self.detector.check_error(agent, error_msg)
+            except Exception as e:
+                # 検出の失敗でログ出力側を止めない
+                print(f"❌ Error loop check failed: {e}", file=sys.stderr)
+            finally:
+                self._queue.task_done()
+
+
 def main():
     """CLI インターフェース"""
     import argparse
     
     parser = argparse.ArgumentParser(description='CCTeam Error Loop Detector')
-    parser.add_argument('command', choices=['check', 'status', 'clear'],
+    parser.add_argument('command', choices=['check', 'status', 'clear', 'normalize'],
                         help='Command to execute')
     parser.add_argument('--agent', help='Agent name')
     parser.add_argument('--error', help='Error message')
     parser.add_argument('--threshold', type=int, default=3,
                         help='Error threshold (default: 3)')
+    parser.add_argument('--rules', help='Normalization rules file (JSON/YAML)')
+    parser.add_argument('--similarity', type=float,
+                        help='Count near-duplicate errors as one (Jaccard threshold 0-1, '
+                             'default: $CCTEAM_ERROR_SIMILARITY or exact match)')
     
     args = parser.parse_args()
     
-    detector = ErrorLoopDetector(threshold=args.threshold)
+    # CLI は1回の check で終了するため、他プロセスと厳密に数えるよう都度書き込む
+    detector = ErrorLoopDetector(threshold=args.threshold, batch_size=1,
+                                 normalizer=ErrorNormalizer.from_file(args.rules),
+                                 clusterer=ErrorClusterer(args.similarity) if args.similarity else None)
     
     if args.command == 'check':
         if not args.agent or not args.error:
@@ -206,6 +750,7 @@ def main():
             sys.exit(1)
         
         is_loop = detector.check_error(args.agent, args.error)
+        detector.save_history()
         if is_loop:
             print(f"⚠️ ERROR LOOP DETECTED for {args.agent}")
             sys.exit(1)
@@ -232,9 +777,14 @@ def main():
                     print(f"     First: {info['first_seen']}")
                     print(f"     Last: {info['last_seen']}")
     
+    elif args.command == 'normalize':
+        if not args.error:
+            print("Error: --error is required for normalize command")
+            sys.exit(1)
+        print(detector.normalizer.normalize(args.error))
+    
     elif args.command == 'clear':
-        detector.error_history = {}
-        detector.save_history()
+        detector.clear()
         print("✅ Error history cleared")
 
 
@@ -3,16 +3,49 @@
 エラーループ検出時に役立つドキュメントやリソースを自動提供するヘルパー
 """
 
+import argparse
 import json
+import os
 import re
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
+
+
+class _KeepMissing(dict):
+    """テンプレート中の未知のプレースホルダはそのまま残す"""
+    
+    def __missing__(self, key: str) -> str:
+        return "{" + key + "}"
+
 
 class ErrorLoopHelper:
-    """エラーループ時の支援情報を提供"""
+    """
+    エラーループ時の支援情報を提供
+    
+    全パターンを1つの正規表現（名前付きグループの選択）にまとめて照合する。
+    各パターンの先頭リテラルの3文字をキーにした索引で候補を絞るため、
+    照合のコストはパターン数ではなくメッセージ長と候補数に比例する
+    """
+    
+    # 先頭リテラルの索引キーの長さ（これより短いリテラルのパターンは常に候補）
+    GRAM_SIZE = 3
+    # コンパイル済みの選択パターンを保持する組み合わせ数
+    PATTERN_CACHE_SIZE = 1024
+    
+    def __init__(self, patterns: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Args:
+            patterns: 正規表現 -> {type, docs, tips, priority, requires} の辞書（省略時は既定パターン）
+                      priority が大きいものほど優先（既定 0、同じなら辞書の順）
+                      requires はマッチに必ず含まれる文字列のリスト（省略時は先頭リテラルを自動抽出）
+        """
+        self.error_patterns = patterns if patterns is not None else self.default_patterns()
+        self._compile()
     
-    def __init__(self):
-        self.error_patterns = {
+    @staticmethod
+    def default_patterns() -> Dict[str, Dict[str, Any]]:
+        """既定のエラーパターン"""
+        return {
             # JavaScript/TypeScript エラー
             r"Cannot find module": {
                 "type": "module_not_found",
@@ -125,26 +158,187 @@ class ErrorLoopHelper:
             }
         }
     
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "ErrorLoopHelper":
+        """
+        ナレッジベース（JSON、PyYAMLがあればYAML）で既定パターンを拡張・上書きして作成
+        
+        ファイル形式: {"replace_defaults": false, "patterns": [{"pattern": ..., "type": ..., "docs": [...], "tips": [...]}]}
+        同じ type のパターンは既定パターンを置き換え、"enabled": false で無効化できる
+        """
+        path = path or os.environ.get("CCTEAM_ERROR_KB")
+        if not path:
+            return cls()
+        
+        with open(path, 'r', encoding='utf-8') as f:
+            if Path(path).suffix in (".yml", ".yaml"):
+                import yaml
+                config = yaml.safe_load(f) or {}
+            else:
+                config = json.load(f)
+        
+        entries = {} if config.get("replace_defaults") else {
+            info["type"]: dict(info, pattern=pattern) for pattern, info in cls.default_patterns().items()
+        }
+        for entry in config.get("patterns", []):
+            if not entry.get("enabled", True):
+                entries.pop(entry["type"], None)
+            else:
+                entries[entry["type"]] = entry
+        patterns = {}
+        for entry in entries.values():
+            info = {key: value for key, value in entry.items() if key not in ("pattern", "enabled")}
+            info.setdefault("docs", [])
+            info.setdefault("tips", [])
+            patterns[entry["pattern"]] = info
+        return cls(patterns)
+    
+    def _compile(self):
+        """パターンの索引（先頭リテラルの3文字 -> パターン番号）を作成"""
+        self._patterns = list(self.error_patterns)
+        self._infos = list(self.error_patterns.values())
+        self._literals: List[tuple] = []
+        self._always: List[int] = []
+        self._index: Dict[str, List[int]] = {}
+        for number, (pattern, info) in enumerate(self.error_patterns.items()):
+            re.compile(pattern, re.IGNORECASE)  # 不正なパターンはここで検出する
+            literals = tuple(literal.lower() for literal in (info.get("requires") or [self._literal_prefix(pattern)]))
+            self._literals.append(literals)
+            if not all(len(literal) >= self.GRAM_SIZE for literal in literals):
+                self._always.append(number)
+                continue
+            for literal in literals:
+                # リテラル中で最も空いている3文字をキーにして、同じ接頭辞のパターンが1か所に偏らないようにする
+                grams = [literal[i:i + self.GRAM_SIZE] for i in range(len(literal) - self.GRAM_SIZE + 1)]
+                gram = min(grams, key=lambda g: len(self._index.get(g, ())))
+                self._index.setdefault(gram, []).append(number)
+        self._combined_cache: Dict[tuple, Any] = {}
+    
+    @staticmethod
+    def _literal_prefix(pattern: str) -> str:
+        """正規表現の先頭にある、マッチに必ず含まれるリテラル（求められなければ空文字）"""
+        depth, in_class, i = 0, False, 0
+        while i < len(pattern):
+            ch = pattern[i]
+            if ch == "\\":
+                i += 2
+                continue
+            if in_class:
+                in_class = ch != "]"
+            elif ch == "[":
+                in_class = True
+            elif ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+            elif ch == "|" and depth == 0:
+                # トップレベルの選択があると先頭リテラルは必須ではない
+                return ""
+            i += 1
+        
+        i = 0
+        while pattern.startswith(("^", "\\b", "\\A"), i):
+            i += 1 if pattern[i] == "^" else 2
+        literal = []
+        while i < len(pattern):
+            ch, step = pattern[i], 1
+            if ch == "\\":
+                escaped = pattern[i + 1:i + 2]
+                if not escaped or escaped.isalnum():
+                    break
+                ch, step = escaped, 2
+            elif ch in ".^$*+?{}[]|()":
+                break
+            if pattern[i + step:i + step + 1] in ("?", "*", "{"):
+                # 直後の量指定子で省略されうる文字は含めない
+                break
+            literal.append(ch)
+            i += step
+        return "".join(literal)
+    
+    def _candidates(self, error_message: str) -> tuple:
+        """先頭リテラルを含むパターンだけを候補にする（パターン数ではなくメッセージ長に比例）"""
+        lowered = error_message.lower()
+        if len(self._index) * 4 < len(lowered):
+            # 索引が小さいうちはキーを1つずつ探す方が速い
+            grams = [gram for gram in self._index if gram in lowered]
+        else:
+            # メッセージ中の3文字を列挙して索引と突き合わせる（パターン数に依存しない）
+            grams = self._index.keys() & map("".join, zip(*(lowered[i:] for i in range(self.GRAM_SIZE))))
+        numbers = set(self._always)
+        for gram in grams:
+            numbers.update(self._index[gram])
+        return tuple(sorted(
+            number for number in numbers
+            if any(literal in lowered for literal in self._literals[number])
+        ))
+    
+    def _combined(self, numbers: tuple):
+        """候補の組み合わせごとに選択パターンを1度だけコンパイル"""
+        pattern = self._combined_cache.get(numbers)
+        if pattern is None:
+            if len(self._combined_cache) >= self.PATTERN_CACHE_SIZE:
+                self._combined_cache.clear()
+            # 各パターンのグループ番号がずれないよう、パターン内の名前付きグループは使わない
+            alternation = "|".join(f"(?P<p{number}>{self._patterns[number]})" for number in numbers)
+            pattern = self._combined_cache[numbers] = re.compile(alternation, re.IGNORECASE)
+        return pattern
+    
+    def match_all(self, error_message: str) -> List[Dict[str, Any]]:
+        """
+        該当する全てのパターンを優先度順に返す
+        
+        通常は1回の走査で済む。同じ位置で別のパターンに先を越されたものだけ、
+        残りの候補で走査し直す
+        """
+        found: Dict[int, Any] = {}
+        remaining = self._candidates(error_message)
+        while remaining:
+            matched = {}
+            for match in self._combined(remaining).finditer(error_message):
+                matched.setdefault(int(match.lastgroup[1:]), match)
+            if not matched:
+                break
+            found.update(matched)
+            remaining = tuple(number for number in remaining if number not in found)
+        
+        return [
+            {
+                "error_type": self._infos[number]["type"],
+                "priority": self._infos[number].get("priority", 0),
+                "pattern": self._patterns[number],
+                "span": found[number].span(),
+            }
+            for number in sorted(found, key=lambda number: (-self._infos[number].get("priority", 0), number))
+        ]
+    
+    def analyze_all(self, error_message: str) -> List[Dict]:
+        """該当する全てのエラータイプの関連情報を優先度順に返す"""
+        analyses = []
+        for match in self.match_all(error_message):
+            info = self.error_patterns[match["pattern"]]
+            # モジュール名などの動的な値を抽出
+            context = self._extract_context(error_message, info['type'])
+            
+            # ドキュメントURLとTipsに動的な値を挿入
+            analyses.append({
+                "error_type": info['type'],
+                "priority": match["priority"],
+                "documentation": [doc.format_map(_KeepMissing(context)) for doc in info['docs']],
+                "tips": [tip.format_map(_KeepMissing(context)) for tip in info['tips']],
+                "context": context
+            })
+        return analyses
+    
     def analyze_error(self, error_message: str) -> Optional[Dict]:
-        """エラーメッセージを分析して関連情報を返す"""
-        for pattern, info in self.error_patterns.items():
-            if re.search(pattern, error_message, re.IGNORECASE):
-                # モジュール名などの動的な値を抽出
-                match = re.search(pattern, error_message, re.IGNORECASE)
-                context = self._extract_context(error_message, info['type'])
-                
-                # ドキュメントURLとTipsに動的な値を挿入
-                docs = [doc.format(**context) for doc in info['docs']]
-                tips = [tip.format(**context) for tip in info['tips']]
-                
-                return {
-                    "error_type": info['type'],
-                    "documentation": docs,
-                    "tips": tips,
-                    "context": context
-                }
-        
-        return None
+        """エラーメッセージを分析して最も優先度の高いエラータイプの関連情報を返す"""
+        analyses = self.analyze_all(error_message)
+        if not analyses:
+            return None
+        
+        analysis = analyses[0]
+        analysis["related"] = [other["error_type"] for other in analyses[1:]]
+        return analysis
     
     def _extract_context(self, error_message: str, error_type: str) -> Dict[str, str]:
         """エラーメッセージから文脈情報を抽出"""
@@ -193,6 +387,9 @@ class ErrorLoopHelper:
 ⚠️ **重要**: 上記の情報を確認してから修正を試みてください。
 """
         
+        if analysis.get('related'):
+            help_message += f"\n🔗 **関連するエラータイプ**: {', '.join(analysis['related'])}\n"
+        
         if analysis.get('context'):
             help_message += f"\n📌 **検出された情報**: {json.dumps(analysis['context'], indent=2)}"
         
@@ -234,18 +431,22 @@ class ErrorLoopHelper:
 
 def main():
     """CLI インターフェース"""
-    import sys
+    parser = argparse.ArgumentParser(description='CCTeam Error Loop Helper')
+    parser.add_argument('error_message', nargs='+', help='Error message to analyze')
+    parser.add_argument('--kb', help='Knowledge base file (JSON/YAML, default: $CCTEAM_ERROR_KB)')
+    parser.add_argument('--json', action='store_true', help='Print all matching error types as JSON')
+    args = parser.parse_args()
     
-    if len(sys.argv) < 2:
-        print("Usage: python error_loop_helper.py <error_message>")
-        sys.exit(1)
+    error_message = " ".join(args.error_message)
+    helper = ErrorLoopHelper.from_file(args.kb)
     
-    error_message = " ".join(sys.argv[1:])
-    helper = ErrorLoopHelper()
+    if args.json:
+        print(json.dumps(helper.analyze_all(error_message), indent=2, ensure_ascii=False))
+        return
     
     help_message = helper.generate_help_message(error_message)
     print(help_message)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
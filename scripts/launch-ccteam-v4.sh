@@ -15,6 +15,10 @@ NC='\033[0m'
 PROJECT_ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 cd "$PROJECT_ROOT"
 
+# メモリデーモンのソケットとDB（各エージェントの作業ディレクトリに関係なく同じものを使う）
+export CCTEAM_MEMORY_SOCKET="$PROJECT_ROOT/memory/ccteam_memory.sock"
+export CCTEAM_MEMORY_DB="$PROJECT_ROOT/memory/ccteam_memory.db"
+
 echo -e "${BLUE}🏢 CCTeam v0.1.16 起動 (階層構造版)${NC}"
 echo "================================"
 echo ""
@@ -117,9 +121,16 @@ main() {
     # 既存機能の初期化
     echo -e "${YELLOW}🔧 システム初期化中...${NC}"
     
-    # メモリシステム
+    # メモリシステム（常駐デーモンを起動）
     if [ -f "$PROJECT_ROOT/scripts/memory_manager.py" ]; then
-        python3 "$PROJECT_ROOT/scripts/memory_manager.py" save --agent SYSTEM --message "CCTeam v0.1.16起動 (階層構造版)" 2>/dev/null || true
+        mkdir -p "$PROJECT_ROOT/logs"
+        nohup python3 "$PROJECT_ROOT/scripts/memory_manager.py" serve >> "$PROJECT_ROOT/logs/memory_daemon.log" 2>&1 &
+        # デーモンの待ち受け開始を待ってから送る（起動できなければ memory_client.py が直接保存する）
+        for _ in $(seq 1 20); do
+            python3 "$PROJECT_ROOT/scripts/memory_client.py" ping >/dev/null 2>&1 && break
+            sleep 0.1
+        done
+        python3 "$PROJECT_ROOT/scripts/memory_client.py" save --agent SYSTEM --message "CCTeam v0.1.16起動 (階層構造版)" >/dev/null 2>&1 || true
     fi
     
     # エラーループ検出
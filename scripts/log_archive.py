@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+"""
+CCTeam ログアーカイブ
+ローテーション済みの JSONL セグメントを列指向の形式（pyarrow があれば Parquet、なければ独自の列ごとのバイナリ）に
+変換し、必要な列だけを読み、時刻・エージェントで行グループごと読み飛ばして集計する
+"""
+
+import fnmatch
+import json
+import os
+import re
+import sys
+import zlib
+from array import array
+from collections import Counter
+from itertools import compress
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+
+try:
+    from log_index import merge_totals, new_totals
+    from log_segments import SEGMENT_DIR, LogRotator, index_file, load_manifest, open_segment
+    from log_serializer import JsonSerializer, LogEntry, get_serializer, summarize_entry
+except ImportError:
+    from scripts.log_index import merge_totals, new_totals
+    from scripts.log_segments import SEGMENT_DIR, LogRotator, index_file, load_manifest, open_segment
+    from scripts.log_serializer import JsonSerializer, LogEntry, get_serializer, summarize_entry
+
+# アーカイブにするファイル（各エージェントのログと、analyze_errors が読む errors_all.jsonl）
+ARCHIVE_PATTERNS = ("*_structured.jsonl", "errors_all.jsonl")
+# 行グループの行数（時刻・エージェントでの読み飛ばしの単位）
+GROUP_ROWS = 16384
+FORMATS = ("columnar", "parquet")
+EXTENSIONS = {"columnar": ".col", "parquet": ".parquet"}
+
+# 独自形式: MAGIC | 列チャンク（zlib）... | フッター（JSON）| フッター長（8バイト LE）| MAGIC
+MAGIC = b"CCTCOL1\n"
+COLUMNAR_VERSION = 1
+# timestamp は「分」までの先頭16文字を辞書にし、残り（秒・マイクロ秒）を micros 列に入れる
+# micros の最上位ビットは小数部なし（':SS' の形）、全ビットが立っていれば辞書の値が timestamp 全体
+_NO_FRACTION = 0x80000000
+_FULL = 0xFFFFFFFF
+_ABSENT = 0xFFFFFFFF
+_TS_SUFFIX = re.compile(r":(\d\d)(?:\.(\d{6}))?")
+# 辞書にする列と、それ以外（行ごとの可変長）の列
+DICT_COLUMNS = ("minute", "level", "agent", "caller", "error_type")
+# 列に分けたフィールド（残りは extra 列に JSON でまとめる）
+_SPLIT_FIELDS = ("timestamp", "level", "agent", "message", "caller")
+
+
+def archive_format(name: Optional[str] = None) -> str:
+    """使う形式を決める（省略・auto は pyarrow があれば parquet、なければ columnar）"""
+    name = (name or "auto").lower()
+    if name == "auto":
+        return "parquet" if pyarrow is not None else "columnar"
+    if name not in FORMATS:
+        raise ValueError(f"unknown archive format: {name} (choose from auto, {', '.join(FORMATS)})")
+    if name == "parquet" and pyarrow is None:
+        print("⚠️  pyarrow is not installed, using columnar archive", file=sys.stderr)
+        return "columnar"
+    return name
+
+
+def _split_timestamp(timestamp: str) -> Tuple[str, int]:
+    """timestamp → (辞書に入れる値, micros)"""
+    match = _TS_SUFFIX.fullmatch(timestamp, 16) if len(timestamp) > 16 else None
+    if match is None:
+        return timestamp, _FULL
+    seconds, fraction = match.groups()
+    if fraction is None:
+        return timestamp[:16], int(seconds) * 1000000 | _NO_FRACTION
+    return timestamp[:16], int(seconds) * 1000000 + int(fraction)
+
+
+def _join_timestamp(value: str, micros: int) -> str:
+    if micros == _FULL:
+        return value
+    if micros & _NO_FRACTION:
+        return f"{value}:{(micros & ~_NO_FRACTION) // 1000000:02d}"
+    return f"{value}:{micros // 1000000:02d}.{micros % 1000000:06d}"
+
+
+def _split_entry(entry: LogEntry) -> Tuple[str, str, str, Optional[str], Optional[str], Any, Dict[str, Any]]:
+    """
+    エントリを (timestamp, level, agent, caller, error_type, message, extra) に分ける
+
+    message は文字列の時だけ列に入れ（None は message がない）、それ以外の値は extra に入れる。
+    timestamp / level / agent / error.type の型が合わないエントリは ValueError（summarize_entry と同じ）
+    """
+    timestamp, level, agent, error_type = summarize_entry(entry)
+    get = entry.get
+    caller = get("caller")
+    extra = {key: value for key, value in entry.items() if key not in _SPLIT_FIELDS}
+    if caller is not None and type(caller) is not dict:
+        extra["caller"] = caller
+        caller = None
+    message = get("message")
+    if "message" in entry and type(message) is not str:
+        extra["message"] = message
+        message = None
+    caller_text = json.dumps(caller, ensure_ascii=False, sort_keys=True) if caller is not None else None
+    return timestamp, level, agent, caller_text, error_type, message, extra
+
+
+def _le(values: array) -> bytes:
+    """array をリトルエンディアンのバイト列に"""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _code_type(size: int) -> str:
+    return "B" if size <= 0xFF else "H" if size <= 0xFFFF else "I"
+
+
+class _Dictionary:
+    """値 → 番号（出てきた順）"""
+
+    def __init__(self):
+        self.codes: Dict[Any, int] = {}
+        self.values: List[Any] = []
+
+    def code(self, value: Any) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def write_columnar(path: Path, entries: Iterable[LogEntry], serializer: Optional[JsonSerializer] = None) -> int:
+    """エントリを独自の列指向形式で書く（書いた行数を返す）"""
+    serializer = serializer or get_serializer()
+    dictionaries = {name: _Dictionary() for name in DICT_COLUMNS}
+    codes: Dict[str, List[int]] = {name: [] for name in DICT_COLUMNS}
+    micros = array("I")
+    timestamps: List[str] = []
+    texts: Dict[str, List[bytes]] = {"message": [], "extra": []}
+    lengths = {"message": array("I"), "extra": array("I")}
+    for entry in entries:
+        timestamp, level, agent, caller, error_type, message, extra = _split_entry(entry)
+        minute, offset = _split_timestamp(timestamp)
+        timestamps.append(timestamp)
+        micros.append(offset)
+        for name, value in (("minute", minute), ("level", level), ("agent", agent),
+                            ("caller", caller), ("error_type", error_type)):
+            codes[name].append(dictionaries[name].code(value))
+        data = message.encode("utf-8") if message is not None else b""
+        texts["message"].append(data)
+        lengths["message"].append(len(data) if message is not None else _ABSENT)
+        data = serializer.dumps(extra)[:-1] if extra else b""
+        texts["extra"].append(data)
+        lengths["extra"].append(len(data))
+
+    rows = len(timestamps)
+    types = {name: _code_type(len(dictionaries[name].values)) for name in DICT_COLUMNS}
+    groups = []
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+
+        def chunk(data: bytes) -> List[int]:
+            start = f.tell()
+            f.write(zlib.compress(data, 6))
+            return [start, f.tell() - start]
+
+        for start in range(0, rows, GROUP_ROWS):
+            end = min(start + GROUP_ROWS, rows)
+            group_ts = timestamps[start:end]
+            columns = {name: chunk(_le(array(types[name], codes[name][start:end]))) for name in DICT_COLUMNS}
+            columns["micros"] = chunk(_le(micros[start:end]))
+            for name in ("message", "extra"):
+                columns[f"{name}_length"] = chunk(_le(lengths[name][start:end]))
+                columns[name] = chunk(b"".join(texts[name][start:end]))
+            groups.append({"rows": end - start, "min": min(group_ts), "max": max(group_ts),
+                           "full": micros[start:end].count(_FULL),
+                           "agents": sorted(set(codes["agent"][start:end])), "columns": columns})
+        footer = json.dumps({"version": COLUMNAR_VERSION, "rows": rows, "types": types,
+                             "dictionaries": {name: d.values for name, d in dictionaries.items()},
+                             "groups": groups}, ensure_ascii=False).encode("utf-8")
+        f.write(footer)
+        f.write(len(footer).to_bytes(8, "little"))
+        f.write(MAGIC)
+    os.replace(tmp, path)
+    return rows
+
+
+class ColumnarArchive:
+    """
+    独自形式のアーカイブの読み込み
+
+    集計は必要な列（level / agent / error_type と、時刻で絞る行グループの minute / micros）だけを読み、
+    時刻の範囲・エージェントの辞書から対象の行がない行グループは読まない
+    """
+
+    def __init__(self, path: Path, serializer: Optional[JsonSerializer] = None):
+        self.path = Path(path)
+        self.serializer = serializer or get_serializer()
+        self.handle = open(self.path, "rb")
+        self.handle.seek(-(8 + len(MAGIC)), os.SEEK_END)
+        tail = self.handle.read(8 + len(MAGIC))
+        if tail[8:] != MAGIC:
+            self.handle.close()
+            raise ValueError(f"not a columnar log archive: {self.path}")
+        length = int.from_bytes(tail[:8], "little")
+        self.handle.seek(-(8 + len(MAGIC) + length), os.SEEK_END)
+        self.footer = json.loads(self.handle.read(length))
+        self.dictionaries = self.footer["dictionaries"]
+        self.types = self.footer["types"]
+        # 読んだ列チャンクのバイト数（列の刈り込みの確認用）
+        self.bytes_read = 0
+
+    def close(self):
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def rows(self) -> int:
+        return self.footer["rows"]
+
+    def _chunk(self, group: Dict[str, Any], name: str) -> bytes:
+        start, length = group["columns"][name]
+        self.handle.seek(start)
+        self.bytes_read += length
+        return zlib.decompress(self.handle.read(length))
+
+    def _codes(self, group: Dict[str, Any], name: str) -> array:
+        return _from_le(self.types.get(name, "I") if name in DICT_COLUMNS else "I", self._chunk(group, name))
+
+    def _texts(self, group: Dict[str, Any], name: str) -> List[Optional[bytes]]:
+        data = self._chunk(group, name)
+        values = []
+        pos = 0
+        for length in self._codes(group, f"{name}_length"):
+            if length == _ABSENT:
+                values.append(None)
+            else:
+                values.append(data[pos:pos + length])
+                pos += length
+        return values
+
+    def _time_mask(self, group: Dict[str, Any], cutoff: str) -> List[bool]:
+        """cutoff より新しい行（境界の「分」の行だけ timestamp を組み立てて比較）"""
+        minutes = self.dictionaries["minute"]
+        prefix = cutoff[:16]
+        # 辞書の値ごと: True/False は確定、None は秒以下まで比べる（timestamp 全体を辞書に入れた行も）
+        state = [None if value == prefix else value > prefix for value in minutes]
+        codes = self._codes(group, "minute")
+        mask = [state[code] for code in codes]
+        if None in mask or group["full"]:
+            micros = self._codes(group, "micros")
+            for row, code in enumerate(codes):
+                if mask[row] is None or micros[row] == _FULL:
+                    mask[row] = _join_timestamp(minutes[code], micros[row]) > cutoff
+        return mask
+
+    def _groups(self, cutoff: Optional[str], agent: Optional[str]) -> Iterator[Tuple[Dict[str, Any], bool]]:
+        """対象の行がありうる行グループと、時刻で行を絞る必要があるか"""
+        agent_code = None
+        if agent is not None:
+            if agent not in self.dictionaries["agent"]:
+                return
+            agent_code = self.dictionaries["agent"].index(agent)
+        for group in self.footer["groups"]:
+            if cutoff is not None and group["max"] <= cutoff:
+                continue
+            if agent_code is not None and agent_code not in group["agents"]:
+                continue
+            yield group, cutoff is not None and group["min"] <= cutoff
+
+    def aggregate(self, totals: Dict[str, Any], cutoff: Optional[str] = None, agent: Optional[str] = None,
+                  level: Optional[str] = None):
+        """条件に合う行の件数（レベル・エージェント・エラータイプ別）を totals に足す"""
+        levels, agents, types = (self.dictionaries[name] for name in ("level", "agent", "error_type"))
+        if level is not None and level not in levels:
+            return
+        counts: Counter = Counter()
+        for group, by_time in self._groups(cutoff, agent):
+            columns = [self._codes(group, name) for name in ("level", "agent", "error_type")]
+            rows = zip(*columns)
+            masks = []
+            if by_time:
+                masks.append(self._time_mask(group, cutoff))
+            if agent is not None:
+                code = agents.index(agent)
+                masks.append([value == code for value in columns[1]])
+            if level is not None:
+                code = levels.index(level)
+                masks.append([value == code for value in columns[0]])
+            if masks:
+                rows = compress(rows, [all(flags) for flags in zip(*masks)] if len(masks) > 1 else masks[0])
+            counts.update(rows)
+        partial = new_totals()
+        for (level_code, agent_code, type_code), count in counts.items():
+            partial["total"] += count
+            for field, value in (("levels", levels[level_code]), ("agents", agents[agent_code]),
+                                 ("types", types[type_code])):
+                if value is not None:
+                    partial[field][value] = partial[field].get(value, 0) + count
+        merge_totals(totals, partial)
+
+    def _entries(self, group: Dict[str, Any]) -> List[LogEntry]:
+        """行グループの全列を読んでエントリに戻す"""
+        dictionaries = self.dictionaries
+        columns = {name: self._codes(group, name) for name in DICT_COLUMNS}
+        micros = self._codes(group, "micros")
+        messages = self._texts(group, "message")
+        extras = self._texts(group, "extra")
+        callers = [json.loads(value) if value is not None else None for value in dictionaries["caller"]]
+        loads = self.serializer.loads
+        entries = []
+        for row in range(group["rows"]):
+            entry = {"timestamp": _join_timestamp(dictionaries["minute"][columns["minute"][row]], micros[row]),
+                     "level": dictionaries["level"][columns["level"][row]],
+                     "agent": dictionaries["agent"][columns["agent"][row]]}
+            if messages[row] is not None:
+                entry["message"] = messages[row].decode("utf-8")
+            caller = callers[columns["caller"][row]]
+            if caller is not None:
+                entry["caller"] = caller
+            if extras[row]:
+                entry.update(loads(extras[row]))
+            entries.append(entry)
+        return entries
+
+    def entries(self) -> Iterator[LogEntry]:
+        """全エントリ（古い順）"""
+        for group in self.footer["groups"]:
+            yield from self._entries(group)
+
+    def tail(self, cutoff: Optional[str], count: int, agent: Optional[str] = None,
+             level: Optional[str] = None) -> List[LogEntry]:
+        """条件に合うエントリを後ろから最大 count 件（新しい順）"""
+        result = []
+        groups = list(self._groups(cutoff, agent))
+        for group, _ in reversed(groups):
+            if len(result) >= count:
+                break
+            for entry in reversed(self._entries(group)):
+                if ((cutoff is None or entry["timestamp"] > cutoff)
+                        and agent in (None, entry["agent"]) and level in (None, entry["level"])):
+                    result.append(entry)
+                    if len(result) >= count:
+                        break
+        return result
+
+
+_PARQUET_COLUMNS = ("timestamp", "level", "agent", "caller", "error_type", "message", "extra")
+
+
+def write_parquet(path: Path, entries: Iterable[LogEntry], serializer: Optional[JsonSerializer] = None) -> int:
+    """エントリを Parquet で書く（timestamp / level / agent / caller / error_type は辞書エンコード）"""
+    serializer = serializer or get_serializer()
+    columns: Dict[str, List[Any]] = {name: [] for name in _PARQUET_COLUMNS}
+    for entry in entries:
+        timestamp, level, agent, caller, error_type, message, extra = _split_entry(entry)
+        for name, value in zip(_PARQUET_COLUMNS, (timestamp, level, agent, caller, error_type, message,
+                                                  serializer.dumps(extra)[:-1].decode("utf-8") if extra else None)):
+            columns[name].append(value)
+    table = pyarrow.table({name: pyarrow.array(values, type=pyarrow.string()) for name, values in columns.items()})
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    pq.write_table(table, tmp, row_group_size=GROUP_ROWS, compression="zstd",
+                   use_dictionary=["timestamp", "level", "agent", "caller", "error_type"])
+    os.replace(tmp, path)
+    return table.num_rows
+
+
+class ParquetArchive:
+    """Parquet のアーカイブの読み込み（列の刈り込みと行グループの統計による絞り込みは pyarrow が行う）"""
+
+    def __init__(self, path: Path, serializer: Optional[JsonSerializer] = None):
+        self.path = Path(path)
+        self.serializer = serializer or get_serializer()
+        self.file = pq.ParquetFile(self.path)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def rows(self) -> int:
+        return self.file.metadata.num_rows
+
+    @staticmethod
+    def _filters(cutoff: Optional[str], agent: Optional[str], level: Optional[str]) -> Optional[List[Tuple]]:
+        filters = []
+        if cutoff is not None:
+            filters.append(("timestamp", ">", cutoff))
+        if agent is not None:
+            filters.append(("agent", "=", agent))
+        if level is not None:
+            filters.append(("level", "=", level))
+        return filters or None
+
+    def aggregate(self, totals: Dict[str, Any], cutoff: Optional[str] = None, agent: Optional[str] = None,
+                  level: Optional[str] = None):
+        table = pq.read_table(self.path, columns=["level", "agent", "error_type"],
+                              filters=self._filters(cutoff, agent, level))
+        partial = new_totals()
+        counts = Counter(zip(*(table.column(name).to_pylist() for name in ("level", "agent", "error_type"))))
+        for (level_value, agent_value, error_type), count in counts.items():
+            partial["total"] += count
+            for field, value in (("levels", level_value), ("agents", agent_value), ("types", error_type)):
+                if value is not None:
+                    partial[field][value] = partial[field].get(value, 0) + count
+        merge_totals(totals, partial)
+
+    def _entry(self, row: Dict[str, Any]) -> LogEntry:
+        entry = {"timestamp": row["timestamp"], "level": row["level"], "agent": row["agent"]}
+        if row["message"] is not None:
+            entry["message"] = row["message"]
+        if row["caller"] is not None:
+            entry["caller"] = json.loads(row["caller"])
+        if row["extra"]:
+            entry.update(self.serializer.loads(row["extra"]))
+        return entry
+
+    def entries(self) -> Iterator[LogEntry]:
+        for batch in self.file.iter_batches(batch_size=GROUP_ROWS):
+            for row in batch.to_pylist():
+                yield self._entry(row)
+
+    def tail(self, cutoff: Optional[str], count: int, agent: Optional[str] = None,
+             level: Optional[str] = None) -> List[LogEntry]:
+        table = pq.read_table(self.path, filters=self._filters(cutoff, agent, level))
+        rows = table.slice(max(table.num_rows - count, 0)).to_pylist()
+        return [self._entry(row) for row in reversed(rows)]
+
+
+def open_archive(path: Path, serializer: Optional[JsonSerializer] = None):
+    """拡張子に応じたアーカイブを開く"""
+    path = Path(path)
+    if path.suffix == EXTENSIONS["parquet"]:
+        if pyarrow is None:
+            raise RuntimeError(f"pyarrow is required to read {path}")
+        return ParquetArchive(path, serializer)
+    return ColumnarArchive(path, serializer)
+
+
+def _archive_name(segment: Dict[str, Any], fmt: str) -> str:
+    """'worker1_structured.000003.jsonl(.gz)' → 'worker1_structured.000003' + 拡張子"""
+    name = segment["file"][:-len(".gz")] if segment["file"].endswith(".gz") else segment["file"]
+    stem = name[:-len(".jsonl")] if name.endswith(".jsonl") else name
+    return stem + EXTENSIONS[fmt]
+
+
+def archived_segments(log_file: Path, cutoff: Optional[str] = None) -> List[Tuple[Dict[str, Any], Path]]:
+    """
+    log_file のアーカイブ済みセグメントとアーカイブのパス（古い順）
+
+    cutoff より前に終わっているセグメント（一覧の統計で分かる）は含めない
+    """
+    log_file = Path(log_file)
+    segment_dir = log_file.parent / SEGMENT_DIR
+    result = []
+    for segment in load_manifest(log_file.parent).get(log_file.name, {}).get("segments", []):
+        if not segment.get("archive"):
+            continue
+        if cutoff is not None and segment.get("end") and segment["end"] <= cutoff:
+            continue
+        result.append((segment, segment_dir / segment["archive"]))
+    return result
+
+
+def compact(log_dir: str = "logs", fmt: Optional[str] = None, prune: bool = False,
+            serializer: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    ローテーション済み（統計・圧縮まで終わった）でまだアーカイブにしていないセグメントをアーカイブにする
+
+    Args:
+        fmt: "auto" / "parquet" / "columnar"
+        prune: True ならアーカイブにした JSONL セグメントを削除
+               （以後そのセグメントは LogAnalyzer（archive=True）からだけ読める）
+    Returns:
+        セグメントごとの {"file", "archive", "rows", "bytes", "stored_bytes", "archive_bytes"}
+    """
+    fmt = archive_format(fmt)
+    log_dir = Path(log_dir)
+    segment_dir = log_dir / SEGMENT_DIR
+    encoder = get_serializer(serializer)
+    rotator = LogRotator(str(log_dir))
+    writer = write_parquet if fmt == "parquet" else write_columnar
+    results = []
+    for name, info in sorted(load_manifest(log_dir).items()):
+        if not any(fnmatch.fnmatch(name, pattern) for pattern in ARCHIVE_PATTERNS):
+            continue
+        for segment in info.get("segments", []):
+            if segment.get("archive") or not segment.get("finalized"):
+                continue
+            handle = open_segment(segment_dir, segment)
+            if handle is None:
+                continue
+            with handle:
+                entries = []
+                for line in handle:
+                    try:
+                        entry = encoder.loads(line)
+                        # 集計で読み飛ばされる行はアーカイブにも入れない
+                        summarize_entry(entry)
+                    except encoder.decode_errors:
+                        continue
+                    entries.append(entry)
+            target = segment_dir / _archive_name(segment, fmt)
+            rows = writer(target, entries, encoder)
+            archive_bytes = target.stat().st_size
+            if not rotator.update_segment(name, segment["seq"], archive=target.name, archive_rows=rows,
+                                          archive_bytes=archive_bytes, pruned=prune):
+                target.unlink(missing_ok=True)  # 保存期間切れで一覧から消えた
+                continue
+            stored = segment.get("compressed_bytes") or segment.get("bytes", 0)
+            if prune:
+                (segment_dir / segment["file"]).unlink(missing_ok=True)
+                index_file(log_dir / name, segment).unlink(missing_ok=True)
+            results.append({"file": segment["file"], "archive": target.name, "rows": rows,
+                            "bytes": segment.get("bytes", 0), "stored_bytes": stored, "archive_bytes": archive_bytes})
+    return results
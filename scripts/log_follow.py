@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+CCTeam ログ追跡（follow）
+全エージェントの *_structured.jsonl を tail し（Linux は inotify、それ以外はポーリング）、
+直近の時間窓のエージェント別エラー数/分・エラータイプ上位を JSON スナップショットとして出力する
+（読むのは追記された分だけなので、ログ全体の大きさに関係なく CPU 使用量は一定）
+"""
+
+import ctypes
+import ctypes.util
+import datetime
+import fnmatch
+import json
+import os
+import select
+import signal
+import socketserver
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+try:
+    from log_segments import OPEN_RETRIES, SEGMENT_DIR, load_manifest, open_segment
+    from log_serializer import JsonSerializer, get_serializer
+except ImportError:
+    from scripts.log_segments import OPEN_RETRIES, SEGMENT_DIR, load_manifest, open_segment
+    from scripts.log_serializer import JsonSerializer, get_serializer
+
+# 追跡するファイル（errors_all.jsonl は各エージェントのファイルと重複するので含めない）
+FOLLOW_PATTERN = "*_structured.jsonl"
+ERROR_LEVELS = ("ERROR", "CRITICAL")
+# 既定の時間窓（秒）・スナップショット間隔（秒）・ポーリング間隔（秒）
+WINDOW = 300
+SNAPSHOT_INTERVAL = 10.0
+POLL_INTERVAL = 1.0
+# 1回に読む最大バイト数（大量に追記された時も1ファイルでループを止めない）
+READ_BYTES = 1024 * 1024
+
+# inotify のイベント（<sys/inotify.h>）
+_IN_MODIFY = 0x002
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    """
+    ディレクトリの変更通知（libc の inotify を ctypes で呼ぶ、Linux 以外では使えない）
+
+    read() は変更のあったファイル名の集合を返す（通知が溢れた時は None、全ファイルを読み直す）
+    """
+
+    MASK = _IN_MODIFY | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+    @classmethod
+    def available(cls) -> bool:
+        return sys.platform.startswith("linux") and ctypes.util.find_library("c") is not None
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed: {directory}")
+
+    def read(self, timeout: float) -> Optional[Set[str]]:
+        """timeout 秒まで通知を待つ"""
+        names: Set[str] = set()
+        ready, _, _ = select.select([self.fd], [], [], max(timeout, 0.0))
+        while ready:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos < len(data):
+                _, mask, _, length = _IN_EVENT.unpack_from(data, pos)
+                pos += _IN_EVENT.size
+                if mask & _IN_Q_OVERFLOW:
+                    return None
+                names.add(os.fsdecode(data[pos:pos + length].rstrip(b"\0")))
+                pos += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileTail:
+    """
+    1つのログファイルの tail
+
+    開いたファイルの位置から追記分だけを読み、書き込み途中の行は次回に回す
+    ローテーション（パスの inode が変わる）時は、古いファイルを最後まで読み、
+    その間に作られたセグメント（読む前にもう一度ローテーションされた分）を読んでから、新しいファイルを先頭から読む
+    """
+
+    def __init__(self, path: Path, from_start: bool = False, since: Optional[float] = None):
+        """
+        Args:
+            from_start: True なら先頭から読む（False なら今の末尾から）
+            since: from_start の時、この時刻（epoch 秒）以降にローテーションされたセグメントも読む
+        """
+        self.path = Path(path)
+        self.segment_dir = self.path.parent / SEGMENT_DIR
+        self.handle = None
+        self.partial = b""
+        self.bytes_read = 0
+        # 追跡を始めてからのローテーション回数（読み終えたセグメントの番号の増分なので、
+        # ポーリングの間隔内に複数回ローテーションされても1回ずつ数える）
+        self.rotations = 0
+        # 読み終えたセグメントの最大の番号（開いているファイルはローテーションされると次の番号になる）
+        self.consumed = 0
+        segments = self._open(from_start)
+        if from_start and since is not None:
+            self.consumed = max((s["seq"] for s in segments if s.get("rotated_at", 0) < since), default=0)
+        else:
+            self.consumed = segments[-1]["seq"] if segments else 0
+        self._missed = [s for s in segments if s["seq"] > self.consumed]
+        if segments:
+            # since 以降にローテーションされたセグメントも追跡中のローテーションとして数える
+            self.rotations = segments[-1]["seq"] - self.consumed
+            self.consumed = segments[-1]["seq"]
+
+    def _segments(self) -> List[Dict[str, Any]]:
+        return load_manifest(self.path.parent).get(self.path.name, {}).get("segments", [])
+
+    def _open(self, from_start: bool) -> List[Dict[str, Any]]:
+        """現在のファイルを開き、開いた時点のセグメント一覧を返す（ファイルがなければ handle は None）"""
+        for attempt in range(OPEN_RETRIES):
+            segments = self._segments()
+            try:
+                self.handle = open(self.path, "rb")
+            except FileNotFoundError:
+                self.handle = None
+            after = self._segments()
+            if len(after) == len(segments) or attempt == OPEN_RETRIES - 1:
+                break
+            # 開いている間にローテーションされた（開いたファイルがどのセグメントの次か分からない）
+            if self.handle is not None:
+                self.handle.close()
+        if self.handle is not None and not from_start:
+            self.handle.seek(0, os.SEEK_END)
+        self.partial = b""
+        return after
+
+    def _drain(self) -> List[bytes]:
+        lines = []
+        while True:
+            data = self.handle.read(READ_BYTES)
+            if not data:
+                return lines
+            self.bytes_read += len(data)
+            data = self.partial + data
+            end = data.rfind(b"\n") + 1
+            self.partial = data[end:]
+            lines.extend(data[:end].splitlines(keepends=True))
+
+    def _read_segments(self, segments: List[Dict[str, Any]]) -> List[bytes]:
+        lines = []
+        for segment in segments:
+            handle = open_segment(self.segment_dir, segment)
+            if handle is None:
+                continue  # 保存期間切れで消えた
+            with handle:
+                data = handle.read()
+            self.bytes_read += len(data)
+            lines.extend(data.splitlines(keepends=True))
+        return lines
+
+    def read(self) -> List[bytes]:
+        """追記された完全な行（古い順）"""
+        consumed = self.consumed
+        lines = self._read_segments(self._missed)
+        self._missed = []
+        if self.handle is not None:
+            lines.extend(self._drain())
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                st = None
+            if st is not None and st.st_ino == os.fstat(self.handle.fileno()).st_ino:
+                if st.st_size < self.handle.tell():
+                    # 切り詰められた
+                    self.handle.seek(0)
+                    self.partial = b""
+                    lines.extend(self._drain())
+                return lines
+            # 古いファイルは次の番号のセグメントになっている（stat の前に追記された分を読み切って閉じる）
+            lines.extend(self._drain())
+            self.handle.close()
+            self.handle = None
+            self.consumed += 1
+        # 現在のファイルがない間（ローテーション後まだ書かれていない）もセグメントは読む
+        segments = self._open(from_start=True)
+        lines.extend(self._read_segments([s for s in segments if s["seq"] > self.consumed]))
+        if segments:
+            # リネーム直後で一覧の更新がまだの時は、古いファイルの番号の方が新しい
+            self.consumed = max(self.consumed, segments[-1]["seq"])
+        self.rotations += self.consumed - consumed
+        if self.handle is not None:
+            lines.extend(self._drain())
+        return lines
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+
+class RollingErrors:
+    """
+    直近 window 秒の集計（1分ごとのバケット、古いバケットは捨てる）
+
+    エントリの timestamp（ISO形式）の先頭16文字をバケットにする（log_index と同じ）
+    保持するのは時間窓の分のバケットだけなので、スナップショットの計算量はログの量に依らない
+    """
+
+    def __init__(self, window: int = WINDOW, clock: Callable[[], datetime.datetime] = datetime.datetime.now):
+        self.window = window
+        self.clock = clock
+        # バケット -> {"entries": {agent: n}, "errors": {agent: n}, "types": {type: n}}
+        self.buckets: Dict[str, Dict[str, Dict[str, int]]] = {}
+
+    def _cutoff(self) -> str:
+        return (self.clock() - datetime.timedelta(seconds=self.window)).isoformat()
+
+    def add(self, timestamp: str, level: str, agent: str, error_type: Optional[str]):
+        key = timestamp[:16]
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if timestamp <= self._cutoff():
+                return
+            bucket = self.buckets[key] = {"entries": {}, "errors": {}, "types": {}}
+        entries = bucket["entries"]
+        entries[agent] = entries.get(agent, 0) + 1
+        if level in ERROR_LEVELS:
+            errors = bucket["errors"]
+            errors[agent] = errors.get(agent, 0) + 1
+            if error_type is not None:
+                types = bucket["types"]
+                types[error_type] = types.get(error_type, 0) + 1
+
+    def expire(self):
+        """時間窓より古いバケットを捨てる"""
+        oldest = self._cutoff()[:16]
+        for key in [key for key in self.buckets if key < oldest]:
+            del self.buckets[key]
+
+    def snapshot(self, top: int = 5) -> Dict[str, Any]:
+        """エージェント別のエラー数・エラー数/分・エラータイプ上位・1分ごとのエラー数"""
+        self.expire()
+        entries: Dict[str, int] = {}
+        errors: Dict[str, int] = {}
+        types: Dict[str, int] = {}
+        minutes = []
+        for key in sorted(self.buckets):
+            bucket = self.buckets[key]
+            for target, source in ((entries, bucket["entries"]), (errors, bucket["errors"]),
+                                   (types, bucket["types"])):
+                for name, count in source.items():
+                    target[name] = target.get(name, 0) + count
+            minutes.append({"minute": key, "errors": dict(bucket["errors"])})
+        window_minutes = self.window / 60
+        return {
+            "timestamp": self.clock().isoformat(),
+            "window_seconds": self.window,
+            "entries": sum(entries.values()),
+            "errors": sum(errors.values()),
+            "entries_by_agent": entries,
+            "errors_by_agent": errors,
+            "errors_per_minute": {agent: round(count / window_minutes, 3) for agent, count in errors.items()},
+            "top_error_types": sorted(types.items(), key=lambda item: (-item[1], item[0]))[:top],
+            "minutes": minutes,
+        }
+
+
+class _SnapshotHandler(socketserver.StreamRequestHandler):
+    """接続ごとに最新のスナップショットを1行の JSON で返して閉じる"""
+
+    def handle(self):
+        self.wfile.write(self.server.follower.latest)
+
+
+class LogFollower:
+    """ログディレクトリの全エージェントのログを追跡して RollingErrors を更新する"""
+
+    def __init__(self, log_dir: str = "logs", window: int = WINDOW, top: int = 5,
+                 serializer: Optional[str] = None, poll: bool = False, poll_interval: float = POLL_INTERVAL):
+        """
+        Args:
+            log_dir: ログの保存先
+            window: 集計する時間窓（秒）
+            top: スナップショットに含めるエラータイプの数
+            poll: True なら inotify を使わずポーリングする
+            poll_interval: ポーリング間隔（秒、inotify でも新しいファイルの確認に使う）
+        """
+        self.log_dir = Path(log_dir)
+        self.top = top
+        self.serializer: JsonSerializer = get_serializer(serializer)
+        self.rolling = RollingErrors(window)
+        self.poll_interval = poll_interval
+        self.tails: Dict[str, FileTail] = {}
+        self.lines = 0
+        self.latest = b"{}\n"
+        self._stop = threading.Event()
+        self.started = time.time()
+        self.inotify: Optional[Inotify] = None
+        if not poll and Inotify.available():
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+            try:
+                self.inotify = Inotify(self.log_dir)
+            except OSError as e:
+                print(f"⚠️  inotify unavailable, polling instead: {e}", file=sys.stderr)
+        # 起動時にあるファイルは末尾から追跡する（過去のログは読まない）
+        self._discover(from_start=False)
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self.inotify else "poll"
+
+    def _discover(self, from_start: bool = True):
+        """
+        新しくできたエージェントのファイルを追跡に加える
+        （途中からできたファイルは先頭から、追跡を始めた後にローテーションされたセグメントも含めて読む）
+        """
+        names = {path.name for path in self.log_dir.glob(FOLLOW_PATTERN)}
+        # 現在のファイルがローテーションされたまま、まだ作り直されていないエージェントも含める
+        names.update(name for name in load_manifest(self.log_dir) if fnmatch.fnmatch(name, FOLLOW_PATTERN))
+        for name in sorted(names - self.tails.keys()):
+            self.tails[name] = FileTail(self.log_dir / name, from_start=from_start, since=self.started)
+
+    def _consume(self, tail: FileTail):
+        summarize = self.serializer.summarize
+        decode_errors = self.serializer.decode_errors
+        for line in tail.read():
+            try:
+                entry = summarize(line)
+            except decode_errors:
+                continue
+            self.lines += 1
+            self.rolling.add(entry.timestamp, entry.level, entry.agent, entry.error_type)
+
+    def poll_once(self, names: Optional[Set[str]] = None):
+        """names（None なら全ファイル）の追記分を読む"""
+        if names is None or any(name not in self.tails and fnmatch.fnmatch(name, FOLLOW_PATTERN) for name in names):
+            self._discover()
+        for name, tail in self.tails.items():
+            if names is None or name in names:
+                self._consume(tail)
+
+    def snapshot(self) -> Dict[str, Any]:
+        result = self.rolling.snapshot(self.top)
+        result.update(mode=self.mode, files=len(self.tails), lines_read=self.lines,
+                      bytes_read=sum(tail.bytes_read for tail in self.tails.values()),
+                      rotations=sum(tail.rotations for tail in self.tails.values()))
+        self.latest = (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+        return result
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, interval: float = SNAPSHOT_INTERVAL, emit: Optional[Callable[[Dict[str, Any]], None]] = None,
+            count: int = 0):
+        """
+        停止するまで追跡し、interval 秒ごとにスナップショットを作って emit に渡す
+
+        Args:
+            count: この数のスナップショットを出したら終了（0 なら stop() まで続ける）
+        """
+        next_snapshot = time.monotonic() + interval
+        next_poll = time.monotonic() + self.poll_interval
+        emitted = 0
+        while not self._stop.is_set():
+            now = time.monotonic()
+            wait = min(next_snapshot, next_poll) - now
+            if self.inotify:
+                names = self.inotify.read(wait)
+                self.poll_once(names)
+            else:
+                self._stop.wait(max(wait, 0.0))
+            now = time.monotonic()
+            if now >= next_poll:
+                # inotify でも定期的に全ファイルを確認する（通知の取りこぼし・新しいファイルに備える）
+                self.poll_once()
+                next_poll = now + self.poll_interval
+            if now >= next_snapshot:
+                snapshot = self.snapshot()
+                if emit:
+                    emit(snapshot)
+                emitted += 1
+                if count and emitted >= count:
+                    break
+                next_snapshot = now + interval
+
+    def serve(self, socket_path: str):
+        """スナップショットを Unix ソケットで返すサーバーをバックグラウンドで起動"""
+        path = Path(socket_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            path.unlink()
+        server = socketserver.ThreadingUnixStreamServer(str(path), _SnapshotHandler)
+        server.daemon_threads = True
+        server.follower = self
+        os.chmod(path, 0o600)
+        threading.Thread(target=server.serve_forever, name="log-follow-server", daemon=True).start()
+        return server
+
+    def close(self):
+        for tail in self.tails.values():
+            tail.close()
+        if self.inotify:
+            self.inotify.close()
+
+
+def follow(log_dir: str = "logs", window: int = WINDOW, interval: float = SNAPSHOT_INTERVAL, top: int = 5,
+           socket_path: Optional[str] = None, poll: bool = False, count: int = 0):
+    """
+    CLI 用: スナップショットを1行の JSON で標準出力に書き（socket_path を指定するとソケットでも返す）、
+    SIGTERM / SIGINT で終了する
+    """
+    follower = LogFollower(log_dir, window=window, top=top, poll=poll)
+    server = follower.serve(socket_path) if socket_path else None
+
+    def _stop(signum, frame):
+        follower.stop()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    def _emit(snapshot: Dict[str, Any]):
+        sys.stdout.write(follower.latest.decode("utf-8"))
+        sys.stdout.flush()
+
+    print(f"👀 Following {log_dir}/{FOLLOW_PATTERN} ({follower.mode}, window {window}s)"
+          + (f", socket {socket_path}" if socket_path else ""), file=sys.stderr)
+    try:
+        follower.run(interval, emit=_emit, count=count)
+    finally:
+        follower.close()
+        if server:
+            server.shutdown()
+            server.server_close()
+            Path(socket_path).unlink(missing_ok=True)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+CCTeam ログ索引
+JSONL ログの時間バケット（1分）ごとのバイト範囲と集計（レベル・エージェント・エラータイプ別件数）を
+サイドカーファイルに保存し、時間範囲の集計を読み直しなしで行う
+"""
+
+import os
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+try:
+    from log_serializer import JsonSerializer, LogEntrySummary, get_serializer
+except ImportError:
+    from scripts.log_serializer import JsonSerializer, LogEntrySummary, get_serializer
+
+INDEX_VERSION = 1
+# ISO形式の timestamp の先頭何文字をバケットにするか（16 = 'YYYY-MM-DDTHH:MM' で1分）
+BUCKET_PREFIX = 16
+# ファイルが同じかを確かめるために先頭から照合するバイト数（inode は削除後に再利用されるため）
+HEAD_BYTES = 4096
+
+
+def new_totals() -> Dict[str, Any]:
+    """集計結果の入れ物（件数・レベル別・エージェント別・エラータイプ別）"""
+    return {"total": 0, "levels": {}, "agents": {}, "types": {}}
+
+
+def count_entry(totals: Dict[str, Any], entry: LogEntrySummary):
+    """1件のエントリを totals に数える"""
+    totals["total"] += 1
+    levels = totals["levels"]
+    levels[entry.level] = levels.get(entry.level, 0) + 1
+    agents = totals["agents"]
+    agents[entry.agent] = agents.get(entry.agent, 0) + 1
+    if entry.error_type is not None:
+        types = totals["types"]
+        types[entry.error_type] = types.get(entry.error_type, 0) + 1
+
+
+def merge_totals(into: Dict[str, Any], other: Dict[str, Any]):
+    """other の件数を into に足す"""
+    into["total"] += other["total"]
+    for field in ("levels", "agents", "types"):
+        target = into[field]
+        for key, count in other[field].items():
+            target[key] = target.get(key, 0) + count
+
+
+class IndexBuilder:
+    """
+    行を順に受け取ってブロック（時間バケット単位の連続したバイト範囲）を作る
+
+    timestamp は複数プロセスの書き込みで多少前後するため、バケットが進んだ時だけ新しいブロックにし、
+    遅れて書かれた行は今のブロックに含める（各ブロックは実際の最小・最大の timestamp を持つ）
+    """
+
+    def __init__(self, serializer: Optional[JsonSerializer] = None, offset: int = 0,
+                 blocks: Optional[List[Dict[str, Any]]] = None, lines: int = 0):
+        self.serializer = serializer or get_serializer()
+        self.offset = offset
+        self.blocks = blocks if blocks is not None else []
+        self.lines = lines
+
+    def add(self, line: bytes):
+        """1行（改行込み）を追加（デコードできない行は位置だけ進める）"""
+        start = self.offset
+        self.offset += len(line)
+        self.lines += 1
+        try:
+            entry = self.serializer.summarize(line)
+        except self.serializer.decode_errors:
+            if self.blocks:
+                self.blocks[-1]["end"] = self.offset
+            return
+        timestamp = entry.timestamp
+        bucket = timestamp[:BUCKET_PREFIX]
+        block = self.blocks[-1] if self.blocks else None
+        if block is None or bucket > block["bucket"]:
+            block = {"bucket": bucket, "start": start, "end": start, "min": timestamp, "max": timestamp,
+                     **new_totals()}
+            self.blocks.append(block)
+        elif timestamp < block["min"]:
+            block["min"] = timestamp
+        elif timestamp > block["max"]:
+            block["max"] = timestamp
+        block["end"] = self.offset
+        count_entry(block, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """行数と最初・最後の timestamp（セグメント一覧用）"""
+        mins = [b["min"] for b in self.blocks if b["min"]]
+        maxs = [b["max"] for b in self.blocks if b["max"]]
+        return {"lines": self.lines, "start": min(mins) if mins else None, "end": max(maxs) if maxs else None}
+
+
+class LogIndex:
+    """
+    1つのログファイル（現在のファイルまたはセグメント）の索引
+
+    現在のファイルは前回索引を作った位置から後ろだけを読み足す（inode が変わっていれば作り直す）
+    セグメントは内容が変わらないので一度作れば読み直さない
+    各メソッドには開いたファイル（セグメントは gzip でもよい）を渡す
+    """
+
+    def __init__(self, index_file: Path, immutable: bool = False,
+                 serializer: Optional[JsonSerializer] = None):
+        """
+        Args:
+            index_file: サイドカーファイルのパス
+            immutable: True ならローテーション済みのセグメント（追記されない）
+        """
+        self.index_file = Path(index_file)
+        self.immutable = immutable
+        self.serializer = serializer or get_serializer()
+        self.data = self._load()
+        # 今回の refresh で読み足したバイト数
+        self.scanned = 0
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.index_file, "rb") as f:
+                data = self.serializer.loads(f.read())
+            if data.get("version") == INDEX_VERSION and data.get("bucket_prefix") == BUCKET_PREFIX:
+                return data
+        except (OSError, ValueError, AttributeError):
+            pass
+        return self._empty()
+
+    @staticmethod
+    def _empty(inode: Optional[int] = None) -> Dict[str, Any]:
+        return {"version": INDEX_VERSION, "bucket_prefix": BUCKET_PREFIX, "inode": inode, "head": None,
+                "offset": 0, "lines": 0, "complete": False, "blocks": []}
+    
+    @staticmethod
+    def _head(f: BinaryIO, length: int) -> List[int]:
+        """先頭 length バイトの [長さ, crc32]"""
+        f.seek(0)
+        head = f.read(length)
+        return [len(head), zlib.crc32(head)]
+
+    def save(self) -> bool:
+        """置き換えで保存（同時に分析を実行しても壊れた索引を読まない、書き込めなければ False）"""
+        tmp = self.index_file.with_name(f"{self.index_file.name}.{os.getpid()}.tmp")
+        try:
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(self.serializer.dumps(self.data))
+            os.replace(tmp, self.index_file)
+        except OSError:
+            # 読み取り専用のログディレクトリでも分析はできる（次回も読み直すだけ）
+            return False
+        return True
+
+    @classmethod
+    def write(cls, index_file: Path, builder: IndexBuilder):
+        """全体を読み終えたセグメントの索引を保存（ローテーション時の圧縮と同時に作る）"""
+        index = cls(index_file, immutable=True, serializer=builder.serializer)
+        index.data = cls._empty()
+        index.data.update(offset=builder.offset, lines=builder.lines, complete=True, blocks=builder.blocks)
+        index.save()
+
+    def refresh(self, f: BinaryIO) -> bool:
+        """索引を f の末尾（書き込み途中の行の手前）まで進める（更新したら保存して True）"""
+        data = self.data
+        if self.immutable:
+            if data["complete"]:
+                return False
+            data = self.data = self._empty()
+        else:
+            st = os.fstat(f.fileno())
+            head = data["head"]
+            if (data["inode"] != st.st_ino or data["offset"] > st.st_size
+                    or (head is not None and self._head(f, head[0]) != head)):
+                # ローテーション・作り直しされたファイル
+                data = self.data = self._empty(st.st_ino)
+            elif data["offset"] == st.st_size:
+                return False
+        builder = IndexBuilder(self.serializer, data["offset"], data["blocks"], data["lines"])
+        f.seek(data["offset"])
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # 書き込み途中の行は次回に読む
+            builder.add(line)
+        self.scanned = builder.offset - data["offset"]
+        if not self.immutable and (data["head"] is None or data["head"][0] < HEAD_BYTES):
+            data["head"] = self._head(f, min(builder.offset, HEAD_BYTES))
+        data.update(offset=builder.offset, lines=builder.lines, complete=self.immutable)
+        self.save()
+        return True
+
+    @staticmethod
+    def _read_lines(f: BinaryIO, start: int, end: int) -> List[bytes]:
+        f.seek(start)
+        lines = f.read(end - start).split(b"\n")
+        return [line + b"\n" for line in lines[:-1]]
+
+    def aggregate(self, f: BinaryIO, cutoff: Optional[str], totals: Dict[str, Any]):
+        """
+        cutoff（ISO形式）より新しいエントリの件数を totals に足す
+
+        全体が cutoff より新しいブロックは保存済みの集計を足すだけ、全体が古いブロックは読まない
+        cutoff をまたぐブロックだけ行を読んで数える
+        """
+        summarize = self.serializer.summarize
+        decode_errors = self.serializer.decode_errors
+        for block in self.data["blocks"]:
+            if cutoff is None or block["min"] > cutoff:
+                merge_totals(totals, block)
+            elif block["max"] > cutoff:
+                for line in self._read_lines(f, block["start"], block["end"]):
+                    try:
+                        entry = summarize(line)
+                    except decode_errors:
+                        continue
+                    if entry.timestamp > cutoff:
+                        count_entry(totals, entry)
+
+    def tail(self, f: BinaryIO, cutoff: Optional[str], count: int) -> Iterator[bytes]:
+        """cutoff より新しいエントリの行をファイルの後ろから最大 count 件返す"""
+        if count <= 0:
+            return
+        summarize = self.serializer.summarize
+        decode_errors = self.serializer.decode_errors
+        for block in reversed(self.data["blocks"]):
+            if cutoff is not None and block["max"] <= cutoff:
+                continue
+            for line in reversed(self._read_lines(f, block["start"], block["end"])):
+                try:
+                    entry = summarize(line)
+                except decode_errors:
+                    continue
+                if cutoff is not None and entry.timestamp <= cutoff:
+                    continue
+                yield line
+                count -= 1
+                if count <= 0:
+                    return
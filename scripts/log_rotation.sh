@@ -26,13 +26,26 @@ if [ ! -d "$LOG_DIR" ]; then
     exit 1
 fi
 
+# StructuredLogger が書き込み・ローテーションしている <agent>.log か
+# （<agent>_structured.jsonl があるか、logs/segments/manifest.json にセグメントが記録されている）
+logger_managed() {
+    local name=$1
+    [ -e "$LOG_DIR/${name%.log}_structured.jsonl" ] \
+        || grep -q "\"$name\"" "$LOG_DIR/segments/manifest.json" 2>/dev/null
+}
+
 # 大きなログファイルを検索して圧縮
+# （StructuredLogger のファイルは自身でローテーションし、logs/segments/ は圧縮・一覧を管理しているので対象外）
 echo -e "${YELLOW}大きなログファイルを検索中...${NC}"
 COMPRESSED_COUNT=0
 
 while IFS= read -r -d '' logfile; do
     SIZE=$(ls -lh "$logfile" | awk '{print $5}')
     BASENAME=$(basename "$logfile")
+    if logger_managed "$BASENAME"; then
+        echo -e "  スキップ: $BASENAME ($SIZE, StructuredLogger がローテーション)"
+        continue
+    fi
     TIMESTAMP=$(date +%Y%m%d_%H%M%S)
     GZFILE="${logfile}.${TIMESTAMP}.gz"
     
@@ -43,8 +56,8 @@ while IFS= read -r -d '' logfile; do
     echo "$(date): Log rotated" > "$logfile"
     
     echo -e "  ${GREEN}✓${NC} 圧縮完了: $(basename "$GZFILE")"
-    ((COMPRESSED_COUNT++))
-done < <(find "$LOG_DIR" -name "*.log" -size +${MAX_SIZE} -print0)
+    COMPRESSED_COUNT=$((COMPRESSED_COUNT + 1))
+done < <(find "$LOG_DIR" -name "*.log" -not -path "$LOG_DIR/segments/*" -size +${MAX_SIZE} -print0)
 
 if [ $COMPRESSED_COUNT -eq 0 ]; then
     echo -e "${GREEN}✓ 圧縮が必要なログファイルはありません${NC}"
@@ -58,13 +71,13 @@ echo ""
 echo -e "${YELLOW}古い圧縮ログファイルを検索中...${NC}"
 DELETED_COUNT=0
 
-# .gzファイルの削除
+# .gzファイルの削除（logs/segments/ の保存期間は LogRotator が一覧と合わせて管理する）
 while IFS= read -r -d '' oldgz; do
     BASENAME=$(basename "$oldgz")
     rm -f "$oldgz"
     echo -e "  ${GREEN}✓${NC} 削除: $BASENAME"
-    ((DELETED_COUNT++))
-done < <(find "$LOG_DIR" -name "*.gz" -mtime +${MAX_AGE} -print0)
+    DELETED_COUNT=$((DELETED_COUNT + 1))
+done < <(find "$LOG_DIR" -name "*.gz" -not -path "$LOG_DIR/segments/*" -mtime +${MAX_AGE} -print0)
 
 # 古い通常のログファイルも削除（error_loops.json, *.jsonlなど）
 while IFS= read -r -d '' oldlog; do
@@ -73,9 +86,9 @@ while IFS= read -r -d '' oldlog; do
     if [[ ! "$BASENAME" =~ ^(system\.log|boss\.log|worker[1-3]\.log|communication\.log)$ ]]; then
         rm -f "$oldlog"
         echo -e "  ${GREEN}✓${NC} 削除: $BASENAME"
-        ((DELETED_COUNT++))
+        DELETED_COUNT=$((DELETED_COUNT + 1))
     fi
-done < <(find "$LOG_DIR" \( -name "*.jsonl" -o -name "*.json" \) -mtime +${MAX_AGE} -print0)
+done < <(find "$LOG_DIR" \( -name "*.jsonl" -o -name "*.json" \) -not -path "$LOG_DIR/segments/*" -mtime +${MAX_AGE} -print0)
 
 if [ $DELETED_COUNT -eq 0 ]; then
     echo -e "${GREEN}✓ 削除が必要な古いログファイルはありません${NC}"
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+CCTeam ログ並列スキャン
+JSONL ログ（ローテーション済みのセグメントを含む）を mmap して改行位置でチャンクに分け、
+プロセスプールで並列に集計する（JSON をデコードする前にバイト列で時刻・レベル・エージェントを絞り込む）
+"""
+
+import gzip
+import json
+import mmap
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    from log_index import count_entry, merge_totals, new_totals
+    from log_segments import open_segments
+    from log_serializer import get_serializer
+except ImportError:
+    from scripts.log_index import count_entry, merge_totals, new_totals
+    from scripts.log_segments import open_segments
+    from scripts.log_serializer import get_serializer
+
+# 1チャンクの大きさ（ワーカー数 × CHUNKS_PER_WORKER 個に分け、この範囲に収める）
+MIN_CHUNK_BYTES = 4 * 1024 * 1024
+MAX_CHUNK_BYTES = 64 * 1024 * 1024
+CHUNKS_PER_WORKER = 4
+
+# StructuredLogger の行は timestamp から始まる（この形の行だけデコード前に時刻で絞り込む）
+_TIMESTAMP_PREFIXES = (b'{"timestamp":"', b'{"timestamp": "')
+
+# fork したワーカーが引き継ぐ mmap（ローテーションでファイルが移動・削除されても開いた時点の内容を読める）
+_MAPS: List[mmap.mmap] = []
+
+
+class ScanJob(NamedTuple):
+    """ワーカーに渡す絞り込み条件"""
+    serializer: str
+    cutoff: Optional[str]
+    agent: Optional[str]
+    level: Optional[str]
+    recent: int
+
+
+def _needles(value: Optional[str]) -> Optional[Tuple[bytes, ...]]:
+    """値が JSON 文字列として行に現れる時のバイト列（エスケープあり・なし）"""
+    if value is None:
+        return None
+    return tuple({json.dumps(value, ensure_ascii=False).encode("utf-8"), json.dumps(value).encode("ascii")})
+
+
+def _lines(data: bytes, needles: Optional[Tuple[bytes, ...]]) -> List[bytes]:
+    """
+    data の行（改行なし）
+
+    needles を指定すると、どれかを含む行だけを返す（bytes.find でチャンク全体から探すので、
+    含まない行は Python のループに入らない）
+    """
+    if needles is None:
+        return data.split(b"\n")
+    spans = {}
+    for needle in needles:
+        pos = data.find(needle)
+        while pos >= 0:
+            start = data.rfind(b"\n", 0, pos) + 1
+            end = data.find(b"\n", pos)
+            if end < 0:
+                end = len(data)
+            spans[start] = end
+            pos = data.find(needle, end)
+    return [data[start:spans[start]] for start in (sorted(spans) if len(needles) > 1 else spans)]
+
+
+def _scan_chunk(task: Tuple[Any, int, int, ScanJob]) -> Tuple[Dict[str, Any], List[bytes]]:
+    """1チャンクを集計（source は _MAPS の番号、または gzip セグメントのパス）"""
+    source, start, end, job = task
+    if isinstance(source, int):
+        data = _MAPS[source][start:end]
+    else:
+        with gzip.open(source, "rb") as f:
+            data = f.read()
+    return scan_bytes(data, job)
+
+
+def scan_bytes(data: bytes, job: ScanJob) -> Tuple[Dict[str, Any], List[bytes]]:
+    """
+    改行区切りのバイト列を集計し、(件数, 条件に合った最後の job.recent 行) を返す
+
+    デコードの前に、時刻（行頭の timestamp）・レベル・エージェントの値がバイト列として含まれるかで
+    明らかに対象外の行を捨て、残った行だけをデコードして正確に判定する
+    （行に分けるのは探す値を含む行だけ）
+    """
+    serializer = get_serializer(job.serializer)
+    summarize = serializer.summarize
+    decode_errors = serializer.decode_errors
+    cutoff_text, level, agent = job.cutoff, job.level, job.agent
+    cutoff = cutoff_text.encode("ascii") if cutoff_text else None
+    # チャンク全体から bytes.find で探す値（レベルを優先）と、取り出した行ごとに確かめる値
+    search, check = _needles(job.level), _needles(job.agent)
+    if search is None:
+        search, check = check, None
+    totals = new_totals()
+    recent = deque(maxlen=job.recent)
+    for line in _lines(data, search):
+        if not line:
+            continue
+        if cutoff is not None and line.startswith(_TIMESTAMP_PREFIXES):
+            begin = line.index(b'"', 13) + 1
+            if line[begin:line.find(b'"', begin)] <= cutoff:
+                continue
+        if check is not None and not any(needle in line for needle in check):
+            continue
+        try:
+            entry = summarize(line)
+        except decode_errors:
+            continue
+        if ((cutoff is not None and entry.timestamp <= cutoff_text)
+                or (level is not None and entry.level != level)
+                or (agent is not None and entry.agent != agent)):
+            continue
+        count_entry(totals, entry)
+        recent.append(line)
+    return totals, [line + b"\n" for line in recent]
+
+
+def _chunks(index: int, size: int, chunk_bytes: int) -> List[Tuple[int, int, int]]:
+    """_MAPS[index] の先頭 size バイトを改行位置で区切ったチャンク"""
+    chunks = []
+    view = _MAPS[index]
+    start = 0
+    while start < size:
+        end = view.find(b"\n", min(start + chunk_bytes, size) - 1, size)
+        end = size if end < 0 else end + 1
+        chunks.append((index, start, end))
+        start = end
+    return chunks
+
+
+def scan(paths: Sequence[Path], cutoff: Optional[str] = None, agent: Optional[str] = None,
+         level: Optional[str] = None, workers: Optional[int] = None, serializer: Optional[str] = None,
+         recent: int = 10, include_archived: bool = True) -> Tuple[Dict[str, Any], List[bytes]]:
+    """
+    ログファイル（とそのセグメント）を並列に集計
+
+    Args:
+        paths: *_structured.jsonl / errors_all.jsonl のパス
+        cutoff: ISO形式の時刻（これより新しいエントリだけを数える）
+        agent / level: 指定した値のエントリだけを数える
+        workers: プロセス数（省略時は CPU 数、1 ならこのプロセスで処理）
+        include_archived: False なら列指向アーカイブにしたセグメントは読まない
+    Returns:
+        (件数・レベル別・エージェント別・エラータイプ別, 条件に合った最後の recent 行（古い順）)
+    """
+    workers = workers or os.cpu_count() or 1
+    job = ScanJob(get_serializer(serializer).name, cutoff, agent, level, recent)
+    opened = [item for path in paths for item in open_segments(path, cutoff, include_archived)]
+    tasks = []
+    try:
+        sources: List[Tuple[Any, int]] = []
+        for segment, handle in opened:
+            if isinstance(handle, gzip.GzipFile):
+                sources.append((handle.name, 0))
+                continue
+            size = os.fstat(handle.fileno()).st_size
+            if size == 0:
+                continue
+            _MAPS.append(mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ))
+            # 書き込み途中の行は含めない
+            sources.append((len(_MAPS) - 1, _MAPS[-1].rfind(b"\n") + 1))
+        total_bytes = sum(size for source, size in sources if isinstance(source, int))
+        chunk_bytes = max(MIN_CHUNK_BYTES, min(MAX_CHUNK_BYTES, total_bytes // (workers * CHUNKS_PER_WORKER) + 1))
+        for source, size in sources:
+            if isinstance(source, int):
+                tasks.extend((*chunk, job) for chunk in _chunks(source, size, chunk_bytes))
+            else:
+                tasks.append((source, 0, 0, job))
+
+        if workers > 1 and len(tasks) > 1 and "fork" in multiprocessing.get_all_start_methods():
+            # fork で _MAPS を引き継ぐので、チャンクの内容をプロセス間で送らない
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context) as pool:
+                results = list(pool.map(_scan_chunk, tasks))
+        else:
+            results = [_scan_chunk(task) for task in tasks]
+    finally:
+        for view in _MAPS:
+            view.close()
+        _MAPS.clear()
+        for _, handle in opened:
+            handle.close()
+
+    totals = new_totals()
+    lines: deque = deque(maxlen=recent)
+    for partial, partial_recent in results:
+        merge_totals(totals, partial)
+        lines.extend(partial_recent)
+    return totals, list(lines)
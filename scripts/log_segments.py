@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+CCTeam ログセグメント管理
+ログファイルのサイズ・時間によるローテーション（リネーム → バックグラウンドで gzip 圧縮）、
+セグメント一覧（segments/manifest.json）の管理、セグメントをまたいだ読み込み
+"""
+
+import atexit
+import fcntl
+import gzip
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from log_index import IndexBuilder, LogIndex
+except ImportError:
+    from scripts.log_index import IndexBuilder, LogIndex
+
+# ローテーション済みのセグメントを置くディレクトリ（logs/ 直下のファイル一覧を汚さない）
+SEGMENT_DIR = "segments"
+MANIFEST_FILE = "manifest.json"
+# 書き込み（共有）とローテーション（排他）で取るロック
+LOCK_FILE = ".rotation.lock"
+# 読み込み中にローテーションが起きた時に開き直す回数
+OPEN_RETRIES = 5
+
+_SIZE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(value) -> int:
+    """'10M' / '512K' / '1G' / バイト数 をバイト数にする（0 は無効）"""
+    text = str(value).strip().upper().rstrip("B")
+    if text and text[-1] in _SIZE_UNITS:
+        return int(float(text[:-1]) * _SIZE_UNITS[text[-1]])
+    return int(text or 0)
+
+
+def segment_name(name: str, seq: int) -> str:
+    """'worker1_structured.jsonl' の seq 番目のセグメント名 → 'worker1_structured.000001.jsonl'"""
+    stem, dot, suffix = name.rpartition(".")
+    if not dot:
+        return f"{name}.{seq:06d}"
+    return f"{stem}.{seq:06d}.{suffix}"
+
+
+def load_manifest(log_dir) -> Dict[str, Any]:
+    """
+    セグメント一覧を読む（なければ空）
+
+    形式: {ファイル名: {"active_since": 現在のファイルの開始時刻,
+                        "segments": [{"seq", "file", "bytes", "rotated_at", "compressed",
+                                      "finalized", "lines", "start", "end"}, ...]}}
+    """
+    try:
+        with open(Path(log_dir) / SEGMENT_DIR / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def _find_segment(manifest: Dict[str, Any], name: str, seq: int) -> Optional[Dict[str, Any]]:
+    for segment in manifest.get(name, {}).get("segments", []):
+        if segment.get("seq") == seq:
+            return segment
+    return None
+
+
+class LogRotator:
+    """
+    ログディレクトリ内のファイルのローテーション
+
+    書き込み側は shared_lock() の中で追記し、ローテーションは排他ロックの中で現在のファイルを
+    segments/ へリネームするだけなので、複数プロセスが同じファイル（errors_all.jsonl など）に
+    書いていても行が途中で切れたり、リネーム後のセグメントに書き込まれたりしない
+    統計（行数・最初と最後の timestamp）と圧縮はバックグラウンドスレッドで行う
+    """
+
+    # このサイズを超えたらローテーション（0 で無効）
+    MAX_BYTES = 10 * 1024 * 1024
+    # 現在のファイルを使い始めてからこの秒数が経ったらローテーション（0 で無効）
+    INTERVAL = 0
+    # 終了時に圧縮の完了を待つ最大秒数
+    DRAIN_TIMEOUT = 10.0
+
+    _instances: Dict[Path, "LogRotator"] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, log_dir: str = "logs", max_bytes: Optional[int] = None,
+               interval: Optional[float] = None, compress: Optional[bool] = None) -> "LogRotator":
+        """
+        ログディレクトリごとに1つのローテーターを返す
+
+        省略した設定は環境変数 CCTEAM_LOG_ROTATE_SIZE（例: 10M、0 で無効）/
+        CCTEAM_LOG_ROTATE_INTERVAL（秒）/ CCTEAM_LOG_COMPRESS（0 で圧縮しない）から読む
+        既存のローテーターに設定を渡すとその値で上書きする
+        """
+        key = Path(log_dir).resolve()
+        with cls._instances_lock:
+            rotator = cls._instances.get(key)
+            if rotator is None:
+                rotator = cls._instances[key] = cls(
+                    log_dir,
+                    max_bytes=parse_size(os.environ.get("CCTEAM_LOG_ROTATE_SIZE", cls.MAX_BYTES)),
+                    interval=float(os.environ.get("CCTEAM_LOG_ROTATE_INTERVAL", cls.INTERVAL)),
+                    compress=os.environ.get("CCTEAM_LOG_COMPRESS", "1") != "0",
+                )
+            if max_bytes is not None:
+                rotator.max_bytes = max_bytes
+            if interval is not None:
+                rotator.interval = interval
+            if compress is not None:
+                rotator.compress = compress
+            return rotator
+
+    def __init__(self, log_dir: str = "logs", max_bytes: int = MAX_BYTES, interval: float = INTERVAL,
+                 compress: bool = True):
+        """
+        Args:
+            log_dir: ログの保存先
+            max_bytes: ローテーションするサイズ（0 で無効）
+            interval: ローテーションする間隔（秒、0 で無効）
+            compress: セグメントを gzip 圧縮するか
+        """
+        self.log_dir = Path(log_dir)
+        self.segment_dir = self.log_dir / SEGMENT_DIR
+        self.manifest_file = self.segment_dir / MANIFEST_FILE
+        self.lock_file = self.log_dir / LOCK_FILE
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.compress = compress
+        self.rotated = 0
+        # スレッドごとの共有ロック用 fd（flock は fd 単位なので、スレッド間で共有すると
+        # 1つのスレッドの解放で他のスレッドのロックも外れてしまう）
+        self._local = threading.local()
+        # ファイル -> 時間によるローテーションの予定時刻 / 最初に書き込んだ時刻
+        self._deadlines: Dict[Path, float] = {}
+        self._first_seen: Dict[Path, float] = {}
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_bytes or self.interval)
+
+    @contextmanager
+    def shared_lock(self):
+        """追記の間ローテーションを待たせる共有ロック（ローテーション無効なら何もしない）"""
+        if not self.enabled:
+            yield
+            return
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+            holder = self._local.holder = _LockFd(self.lock_file)
+        fcntl.flock(holder.fd, fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(holder.fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _exclusive(self):
+        """ローテーション・一覧の更新に使う排他ロック（共有ロックを持ったまま取らないこと）"""
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # クローズでロックも解放される
+
+    def after_write(self, path: Path, size: int):
+        """追記後のサイズと経過時間を見て、必要ならローテーション（共有ロックの外で呼ぶ）"""
+        if self.max_bytes and size >= self.max_bytes:
+            self.rotate(path)
+        elif self.interval:
+            deadline = self._deadlines.get(path)
+            if deadline is None:
+                self._first_seen.setdefault(path, time.time())
+                since = load_manifest(self.log_dir).get(path.name, {}).get("active_since")
+                deadline = self._deadlines[path] = (since or self._first_seen[path]) + self.interval
+            if time.time() >= deadline:
+                self.rotate(path)
+
+    def rotate(self, path: Path, force: bool = False) -> Optional[Path]:
+        """
+        path を segments/ へリネームして新しいセグメントにする
+
+        他のプロセスが先にローテーションしていれば何もしない（空のファイルもそのまま）
+        Returns:
+            セグメントのパス（ローテーションしなかった時は None）
+        """
+        path = Path(path)
+        now = time.time()
+        self._first_seen.setdefault(path, now)
+        with self._exclusive():
+            try:
+                size = os.stat(path).st_size
+            except FileNotFoundError:
+                return None
+            manifest = load_manifest(self.log_dir)
+            entry = manifest.setdefault(path.name, {"segments": []})
+            since = entry.get("active_since") or self._first_seen[path]
+            due = size > 0 and (force or (self.max_bytes and size >= self.max_bytes)
+                                or (self.interval and now - since >= self.interval))
+            if not due:
+                self._deadlines[path] = since + self.interval
+                return None
+            segments = entry.setdefault("segments", [])
+            seq = segments[-1]["seq"] + 1 if segments else 1
+            self.segment_dir.mkdir(parents=True, exist_ok=True)
+            target = self.segment_dir / segment_name(path.name, seq)
+            os.rename(path, target)
+            segments.append({"seq": seq, "file": target.name, "bytes": size, "rotated_at": now,
+                             "compressed": False, "finalized": False})
+            entry["active_since"] = now
+            self._save_manifest(manifest)
+            # 前回のプロセスが終了して処理されなかったセグメントも拾う
+            pending = [s["seq"] for s in segments if not s.get("finalized")]
+        self._deadlines[path] = now + self.interval
+        self.rotated += 1
+        self._start()
+        for pending_seq in pending:
+            self._queue.put((path.name, pending_seq))
+        return target
+
+    def update_segment(self, name: str, seq: int, **fields) -> bool:
+        """一覧のセグメント情報にフィールドを追加・更新（セグメントがなければ False）"""
+        with self._exclusive():
+            manifest = load_manifest(self.log_dir)
+            segment = _find_segment(manifest, name, seq)
+            if segment is None:
+                return False
+            segment.update(fields)
+            self._save_manifest(manifest)
+        return True
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        """一覧を置き換えで保存（読み込み側はロックなしで常に完全な一覧を読める）"""
+        tmp = self.manifest_file.with_name(f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, self.manifest_file)
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-segment-finalizer", daemon=True)
+                self._thread.start()
+                atexit.register(self.drain)
+
+    def drain(self, timeout: float = DRAIN_TIMEOUT) -> bool:
+        """ローテーション済みセグメントの統計・圧縮の完了を待つ（タイムアウト時は False）"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _run(self):
+        while True:
+            name, seq = self._queue.get()
+            try:
+                self._finalize(name, seq)
+            except Exception as e:
+                # 圧縮の失敗ではログ出力を止めない（未圧縮のセグメントもそのまま読める）
+                print(f"❌ Log segment finalize failed: {e}", file=sys.stderr)
+            finally:
+                self._queue.task_done()
+
+    def _finalize(self, name: str, seq: int):
+        """セグメントの索引を作り（行数・時刻範囲も一覧に記録）、圧縮して一覧を更新"""
+        segment = _find_segment(load_manifest(self.log_dir), name, seq)
+        if segment is None or segment.get("finalized"):
+            return
+        raw = self.segment_dir / segment["file"]
+        gz = raw.with_name(raw.name + ".gz")
+        tmp = raw.with_name(f"{gz.name}.{os.getpid()}.tmp")
+        # 圧縮は一覧のロックを持たずに行う（他のプロセスの書き込み・ローテーションを待たせない）
+        try:
+            with open(raw, "rb") as src:
+                if self.compress:
+                    with gzip.open(tmp, "wb", compresslevel=6) as dst:
+                        stats = _segment_stats(src, name, dst.write)
+                else:
+                    stats = _segment_stats(src, name)
+        except FileNotFoundError:
+            return  # 他のプロセスが処理済み
+        if isinstance(stats, IndexBuilder):
+            LogIndex.write(self.segment_dir / f"{raw.name}.idx", stats)
+            stats = stats.stats()
+        with self._exclusive():
+            manifest = load_manifest(self.log_dir)
+            segment = _find_segment(manifest, name, seq)
+            if segment is None or segment.get("finalized"):
+                if self.compress:
+                    tmp.unlink(missing_ok=True)
+                return
+            segment.update(stats, finalized=True)
+            if self.compress:
+                os.replace(tmp, gz)
+                segment.update(file=gz.name, compressed=True, compressed_bytes=gz.stat().st_size)
+            self._save_manifest(manifest)
+        if self.compress:
+            # 一覧が .gz を指してから消す（開いたままの読み込み側はそのまま読み切れる）
+            raw.unlink(missing_ok=True)
+
+
+class _LockFd:
+    """スレッドごとのロック用 fd（スレッド終了時に閉じる）"""
+
+    def __init__(self, path: Path):
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def __del__(self):
+        os.close(self.fd)
+
+
+def _segment_stats(src: BinaryIO, name: str, write=None):
+    """
+    セグメントを1回読み、JSONL なら索引（IndexBuilder）、それ以外は行数を返す
+    （write を渡すと各行をそのまま書き出す）
+    """
+    builder = IndexBuilder() if name.endswith(".jsonl") else None
+    lines = 0
+    for line in src:
+        if write is not None:
+            write(line)
+        if builder is not None:
+            builder.add(line)
+        else:
+            lines += 1
+    return builder if builder is not None else {"lines": lines}
+
+
+def index_file(log_file: Path, segment: Optional[Dict[str, Any]] = None) -> Path:
+    """log_file（segment を渡すとそのセグメント）の索引ファイル（log_index.py）のパス"""
+    log_file = Path(log_file)
+    if segment is None:
+        return log_file.parent / SEGMENT_DIR / f"{log_file.name}.idx"
+    name = segment["file"][:-len(".gz")] if segment["file"].endswith(".gz") else segment["file"]
+    return log_file.parent / SEGMENT_DIR / f"{name}.idx"
+
+
+def open_segment(segment_dir: Path, segment: Dict[str, Any]) -> Optional[BinaryIO]:
+    """セグメントを開く（読み込み中に圧縮されていれば .gz、保存期間切れで消えていれば None）"""
+    path = segment_dir / segment["file"]
+    for candidate in (path, path.with_name(path.name + ".gz")):
+        try:
+            if candidate.suffix == ".gz":
+                handle = gzip.open(candidate, "rb")
+                handle.peek(1)  # 存在しない・壊れたファイルはここで分かる
+                return handle
+            return open(candidate, "rb")
+        except (FileNotFoundError, gzip.BadGzipFile, EOFError):
+            continue
+    return None
+
+
+def log_exists(log_file: Path) -> bool:
+    """現在のファイルかローテーション済みのセグメントがあるか"""
+    log_file = Path(log_file)
+    return log_file.exists() or bool(load_manifest(log_file.parent).get(log_file.name, {}).get("segments"))
+
+
+def open_segments(log_file: Path, since: Optional[str] = None,
+                  include_archived: bool = True) -> List[Tuple[Optional[Dict[str, Any]], BinaryIO]]:
+    """
+    log_file のセグメント（古い順）と現在のファイルを開く
+
+    Args:
+        since: ISO形式の時刻（統計からこれより前に終わっていると分かるセグメントは開かない）
+        include_archived: False なら列指向アーカイブ（log_archive.py）にしたセグメントは開かない
+    Returns:
+        (一覧のセグメント情報、現在のファイルは None, 開いたファイル) のリスト
+    開いている間にローテーションが起きた場合は開き直す（行の取りこぼし・重複を防ぐ）
+    """
+    log_file = Path(log_file)
+    segment_dir = log_file.parent / SEGMENT_DIR
+    for attempt in range(OPEN_RETRIES):
+        segments = load_manifest(log_file.parent).get(log_file.name, {}).get("segments", [])
+        opened = []
+        for segment in segments:
+            if since is not None and segment.get("end") and segment["end"] < since:
+                continue
+            if not include_archived and segment.get("archive"):
+                continue
+            handle = open_segment(segment_dir, segment)
+            if handle is not None:
+                opened.append((segment, handle))
+        try:
+            opened.append((None, open(log_file, "rb")))
+        except FileNotFoundError:
+            pass
+        after = load_manifest(log_file.parent).get(log_file.name, {}).get("segments", [])
+        if len(after) == len(segments) or attempt == OPEN_RETRIES - 1:
+            return opened
+        for _, handle in opened:
+            handle.close()
+    return []
+
+
+def iter_lines(log_file: Path, since: Optional[str] = None, include_archived: bool = True) -> Iterator[bytes]:
+    """セグメントをまたいで log_file の行を古い順に返す"""
+    opened = open_segments(log_file, since, include_archived)
+    try:
+        for _, handle in opened:
+            yield from handle
+    finally:
+        for _, handle in opened:
+            handle.close()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+CCTeam ログシリアライザ
+構造化ログ（JSONL）1行のエンコード・デコードを msgspec / orjson / 標準 json から選んで行う
+"""
+
+import json
+import os
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, TypedDict, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class ErrorInfo(TypedDict, total=False):
+    """ログエントリの error フィールド"""
+    type: str
+    message: str
+    traceback: List[str]
+    attributes: Dict[str, str]
+
+
+class LogEntry(TypedDict, total=False):
+    """構造化ログ1行のスキーマ（StructuredLogger が書き出す形式）"""
+    timestamp: str
+    level: str
+    agent: str
+    message: str
+    caller: Dict[str, Any]
+    context: Dict[str, Any]
+    error: ErrorInfo
+
+
+class LogEntrySummary(NamedTuple):
+    """集計に使うフィールドだけを取り出したログエントリ"""
+    timestamp: str
+    level: str
+    agent: str
+    error_type: Optional[str]
+
+
+# NamedTuple の __new__ を経由せずに作る
+_new_summary = tuple.__new__
+
+
+def summarize_entry(entry: Any) -> LogEntrySummary:
+    """
+    デコード済みのエントリから集計用のフィールドだけを取り出す
+
+    msgspec の型付きスキーマと同じく、オブジェクトでない行や timestamp / level / agent / error.type が
+    文字列でない行、error がオブジェクトでない行は ValueError（どのシリアライザでも同じ行を読み飛ばす）
+    """
+    if type(entry) is not dict:
+        raise ValueError("log entry must be a JSON object")
+    get = entry.get
+    timestamp = get("timestamp", "")
+    level = get("level", "UNKNOWN")
+    agent = get("agent", "unknown")
+    error = get("error")
+    error_type = None
+    if error is not None:
+        if type(error) is not dict:
+            raise ValueError("log entry error must be a JSON object")
+        error_type = error.get("type")
+    if (type(timestamp) is not str or type(level) is not str or type(agent) is not str
+            or (error_type is not None and type(error_type) is not str)):
+        raise ValueError("log entry timestamp, level, agent and error.type must be strings")
+    return _new_summary(LogEntrySummary, (timestamp, level, agent, error_type))
+
+
+class JsonSerializer:
+    """標準ライブラリの json を使うシリアライザ（常に利用可能）"""
+
+    name = "json"
+    # 壊れた行のデコードで送出される例外
+    decode_errors: tuple = (ValueError,)
+
+    def dumps(self, entry: LogEntry) -> bytes:
+        """エントリを末尾改行付きの UTF-8 の1行にする"""
+        return (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+
+    # 1行をエントリの dict に戻す（1行ごとに呼ばれるのでラッパーを挟まない）
+    loads = staticmethod(json.loads)
+
+    def summarize(self, line: Union[bytes, str]) -> LogEntrySummary:
+        """1行から集計用のフィールドだけを取り出す（スキーマに合わない行は ValueError、summarize_entry を参照）"""
+        return summarize_entry(self.loads(line))
+
+
+class OrjsonSerializer(JsonSerializer):
+    """orjson を使うシリアライザ（出力は区切りの空白なしのJSON）"""
+
+    name = "orjson"
+
+    def __init__(self):
+        self._option = orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, entry: LogEntry) -> bytes:
+        try:
+            return orjson.dumps(entry, option=self._option)
+        except TypeError:
+            # 64bit を超える整数など orjson が扱えない値は標準 json に任せる
+            return super().dumps(entry)
+
+    if orjson is not None:
+        loads = staticmethod(orjson.loads)
+
+
+if msgspec is not None:
+    class _ErrorSummary(msgspec.Struct):
+        type: Optional[str] = None
+
+    class _EntrySummary(msgspec.Struct):
+        """集計用のスキーマ（ここにないフィールドは dict を作らずに読み飛ばされる）"""
+        timestamp: str = ""
+        level: str = "UNKNOWN"
+        agent: str = "unknown"
+        error: Optional[_ErrorSummary] = None
+
+
+class MsgspecSerializer(JsonSerializer):
+    """msgspec を使うシリアライザ（集計用のデコードは型付きスキーマへ直接行う）"""
+
+    name = "msgspec"
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder()
+        self.loads = msgspec.json.Decoder().decode
+        self._summary_decoder = msgspec.json.Decoder(_EntrySummary)
+        self.decode_errors = (ValueError, msgspec.DecodeError)
+
+    def dumps(self, entry: LogEntry) -> bytes:
+        try:
+            return self._encoder.encode(entry) + b"\n"
+        except (TypeError, OverflowError, msgspec.EncodeError):
+            return super().dumps(entry)
+
+    def summarize(self, line: Union[bytes, str]) -> LogEntrySummary:
+        entry = self._summary_decoder.decode(line)
+        error = entry.error
+        return _new_summary(LogEntrySummary, (entry.timestamp, entry.level, entry.agent,
+                                              error.type if error is not None else None))
+
+
+# 自動選択の優先順
+SERIALIZERS = {
+    "msgspec": MsgspecSerializer,
+    "orjson": OrjsonSerializer,
+    "json": JsonSerializer,
+}
+
+_instances: Dict[str, JsonSerializer] = {}
+
+
+def available_serializers() -> List[str]:
+    """この環境で使えるシリアライザ名（優先順）"""
+    installed = {"msgspec": msgspec is not None, "orjson": orjson is not None, "json": True}
+    return [name for name in SERIALIZERS if installed[name]]
+
+
+def get_serializer(name: Optional[str] = None) -> JsonSerializer:
+    """
+    シリアライザを返す
+
+    Args:
+        name: "msgspec" / "orjson" / "json" / "auto"
+              （省略時は環境変数 CCTEAM_LOG_SERIALIZER、なければ auto = 使える中で最速のもの）
+              インストールされていないものを指定した場合は auto と同じ
+    """
+    requested = (name or os.environ.get("CCTEAM_LOG_SERIALIZER") or "auto").lower()
+    if requested in _instances:
+        return _instances[requested]
+    if requested != "auto" and requested not in SERIALIZERS:
+        raise ValueError(f"serializer must be one of {['auto'] + list(SERIALIZERS)}: {requested}")
+    available = available_serializers()
+    name = requested if requested in available else available[0]
+    if requested not in ("auto", name):
+        print(f"⚠️  {requested} is not installed, using {name}", file=sys.stderr)
+    serializer = next((s for s in _instances.values() if s.name == name), None) or SERIALIZERS[name]()
+    _instances[requested] = serializer
+    return serializer
+
+
+def main():
+    """CLI インターフェース"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='CCTeam Log Serializer')
+    parser.add_argument('--serializer', help='Serializer to check (default: CCTEAM_LOG_SERIALIZER or auto)')
+    args = parser.parse_args()
+
+    print(f"利用可能: {', '.join(available_serializers())}")
+    print(f"使用中: {get_serializer(args.serializer).name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+CCTeam ログストア
+構造化ログ（*_structured.jsonl と errors_all.jsonl）を SQLite のテーブルに取り込み、任意の SQL で集計する
+取り込みはファイルごとに前回の位置を覚えておき、2回目以降は追記された行（と新しいセグメント）だけを読む
+"""
+
+import fnmatch
+import json
+import os
+import sqlite3
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from log_archive import open_archive
+    from log_index import HEAD_BYTES, new_totals
+    from log_segments import OPEN_RETRIES, SEGMENT_DIR, load_manifest, open_segment
+    from log_serializer import JsonSerializer, get_serializer, summarize_entry
+except ImportError:
+    from scripts.log_archive import open_archive
+    from scripts.log_index import HEAD_BYTES, new_totals
+    from scripts.log_segments import OPEN_RETRIES, SEGMENT_DIR, load_manifest, open_segment
+    from scripts.log_serializer import JsonSerializer, get_serializer, summarize_entry
+
+# logs/segments/ に置く（log_rotation.sh の圧縮・削除の対象外）
+STORE_FILE = "logs.sqlite3"
+# テーブル → 取り込むファイル（errors_all.jsonl は各エージェントのログと重複するので別のテーブルにする）
+TABLES = {"entries": "*_structured.jsonl", "errors": "errors_all.jsonl"}
+# 1回の executemany で入れる行数
+BATCH_ROWS = 5000
+
+_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY,          -- 取り込んだ順（ファイル内の順）
+    source TEXT NOT NULL,            -- 取り込み元のファイル名（例: worker1_structured.jsonl）
+    timestamp TEXT NOT NULL,
+    level TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    error_type TEXT,
+    message TEXT,
+    caller_file TEXT,
+    caller_function TEXT,
+    caller_line INTEGER,
+    entry TEXT NOT NULL              -- 元の JSON（context などは json_extract(entry, '$.context.key') で引く）
+);
+CREATE INDEX IF NOT EXISTS {table}_timestamp ON {table} (timestamp);
+CREATE INDEX IF NOT EXISTS {table}_agent ON {table} (agent, timestamp);
+CREATE INDEX IF NOT EXISTS {table}_level ON {table} (level, timestamp);
+CREATE INDEX IF NOT EXISTS {table}_error_type ON {table} (error_type, timestamp);
+-- ファイル単位の集計（analyze_errors / get_agent_activity）は表を読まずに索引だけで済ませる
+-- （時間範囲ありは timestamp の範囲を読む、なしは GROUP BY の順に並んだ索引を読む、最後の数件は id の逆順）
+CREATE INDEX IF NOT EXISTS {table}_source ON {table} (source, timestamp, level, agent, error_type);
+CREATE INDEX IF NOT EXISTS {table}_source_groups ON {table} (source, level, agent, error_type);
+CREATE INDEX IF NOT EXISTS {table}_source_recent ON {table} (source);
+"""
+
+_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_state (
+    name TEXT PRIMARY KEY,           -- ログファイル名
+    segment INTEGER NOT NULL,        -- 取り込み終えたセグメントの seq
+    inode INTEGER,                   -- 現在のファイル（取り込み途中）の inode と先頭の [長さ, crc32]
+    head_length INTEGER,
+    head_crc INTEGER,
+    offset INTEGER NOT NULL,         -- 現在のファイルの取り込み済みのバイト数・行数
+    rows INTEGER NOT NULL
+);
+"""
+
+_COLUMNS = ("source", "timestamp", "level", "agent", "error_type", "message",
+            "caller_file", "caller_function", "caller_line", "entry")
+
+
+def table_for(name: str) -> Optional[str]:
+    """ログファイル名を取り込むテーブル（対象外なら None）"""
+    for table, pattern in TABLES.items():
+        if fnmatch.fnmatch(name, pattern):
+            return table
+    return None
+
+
+def _head(f: BinaryIO, length: int) -> Tuple[int, int]:
+    """先頭 length バイトの (長さ, crc32)"""
+    f.seek(0)
+    head = f.read(length)
+    return len(head), zlib.crc32(head)
+
+
+def _value(value: Any) -> Any:
+    """SQLite に入れられない値（dict・list など）は JSON の文字列にする"""
+    if value is None or type(value) in (str, int, float):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+class LogStore:
+    """
+    構造化ログを取り込んだ SQLite データベース
+
+    entries（*_structured.jsonl）と errors（errors_all.jsonl）の2つのテーブルがあり、
+    timestamp / agent / level / error_type に索引がある。例: 1時間ごと・エージェントごと・呼び出し元の関数ごとのエラー数
+        SELECT substr(timestamp, 1, 13) AS hour, agent, caller_function, count(*)
+        FROM entries WHERE level IN ('ERROR', 'CRITICAL') GROUP BY hour, agent, caller_function
+    ローテーション済みのセグメント（アーカイブにして JSONL を削除したものはアーカイブ）も順に取り込む
+    """
+
+    def __init__(self, log_dir: str = "logs", path: Optional[str] = None, serializer: Optional[str] = None):
+        """
+        Args:
+            log_dir: ログの保存先
+            path: データベースのパス（省略時は logs/segments/logs.sqlite3）
+            serializer: JSON のデコードに使うライブラリ
+        """
+        self.log_dir = Path(log_dir)
+        self.path = Path(path) if path else self.log_dir / SEGMENT_DIR / STORE_FILE
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.serializer: JsonSerializer = get_serializer(serializer)
+        # 取り込みは BEGIN IMMEDIATE で明示的にトランザクションにする（同時に実行しても二重に取り込まない）
+        self.db = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        for table in TABLES:
+            self.db.executescript(_TABLE_SCHEMA.format(table=table))
+        self.db.executescript(_STATE_SCHEMA)
+        # query() 用の読み取り専用の接続（初回の query で開く）
+        self._reader: Optional[sqlite3.Connection] = None
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def log_files(self) -> List[str]:
+        """取り込み対象のログファイル名（現在のファイルがローテーションされたままのものを含む）"""
+        names = {path.name for pattern in TABLES.values() for path in self.log_dir.glob(pattern)}
+        names.update(name for name in load_manifest(self.log_dir) if table_for(name))
+        return sorted(names)
+
+    def ingest(self, names: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        ログファイル（省略時はすべて）の未取り込みの行を取り込む
+
+        Returns:
+            ファイル名ごとの取り込んだ行数
+        """
+        added = {}
+        for name in (self.log_files() if names is None else names):
+            table = table_for(name)
+            if table is None:
+                raise ValueError(f"not a structured log: {name}")
+            added[name] = self._ingest_file(table, name)
+        return added
+
+    def _open(self, log_file: Path) -> Tuple[List[Dict[str, Any]], Optional[BinaryIO]]:
+        """セグメント一覧と現在のファイル（開いている間にローテーションが起きたら開き直す）"""
+        for attempt in range(OPEN_RETRIES):
+            segments = load_manifest(self.log_dir).get(log_file.name, {}).get("segments", [])
+            try:
+                live = open(log_file, "rb")
+            except FileNotFoundError:
+                live = None
+            after = load_manifest(self.log_dir).get(log_file.name, {}).get("segments", [])
+            if len(after) == len(segments) or attempt == OPEN_RETRIES - 1:
+                return segments, live
+            if live is not None:
+                live.close()
+        return [], None
+
+    def _ingest_file(self, table: str, name: str) -> int:
+        """
+        1つのログファイルの未取り込みの行を1トランザクションで取り込む
+
+        前回取り込み途中だった現在のファイルがローテーションされていれば、そのセグメントの続きから読む
+        （先頭のバイト列で同じファイルか確かめる）
+        """
+        segment_dir = self.log_dir / SEGMENT_DIR
+        segments, live = self._open(self.log_dir / name)
+        added = 0
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute("SELECT segment, inode, head_length, head_crc, offset, rows "
+                                      "FROM ingest_state WHERE name = ?", (name,)).fetchone()
+                done, inode, head_length, head_crc, offset, rows = row or (0, None, None, None, 0, 0)
+                head = (head_length, head_crc) if head_length is not None else None
+                for segment in segments:
+                    if segment["seq"] <= done:
+                        continue
+                    resume = segment["seq"] == done + 1 and offset > 0 and head is not None
+                    handle = open_segment(segment_dir, segment)
+                    if handle is not None:
+                        with handle:
+                            start = offset if resume and _head(handle, head[0]) == head else 0
+                            handle.seek(start)
+                            added += self._insert(table, name, handle, partial=False)[0]
+                    elif segment.get("archive") and (segment_dir / segment["archive"]).exists():
+                        # JSONL を削除したセグメントはアーカイブから（取り込み済みの行数だけ飛ばす）
+                        with open_archive(segment_dir / segment["archive"], self.serializer) as archive:
+                            dumps = self.serializer.dumps
+                            lines = (dumps(entry) for entry in archive.entries())
+                            for _ in range(rows if resume else 0):
+                                next(lines, None)
+                            added += self._insert(table, name, lines, partial=False)[0]
+                    done, inode, head, offset, rows = segment["seq"], None, None, 0, 0
+                if live is not None:
+                    st = os.fstat(live.fileno())
+                    if (inode != st.st_ino or offset > st.st_size
+                            or (head is not None and _head(live, head[0]) != head)):
+                        # ローテーション後の新しいファイル・作り直されたファイル
+                        inode, head, offset, rows = st.st_ino, None, 0, 0
+                    live.seek(offset)
+                    count, consumed = self._insert(table, name, live, partial=True)
+                    added += count
+                    offset += consumed
+                    rows += count
+                    if head is None or head[0] < HEAD_BYTES:
+                        head = _head(live, min(offset, HEAD_BYTES))
+                self.db.execute("INSERT OR REPLACE INTO ingest_state VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (name, done, inode, head[0] if head else None, head[1] if head else None,
+                                 offset, rows))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        finally:
+            if live is not None:
+                live.close()
+        return added
+
+    def _insert(self, table: str, source: str, lines: Iterable[bytes], partial: bool) -> Tuple[int, int]:
+        """
+        行をテーブルに入れる（デコードできない行・集計用のフィールドの型が合わない行は飛ばす）
+
+        Args:
+            partial: True なら改行で終わらない最後の行（書き込み途中）は入れずに止める
+        Returns:
+            (入れた行数, 読んだバイト数)
+        """
+        sql = f"INSERT INTO {table} ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+        loads = self.serializer.loads
+        decode_errors = self.serializer.decode_errors
+        batch = []
+        count = consumed = 0
+        for line in lines:
+            if partial and not line.endswith(b"\n"):
+                break
+            consumed += len(line)
+            try:
+                entry = loads(line)
+                # 他の集計経路（summarize）と同じ行を飛ばす
+                timestamp, level, agent, error_type = summarize_entry(entry)
+            except decode_errors:
+                continue
+            get = entry.get
+            caller = get("caller")
+            if type(caller) is not dict:
+                caller = {}
+            batch.append((source, timestamp, level, agent, error_type,
+                          _value(get("message")), _value(caller.get("file")), _value(caller.get("function")),
+                          _value(caller.get("line")), line.rstrip(b"\n").decode("utf-8", "replace")))
+            if len(batch) >= BATCH_ROWS:
+                self.db.executemany(sql, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self.db.executemany(sql, batch)
+            count += len(batch)
+        return count, consumed
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> Tuple[List[str], List[tuple]]:
+        """
+        SQL を読み取り専用の接続で実行して (列名, 行) を返す
+
+        DELETE / UPDATE / DROP などの書き込みは sqlite3.OperationalError
+        （取り込み用の接続で実行すると即座にコミットされ、ingest_state の位置と行がずれて再取り込みされなくなる）
+        """
+        if self._reader is None:
+            self._reader = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True, timeout=60)
+            # ATTACH したデータベースへの書き込みも拒否する
+            self._reader.execute("PRAGMA query_only=ON")
+        cursor = self._reader.execute(sql, tuple(params))
+        columns = [d[0] for d in cursor.description] if cursor.description else []
+        return columns, cursor.fetchall()
+
+    def totals(self, name: str, cutoff: Optional[str] = None,
+               recent: int = 10) -> Tuple[Dict[str, Any], List[bytes]]:
+        """
+        1つのログファイルの cutoff より新しいエントリの件数（レベル・エージェント・エラータイプ別）と最後の recent 件の行
+
+        件数は索引だけを読む GROUP BY で数える（統計がないと時間範囲が狭くても全件を読む計画になるので索引を指定する）
+        """
+        table = table_for(name)
+        where, params = "source = ?", [name]
+        if cutoff is not None:
+            where += " AND timestamp > ?"
+            params.append(cutoff)
+        index = f"{table}_source" if cutoff is not None else f"{table}_source_groups"
+        totals = new_totals()
+        for level, agent, error_type, count in self.db.execute(
+                f"SELECT level, agent, error_type, count(*) FROM {table} INDEXED BY {index} WHERE {where} "
+                f"GROUP BY level, agent, error_type", params):
+            totals["total"] += count
+            for field, value in (("levels", level), ("agents", agent), ("types", error_type)):
+                if value is not None:
+                    totals[field][value] = totals[field].get(value, 0) + count
+        lines = [row[0].encode("utf-8") for row in self.db.execute(
+            f"SELECT entry FROM {table} INDEXED BY {table}_source_recent WHERE {where} ORDER BY id DESC LIMIT ?",
+            params + [recent])]
+        lines.reverse()
+        return totals, lines
@@ -62,11 +62,9 @@ optimize_memory() {
         # バックアップ
         cp "$PROJECT_ROOT/memory/ccteam_memory.db" "$PROJECT_ROOT/memory/ccteam_memory.db.backup"
         
-        # VACUUM実行
-        sqlite3 "$PROJECT_ROOT/memory/ccteam_memory.db" "VACUUM;"
-        
-        # 古い会話を削除（30日以上前）
-        sqlite3 "$PROJECT_ROOT/memory/ccteam_memory.db" "DELETE FROM conversations WHERE datetime(timestamp) < datetime('now', '-30 days');"
+        # 古い会話を削除（30日以上前）してVACUUM
+        # 本文は blobs に圧縮されており全文検索インデックスの更新が必要なため、sqlite3 で直接削除しない
+        (cd "$PROJECT_ROOT" && python3 scripts/memory_manager.py compact --retention-days 30 --no-archive)
         
         echo -e "${GREEN}✅ Memory optimization completed${NC}"
     else
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+CCTeam Memory Client - メモリデーモン用の軽量クライアント
+`memory_manager.py serve` にUnixソケット経由で要求を送る
+デーモンが停止している場合は CCTeamMemoryManager を直接使用する
+
+プロトコル（1行1要求、フィールドはタブ区切り）:
+    PING
+    SAVE   <agent> <message_type> <message> [<metadata_json>]
+    SEARCH <limit> <query>
+    LOAD   <limit> [<agent>]
+    CONTEXT <agent> <token_budget> [<query>]
+    STATS
+応答:
+    OK [<json>]
+    ERR <message>
+"""
+
+import json
+import os
+import socket
+import sys
+from typing import Any, Dict, List, Optional
+
+# ソケットの既定パス（環境変数で上書き可能）
+DEFAULT_SOCKET_PATH = os.environ.get("CCTEAM_MEMORY_SOCKET", "memory/ccteam_memory.sock")
+
+_ESCAPES = {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"}
+_UNESCAPES = {"\\": "\\", "t": "\t", "n": "\n", "r": "\r"}
+
+
+def encode_fields(*fields: str) -> bytes:
+    """フィールドをエスケープして1行にまとめる"""
+    escaped = ("".join(_ESCAPES.get(ch, ch) for ch in str(field)) for field in fields)
+    return ("\t".join(escaped) + "\n").encode("utf-8")
+
+
+def decode_fields(line: bytes) -> List[str]:
+    """1行をフィールドに分解してエスケープを戻す"""
+    fields = []
+    for raw in line.decode("utf-8").rstrip("\n").split("\t"):
+        if "\\" not in raw:
+            fields.append(raw)
+            continue
+        out = []
+        chars = iter(raw)
+        for ch in chars:
+            if ch == "\\":
+                nxt = next(chars, "\\")
+                out.append(_UNESCAPES.get(nxt, nxt))
+            else:
+                out.append(ch)
+        fields.append("".join(out))
+    return fields
+
+
+class MemoryClient:
+    """メモリデーモンへの接続（接続は使い回す）"""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 2.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._rfile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        """接続を閉じる"""
+        if self._sock is not None:
+            self._rfile.close()
+            self._sock.close()
+            self._sock = None
+            self._rfile = None
+
+    def connect(self):
+        """デーモンに接続（接続済みなら何もしない、デーモン不在時は OSError）"""
+        if self._sock is not None:
+            return
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._rfile = sock.makefile("rb")
+
+    def request(self, *fields: str) -> Any:
+        """要求を送信して応答ペイロードを返す（デーモン不在時は OSError）"""
+        self.connect()
+        self._sock.sendall(encode_fields(*fields))
+        line = self._rfile.readline()
+        if not line:
+            self.close()
+            raise ConnectionError("memory daemon closed the connection")
+
+        status, *payload = decode_fields(line)
+        if status != "OK":
+            raise RuntimeError(payload[0] if payload else "memory daemon error")
+        return json.loads(payload[0]) if payload else None
+
+    def ping(self) -> bool:
+        """デーモンが応答するか確認"""
+        try:
+            self.request("PING")
+            return True
+        except OSError:
+            return False
+
+    def save(self, agent: str, message: str, message_type: str = "user",
+             metadata: Optional[Dict] = None):
+        """対話履歴の保存を依頼（デーモン側でキューに積まれ即時応答）"""
+        fields = ["SAVE", agent, message_type, message]
+        if metadata:
+            fields.append(json.dumps(metadata, ensure_ascii=False))
+        self.request(*fields)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """関連する記憶の検索"""
+        return self.request("SEARCH", str(limit), query)
+
+    def load(self, limit: int = 20, agent: Optional[str] = None) -> List[Dict[str, Any]]:
+        """最近のコンテキストを取得"""
+        return self.request("LOAD", str(limit), agent or "")
+
+    def context(self, agent: str, token_budget: int, query: Optional[str] = None) -> Dict[str, Any]:
+        """トークン予算内の記憶を取得（デーモン側でキャッシュされる）"""
+        return self.request("CONTEXT", agent, str(token_budget), query or "")
+
+    def stats(self) -> Dict[str, Any]:
+        """メモリ統計情報の取得"""
+        return self.request("STATS")
+
+
+def _direct_manager():
+    """デーモン不在時のフォールバック（直接DBへアクセス）"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from memory_manager import CCTeamMemoryManager
+    return CCTeamMemoryManager()
+
+
+def main():
+    """CLI インターフェース（シェルスクリプトからの呼び出し用）"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='CCTeam Memory Client')
+    parser.add_argument('command', choices=['save', 'search', 'load', 'context', 'stats', 'ping'],
+                        help='Command to execute')
+    parser.add_argument('--agent', default='USER', help='Agent name')
+    parser.add_argument('--message', help='Message to save')
+    parser.add_argument('--type', default='user', help='Message type')
+    parser.add_argument('--query', help='Search query')
+    parser.add_argument('--limit', type=int, default=20, help='Number of results')
+    parser.add_argument('--tokens', type=int, default=2000, help='Token budget for context')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH, help='Daemon socket path')
+
+    args = parser.parse_args()
+
+    client = MemoryClient(args.socket)
+    if args.command == 'ping':
+        alive = client.ping()
+        print("✅ Memory daemon is running" if alive else "❌ Memory daemon is not running")
+        sys.exit(0 if alive else 1)
+
+    if args.command == 'save' and not args.message:
+        print("Error: --message is required for save command")
+        sys.exit(1)
+    if args.command == 'search' and not args.query:
+        print("Error: --query is required for search command")
+        sys.exit(1)
+
+    try:
+        client.connect()
+    except OSError:
+        # デーモン停止中は直接モードで処理
+        memory = _direct_manager()
+        memory.verbose = False
+        with memory:
+            if args.command == 'save':
+                memory.save_conversation(args.agent, args.message, args.type)
+                result = None
+            elif args.command == 'search':
+                result = memory.get_relevant_memories(args.query, limit=args.limit)
+            elif args.command == 'load':
+                result = memory.get_context_window(None if args.agent == 'USER' else args.agent,
+                                                   limit=args.limit)
+            elif args.command == 'context':
+                result = memory.build_context(args.agent, args.tokens, args.query)
+            else:
+                result = memory._get_statistics()
+    else:
+        # 送信後のタイムアウト・切断ではデーモン側で処理済みの可能性があるため
+        # 直接モードで再実行せずエラーにする（SAVE の二重書き込みを防ぐ）
+        try:
+            if args.command == 'save':
+                client.save(args.agent, args.message, args.type)
+                result = None
+            elif args.command == 'search':
+                result = client.search(args.query, args.limit)
+            elif args.command == 'load':
+                result = client.load(args.limit, None if args.agent == 'USER' else args.agent)
+            elif args.command == 'context':
+                result = client.context(args.agent, args.tokens, args.query)
+            else:
+                result = client.stats()
+        except (OSError, RuntimeError) as e:
+            print(f"❌ Memory daemon request failed: {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            client.close()
+
+    if result is not None:
+        print(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,31 @@ import datetime
 import os
 import sys
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterable, Iterator
 import hashlib
 import argparse
+import threading
+import time
+import zlib
+import atexit
+import gzip
+import io
+import itertools
+import functools
+import queue
+import re
+import signal
+import socketserver
+from contextlib import contextmanager
+
+try:
+    from memory_client import DEFAULT_SOCKET_PATH, MemoryClient, encode_fields, decode_fields
+except ImportError:  # scripts パッケージとして import された場合
+    from scripts.memory_client import DEFAULT_SOCKET_PATH, MemoryClient, encode_fields, decode_fields
+
+# データベースの既定パス（環境変数で上書き可能）
+DEFAULT_DB_PATH = os.environ.get("CCTEAM_MEMORY_DB", "memory/ccteam_memory.db")
+
 
 class CCTeamMemoryManager:
     """
@@ -20,16 +42,170 @@ class CCTeamMemoryManager:
     SQLiteを使用して対話履歴とコンテキストを管理
     """
     
-    def __init__(self, db_path: str = "memory/ccteam_memory.db"):
+    # スキーマバージョン（PRAGMA user_version で管理）
+    SCHEMA_VERSION = 5
+    # ロック競合時の待機時間（ミリ秒）
+    BUSY_TIMEOUT_MS = 5000
+    # ストリーミングエクスポート対象: テーブル名 -> (時刻カラム, インポート時の重複解決)
+    # learned_patterns は更新されるため時刻で差分を取り、インポート時は置き換える
+    EXPORT_TABLES = {
+        "conversations": ("timestamp", "IGNORE"),
+        "project_contexts": ("timestamp", "IGNORE"),
+        "learned_patterns": ("last_used", "REPLACE"),
+    }
+    # fetchmany / executemany の1回あたりの行数
+    STREAM_CHUNK_SIZE = 1000
+    # IN (...) に1回で渡すパラメータ数（SQLite 3.32 より前の上限 999 を超えない）
+    LOOKUP_CHUNK_SIZE = 500
+    # build_context の結果を保持する件数
+    CONTEXT_CACHE_SIZE = 128
+    # これ以上のバイト数の本文は blobs に圧縮して格納
+    BLOB_COMPRESS_THRESHOLD = 512
+    
+    def __init__(self, db_path: str = DEFAULT_DB_PATH,
+                 buffer_size: int = 0, buffer_max_age: float = 1.0,
+                 compression: Optional[str] = "zlib"):
+        """
+        Args:
+            db_path: データベースファイルのパス
+            buffer_size: 書き込みバッファの最大行数（0でバッファ無効、即時書き込み）
+            buffer_max_age: バッファ内の行を保持する最大秒数
+            compression: 本文の圧縮形式（None / "zlib" / "zstd"）
+        """
         self.db_path = Path(db_path)
-        self.db_path.parent.mkdir(exist_ok=True)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 古い対話履歴の移動先（compact で作成され、以降は ATTACH して検索対象に含める）
+        self.archive_path = self.db_path.with_name(f"{self.db_path.stem}_archive{self.db_path.suffix}")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        # 保存時のコンソール出力（デーモン/クライアントでは無効化）
+        self.verbose = True
+        self.buffer_size = buffer_size
+        self.buffer_max_age = buffer_max_age
+        self.compression = compression
+        self._buffer: List[tuple] = []
+        self._buffer_since: Optional[float] = None
+        self._flush_thread: Optional[threading.Thread] = None
+        self._flush_stop = threading.Event()
+        # キーに最新行IDを含めるため、書き込みがあれば自然に無効化される
+        self._context_cache = functools.lru_cache(maxsize=self.CONTEXT_CACHE_SIZE)(self._assemble_context)
         self._init_database()
+        if buffer_size > 0:
+            self._start_write_buffer()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+    
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """長寿命のSQLite接続（初回アクセス時に確立）"""
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            return self._conn
+    
+    def _connect(self) -> sqlite3.Connection:
+        """WALモードとチューニング済みPRAGMAで接続を確立"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,  # トランザクションは _transaction() で明示管理
+            check_same_thread=False,
+        )
+        # 新規DBのみ有効（既存DBは compact 時に VACUUM して切り替える）
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        # 本文の展開は接続ごとの TEMP ビューで行う（スキーマに UDF を含めると
+        # sqlite3 コマンド等の他の書き込み元で "no such function" になるため。temp_store 変更後に作成する）
+        conn.create_function("blob_text", 2, self._decode_blob, deterministic=True)
+        conn.execute("""
+            CREATE TEMP VIEW IF NOT EXISTS conversation_texts AS
+            SELECT c.id, c.session_id, c.timestamp, c.agent_name, c.message_type,
+                   CASE WHEN b.hash IS NULL THEN c.content
+                        WHEN b.codec IS NULL THEN b.data
+                        ELSE blob_text(b.codec, b.data) END AS content,
+                   c.context_hash, c.metadata
+            FROM main.conversations c
+            LEFT JOIN main.blobs b ON b.hash = c.context_hash
+        """)
+        if self.archive_path.exists():
+            conn.execute("ATTACH DATABASE ? AS archive", (str(self.archive_path),))
+        return conn
+    
+    @property
+    def _archive_attached(self) -> bool:
+        """アーカイブDBが接続済みか"""
+        return any(row[1] == "archive" for row in self.conn.execute("PRAGMA database_list"))
+    
+    def close(self):
+        """バッファを書き出して接続を閉じる（再アクセス時は自動で再接続）"""
+        self._stop_write_buffer()
+        with self._lock:
+            self.flush()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    
+    @contextmanager
+    def _transaction(self):
+        """書き込みトランザクション（BEGIN IMMEDIATEでロックを先取り）"""
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            else:
+                cursor.execute("COMMIT")
+    
+    @contextmanager
+    def _reader(self):
+        """読み取り用カーソル（未書き込みのバッファを先に反映）"""
+        with self._lock:
+            if self._buffer:
+                self.flush()
+            yield self.conn.cursor()
     
     def _init_database(self):
-        """メモリデータベースの初期化"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        """メモリデータベースの初期化（スキーマが古い場合のみマイグレーション）"""
+        with self._lock:
+            if self.conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+                with self._transaction() as cursor:
+                    # 他プロセスが先にマイグレーション済みの可能性があるためロック取得後に再確認
+                    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+                    if version < 1:
+                        self._migrate_v1(cursor)
+                    if version < 2:
+                        self._migrate_v2(cursor)
+                    if version < 3:
+                        self._migrate_v3(cursor)
+                    if version < 4:
+                        self._migrate_v4(cursor)
+                    if version < 5:
+                        self._migrate_v5(cursor)
+                    cursor.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+            
+            # FTS5が使えない環境ではLIKE検索にフォールバック
+            self._fts_enabled = self._has_table("conversations_fts")
+    
+    def _has_table(self, name: str) -> bool:
+        """テーブル（仮想テーブル含む）の存在確認"""
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone()
+        return row is not None
+    
+    def _migrate_v1(self, cursor: sqlite3.Cursor):
+        """v1: 基本テーブルとインデックス"""
         # 対話履歴テーブル
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS conversations (
@@ -73,186 +249,651 @@ class CCTeamMemoryManager:
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_timestamp ON conversations(timestamp)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent ON conversations(agent_name)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_project ON project_contexts(project_name)")
+    
+    def _migrate_v2(self, cursor: sqlite3.Cursor):
+        """v2: FTS5全文検索インデックス（トリガーで同期、既存データはバックフィル）"""
+        try:
+            # trigramトークナイザは日本語を含む部分一致検索に対応（SQLite 3.34+）
+            for table in ("conversations", "project_contexts"):
+                cursor.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+                        content, content='{table}', content_rowid='id', tokenize='trigram'
+                    )
+                """)
+        except sqlite3.OperationalError:
+            # FTS5/trigram非対応のSQLiteではインデックスを作らずLIKE検索を継続
+            for table in ("conversations", "project_contexts"):
+                cursor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+            return
         
-        conn.commit()
-        conn.close()
+        for table in ("conversations", "project_contexts"):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {table}_fts(rowid, content) VALUES (new.id, new.content);
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {table}_fts({table}_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF content ON {table} BEGIN
+                    INSERT INTO {table}_fts({table}_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                    INSERT INTO {table}_fts(rowid, content) VALUES (new.id, new.content);
+                END
+            """)
+            # 既存データのバックフィル
+            cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
     
-    def save_conversation(self, agent: str, message: str, message_type: str = "user", metadata: Optional[Dict] = None):
-        """対話履歴の保存"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _migrate_v3(self, cursor: sqlite3.Cursor):
+        """v3: パターンキーを索引付きカラムに分離し (pattern_type, pattern_key) を一意化"""
+        cursor.execute("ALTER TABLE learned_patterns ADD COLUMN pattern_key TEXT")
+        cursor.execute("UPDATE learned_patterns SET pattern_key = json_extract(pattern_data, '$.key')")
         
-        session_id = self._get_current_session_id()
-        context_hash = hashlib.md5(message.encode()).hexdigest()
+        # 同時更新で重複したパターンは最小IDの行に統合
+        duplicates = cursor.execute("""
+            SELECT pattern_type, pattern_key
+            FROM learned_patterns
+            WHERE pattern_key IS NOT NULL
+            GROUP BY pattern_type, pattern_key
+            HAVING COUNT(*) > 1
+        """).fetchall()
+        for pattern_type, pattern_key in duplicates:
+            rows = cursor.execute("""
+                SELECT id, success_rate, usage_count, last_used
+                FROM learned_patterns
+                WHERE pattern_type = ? AND pattern_key = ?
+                ORDER BY id
+            """, (pattern_type, pattern_key)).fetchall()
+            total = sum(row[2] or 0 for row in rows)
+            rate = sum((row[1] or 0) * (row[2] or 0) for row in rows) / total if total else rows[0][1]
+            last_used = max((row[3] for row in rows if row[3]), default=None)
+            cursor.execute("""
+                UPDATE learned_patterns SET success_rate = ?, usage_count = ?, last_used = ?
+                WHERE id = ?
+            """, (rate, total, last_used, rows[0][0]))
+            cursor.executemany("DELETE FROM learned_patterns WHERE id = ?", [(row[0],) for row in rows[1:]])
         
         cursor.execute("""
-            INSERT INTO conversations (session_id, agent_name, message_type, content, context_hash, metadata)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (session_id, agent, message_type, message, context_hash, json.dumps(metadata) if metadata else None))
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_pattern_key
+            ON learned_patterns(pattern_type, pattern_key)
+        """)
+    
+    def _migrate_v4(self, cursor: sqlite3.Cursor):
+        """v4: エージェント別の時系列ページング用複合インデックス"""
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_agent_timestamp
+            ON conversations(agent_name, timestamp, id)
+        """)
+        # agent_name 単独のインデックスは複合インデックスの先頭列で代替できる
+        cursor.execute("DROP INDEX IF EXISTS idx_agent")
+    
+    def _migrate_v5(self, cursor: sqlite3.Cursor):
+        """v5: 本文を context_hash をキーとする blobs に重複排除して格納"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                codec TEXT,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_context_hash ON conversations(context_hash)")
+        
+        fts = self._has_table("conversations_fts")
+        if fts:
+            # blobs 側の本文は SQL から読めないため、本文を持たない（contentless）索引に作り直し、
+            # blobs を参照する行は Python 側で登録・削除する（トリガーは content を持つ行のみ扱う）
+            for suffix in ("ai", "ad", "au"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS conversations_fts_{suffix}")
+            cursor.execute("DROP TABLE conversations_fts")
+            cursor.execute("""
+                CREATE VIRTUAL TABLE conversations_fts USING fts5(
+                    content, content='', tokenize='trigram'
+                )
+            """)
+        
+        # blobs を参照する行の content は空文字（NOT NULL 制約のため）
+        # 読み取りは別カーソルで少しずつ（更新するのは読み終えた行のみ）
+        rows = cursor.connection.execute("SELECT id, content FROM conversations WHERE content != '' ORDER BY id")
+        while True:
+            chunk = rows.fetchmany(self.STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            hashes = [hashlib.md5(content.encode()).hexdigest() for _, content in chunk]
+            cursor.executemany(
+                "INSERT OR IGNORE INTO blobs (hash, codec, size, data) VALUES (?, ?, ?, ?)",
+                [(digest, *self._encode_blob(content)) for digest, (_, content) in zip(hashes, chunk)],
+            )
+            cursor.executemany(
+                "UPDATE conversations SET content = '', context_hash = ? WHERE id = ?",
+                [(digest, row_id) for digest, (row_id, _) in zip(hashes, chunk)],
+            )
+            if fts:
+                cursor.executemany("INSERT INTO conversations_fts(rowid, content) VALUES (?, ?)", chunk)
+        
+        if fts:
+            cursor.execute("""
+                CREATE TRIGGER conversations_fts_ai AFTER INSERT ON conversations
+                WHEN new.content != '' BEGIN
+                    INSERT INTO conversations_fts(rowid, content) VALUES (new.id, new.content);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER conversations_fts_ad AFTER DELETE ON conversations
+                WHEN old.content != '' BEGIN
+                    INSERT INTO conversations_fts(conversations_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER conversations_fts_au AFTER UPDATE OF content ON conversations BEGIN
+                    INSERT INTO conversations_fts(conversations_fts, rowid, content)
+                    SELECT 'delete', old.id, old.content WHERE old.content != '';
+                    INSERT INTO conversations_fts(rowid, content)
+                    SELECT new.id, new.content WHERE new.content != '';
+                END
+            """)
+    
+    def _encode_blob(self, text: str) -> tuple:
+        """本文を (codec, 元のバイト数, 格納データ) に変換（閾値未満は非圧縮のまま）"""
+        raw = text.encode("utf-8")
+        if self.compression and len(raw) >= self.BLOB_COMPRESS_THRESHOLD:
+            if self.compression == "zlib":
+                packed = zlib.compress(raw)
+            elif self.compression == "zstd":
+                try:
+                    import zstandard
+                except ImportError:
+                    raise RuntimeError("zstd compression requires the 'zstandard' package")
+                packed = zstandard.ZstdCompressor().compress(raw)
+            else:
+                raise ValueError(f"Unknown compression: {self.compression}")
+            # 圧縮しても小さくならない場合はそのまま格納
+            if len(packed) < len(raw):
+                return self.compression, len(raw), packed
+        return None, len(raw), text
+    
+    @staticmethod
+    def _decode_blob(codec: Optional[str], data: Any) -> Optional[str]:
+        """blobs の格納データを本文に戻す（SQL関数 blob_text の実体）"""
+        if codec is None:
+            return data
+        if codec == "zlib":
+            return zlib.decompress(data).decode("utf-8")
+        if codec == "zstd":
+            import zstandard
+            return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+        raise ValueError(f"Unknown blob codec: {codec}")
+    
+    def save_conversation(self, agent: str, message: str, message_type: str = "user", metadata: Optional[Dict] = None):
+        """対話履歴の保存（バッファ有効時はまとめて書き込み）"""
+        row = self._conversation_row(agent, message, message_type, metadata)
         
-        conn.commit()
-        conn.close()
+        if self.buffer_size > 0:
+            with self._lock:
+                if self._flush_thread is None:
+                    # close() 後に再利用された場合は書き出しスレッドを再開
+                    self._start_write_buffer()
+                self._buffer.append(row)
+                if self._buffer_since is None:
+                    self._buffer_since = time.monotonic()
+                if len(self._buffer) >= self.buffer_size:
+                    self.flush()
+        else:
+            self._insert_conversations([row])
         
-        print(f"✅ Saved: [{agent}] {message[:50]}...")
+        if self.verbose:
+            print(f"✅ Saved: [{agent}] {message[:50]}...")
+    
+    def save_conversations_bulk(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """
+        対話履歴を1トランザクションで一括保存
+        
+        Args:
+            entries: save_conversation と同じキー（agent, message, message_type, metadata）の辞書
+        
+        Returns:
+            int: 保存した件数
+        """
+        rows = [
+            self._conversation_row(e["agent"], e["message"], e.get("message_type", "user"), e.get("metadata"))
+            for e in entries
+        ]
+        with self._lock:
+            # 順序を保つため未書き込みのバッファも同じトランザクションで書き込む
+            rows, self._buffer = self._buffer + rows, []
+            self._buffer_since = None
+            self._insert_conversations(rows)
+        
+        if self.verbose:
+            print(f"✅ Saved: {len(rows)} conversations")
+        return len(rows)
+    
+    def flush(self) -> int:
+        """書き込みバッファを1トランザクションで書き出す"""
+        with self._lock:
+            if not self._buffer:
+                return 0
+            rows, self._buffer = self._buffer, []
+            self._buffer_since = None
+            try:
+                self._insert_conversations(rows)
+            except BaseException:
+                # 書き込み失敗時はバッファに戻して次回の flush で再試行
+                self._buffer = rows + self._buffer
+                raise
+            return len(rows)
+    
+    def _conversation_row(self, agent: str, message: str, message_type: str,
+                          metadata: Optional[Dict]) -> tuple:
+        """INSERT用の行を作成（時刻はバッファリング時点で確定）"""
+        return (
+            self._get_current_session_id(),
+            time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),  # CURRENT_TIMESTAMP と同じUTC形式
+            agent,
+            message_type,
+            message,
+            hashlib.md5(message.encode()).hexdigest(),
+            json.dumps(metadata) if metadata else None,
+        )
+    
+    def _insert_conversations(self, rows: List[tuple]):
+        """対話履歴をexecutemanyでまとめて挿入"""
+        if not rows:
+            return
+        with self._transaction() as cursor:
+            self._write_conversations(cursor, rows)
+    
+    def _write_conversations(self, cursor: sqlite3.Cursor, rows: List[tuple]):
+        """本文を blobs に格納してから対話履歴の行を挿入（同じ本文は1つのblobを共有）"""
+        blobs = {row[5]: row[4] for row in rows}
+        cursor.executemany(
+            "INSERT OR IGNORE INTO blobs (hash, codec, size, data) VALUES (?, ?, ?, ?)",
+            [(digest, *self._encode_blob(text)) for digest, text in blobs.items()],
+        )
+        last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM conversations").fetchone()[0]
+        cursor.executemany("""
+            INSERT INTO conversations (session_id, timestamp, agent_name, message_type, content, context_hash, metadata)
+            VALUES (?, ?, ?, ?, '', ?, ?)
+        """, [row[:4] + row[5:] for row in rows])
+        if self._fts_enabled:
+            # 書き込みロック中なので last_id より大きいIDは今回の行（挿入順）
+            ids = [row[0] for row in cursor.execute("SELECT id FROM conversations WHERE id > ? ORDER BY id", (last_id,))]
+            self._index_texts(cursor, zip(ids, (row[4] for row in rows)))
+    
+    @staticmethod
+    def _index_texts(cursor: sqlite3.Cursor, rows: Iterable[tuple], delete: bool = False):
+        """blobs を参照する行の本文 (id, 本文) を全文検索インデックスに登録／削除"""
+        if delete:
+            cursor.executemany(
+                "INSERT INTO conversations_fts(conversations_fts, rowid, content) VALUES ('delete', ?, ?)", rows
+            )
+        else:
+            cursor.executemany("INSERT INTO conversations_fts(rowid, content) VALUES (?, ?)", rows)
+    
+    def _start_write_buffer(self):
+        """経過時間による書き出しスレッドと終了時の書き出しを登録（close() で解除）"""
+        def _flush_periodically(stop: threading.Event):
+            while not stop.wait(self.buffer_max_age / 2):
+                since = self._buffer_since
+                if since is not None and time.monotonic() - since >= self.buffer_max_age:
+                    try:
+                        self.flush()
+                    except sqlite3.Error as e:
+                        print(f"❌ Buffer flush failed: {e}", file=sys.stderr)
+        
+        self._flush_stop = threading.Event()
+        self._flush_thread = threading.Thread(target=_flush_periodically, args=(self._flush_stop,),
+                                              name="memory-buffer-flush", daemon=True)
+        self._flush_thread.start()
+        atexit.register(self.close)
+    
+    def _stop_write_buffer(self):
+        """書き出しスレッドを停止して atexit の登録を解除"""
+        with self._lock:
+            thread, self._flush_thread = self._flush_thread, None
+        if thread is None:
+            return
+        self._flush_stop.set()
+        atexit.unregister(self.close)
+        # スレッドは flush 中にロックを取るため、ロックの外で待つ
+        if thread is not threading.current_thread():
+            thread.join()
     
     def get_context_window(self, agent: str = None, limit: int = 50) -> List[Dict[str, Any]]:
-        """最近のコンテキストを取得"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        query = """
-            SELECT agent_name, message_type, content, timestamp, metadata
-            FROM conversations
-            WHERE 1=1
+        """最近のコンテキストを取得（時系列順）"""
+        conversations = list(itertools.islice(
+            self.iter_conversations(agent=agent, page_size=limit), limit
+        ))
+        return conversations[::-1]  # 時系列順に戻す
+    
+    def iter_conversations(self, agent: Optional[str] = None, since: Optional[str] = None,
+                           before_id: Optional[int] = None, page_size: int = 200) -> Iterator[Dict[str, Any]]:
         """
-        params = []
+        対話履歴を新しい順に遅延取得（(timestamp, id) によるキーセットページング）
         
-        if agent:
-            query += " AND agent_name = ?"
-            params.append(agent)
+        Args:
+            agent: エージェント名で絞り込み
+            since: この時刻（'YYYY-MM-DD HH:MM:SS'、UTC）以降の行のみ
+            before_id: このIDの行より古い行から開始（前ページの最後の id を渡す）
+            page_size: 1回のクエリで取得する行数
+        """
+        cursor_key = None
+        if before_id is not None:
+            with self._reader() as cursor:
+                row = cursor.execute("SELECT timestamp, id FROM conversations WHERE id = ?", (before_id,)).fetchone()
+            if row is None:
+                return
+            cursor_key = tuple(row)
         
-        query += " ORDER BY timestamp DESC LIMIT ?"
-        params.append(limit)
+        while True:
+            query = """
+                SELECT id, agent_name, message_type, content, timestamp, metadata
+                FROM conversation_texts
+                WHERE 1=1
+            """
+            params: List[Any] = []
+            if agent:
+                query += " AND agent_name = ?"
+                params.append(agent)
+            if since:
+                query += " AND timestamp >= ?"
+                params.append(since)
+            if cursor_key:
+                query += " AND (timestamp, id) < (?, ?)"
+                params.extend(cursor_key)
+            query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+            params.append(page_size)
+            
+            # ページ毎にロックを解放してから yield する
+            with self._reader() as cursor:
+                rows = cursor.execute(query, params).fetchall()
+            
+            for row in rows:
+                yield {
+                    "id": row[0],
+                    "agent": row[1],
+                    "type": row[2],
+                    "content": row[3],
+                    "timestamp": row[4],
+                    "metadata": json.loads(row[5]) if row[5] else None
+                }
+            
+            if len(rows) < page_size:
+                return
+            cursor_key = (rows[-1][4], rows[-1][0])
+    
+    def build_context(self, agent: str, token_budget: int, query: Optional[str] = None) -> Dict[str, Any]:
+        """
+        トークン予算内に収まるようにエージェント向けの記憶を組み立てる
         
-        cursor.execute(query, params)
-        results = cursor.fetchall()
+        query があれば関連する記憶を優先し、残りの予算を直近の対話で埋める。
+        結果は (agent, token_budget, query, 最新行ID) をキーにキャッシュされる
+        （返り値はキャッシュと共有されるため変更しないこと）
         
-        conn.close()
+        Returns:
+            Dict: entries（source/tokens付きの記憶、関連→時系列順）と tokens（推定合計）
+        """
+        with self._reader() as cursor:
+            last_ids = cursor.execute("""
+                SELECT (SELECT COALESCE(MAX(id), 0) FROM conversations),
+                       (SELECT COALESCE(MAX(id), 0) FROM project_contexts)
+            """).fetchone()
+        return self._context_cache(agent, token_budget, query or None, tuple(last_ids))
+    
+    def _assemble_context(self, agent: str, token_budget: int, query: Optional[str],
+                          last_ids: tuple) -> Dict[str, Any]:
+        """build_context の本体（last_ids はキャッシュキー用）"""
+        entries: List[Dict[str, Any]] = []
+        recent: List[Dict[str, Any]] = []
+        used = 0
+        seen = set()
         
-        conversations = []
-        for row in results:
-            conv = {
-                "agent": row[0],
-                "type": row[1],
-                "content": row[2],
-                "timestamp": row[3],
-                "metadata": json.loads(row[4]) if row[4] else None
-            }
-            conversations.append(conv)
+        # 関連する記憶もこのエージェントの対話に限る（他エージェントの対話で予算を埋めない）
+        relevant = self.get_relevant_memories(query, limit=20, agent=agent) if query else []
+        candidates = itertools.chain(
+            ((entry, "relevant") for entry in relevant),
+            ((entry, "recent") for entry in self.iter_conversations(agent=agent, page_size=50)),
+        )
+        for entry, source in candidates:
+            content = entry["content"]
+            text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+            if text in seen:
+                continue
+            tokens = self._estimate_tokens(text)
+            if used + tokens > token_budget:
+                if source == "recent":
+                    break  # 直近の対話は古い方へ連続して詰める
+                continue
+            seen.add(text)
+            used += tokens
+            (entries if source == "relevant" else recent).append({**entry, "source": source, "tokens": tokens})
+        entries.extend(reversed(recent))  # 直近の対話は時系列順に並べる
         
-        return conversations[::-1]  # 時系列順に戻す
+        return {"agent": agent, "token_budget": token_budget, "tokens": used, "entries": entries}
+    
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """
+        高速なトークン数の推定（ASCIIは約4文字/トークン、日本語等は約1文字/トークン）
+        UTF-8で増えたバイト数から非ASCII文字数を見積もる
+        """
+        non_ascii = (len(text.encode("utf-8")) - len(text)) // 2
+        return max(1, (len(text) - non_ascii) // 4 + non_ascii)
+    
+    def context_cache_info(self) -> Dict[str, Any]:
+        """build_context キャッシュのヒット率"""
+        info = self._context_cache.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "hit_rate": info.hits / lookups if lookups else 0.0,
+        }
     
     def save_project_context(self, project_name: str, context_type: str, content: Dict[str, Any], importance: float = 0.5):
         """プロジェクトコンテキストの保存"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO project_contexts (project_name, context_type, content, importance_score)
-            VALUES (?, ?, ?, ?)
-        """, (project_name, context_type, json.dumps(content, ensure_ascii=False), importance))
-        
-        conn.commit()
-        conn.close()
+        with self._transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO project_contexts (project_name, context_type, content, importance_score)
+                VALUES (?, ?, ?, ?)
+            """, (project_name, context_type, json.dumps(content, ensure_ascii=False), importance))
         
-        print(f"✅ Project context saved: {project_name}/{context_type}")
+        if self.verbose:
+            print(f"✅ Project context saved: {project_name}/{context_type}")
     
     def learn_pattern(self, pattern_type: str, pattern_data: Dict[str, Any], success: bool):
         """成功/失敗パターンの学習"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # パターンキーの生成
         pattern_key = self._generate_pattern_key(pattern_data)
         pattern_data['key'] = pattern_key
         
-        # 既存パターンの確認
-        cursor.execute("""
-            SELECT id, success_rate, usage_count
-            FROM learned_patterns
-            WHERE pattern_type = ? AND json_extract(pattern_data, '$.key') = ?
-        """, (pattern_type, pattern_key))
-        
-        existing = cursor.fetchone()
-        
-        if existing:
-            # 既存パターンの更新
-            pattern_id, current_rate, usage_count = existing
-            new_rate = (current_rate * usage_count + (1.0 if success else 0.0)) / (usage_count + 1)
-            
-            cursor.execute("""
-                UPDATE learned_patterns
-                SET success_rate = ?, usage_count = usage_count + 1, last_used = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (new_rate, pattern_id))
-        else:
-            # 新規パターンの登録
+        # 新規登録と既存パターンの更新を1文で実行（成功率は逐次平均で更新）
+        with self._transaction() as cursor:
             cursor.execute("""
-                INSERT INTO learned_patterns (pattern_type, pattern_data, success_rate, usage_count, last_used)
-                VALUES (?, ?, ?, 1, CURRENT_TIMESTAMP)
-            """, (pattern_type, json.dumps(pattern_data), 1.0 if success else 0.0))
-        
-        conn.commit()
-        conn.close()
+                INSERT INTO learned_patterns (pattern_type, pattern_key, pattern_data, success_rate, usage_count, last_used)
+                VALUES (?, ?, ?, ?, 1, CURRENT_TIMESTAMP)
+                ON CONFLICT(pattern_type, pattern_key) DO UPDATE SET
+                    success_rate = (success_rate * usage_count + excluded.success_rate) / (usage_count + 1),
+                    usage_count = usage_count + 1,
+                    last_used = CURRENT_TIMESTAMP
+            """, (pattern_type, pattern_key, json.dumps(pattern_data), 1.0 if success else 0.0))
         
-        print(f"✅ Pattern learned: {pattern_type} (success={success})")
+        if self.verbose:
+            print(f"✅ Pattern learned: {pattern_type} (success={success})")
     
-    def get_relevant_memories(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """関連する記憶の検索"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # キーワードベースの簡易検索
+    def get_relevant_memories(self, query: str, limit: int = 10, agent: Optional[str] = None) -> List[Dict[str, Any]]:
+        """関連する記憶の検索（FTS5 + BM25ランキング、全キーワードを使用。agent 指定時は対話履歴をそのエージェントに限定）"""
         keywords = query.lower().split()
+        # trigramは3文字以上のキーワードのみ索引で引ける
+        indexed = [kw for kw in keywords if len(kw) >= 3]
+        if not self._fts_enabled or not indexed:
+            return self._search_like(query, limit, agent)
+        
+        phrases = ['"' + kw.replace('"', '""') + '"' for kw in indexed]
+        agent_filter, agent_params = ("AND c.agent_name = ?", [agent]) if agent else ("", [])
         results = []
         
-        for keyword in keywords[:3]:  # 最初の3キーワードのみ
-            cursor.execute("""
-                SELECT content, timestamp, agent_name, message_type
-                FROM conversations
-                WHERE LOWER(content) LIKE ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            """, (f"%{keyword}%", limit))
+        with self._reader() as cursor:
+            # アーカイブは本体で件数が足りない場合のみ検索
+            for schema, table, relevance in self._conversation_sources():
+                if len(results) >= limit:
+                    break
+                rows = self._match_fts(cursor, f"""
+                    SELECT c.id, c.content, c.timestamp, c.agent_name, c.message_type, bm25(conversations_fts)
+                    FROM {schema}.conversations_fts
+                    JOIN {table} c ON c.id = conversations_fts.rowid
+                    WHERE conversations_fts MATCH ? {agent_filter}
+                    ORDER BY bm25(conversations_fts)
+                    LIMIT ?
+                """, phrases, limit - len(results), agent_params)
+                
+                for row in rows:
+                    results.append({
+                        "content": row[1],
+                        "timestamp": row[2],
+                        "agent": row[3],
+                        "type": row[4],
+                        "snippet": self._snippet(row[1], indexed),
+                        "score": row[5],
+                        "relevance": relevance
+                    })
             
-            for row in cursor.fetchall():
-                results.append({
-                    "content": row[0],
-                    "timestamp": row[1],
-                    "agent": row[2],
-                    "type": row[3],
-                    "relevance": "keyword_match"
-                })
-        
-        # プロジェクトコンテキストからも検索
-        for keyword in keywords[:2]:
-            cursor.execute("""
-                SELECT content, timestamp, context_type
-                FROM project_contexts
-                WHERE LOWER(content) LIKE ?
-                ORDER BY importance_score DESC
+            # プロジェクトコンテキストからも検索
+            rows = self._match_fts(cursor, """
+                SELECT p.id, p.content, p.timestamp, p.context_type,
+                       snippet(project_contexts_fts, 0, '[', ']', '…', 16), bm25(project_contexts_fts)
+                FROM project_contexts_fts
+                JOIN project_contexts p ON p.id = project_contexts_fts.rowid
+                WHERE project_contexts_fts MATCH ?
+                ORDER BY bm25(project_contexts_fts), p.importance_score DESC
                 LIMIT ?
-            """, (f"%{keyword}%", limit // 2))
+            """, phrases, limit // 2)
             
-            for row in cursor.fetchall():
+            for row in rows:
                 results.append({
-                    "content": json.loads(row[0]),
-                    "timestamp": row[1],
-                    "type": f"project_{row[2]}",
+                    "content": json.loads(row[1]),
+                    "timestamp": row[2],
+                    "type": f"project_{row[3]}",
+                    "snippet": row[4],
+                    "score": row[5],
                     "relevance": "context_match"
                 })
         
-        conn.close()
+        # 重複を除去（同一内容のブロードキャスト等）
+        return self._dedupe(results)[:limit]
+    
+    def _conversation_sources(self) -> List[tuple]:
+        """対話履歴の検索対象（スキーマ名, テーブル名, relevance）"""
+        # 本体は TEMP ビューで本文を展開、アーカイブは本文を展開済みで格納している
+        sources = [("main", "conversation_texts", "keyword_match")]
+        if not self._archive_attached and self.archive_path.exists():
+            # 起動後に別プロセスの compact で作成された場合
+            self.conn.execute("ATTACH DATABASE ? AS archive", (str(self.archive_path),))
+        if self._archive_attached:
+            sources.append(("archive", "archive.conversations", "archive_match"))
+        return sources
+    
+    @staticmethod
+    def _snippet(text: str, keywords: List[str], width: int = 32) -> str:
+        """最初の一致箇所の前後を切り出し、キーワードを [] で囲む（本文を持たない索引では snippet() が使えない）"""
+        pattern = re.compile("|".join(re.escape(kw) for kw in sorted(keywords, key=len, reverse=True)), re.IGNORECASE)
+        match = pattern.search(text)
+        start = max(match.start() - width // 4, 0) if match else 0
+        end = max(start + width, match.end() if match else 0)
+        excerpt = pattern.sub(lambda m: f"[{m.group(0)}]", text[start:end])
+        return ("…" if start else "") + excerpt + ("…" if end < len(text) else "")
+    
+    @staticmethod
+    def _match_fts(cursor: sqlite3.Cursor, sql: str, phrases: List[str], limit: int,
+                   params: Iterable[Any] = ()) -> List[tuple]:
+        """
+        全キーワードのAND検索を優先し、件数が足りなければOR検索で補完
+        （頻出語を含むOR検索は全件のBM25計算になるため必要な時だけ実行）
+        
+        params は MATCH と LIMIT の間のプレースホルダに渡す値
+        """
+        if limit <= 0:
+            return []
+        params = list(params)
+        rows = cursor.execute(sql, (" AND ".join(phrases), *params, limit)).fetchall()
+        if len(rows) < limit and len(phrases) > 1:
+            seen = {row[0] for row in rows}
+            for row in cursor.execute(sql, (" OR ".join(phrases), *params, limit)).fetchall():
+                if row[0] not in seen and len(rows) < limit:
+                    seen.add(row[0])
+                    rows.append(row)
+        return rows
+    
+    def _search_like(self, query: str, limit: int = 10, agent: Optional[str] = None) -> List[Dict[str, Any]]:
+        """LIKEによる全件走査検索（FTS5非対応環境・短いキーワード用）"""
+        # キーワードベースの簡易検索
+        keywords = query.lower().split()
+        agent_filter, agent_params = ("AND agent_name = ?", [agent]) if agent else ("", [])
+        results = []
+        
+        with self._reader() as cursor:
+            for schema, table, relevance in self._conversation_sources():
+                for keyword in keywords[:3]:  # 最初の3キーワードのみ
+                    cursor.execute(f"""
+                        SELECT content, timestamp, agent_name, message_type
+                        FROM {table}
+                        WHERE LOWER(content) LIKE ? {agent_filter}
+                        ORDER BY timestamp DESC
+                        LIMIT ?
+                    """, (f"%{keyword}%", *agent_params, limit))
+                    
+                    for row in cursor.fetchall():
+                        results.append({
+                            "content": row[0],
+                            "timestamp": row[1],
+                            "agent": row[2],
+                            "type": row[3],
+                            "relevance": relevance
+                        })
+                if len(results) >= limit:
+                    break
+            
+            # プロジェクトコンテキストからも検索
+            for keyword in keywords[:2]:
+                cursor.execute("""
+                    SELECT content, timestamp, context_type
+                    FROM project_contexts
+                    WHERE LOWER(content) LIKE ?
+                    ORDER BY importance_score DESC
+                    LIMIT ?
+                """, (f"%{keyword}%", limit // 2))
+                
+                for row in cursor.fetchall():
+                    results.append({
+                        "content": json.loads(row[0]),
+                        "timestamp": row[1],
+                        "type": f"project_{row[2]}",
+                        "relevance": "context_match"
+                    })
         
         # 重複を除去
+        return self._dedupe(results)[:limit]
+    
+    @staticmethod
+    def _dedupe(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """内容の先頭100文字が同じ結果を除去（順序は維持）"""
         seen = set()
         unique_results = []
         for result in results:
-            content_str = str(result['content'])[:100]
-            content_hash = hashlib.md5(content_str.encode()).hexdigest()
-            if content_hash not in seen:
-                seen.add(content_hash)
+            content_key = str(result['content'])[:100]
+            if content_key not in seen:
+                seen.add(content_key)
                 unique_results.append(result)
-        
-        return unique_results[:limit]
+        return unique_results
     
     def export_memory_snapshot(self, output_path: str = None):
         """メモリのスナップショットをエクスポート"""
         if not output_path:
             output_path = f"memory_snapshot_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         
-        conn = sqlite3.connect(self.db_path)
-        
         snapshot = {
             "timestamp": datetime.datetime.now().isoformat(),
             "statistics": self._get_statistics(),
@@ -261,29 +902,27 @@ class CCTeamMemoryManager:
             "learned_patterns": []
         }
         
-        # 対話履歴
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM conversations ORDER BY timestamp DESC LIMIT 1000")
-        columns = [col[0] for col in cursor.description]
-        snapshot["conversations"] = [
-            dict(zip(columns, row)) for row in cursor.fetchall()
-        ]
-        
-        # プロジェクトコンテキスト
-        cursor.execute("SELECT * FROM project_contexts ORDER BY timestamp DESC")
-        columns = [col[0] for col in cursor.description]
-        snapshot["project_contexts"] = [
-            dict(zip(columns, row)) for row in cursor.fetchall()
-        ]
-        
-        # 学習パターン
-        cursor.execute("SELECT * FROM learned_patterns ORDER BY success_rate DESC")
-        columns = [col[0] for col in cursor.description]
-        snapshot["learned_patterns"] = [
-            dict(zip(columns, row)) for row in cursor.fetchall()
-        ]
-        
-        conn.close()
+        with self._reader() as cursor:
+            # 対話履歴
+            cursor.execute("SELECT * FROM conversation_texts ORDER BY timestamp DESC LIMIT 1000")
+            columns = [col[0] for col in cursor.description]
+            snapshot["conversations"] = [
+                dict(zip(columns, row)) for row in cursor.fetchall()
+            ]
+            
+            # プロジェクトコンテキスト
+            cursor.execute("SELECT * FROM project_contexts ORDER BY timestamp DESC")
+            columns = [col[0] for col in cursor.description]
+            snapshot["project_contexts"] = [
+                dict(zip(columns, row)) for row in cursor.fetchall()
+            ]
+            
+            # 学習パターン
+            cursor.execute("SELECT * FROM learned_patterns ORDER BY success_rate DESC")
+            columns = [col[0] for col in cursor.description]
+            snapshot["learned_patterns"] = [
+                dict(zip(columns, row)) for row in cursor.fetchall()
+            ]
         
         # JSON保存
         with open(output_path, 'w', encoding='utf-8') as f:
@@ -292,34 +931,411 @@ class CCTeamMemoryManager:
         print(f"✅ Memory snapshot exported to: {output_path}")
         return output_path
     
-    def _get_statistics(self) -> Dict[str, Any]:
-        """メモリ統計情報の取得"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def export_memory_stream(self, output_path: str = None, compression: Optional[str] = None,
+                             since: Optional[str] = None, until: Optional[str] = None,
+                             watermark_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        メモリをJSONLでストリーミングエクスポート（件数上限なし・メモリ使用量一定）
         
-        stats = {}
+        Args:
+            output_path: 出力先（省略時はタイムスタンプ付きファイル名）
+            compression: None / "gzip" / "zstd"
+            since, until: 時刻範囲（'YYYY-MM-DD HH:MM:SS'、UTC）
+            watermark_path: 差分エクスポート用のウォーターマークファイル
+                            （前回以降の行のみ出力し、完了後に更新する）
         
-        # 対話数
-        cursor.execute("SELECT COUNT(*) FROM conversations")
-        stats["total_conversations"] = cursor.fetchone()[0]
+        Returns:
+            Dict: 出力先・テーブル別件数・新しいウォーターマーク
+        """
+        if not output_path:
+            suffix = {"gzip": ".gz", "zstd": ".zst"}.get(compression, "")
+            output_path = f"memory_export_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl{suffix}"
         
-        # エージェント別統計
-        cursor.execute("""
-            SELECT agent_name, COUNT(*) as count
-            FROM conversations
-            GROUP BY agent_name
-        """)
-        stats["agent_stats"] = dict(cursor.fetchall())
+        previous = {}
+        if watermark_path and Path(watermark_path).exists():
+            with open(watermark_path, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        
+        self.flush()
+        # 専用の読み取り接続で1トランザクション内に読む（WALなので書き込みを止めない）
+        conn = self._connect()
+        counts = {}
+        try:
+            conn.execute("BEGIN")
+            watermark = {
+                "exported_at": conn.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0],
+                "max_ids": {
+                    table: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+                    for table in self.EXPORT_TABLES
+                },
+            }
+            
+            with self._open_stream(output_path, "w", compression) as out:
+                out.write(json.dumps({
+                    "type": "header",
+                    "schema_version": self.SCHEMA_VERSION,
+                    "exported_at": watermark["exported_at"],
+                    "since": since,
+                    "until": until,
+                    "after": previous or None,
+                }, ensure_ascii=False) + "\n")
+                
+                for table, (time_column, _) in self.EXPORT_TABLES.items():
+                    query, params = self._export_query(table, time_column, since, until, previous, watermark)
+                    cursor = conn.execute(query, params)
+                    columns = [col[0] for col in cursor.description]
+                    counts[table] = 0
+                    while True:
+                        rows = cursor.fetchmany(self.STREAM_CHUNK_SIZE)
+                        if not rows:
+                            break
+                        out.writelines(
+                            json.dumps({"type": "row", "table": table, "data": dict(zip(columns, row))},
+                                       ensure_ascii=False) + "\n"
+                            for row in rows
+                        )
+                        counts[table] += len(rows)
+                
+                out.write(json.dumps({"type": "footer", "rows": counts, "watermark": watermark}) + "\n")
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        
+        if watermark_path:
+            tmp_path = f"{watermark_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(watermark, f)
+            os.replace(tmp_path, watermark_path)
+        
+        if self.verbose:
+            print(f"✅ Memory exported to: {output_path} ({sum(counts.values())} rows)")
+        return {"path": output_path, "rows": counts, "watermark": watermark}
+    
+    @staticmethod
+    def _export_query(table: str, time_column: str, since: Optional[str], until: Optional[str],
+                      previous: Dict[str, Any], watermark: Dict[str, Any]) -> tuple:
+        """テーブル別のエクスポートクエリ（時刻範囲・ウォーターマークの条件付き）"""
+        conditions = []
+        params: List[Any] = []
+        if since:
+            conditions.append(f"{time_column} >= ?")
+            params.append(since)
+        if until:
+            conditions.append(f"{time_column} < ?")
+            params.append(until)
+        if previous:
+            if time_column == "last_used":
+                # 更新される行は前回エクスポート以降に使われたものを対象にする
+                conditions.append("last_used >= ?")
+                params.append(previous["exported_at"])
+            else:
+                conditions.append("id > ?")
+                params.append(previous["max_ids"].get(table, 0))
+        if time_column != "last_used":
+            # エクスポート中に追加された行は次回に回す
+            conditions.append("id <= ?")
+            params.append(watermark["max_ids"][table])
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # 対話履歴は本文を展開して出力する
+        source = "conversation_texts" if table == "conversations" else table
+        return f"SELECT * FROM {source} {where} ORDER BY id", params
+    
+    def import_memory_stream(self, input_path: str, compression: Optional[str] = None) -> Dict[str, int]:
+        """
+        export_memory_stream の出力をインポート（executemanyで一括挿入）
+        
+        同じエクスポートを再適用しても行は重複しない
+        """
+        counts: Dict[str, int] = {}
+        pending: Dict[str, List[Dict[str, Any]]] = {}
         
-        # パターン統計
-        cursor.execute("SELECT COUNT(*) FROM learned_patterns")
-        stats["total_patterns"] = cursor.fetchone()[0]
+        with self._open_stream(input_path, "r", compression) as src, self._transaction() as cursor:
+            for line in src:
+                record = json.loads(line)
+                if record.get("type") != "row":
+                    continue
+                table = record["table"]
+                if table not in self.EXPORT_TABLES:
+                    continue
+                batch = pending.setdefault(table, [])
+                batch.append(record["data"])
+                if len(batch) >= self.STREAM_CHUNK_SIZE:
+                    counts[table] = counts.get(table, 0) + self._insert_exported_rows(cursor, table, batch)
+                    batch.clear()
+            for table, batch in pending.items():
+                counts[table] = counts.get(table, 0) + self._insert_exported_rows(cursor, table, batch)
         
-        cursor.execute("SELECT AVG(success_rate) FROM learned_patterns")
-        stats["avg_success_rate"] = cursor.fetchone()[0] or 0
+        if self.verbose:
+            print(f"✅ Memory imported from: {input_path} ({sum(counts.values())} rows)")
+        return counts
+    
+    def _insert_exported_rows(self, cursor: sqlite3.Cursor, table: str, rows: List[Dict[str, Any]]) -> int:
+        """エクスポート行をテーブルに一括挿入"""
+        if not rows:
+            return 0
+        if table == "learned_patterns" and "pattern_key" not in rows[0]:
+            # v3より前のエクスポートはキーを pattern_data から復元
+            for row in rows:
+                row["pattern_key"] = json.loads(row["pattern_data"]).get("key")
+        texts = {}
+        if table == "conversations":
+            # 本文は blobs に格納し直す（エクスポート側の context_hash は信用しない）
+            for row in rows:
+                digest = hashlib.md5(row["content"].encode()).hexdigest()
+                cursor.execute(
+                    "INSERT OR IGNORE INTO blobs (hash, codec, size, data) VALUES (?, ?, ?, ?)",
+                    (digest, *self._encode_blob(row["content"])),
+                )
+                texts[row["id"]] = row["content"]
+                row["content"], row["context_hash"] = "", digest
+            if self._fts_enabled:
+                # 既存の行（INSERT OR IGNORE で無視される）は索引に登録しない
+                ids = list(texts)
+                for start in range(0, len(ids), self.LOOKUP_CHUNK_SIZE):
+                    chunk = ids[start:start + self.LOOKUP_CHUNK_SIZE]
+                    existing = cursor.execute(
+                        f"SELECT id FROM conversations WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for (row_id,) in existing:
+                        del texts[row_id]
+        columns = list(rows[0].keys())
+        conflict = self.EXPORT_TABLES[table][1]
+        cursor.executemany(
+            f"INSERT OR {conflict} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [tuple(row.get(col) for col in columns) for row in rows],
+        )
+        if texts and self._fts_enabled:
+            self._index_texts(cursor, texts.items())
+        return len(rows)
+    
+    @staticmethod
+    @contextmanager
+    def _open_stream(path: str, mode: str, compression: Optional[str] = None):
+        """圧縮形式に応じたテキストストリームを開く（省略時は拡張子から判定）"""
+        if compression is None:
+            compression = {".gz": "gzip", ".zst": "zstd"}.get(Path(path).suffix)
         
-        conn.close()
+        if compression == "gzip":
+            stream = gzip.open(path, mode + "t", encoding="utf-8")
+        elif compression == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError("zstd compression requires the 'zstandard' package")
+            raw = open(path, mode + "b")
+            if mode == "w":
+                binary = zstandard.ZstdCompressor().stream_writer(raw)
+            else:
+                binary = zstandard.ZstdDecompressor().stream_reader(raw)
+            stream = io.TextIOWrapper(binary, encoding="utf-8")
+        else:
+            stream = open(path, mode, encoding="utf-8")
+        
+        try:
+            yield stream
+        finally:
+            stream.close()
+    
+    def compact(self, retention_days: int = 90, agent_retention: Optional[Dict[str, int]] = None,
+                type_retention: Optional[Dict[str, int]] = None, summarize: bool = True,
+                archive: bool = True, vacuum: bool = True) -> Dict[str, Any]:
+        """
+        保持期間を過ぎた対話履歴を整理
         
+        期限切れの行はセッション単位の要約行（message_type="session_summary"）に畳み込み、
+        アーカイブDBへ移動（archive=False なら削除）した後、増分VACUUMと統計更新を行う
+        
+        Args:
+            retention_days: 既定の保持日数
+            agent_retention: エージェント別の保持日数（最優先）
+            type_retention: message_type 別の保持日数
+            summarize: セッション要約を作成するか
+            archive: 期限切れの行をアーカイブDBへ移すか
+            vacuum: 増分VACUUM/ANALYZEを実行するか
+        
+        Returns:
+            Dict: 要約・アーカイブ・削除件数とDBサイズ（前後）
+        """
+        self.flush()
+        size_before = self._db_size()
+        expired, params = self._expired_condition(retention_days, agent_retention or {}, type_retention or {})
+        result = {"summaries": 0, "archived": 0, "deleted": 0, "size_before": size_before}
+        
+        with self._lock:
+            if archive:
+                self._ensure_archive()
+            
+            with self._transaction() as cursor:
+                if summarize:
+                    result["summaries"] = self._summarize_sessions(cursor, expired, params)
+                if archive:
+                    cursor.execute(f"""
+                        INSERT OR IGNORE INTO archive.conversations
+                        SELECT * FROM conversation_texts WHERE {expired}
+                    """, params)
+                    result["archived"] = cursor.rowcount
+                if self._fts_enabled:
+                    # blobs を参照する行はトリガーで索引から外せないため、削除前に本文を展開して外す
+                    texts = self.conn.execute(f"""
+                        SELECT c.id, b.codec, b.data
+                        FROM main.conversations c JOIN blobs b ON b.hash = c.context_hash
+                        WHERE c.content = '' AND {expired}
+                    """, params)
+                    while True:
+                        chunk = texts.fetchmany(self.STREAM_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        self._index_texts(cursor, [(row_id, self._decode_blob(codec, data))
+                                                   for row_id, codec, data in chunk], delete=True)
+                cursor.execute(f"DELETE FROM main.conversations WHERE {expired}", params)
+                result["deleted"] = cursor.rowcount
+                # どの行からも参照されなくなった本文を削除
+                cursor.execute("""
+                    DELETE FROM blobs
+                    WHERE NOT EXISTS (SELECT 1 FROM conversations c WHERE c.context_hash = blobs.hash)
+                """)
+            
+            if vacuum:
+                if self._fts_enabled:
+                    self.conn.execute("INSERT INTO conversations_fts(conversations_fts) VALUES ('optimize')")
+                if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                    # 既存DBは一度だけ VACUUM して増分モードへ切り替える
+                    self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                    self.conn.execute("VACUUM")
+                self.conn.executescript("PRAGMA incremental_vacuum;")  # execute() では1ページしか解放されない
+                self.conn.execute("PRAGMA optimize")
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        
+        self._context_cache.cache_clear()
+        result["size_after"] = self._db_size()
+        if self.verbose:
+            print(f"✅ Compacted: {result['deleted']} rows expired, {result['summaries']} session summaries, "
+                  f"{result['archived']} archived ({size_before / 1024:.0f}KiB → {result['size_after'] / 1024:.0f}KiB)")
+        return result
+    
+    @staticmethod
+    def _expired_condition(retention_days: int, agent_retention: Dict[str, int],
+                           type_retention: Dict[str, int]) -> tuple:
+        """保持期間切れを判定するWHERE句（エージェント別 > タイプ別 > 既定 の優先順）"""
+        now = time.time()
+        
+        def cutoff(days: int) -> str:
+            return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - days * 86400))
+        
+        params: List[Any] = []
+        expression = "?"
+        default = [cutoff(retention_days)]
+        if type_retention:
+            expression = "CASE message_type " + "WHEN ? THEN ? " * len(type_retention) + "ELSE ? END"
+            default = [v for item in type_retention.items() for v in (item[0], cutoff(item[1]))] + default
+        if agent_retention:
+            params = [v for item in agent_retention.items() for v in (item[0], cutoff(item[1]))]
+            expression = "CASE agent_name " + "WHEN ? THEN ? " * len(agent_retention) + f"ELSE {expression} END"
+        params += default
+        # 要約行自体は整理対象にしない
+        return f"message_type != 'session_summary' AND timestamp < {expression}", params
+    
+    def _summarize_sessions(self, cursor: sqlite3.Cursor, expired: str, params: List[Any]) -> int:
+        """期限切れの行をセッション×エージェント単位の要約行にまとめる"""
+        cursor.execute(f"""
+            SELECT session_id, agent_name, COUNT(*), MIN(timestamp), MAX(timestamp),
+                   group_concat(DISTINCT message_type), group_concat(excerpt, ' / ')
+            FROM (
+                SELECT session_id, agent_name, timestamp, message_type,
+                       CASE WHEN ROW_NUMBER() OVER (
+                           PARTITION BY session_id, agent_name ORDER BY timestamp, id
+                       ) <= 3 THEN substr(content, 1, 80) END AS excerpt
+                FROM conversation_texts
+                WHERE {expired}
+            )
+            GROUP BY session_id, agent_name
+        """, params)
+        summaries = []
+        for session_id, agent, count, first, last, types, excerpts in cursor.fetchall():
+            content = f"[{session_id}] {count} messages ({types}) {first} - {last}: {excerpts}"
+            summaries.append((
+                session_id, last, agent, "session_summary", content,
+                hashlib.md5(content.encode()).hexdigest(),
+                json.dumps({"session_id": session_id, "count": count, "first": first, "last": last}),
+            ))
+        self._write_conversations(cursor, summaries)
+        return len(summaries)
+    
+    def _ensure_archive(self):
+        """アーカイブDBを作成して ATTACH（本体と同じ列構成・全文検索付き）"""
+        if not self._archive_attached:
+            self.conn.execute("ATTACH DATABASE ? AS archive", (str(self.archive_path),))
+        columns = ", ".join(
+            f"{row[1]} {row[2]}{' PRIMARY KEY' if row[5] else ''}"
+            for row in self.conn.execute("PRAGMA main.table_info(conversations)")
+        )
+        with self._transaction() as cursor:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS archive.conversations ({columns})")
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS archive.idx_archive_agent_timestamp
+                ON conversations(agent_name, timestamp, id)
+            """)
+            if self._fts_enabled:
+                cursor.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS archive.conversations_fts USING fts5(
+                        content, content='conversations', content_rowid='id', tokenize='trigram'
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TRIGGER IF NOT EXISTS archive.conversations_fts_ai AFTER INSERT ON conversations BEGIN
+                        INSERT INTO conversations_fts(rowid, content) VALUES (new.id, new.content);
+                    END
+                """)
+    
+    def _db_size(self) -> int:
+        """DBファイル（WAL含む）の合計サイズ"""
+        return sum(
+            path.stat().st_size
+            for path in (self.db_path, Path(f"{self.db_path}-wal"))
+            if path.exists()
+        )
+    
+    def _get_statistics(self) -> Dict[str, Any]:
+        """メモリ統計情報の取得"""
+        stats = {}
+        
+        with self._reader() as cursor:
+            # 対話数
+            cursor.execute("SELECT COUNT(*) FROM conversations")
+            stats["total_conversations"] = cursor.fetchone()[0]
+            
+            # エージェント別統計
+            cursor.execute("""
+                SELECT agent_name, COUNT(*) as count
+                FROM conversations
+                GROUP BY agent_name
+            """)
+            stats["agent_stats"] = dict(cursor.fetchall())
+            
+            # パターン統計
+            cursor.execute("SELECT COUNT(*) FROM learned_patterns")
+            stats["total_patterns"] = cursor.fetchone()[0]
+            
+            cursor.execute("SELECT AVG(success_rate) FROM learned_patterns")
+            stats["avg_success_rate"] = cursor.fetchone()[0] or 0
+            
+            # 本文の重複排除・圧縮による節約量（参照元の合計バイト数と格納バイト数の差）
+            cursor.execute("SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length(data)), 0) FROM blobs")
+            blob_count, unique_bytes, stored_bytes = cursor.fetchone()
+            cursor.execute("""
+                SELECT COALESCE(SUM(b.size), 0)
+                FROM conversations c JOIN blobs b ON b.hash = c.context_hash
+            """)
+            referenced_bytes = cursor.fetchone()[0]
+            stats["blobs"] = {
+                "count": blob_count,
+                "referenced_bytes": referenced_bytes,
+                "stored_bytes": stored_bytes,
+                "saved_bytes": referenced_bytes - stored_bytes,
+            }
+        
+        stats["context_cache"] = self.context_cache_info()
         return stats
     
     def _get_current_session_id(self) -> str:
@@ -336,19 +1352,25 @@ class CCTeamMemoryManager:
         
         return hashlib.md5("|".join(key_elements).encode()).hexdigest()[:16]
     
-    def display_recent_memories(self, limit: int = 20):
-        """最近の記憶を表示"""
-        memories = self.get_context_window(limit=limit)
+    def display_recent_memories(self, limit: int = 20, agent: Optional[str] = None,
+                                since: Optional[str] = None, before_id: Optional[int] = None):
+        """最近の記憶を表示（before_id で古いページへ遡る）"""
+        memories = list(itertools.islice(
+            self.iter_conversations(agent=agent, since=since, before_id=before_id, page_size=limit), limit
+        ))
         
         print(f"\n📚 Recent Memories (Last {limit} entries)")
         print("=" * 80)
         
-        for mem in memories:
+        for mem in reversed(memories):
             timestamp = datetime.datetime.fromisoformat(mem['timestamp']).strftime("%m/%d %H:%M")
-            agent = mem['agent']
+            agent_name = mem['agent']
             content = mem['content'][:100] + "..." if len(mem['content']) > 100 else mem['content']
             
-            print(f"[{timestamp}] {agent}: {content}")
+            print(f"[{timestamp}] {agent_name}: {content}")
+        
+        if len(memories) == limit:
+            print(f"\n⏪ Older entries: --before-id {memories[-1]['id']}")
         
         print("\n📊 Statistics:")
         stats = self._get_statistics()
@@ -358,10 +1380,151 @@ class CCTeamMemoryManager:
         print(f"  Success rate: {stats['avg_success_rate']:.1%}")
 
 
+class _MemoryRequestHandler(socketserver.StreamRequestHandler):
+    """1接続分の要求を処理（1行1要求、接続は使い回し可能）"""
+    
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.memory_daemon.dispatch(decode_fields(line))
+            except Exception as e:
+                response = encode_fields("ERR", f"{type(e).__name__}: {e}")
+            try:
+                self.wfile.write(response)
+            except (BrokenPipeError, ConnectionResetError):
+                # クライアントがタイムアウトで切断済み（要求自体は処理済み）
+                return
+
+
+class MemoryDaemon:
+    """
+    単一の CCTeamMemoryManager を保持する常駐プロセス
+    Unixソケット経由で save/search/load を受け付け、保存はキュー経由で非同期に書き込む
+    """
+    
+    # 1トランザクションでまとめて書き込む最大件数
+    BATCH_SIZE = 500
+    
+    def __init__(self, memory: CCTeamMemoryManager, socket_path: str = DEFAULT_SOCKET_PATH):
+        self.memory = memory
+        self.memory.verbose = False
+        self.socket_path = Path(socket_path)
+        # 保存要求は (受付順の連番, エントリ)。読み取りは到着時点の連番まで書き込まれるのを待つ
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._enqueued = 0
+        self._written = 0
+        self._enqueue_lock = threading.Lock()
+        self._written_cond = threading.Condition()
+        self._writer = threading.Thread(target=self._drain, name="memory-writer", daemon=True)
+        self._server: Optional[socketserver.ThreadingUnixStreamServer] = None
+    
+    def dispatch(self, fields: List[str]) -> bytes:
+        """要求を処理して応答行を返す"""
+        command, args = fields[0].upper(), fields[1:]
+        
+        if command == "PING":
+            return b"OK\n"
+        
+        if command == "SAVE":
+            agent, message_type, message = args[:3]
+            metadata = json.loads(args[3]) if len(args) > 3 and args[3] else None
+            with self._enqueue_lock:
+                self._enqueued += 1
+                self._queue.put((self._enqueued, {"agent": agent, "message": message,
+                                                  "message_type": message_type, "metadata": metadata}))
+            return b"OK\n"
+        
+        # 読み取り系はこの要求より前に受け付けた保存要求の書き込みだけを待つ
+        # （後から届く保存要求で待ち時間が延びないようにキュー全体の join() は使わない）
+        target = self._enqueued
+        with self._written_cond:
+            self._written_cond.wait_for(lambda: self._written >= target)
+        if command == "SEARCH":
+            result = self.memory.get_relevant_memories(args[1], limit=int(args[0]))
+        elif command == "LOAD":
+            agent = args[1] if len(args) > 1 and args[1] else None
+            result = self.memory.get_context_window(agent, limit=int(args[0]))
+        elif command == "CONTEXT":
+            agent, budget = args[0], int(args[1])
+            query = args[2] if len(args) > 2 and args[2] else None
+            result = self.memory.build_context(agent, budget, query)
+        elif command == "STATS":
+            result = self.memory._get_statistics()
+        else:
+            return encode_fields("ERR", f"unknown command: {command}")
+        return encode_fields("OK", json.dumps(result, ensure_ascii=False, default=str))
+    
+    def _drain(self):
+        """キューに積まれた保存要求をまとめて書き込むワーカー"""
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            items = [item for item in batch if item is not None]
+            try:
+                if items:
+                    self.memory.save_conversations_bulk([entry for _, entry in items])
+            except Exception as e:
+                print(f"❌ Save failed: {e}", file=sys.stderr)
+            finally:
+                if items:
+                    with self._written_cond:
+                        self._written = items[-1][0]
+                        self._written_cond.notify_all()
+            if len(items) < len(batch):
+                return
+    
+    def _claim_socket(self):
+        """古いソケットファイルを除去（稼働中のデーモンがあればエラー）"""
+        if not self.socket_path.exists():
+            self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+            return
+        if MemoryClient(str(self.socket_path), timeout=0.5).ping():
+            raise RuntimeError(f"memory daemon already running on {self.socket_path}")
+        self.socket_path.unlink()
+    
+    def serve_forever(self):
+        """デーモンを起動（SIGTERM/SIGINTでキューを書き切ってから終了）"""
+        self._claim_socket()
+        self._server = socketserver.ThreadingUnixStreamServer(str(self.socket_path), _MemoryRequestHandler)
+        self._server.daemon_threads = True
+        self._server.memory_daemon = self
+        os.chmod(self.socket_path, 0o600)
+        
+        def _stop(signum, frame):
+            # serve_forever と同じスレッドから shutdown() を呼ぶとデッドロックするため別スレッドで実行
+            threading.Thread(target=self._server.shutdown).start()
+        
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+        
+        self._writer.start()
+        print(f"🧠 Memory daemon listening on {self.socket_path}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._queue.put(None)
+            self._writer.join()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+            self.memory.close()
+            print("✅ Memory daemon stopped")
+
+
+def _exit_on_signal(signum, frame):
+    """シグナルを SystemExit に変換（ハンドラ内で直接書き込むと実行中のトランザクションに
+    割り込むため、書き出しは atexit / finally に任せる）"""
+    raise SystemExit(128 + signum)
+
+
 def main():
     """CLI インターフェース"""
     parser = argparse.ArgumentParser(description='CCTeam Memory Manager')
-    parser.add_argument('command', choices=['save', 'load', 'search', 'export', 'stats', 'project'],
+    parser.add_argument('command', choices=['save', 'load', 'search', 'context', 'export', 'import', 'compact', 'stats', 'project', 'serve'],
                         help='Command to execute')
     parser.add_argument('--agent', default='USER', help='Agent name')
     parser.add_argument('--message', help='Message to save')
@@ -369,9 +1532,26 @@ def main():
     parser.add_argument('--limit', type=int, default=20, help='Number of results')
     parser.add_argument('--project', default='CCTeam', help='Project name')
     parser.add_argument('--context-type', help='Context type for project')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH, help='Socket path for serve')
+    parser.add_argument('--output', help='Export file path (.jsonl, .jsonl.gz, .jsonl.zst)')
+    parser.add_argument('--input', help='Import file path')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'], help='Export compression')
+    parser.add_argument('--since', help="Rows at or after this UTC time ('YYYY-MM-DD HH:MM:SS')")
+    parser.add_argument('--until', help='Export rows before this UTC time')
+    parser.add_argument('--watermark', help='Watermark file for incremental export')
+    parser.add_argument('--before-id', type=int, help='Load entries older than this conversation id')
+    parser.add_argument('--tokens', type=int, default=2000, help='Token budget for context')
+    parser.add_argument('--retention-days', type=int, default=90, help='Default retention for compact')
+    parser.add_argument('--retain', action='append', default=[],
+                        help='Retention override for compact: agent:NAME=DAYS or type:NAME=DAYS')
+    parser.add_argument('--no-archive', action='store_true', help='Delete expired rows instead of archiving')
     
     args = parser.parse_args()
     
+    # SIGTERM/SIGHUP で終了した場合も close() で書き出す（serve は SIGTERM を独自に処理）
+    for signum in (signal.SIGTERM, signal.SIGHUP):
+        signal.signal(signum, _exit_on_signal)
+    
     memory = CCTeamMemoryManager()
     
     if args.command == 'save':
@@ -385,7 +1565,9 @@ def main():
                 memory.save_conversation(agent, message)
     
     elif args.command == 'load':
-        memory.display_recent_memories(limit=args.limit)
+        memory.display_recent_memories(limit=args.limit,
+                                       agent=None if args.agent == 'USER' else args.agent,
+                                       since=args.since, before_id=args.before_id)
     
     elif args.command == 'search':
         if args.query:
@@ -400,14 +1582,23 @@ def main():
             
             for i, result in enumerate(results, 1):
                 print(f"\n{i}. [{result['timestamp']}] {result.get('agent', 'N/A')} ({result['relevance']})")
-                if isinstance(result['content'], dict):
+                if result.get('snippet'):
+                    print(f"   {result['snippet']}")
+                elif isinstance(result['content'], dict):
                     print(f"   {json.dumps(result['content'], ensure_ascii=False, indent=2)[:200]}...")
                 else:
                     print(f"   {result['content'][:200]}...")
     
     elif args.command == 'export':
-        output_path = memory.export_memory_snapshot()
-        print(f"Memory exported to: {output_path}")
+        memory.export_memory_stream(args.output, args.compress, args.since, args.until, args.watermark)
+    
+    elif args.command == 'import':
+        if not args.input:
+            print("Import requires --input")
+            sys.exit(1)
+        counts = memory.import_memory_stream(args.input)
+        for table, count in counts.items():
+            print(f"  {table}: {count} rows")
     
     elif args.command == 'stats':
         stats = memory._get_statistics()
@@ -419,6 +1610,20 @@ def main():
         print("\nAgent Activity:")
         for agent, count in stats['agent_stats'].items():
             print(f"  {agent}: {count} messages")
+        cache = stats['context_cache']
+        print(f"\nContext cache: {cache['hits']} hits / {cache['misses']} misses ({cache['hit_rate']:.1%})")
+        blobs = stats['blobs']
+        print(f"Message bodies: {blobs['count']} unique, {blobs['stored_bytes']:,} bytes stored "
+              f"({blobs['saved_bytes']:,} bytes saved by dedup/compression)")
+    
+    elif args.command == 'context':
+        context = memory.build_context(None if args.agent == 'USER' else args.agent,
+                                       args.tokens, args.query)
+        print(f"\n🧠 Context for {args.agent} ({context['tokens']}/{args.tokens} tokens)")
+        print("=" * 80)
+        for entry in context['entries']:
+            content = entry['content'] if isinstance(entry['content'], str) else json.dumps(entry['content'], ensure_ascii=False)
+            print(f"[{entry['source']}] {entry.get('agent', 'N/A')}: {content[:100]}")
     
     elif args.command == 'project':
         if args.context_type and args.message:
@@ -426,6 +1631,21 @@ def main():
             memory.save_project_context(args.project, args.context_type, content)
         else:
             print("Project context requires --context-type and --message")
+    
+    elif args.command == 'compact':
+        agent_retention, type_retention = {}, {}
+        for rule in args.retain:
+            try:
+                target, days = rule.rsplit('=', 1)
+                kind, name = target.split(':', 1)
+                {'agent': agent_retention, 'type': type_retention}[kind][name] = int(days)
+            except (ValueError, KeyError):
+                print(f"Invalid --retain rule: {rule} (expected agent:NAME=DAYS or type:NAME=DAYS)")
+                sys.exit(1)
+        memory.compact(args.retention_days, agent_retention, type_retention, archive=not args.no_archive)
+    
+    elif args.command == 'serve':
+        MemoryDaemon(memory, args.socket).serve_forever()
 
 
 if __name__ == "__main__":
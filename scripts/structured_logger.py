@@ -4,15 +4,48 @@ CCTeam 構造化ログシステム
 エラーログの充実化とJSON形式での構造化ログ出力
 """
 
-import json
 import datetime
 import traceback
 import sys
 import os
+import atexit
+import sqlite3
+import queue
+import threading
+import time
+from collections import deque
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from enum import Enum
-import inspect
+
+try:
+    from error_loop_detector import ErrorLoopService
+except ImportError:
+    from scripts.error_loop_detector import ErrorLoopService
+try:
+    from log_serializer import LogEntry, get_serializer
+except ImportError:
+    from scripts.log_serializer import LogEntry, get_serializer
+try:
+    from log_segments import LogRotator, index_file, iter_lines, load_manifest, log_exists, open_segments
+except ImportError:
+    from scripts.log_segments import LogRotator, index_file, iter_lines, load_manifest, log_exists, open_segments
+try:
+    from log_index import LogIndex, count_entry, new_totals
+except ImportError:
+    from scripts.log_index import LogIndex, count_entry, new_totals
+try:
+    from log_scan import scan
+except ImportError:
+    from scripts.log_scan import scan
+try:
+    from log_archive import archived_segments, compact, open_archive
+except ImportError:
+    from scripts.log_archive import archived_segments, compact, open_archive
+try:
+    from log_store import LogStore
+except ImportError:
+    from scripts.log_store import LogStore
 
 class LogLevel(Enum):
     """ログレベル定義"""
@@ -22,13 +55,205 @@ class LogLevel(Enum):
     ERROR = "ERROR"
     CRITICAL = "CRITICAL"
 
+# レベルの重要度（出力するかの判定に使う）
+LEVEL_ORDER = {level: rank for rank, level in enumerate(LogLevel)}
+
+# 呼び出し元のコードオブジェクト -> (ファイル名, 関数名)、StructuredLogger 自身のメソッドは None
+_CALLER_CACHE: Dict[Any, Optional[Tuple[str, str]]] = {}
+# トレースバックのフレーム列 ((コード, 命令位置), ...) -> 整形済みの行（ループ中の同じエラーは整形し直さない）
+_TRACEBACK_CACHE: Dict[tuple, List[str]] = {}
+TRACEBACK_CACHE_SIZE = 1024
+
+
+class LogWriter:
+    """
+    ログファイルへの非同期・一括書き込み
+    
+    write() は書き込む行をキューに積むだけで戻り、バックグラウンドスレッドがファイルを
+    開いたまま保持して、ファイルごとにまとめて書き出す（サイズ・時間の上限と終了時に書き出し）
+    """
+    
+    # キューに保持する未処理のログ呼び出し数
+    QUEUE_SIZE = 10000
+    # キューが満杯の時の動作（block: 空くまで待つ、drop: 破棄して数える）
+    OVERFLOW_POLICIES = ("block", "drop")
+    # 溜まった行がこのバイト数を超えたら書き出す
+    FLUSH_BYTES = 256 * 1024
+    # 最初の未書き込み行からこの秒数が経ったら書き出す
+    FLUSH_INTERVAL = 0.5
+    # 終了時に未処理の行を待つ最大秒数
+    DRAIN_TIMEOUT = 5.0
+    
+    _instances: Dict[Path, "LogWriter"] = {}
+    _instances_lock = threading.Lock()
+    
+    @classmethod
+    def shared(cls, log_dir: str = "logs") -> "LogWriter":
+        """ログディレクトリごとに1つのライターを返す（設定は CCTEAM_LOG_QUEUE_SIZE / CCTEAM_LOG_OVERFLOW）"""
+        key = Path(log_dir).resolve()
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(
+                    queue_size=int(os.environ.get("CCTEAM_LOG_QUEUE_SIZE", cls.QUEUE_SIZE)),
+                    overflow=os.environ.get("CCTEAM_LOG_OVERFLOW", "block"),
+                )
+            return cls._instances[key]
+    
+    def __init__(self, queue_size: int = QUEUE_SIZE, overflow: str = "block",
+                 flush_bytes: int = FLUSH_BYTES, flush_interval: float = FLUSH_INTERVAL):
+        """
+        Args:
+            queue_size: キューの上限（ログ呼び出し単位）
+            overflow: キューが満杯の時の動作（"block" または "drop"）
+            flush_bytes: 書き出すまでに溜める最大バイト数
+            flush_interval: 書き出すまでに待つ最大秒数
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {self.OVERFLOW_POLICIES}: {overflow}")
+        self.overflow = overflow
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self._files: Dict[Path, Any] = {}
+        self._rotators: Dict[Path, LogRotator] = {}
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        threading.Thread(target=self._run, name="structured-log-writer", daemon=True).start()
+        # ファイルはバッファなしで開くので、終了時は溜まった行を書き出すだけでよい
+        atexit.register(self._shutdown)
+    
+    def write(self, records: List[Tuple[Path, bytes]]) -> bool:
+        """
+        (ファイル, 行) のリストを書き込みキューに積む
+        
+        1回のログ呼び出し分をまとめて渡すと、複数ファイルへの書き込みが同じ順序で行われる
+        drop ポリシーでキューが満杯なら破棄して False
+        """
+        if self.overflow == "drop":
+            try:
+                self._queue.put_nowait(records)
+                return True
+            except queue.Full:
+                self.dropped += 1
+                return False
+        self._queue.put(records)
+        return True
+    
+    def flush(self, timeout: float = DRAIN_TIMEOUT) -> bool:
+        """ここまでに積まれた行をすべてファイルへ書き出すまで待つ（タイムアウト時は False）"""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+    
+    def _shutdown(self):
+        """
+        終了時に溜まった行を書き出し、その書き込みで起きたローテーションの圧縮も待つ
+        
+        （ローテーターの終了処理はこれより後に登録されるので先に実行される、ここで待たないと
+        終了時の書き込みでできた最後のセグメントが圧縮されずに残る）
+        """
+        if self.flush():
+            for rotator in set(self._rotators.values()):
+                rotator.drain()
+    
+    def _run(self):
+        """キューから行を取り出してファイルごとに溜め、上限に達したら書き出す"""
+        pending: Dict[Path, List[bytes]] = {}
+        size = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            try:
+                if isinstance(item, list):
+                    for path, text in item:
+                        pending.setdefault(path, []).append(text)
+                        size += len(text)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                    if size < self.flush_bytes and time.monotonic() < deadline:
+                        continue
+                try:
+                    self._write_pending(pending)
+                except (OSError, ValueError) as e:
+                    # 書き込みの失敗でライターを止めない（block ポリシーの呼び出し元が待ち続けないように）
+                    print(f"❌ Log writer failed: {e}", file=sys.stderr)
+                pending, size, deadline = {}, 0, None
+                if isinstance(item, threading.Event):
+                    item.set()
+            finally:
+                if item is not None:
+                    self._queue.task_done()
+    
+    def _write_pending(self, pending: Dict[Path, List[bytes]]):
+        """ファイルごとに1回の write で追記（ローテーション中は待ち、その後のファイルに書く）"""
+        for path, texts in pending.items():
+            data = b"".join(texts)
+            rotator = self._rotators.get(path)
+            if rotator is None:
+                rotator = self._rotators[path] = LogRotator.shared(path.parent)
+            with rotator.shared_lock():
+                handle = self._open(path)
+                view = memoryview(data)
+                while view:
+                    view = view[handle.write(view):]
+                size = os.fstat(handle.fileno()).st_size
+            self.written += len(texts)
+            rotator.after_write(path, size)
+    
+    def _open(self, path: Path):
+        """開いたままのファイルを返す（削除・置き換えられていれば開き直す）"""
+        handle = self._files.get(path)
+        if handle is not None:
+            try:
+                if os.stat(path).st_ino == os.fstat(handle.fileno()).st_ino:
+                    return handle
+            except FileNotFoundError:
+                pass
+            handle.close()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # バッファなし・追記モードなので1回の write がそのまま1回の追記になる
+        handle = self._files[path] = open(path, 'ab', buffering=0)
+        return handle
+
+
 class StructuredLogger:
     """構造化ログを出力するロガー"""
     
-    def __init__(self, agent_name: str, log_dir: str = "logs"):
+    def __init__(self, agent_name: str, log_dir: str = "logs", async_write: Optional[bool] = None,
+                 writer: Optional[LogWriter] = None, level: Optional[str] = None,
+                 serializer: Optional[str] = None, rotate_bytes: Optional[int] = None,
+                 rotate_interval: Optional[float] = None):
+        """
+        Args:
+            agent_name: エージェント名（ログファイル名になる）
+            log_dir: ログの保存先
+            level: 出力する最低レベル（省略時は環境変数 CCTEAM_LOG_LEVEL、なければ DEBUG）
+            async_write: True ならバックグラウンドスレッドでまとめて書き込む
+                         （省略時は環境変数 CCTEAM_LOG_ASYNC=1 で有効）
+            writer: 非同期書き込みに使うライター（省略時はログディレクトリごとの共有ライター）
+            serializer: JSON のエンコードに使うライブラリ（省略時は環境変数 CCTEAM_LOG_SERIALIZER、
+                        なければ msgspec / orjson / json のうち使えるもの）
+            rotate_bytes: このサイズを超えたファイルをローテーション（0 で無効、
+                          省略時は環境変数 CCTEAM_LOG_ROTATE_SIZE、なければ 10MB）
+            rotate_interval: この秒数ごとにローテーション（省略時は環境変数 CCTEAM_LOG_ROTATE_INTERVAL）
+                             ローテーションの設定はログディレクトリ単位で共有される
+        """
         self.agent_name = agent_name
         self.log_dir = Path(log_dir)
         self.log_dir.mkdir(exist_ok=True)
+        self.set_level(level or os.environ.get("CCTEAM_LOG_LEVEL") or LogLevel.DEBUG)
+        if async_write is None:
+            async_write = writer is not None or os.environ.get("CCTEAM_LOG_ASYNC") == "1"
+        self.writer = (writer or LogWriter.shared(self.log_dir)) if async_write else None
+        self.serializer = get_serializer(serializer)
+        self.rotator = LogRotator.shared(self.log_dir, max_bytes=rotate_bytes, interval=rotate_interval)
         
         # 通常ログファイル
         self.log_file = self.log_dir / f"{agent_name}.log"
@@ -36,23 +261,41 @@ class StructuredLogger:
         self.structured_log_file = self.log_dir / f"{agent_name}_structured.jsonl"
         # エラー専用ログ
         self.error_log_file = self.log_dir / "errors_all.jsonl"
-        
+    
+    def set_level(self, level):
+        """出力する最低レベルを変更（LogLevel またはレベル名）"""
+        self.level = level if isinstance(level, LogLevel) else LogLevel(str(level).upper())
+        self._min_rank = LEVEL_ORDER[self.level]
+        # 各レベルのメソッドが最初に見るフラグ（無効なレベルは属性を1つ読むだけで戻る）
+        self._debug_enabled = self.is_enabled(LogLevel.DEBUG)
+        self._info_enabled = self.is_enabled(LogLevel.INFO)
+        self._warning_enabled = self.is_enabled(LogLevel.WARNING)
+        self._error_enabled = self.is_enabled(LogLevel.ERROR)
+    
+    def is_enabled(self, level: LogLevel) -> bool:
+        """そのレベルのログが出力されるか"""
+        return LEVEL_ORDER[level] >= self._min_rank
+    
     def _get_caller_info(self) -> Dict[str, Any]:
-        """呼び出し元の情報を取得"""
-        frame = inspect.currentframe()
-        if frame and frame.f_back and frame.f_back.f_back:
-            caller_frame = frame.f_back.f_back
-            return {
-                "file": os.path.basename(caller_frame.f_code.co_filename),
-                "function": caller_frame.f_code.co_name,
-                "line": caller_frame.f_lineno
-            }
+        """呼び出し元の情報を取得（StructuredLogger 自身のメソッドのフレームは飛ばす）"""
+        frame = sys._getframe(1)
+        while frame is not None:
+            code = frame.f_code
+            try:
+                cached = _CALLER_CACHE[code]
+            except KeyError:
+                cached = _CALLER_CACHE[code] = (
+                    None if code in _LOGGER_CODES else (os.path.basename(code.co_filename), code.co_name)
+                )
+            if cached is not None:
+                return {"file": cached[0], "function": cached[1], "line": frame.f_lineno}
+            frame = frame.f_back
         return {}
     
     def _create_log_entry(self, level: LogLevel, message: str, 
                          context: Optional[Dict[str, Any]] = None,
-                         error: Optional[Exception] = None) -> Dict[str, Any]:
-        """構造化ログエントリを作成"""
+                         error: Optional[Exception] = None) -> LogEntry:
+        """構造化ログエントリを作成（timestamp はプレーンテキストログと共用）"""
         entry = {
             "timestamp": datetime.datetime.now().isoformat(),
             "level": level.value,
@@ -70,7 +313,7 @@ class StructuredLogger:
             entry["error"] = {
                 "type": type(error).__name__,
                 "message": str(error),
-                "traceback": traceback.format_exc().splitlines()
+                "traceback": self._format_traceback(error)
             }
             
             # エラー固有の属性を抽出
@@ -82,21 +325,50 @@ class StructuredLogger:
         
         return entry
     
-    def _write_to_file(self, file_path: Path, entry: Dict[str, Any]):
-        """ファイルにログエントリを書き込み"""
-        with open(file_path, 'a', encoding='utf-8') as f:
-            json.dump(entry, f, ensure_ascii=False)
-            f.write('\n')
+    @staticmethod
+    def _format_traceback(error: Exception) -> List[str]:
+        """渡された例外自身のトレースバック（送出されていない例外なら空）"""
+        tb = error.__traceback__
+        if tb is None:
+            return []
+        if error.__cause__ is not None or (error.__context__ is not None and not error.__suppress_context__):
+            # 連鎖した例外は毎回すべて整形する
+            return "".join(traceback.format_exception(type(error), error, tb)).splitlines()
+        
+        key = []
+        while tb is not None:
+            key.append((tb.tb_frame.f_code, tb.tb_lasti))
+            tb = tb.tb_next
+        key = tuple(key)
+        stack = _TRACEBACK_CACHE.get(key)
+        if stack is None:
+            if len(_TRACEBACK_CACHE) >= TRACEBACK_CACHE_SIZE:
+                _TRACEBACK_CACHE.clear()
+            stack = _TRACEBACK_CACHE[key] = "".join(traceback.format_tb(error.__traceback__)).splitlines()
+        return ["Traceback (most recent call last):", *stack,
+                *"".join(traceback.format_exception_only(type(error), error)).splitlines()]
+    
+    def _write_to_file(self, file_path: Path, line: bytes):
+        """ファイルにシリアライズ済みの行を書き込み（必要ならその後ローテーション）"""
+        with self.rotator.shared_lock():
+            with open(file_path, 'ab') as f:
+                f.write(line)
+                size = f.tell()
+        self.rotator.after_write(file_path, size)
     
-    def _write_plain_log(self, level: LogLevel, message: str):
+    def _write_plain_log(self, level: LogLevel, message: str, timestamp: str):
         """プレーンテキストログを書き込み"""
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_line = f"[{timestamp}] [{level.value}] {message}\n"
+        log_line = self._plain_line(level, message, timestamp)
+        self._write_to_file(self.log_file, log_line.encode("utf-8"))
         
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(log_line)
-        
-        # コンソールにも出力
+        self._print_console(level, log_line)
+    
+    def _plain_line(self, level: LogLevel, message: str, timestamp: str) -> str:
+        """ISO形式の timestamp を 'YYYY-MM-DD HH:MM:SS' にして1行にする"""
+        return f"[{timestamp[:10]} {timestamp[11:19]}] [{level.value}] {message}\n"
+    
+    def _print_console(self, level: LogLevel, log_line: str):
+        """コンソールにも出力"""
         if level in [LogLevel.ERROR, LogLevel.CRITICAL]:
             print(f"\033[0;31m{log_line.strip()}\033[0m", file=sys.stderr)
         elif level == LogLevel.WARNING:
@@ -104,33 +376,60 @@ class StructuredLogger:
         else:
             print(log_line.strip())
     
+    def _emit(self, level: LogLevel, message: str, entry: LogEntry, error_log: bool = False):
+        """構造化ログ（error_log なら errors_all.jsonl にも）とプレーンテキストログへ出力"""
+        # 呼び出し時点の内容で1度だけシリアライズし、両方のファイルに同じ行を書く
+        line = self.serializer.dumps(entry)
+        if self.writer is None:
+            self._write_to_file(self.structured_log_file, line)
+            if error_log:
+                self._write_to_file(self.error_log_file, line)
+            self._write_plain_log(level, message, entry["timestamp"])
+            return
+        
+        # ファイルへの書き込みはライターに任せる
+        log_line = self._plain_line(level, message, entry["timestamp"])
+        records = [(self.structured_log_file, line)]
+        if error_log:
+            records.append((self.error_log_file, line))
+        records.append((self.log_file, log_line.encode("utf-8")))
+        self.writer.write(records)
+        self._print_console(level, log_line)
+    
+    def flush(self):
+        """非同期書き込みの未書き込み分をファイルへ書き出す（同期モードでは何もしない）"""
+        if self.writer is not None:
+            self.writer.flush()
+    
     def debug(self, message: str, context: Optional[Dict[str, Any]] = None):
         """デバッグログ"""
+        if not self._debug_enabled:
+            return
         entry = self._create_log_entry(LogLevel.DEBUG, message, context)
-        self._write_to_file(self.structured_log_file, entry)
-        self._write_plain_log(LogLevel.DEBUG, message)
+        self._emit(LogLevel.DEBUG, message, entry)
     
     def info(self, message: str, context: Optional[Dict[str, Any]] = None):
         """情報ログ"""
+        if not self._info_enabled:
+            return
         entry = self._create_log_entry(LogLevel.INFO, message, context)
-        self._write_to_file(self.structured_log_file, entry)
-        self._write_plain_log(LogLevel.INFO, message)
+        self._emit(LogLevel.INFO, message, entry)
     
     def warning(self, message: str, context: Optional[Dict[str, Any]] = None):
         """警告ログ"""
+        if not self._warning_enabled:
+            return
         entry = self._create_log_entry(LogLevel.WARNING, message, context)
-        self._write_to_file(self.structured_log_file, entry)
-        self._write_plain_log(LogLevel.WARNING, message)
+        self._emit(LogLevel.WARNING, message, entry)
     
     def error(self, message: str, error: Optional[Exception] = None, 
               context: Optional[Dict[str, Any]] = None):
         """エラーログ"""
-        entry = self._create_log_entry(LogLevel.ERROR, message, context, error)
-        self._write_to_file(self.structured_log_file, entry)
-        self._write_to_file(self.error_log_file, entry)  # エラー専用ログにも記録
-        self._write_plain_log(LogLevel.ERROR, message)
+        if self._error_enabled:
+            entry = self._create_log_entry(LogLevel.ERROR, message, context, error)
+            self._emit(LogLevel.ERROR, message, entry, error_log=True)  # エラー専用ログにも記録
         
-        # エラーループ検出システムに通知
+        # エラーループ検出システムに通知（ログのレベル設定に関係なく行う）
         if error:
             self._check_error_loop(message, error)
     
@@ -138,19 +437,12 @@ class StructuredLogger:
                  context: Optional[Dict[str, Any]] = None):
         """重大エラーログ"""
         entry = self._create_log_entry(LogLevel.CRITICAL, message, context, error)
-        self._write_to_file(self.structured_log_file, entry)
-        self._write_to_file(self.error_log_file, entry)
-        self._write_plain_log(LogLevel.CRITICAL, message)
+        self._emit(LogLevel.CRITICAL, message, entry, error_log=True)
     
     def _check_error_loop(self, message: str, error: Exception):
-        """エラーループ検出システムと連携"""
-        try:
-            error_msg = f"{type(error).__name__}: {str(error)}"
-            os.system(f'python3 scripts/error_loop_detector.py check '
-                     f'--agent {self.agent_name} '
-                     f'--error "{error_msg}"')
-        except:
-            pass  # エラーループ検出の失敗は無視
+        """エラーループ検出システムと連携（検出はバックグラウンドで行い、呼び出し元を待たせない）"""
+        error_msg = f"{type(error).__name__}: {str(error)}"
+        ErrorLoopService.shared(self.log_dir).submit(self.agent_name, error_msg)
     
     def log_task_start(self, task_name: str, task_details: Optional[Dict[str, Any]] = None):
         """タスク開始ログ"""
@@ -197,86 +489,189 @@ class StructuredLogger:
             self.error(f"通信失敗: {from_agent} → {to_agent}", context=context)
 
 
+# 呼び出し元の取得で飛ばすメソッド
+_LOGGER_CODES = {member.__code__ for member in vars(StructuredLogger).values() if hasattr(member, "__code__")}
+
+
 class LogAnalyzer:
     """構造化ログを分析するツール"""
     
-    def __init__(self, log_dir: str = "logs"):
+    # recent に含めるエントリ数
+    RECENT_ENTRIES = 10
+    
+    def __init__(self, log_dir: str = "logs", serializer: Optional[str] = None, indexed: bool = True,
+                 workers: Optional[int] = None, archive: bool = True, sql: bool = False):
+        """
+        Args:
+            log_dir: ログの保存先
+            serializer: JSON のデコードに使うライブラリ（StructuredLogger と同じ）
+            indexed: True なら索引（logs/segments/*.idx）を使い、前回の分析以降に追記された分だけを読む
+                     False なら毎回すべての行を読む
+            workers: 指定すると索引を使わず、ファイルを mmap してこの数のプロセスで並列に読む
+                     （0 なら CPU 数、索引のない大量のログを一度だけ分析する時向け）
+            archive: True なら列指向アーカイブ（log_archive.py、compact で作成）にしたセグメントは
+                     アーカイブから必要な列だけを読む（False なら JSONL のセグメントを読む）
+            sql: True なら追記分を SQLite のログストア（log_store.py）に取り込み、索引を使った SQL の集計で数える
+        """
         self.log_dir = Path(log_dir)
+        self.serializer = get_serializer(serializer)
+        self.indexed = indexed
+        self.workers = workers
+        self.archive = archive
+        self.sql = sql
+    
+    @staticmethod
+    def _cutoff(time_range: Optional[int]) -> Optional[str]:
+        """time_range 秒前の時刻（ISO形式、timestamp と文字列のまま比較できる）"""
+        if not time_range:
+            return None
+        return (datetime.datetime.now() - datetime.timedelta(seconds=time_range)).isoformat()
+    
+    def _totals(self, log_file: Path, time_range: Optional[int] = None) -> Tuple[Dict[str, Any], List[LogEntry]]:
+        """log_file（ローテーション済みのセグメントを含む）の time_range 秒以内のエントリの件数と最後の数件"""
+        cutoff = self._cutoff(time_range)
+        if self.sql:
+            with LogStore(str(self.log_dir), serializer=self.serializer.name) as store:
+                store.ingest([log_file.name])
+                totals, recent = store.totals(log_file.name, cutoff, self.RECENT_ENTRIES)
+            return totals, [self.serializer.loads(line) for line in recent]
+        # アーカイブにしたセグメントは JSONL では読まない（アーカイブを使う場合）
+        jsonl = not self.archive
+        if self.workers is not None:
+            totals, recent = scan([log_file], cutoff, workers=self.workers, serializer=self.serializer.name,
+                                  recent=self.RECENT_ENTRIES, include_archived=jsonl)
+        elif self.indexed:
+            totals, recent = self._indexed_totals(log_file, cutoff, jsonl)
+        else:
+            totals, recent = self._scan_totals(log_file, cutoff, jsonl)
+        entries = [self.serializer.loads(line) for line in recent]
+        if self.archive:
+            entries = self._archive_totals(log_file, cutoff, totals, entries)
+        return totals, entries
+    
+    def _archive_totals(self, log_file: Path, cutoff: Optional[str], totals: Dict[str, Any],
+                        recent: List[LogEntry], agent: Optional[str] = None,
+                        level: Optional[str] = None) -> List[LogEntry]:
+        """
+        アーカイブにしたセグメントの件数を totals に足し、recent が足りなければ古い方に補う
+        
+        集計に使う列だけを読み、cutoff・agent に合う行がない行グループは読まない
+        """
+        archived = archived_segments(log_file, cutoff)
+        for _, path in archived:
+            with open_archive(path, self.serializer) as archive:
+                archive.aggregate(totals, cutoff, agent=agent, level=level)
+        older: List[LogEntry] = []
+        for _, path in reversed(archived):
+            if len(recent) + len(older) >= self.RECENT_ENTRIES:
+                break
+            with open_archive(path, self.serializer) as archive:
+                older.extend(archive.tail(cutoff, self.RECENT_ENTRIES - len(recent) - len(older), agent, level))
+        older.reverse()
+        return older + recent
+    
+    def _scan_totals(self, log_file: Path, cutoff: Optional[str],
+                     include_archived: bool = True) -> Tuple[Dict[str, Any], List[bytes]]:
+        """すべての行を読んで数える（集計に使うフィールドだけをデコードし、壊れた行は飛ばす）"""
+        totals = new_totals()
+        recent = deque(maxlen=self.RECENT_ENTRIES)
+        summarize = self.serializer.summarize
+        decode_errors = self.serializer.decode_errors
+        for line in iter_lines(log_file, cutoff, include_archived):
+            try:
+                entry = summarize(line)
+            except decode_errors:
+                continue
+            if cutoff is not None and entry.timestamp <= cutoff:
+                continue
+            count_entry(totals, entry)
+            recent.append(line)
+        return totals, list(recent)
+    
+    def _indexed_totals(self, log_file: Path, cutoff: Optional[str],
+                        include_archived: bool = True) -> Tuple[Dict[str, Any], List[bytes]]:
+        """
+        索引を使って数える
+        
+        索引を未読の部分まで進めてから、時間範囲内のブロックは保存済みの集計を足し、
+        範囲の境界をまたぐブロックだけを読み直す（recent は最後のブロックから読む）
+        """
+        totals = new_totals()
+        opened = open_segments(log_file, cutoff, include_archived)
+        try:
+            indexes = []
+            for segment, handle in opened:
+                index = LogIndex(index_file(log_file, segment), immutable=segment is not None,
+                                 serializer=self.serializer)
+                index.refresh(handle)
+                index.aggregate(handle, cutoff, totals)
+                indexes.append((index, handle))
+            recent = []
+            for index, handle in reversed(indexes):
+                if len(recent) >= self.RECENT_ENTRIES:
+                    break
+                recent.extend(index.tail(handle, cutoff, self.RECENT_ENTRIES - len(recent)))
+        finally:
+            for _, handle in opened:
+                handle.close()
+        recent.reverse()
+        return totals, recent
     
     def analyze_errors(self, time_range: Optional[int] = None) -> Dict[str, Any]:
         """エラーログを分析"""
         error_file = self.log_dir / "errors_all.jsonl"
-        if not error_file.exists():
+        if not log_exists(error_file):
             return {"total": 0, "by_type": {}, "by_agent": {}}
         
-        errors = []
-        with open(error_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    entry = json.loads(line)
-                    errors.append(entry)
-                except:
-                    continue
-        
-        # 時間範囲でフィルタ
-        if time_range:
-            cutoff = datetime.datetime.now() - datetime.timedelta(seconds=time_range)
-            errors = [e for e in errors 
-                     if datetime.datetime.fromisoformat(e["timestamp"]) > cutoff]
-        
-        # 分析
-        by_type = {}
-        by_agent = {}
-        
-        for error in errors:
-            # エラータイプ別
-            if "error" in error and "type" in error["error"]:
-                error_type = error["error"]["type"]
-                by_type[error_type] = by_type.get(error_type, 0) + 1
-            
-            # エージェント別
-            agent = error.get("agent", "unknown")
-            by_agent[agent] = by_agent.get(agent, 0) + 1
-        
+        totals, recent = self._totals(error_file, time_range)
         return {
-            "total": len(errors),
-            "by_type": by_type,
-            "by_agent": by_agent,
-            "recent": errors[-10:] if errors else []
+            "total": totals["total"],
+            "by_type": totals["types"],
+            "by_agent": totals["agents"],
+            "recent": recent
         }
     
     def get_agent_activity(self, agent_name: str, 
                           time_range: Optional[int] = None) -> Dict[str, Any]:
         """特定エージェントのアクティビティを取得"""
         log_file = self.log_dir / f"{agent_name}_structured.jsonl"
-        if not log_file.exists():
+        if not log_exists(log_file):
             return {"total": 0, "by_level": {}}
         
-        entries = []
-        with open(log_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    entry = json.loads(line)
-                    entries.append(entry)
-                except:
-                    continue
-        
-        # 時間範囲でフィルタ
-        if time_range:
-            cutoff = datetime.datetime.now() - datetime.timedelta(seconds=time_range)
-            entries = [e for e in entries 
-                      if datetime.datetime.fromisoformat(e["timestamp"]) > cutoff]
-        
-        # レベル別集計
-        by_level = {}
-        for entry in entries:
-            level = entry.get("level", "UNKNOWN")
-            by_level[level] = by_level.get(level, 0) + 1
+        totals, recent = self._totals(log_file, time_range)
+        return {
+            "total": totals["total"],
+            "by_level": totals["levels"],
+            "recent": recent
+        }
+    
+    def search(self, time_range: Optional[int] = None, agent: Optional[str] = None,
+               level: Optional[str] = None) -> Dict[str, Any]:
+        """
+        全エージェントの構造化ログから条件に合うエントリを数える（mmap した並列スキャン）
         
+        エージェント・レベルはデコード前にバイト列で絞り込むので、条件に合う行が少ないほど速い
+        """
+        names = {path.name for path in self.log_dir.glob("*_structured.jsonl")}
+        # 現在のファイルがローテーションされたままのエージェントも含める
+        names.update(name for name in load_manifest(self.log_dir) if name.endswith("_structured.jsonl"))
+        if agent is not None:
+            names &= {f"{agent}_structured.jsonl"}
+        paths = [self.log_dir / name for name in sorted(names)]
+        cutoff = self._cutoff(time_range)
+        totals, recent = scan(paths, cutoff, agent=agent, level=level, workers=self.workers,
+                              serializer=self.serializer.name, recent=self.RECENT_ENTRIES,
+                              include_archived=not self.archive)
+        entries = [self.serializer.loads(line) for line in recent]
+        if self.archive:
+            for path in paths:
+                entries = self._archive_totals(path, cutoff, totals, entries, agent, level)
         return {
-            "total": len(entries),
-            "by_level": by_level,
-            "recent": entries[-10:] if entries else []
+            "total": totals["total"],
+            "by_level": totals["levels"],
+            "by_agent": totals["agents"],
+            "by_type": totals["types"],
+            "recent": entries[-self.RECENT_ENTRIES:]
         }
 
 
@@ -285,10 +680,24 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='CCTeam Structured Logger')
-    parser.add_argument('command', choices=['test', 'analyze', 'agent'],
+    parser.add_argument('command', choices=['test', 'analyze', 'agent', 'rotate', 'search', 'follow', 'compact', 'query'],
                         help='Command to execute')
+    parser.add_argument('statement', nargs='?', help='SQL statement to run on the log store (query)')
     parser.add_argument('--agent', help='Agent name')
     parser.add_argument('--hours', type=int, help='Time range in hours')
+    parser.add_argument('--level', help='Log level (search)')
+    parser.add_argument('--workers', type=int,
+                        help='Scan with this many processes instead of the index (0 = CPU count)')
+    parser.add_argument('--window', type=int, default=300, help='Rolling window in seconds (follow)')
+    parser.add_argument('--interval', type=float, default=10.0, help='Snapshot interval in seconds (follow)')
+    parser.add_argument('--socket', help='Also serve snapshots on this Unix socket (follow)')
+    parser.add_argument('--poll', action='store_true', help='Poll instead of using inotify (follow)')
+    parser.add_argument('--count', type=int, default=0, help='Exit after this many snapshots (follow)')
+    parser.add_argument('--format', default='auto', choices=['auto', 'parquet', 'columnar'],
+                        help='Archive format (compact)')
+    parser.add_argument('--prune', action='store_true', help='Delete JSONL segments once archived (compact)')
+    parser.add_argument('--sql', action='store_true',
+                        help='Ingest into the SQLite log store and aggregate with SQL (analyze, agent)')
     
     args = parser.parse_args()
     
@@ -312,7 +721,7 @@ def main():
     
     elif args.command == 'analyze':
         # エラー分析
-        analyzer = LogAnalyzer()
+        analyzer = LogAnalyzer(workers=args.workers, sql=args.sql)
         time_range = args.hours * 3600 if args.hours else None
         
         result = analyzer.analyze_errors(time_range)
@@ -331,7 +740,7 @@ def main():
             print("エラー: --agent を指定してください")
             sys.exit(1)
         
-        analyzer = LogAnalyzer()
+        analyzer = LogAnalyzer(workers=args.workers, sql=args.sql)
         time_range = args.hours * 3600 if args.hours else None
         
         result = analyzer.get_agent_activity(args.agent, time_range)
@@ -340,7 +749,80 @@ def main():
         print(f"\nレベル別:")
         for level, count in result['by_level'].items():
             print(f"  {level}: {count}")
+    
+    elif args.command == 'rotate':
+        # 現在のファイルをすべてセグメントにする（サイズ・時間の条件に関係なく）
+        rotator = LogRotator.shared()
+        log_dir = Path("logs")
+        structured = sorted(log_dir.glob("*_structured.jsonl"))
+        paths = structured + [log_dir / f"{path.name[:-len('_structured.jsonl')]}.log" for path in structured]
+        paths.append(log_dir / "errors_all.jsonl")
+        rotated = [target for target in (rotator.rotate(path, force=True) for path in paths) if target]
+        rotator.drain()
+        print(f"🔄 {len(rotated)} 個のファイルをローテーションしました")
+        for target in rotated:
+            print(f"  {target.name}")
+    
+    elif args.command == 'search':
+        # 全エージェントのログを条件で絞り込んで集計（並列スキャン）
+        analyzer = LogAnalyzer(workers=args.workers or 0)
+        time_range = args.hours * 3600 if args.hours else None
+        
+        result = analyzer.search(time_range, agent=args.agent, level=args.level)
+        print(f"\n🔎 検索結果")
+        print(f"該当ログ数: {result['total']}")
+        for title, key in (("レベル別", "by_level"), ("エージェント別", "by_agent"), ("エラータイプ別", "by_type")):
+            if result[key]:
+                print(f"\n{title}:")
+                for name, count in sorted(result[key].items(), key=lambda item: -item[1]):
+                    print(f"  {name}: {count}")
+    
+    elif args.command == 'follow':
+        # 追記を追跡して直近の時間窓のエラー数を JSON で出し続ける（ロガー本体の import を軽くするためここで読む）
+        try:
+            from log_follow import follow
+        except ImportError:
+            from scripts.log_follow import follow
+        follow("logs", window=args.window, interval=args.interval, socket_path=args.socket,
+               poll=args.poll, count=args.count)
+    
+    elif args.command == 'compact':
+        # ローテーション済みのセグメントを列指向アーカイブにする
+        results = compact("logs", fmt=args.format, prune=args.prune)
+        print(f"🗜️  {len(results)} 個のセグメントをアーカイブにしました")
+        for result in results:
+            print(f"  {result['file']} → {result['archive']}: {result['rows']:,} 行, "
+                  f"{result['bytes'] / 1024:,.0f}KB → {result['archive_bytes'] / 1024:,.0f}KB "
+                  f"({result['bytes'] / max(result['archive_bytes'], 1):.1f}x)")
+        if results:
+            raw = sum(result['bytes'] for result in results)
+            stored = sum(result['stored_bytes'] for result in results)
+            archived = sum(result['archive_bytes'] for result in results)
+            print(f"\n合計: JSONL {raw / 1024 ** 2:,.1f}MB (保存時 {stored / 1024 ** 2:,.1f}MB) → "
+                  f"{archived / 1024 ** 2:,.1f}MB, 圧縮率 {raw / max(archived, 1):.1f}x")
+    
+    elif args.command == 'query':
+        # ログストアに追記分を取り込んでから SQL を実行（テーブル: entries, errors）
+        if not args.statement:
+            print("エラー: SQL を指定してください（例: query \"SELECT agent, count(*) FROM entries GROUP BY agent\"）")
+            sys.exit(1)
+        with LogStore("logs") as store:
+            added = sum(store.ingest().values())
+            try:
+                columns, rows = store.query(args.statement)
+            except sqlite3.Error as e:
+                print(f"❌ SQL エラー: {e}")
+                sys.exit(1)
+        print(f"📥 {added:,} 行を取り込みました", file=sys.stderr)
+        cells = [[("" if value is None else str(value)) for value in row] for row in rows]
+        widths = [max([len(column)] + [len(row[i]) for row in cells]) for i, column in enumerate(columns)]
+        if columns:
+            print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+            print("  ".join("-" * width for width in widths))
+        for row in cells:
+            print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+        print(f"\n{len(rows):,} 行", file=sys.stderr)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -59,17 +59,33 @@ echo ""
 echo -e "${YELLOW}[3/7] エラーループ検出システム${NC}"
 run_test "エラーループ検出status" "python3 scripts/error_loop_detector.py status"
 run_test "エラーループヘルパー" "python3 scripts/error_loop_helper.py 'test error' | grep -q '📚'"
+run_test "エラーループ検出 同時実行" "CHECKS=20 CLI_CHECKS=1 bash tests/test_error_loop_concurrency.sh"
+run_test "エラーループ検出 類似度モード" "CHECKS=10 bash tests/test_error_clustering.sh"
 echo ""
 
 # 4. メモリシステムテスト
 echo -e "${YELLOW}[4/7] メモリシステム${NC}"
 run_test "メモリディレクトリ作成" "mkdir -p memory"
 run_test "メモリマネージャ初期化" "python3 -c 'from scripts.memory_manager import CCTeamMemoryManager; m = CCTeamMemoryManager()'"
+run_test "メモリ マイグレーション" "bash tests/test_memory_migration.sh"
+run_test "メモリ デーモン" "bash tests/test_memory_daemon.sh"
+run_test "メモリ エクスポート/インポート" "bash tests/test_memory_export.sh"
+run_test "メモリ コンテキスト" "bash tests/test_memory_context.sh"
+run_test "メモリ compact" "bash tests/test_memory_compact.sh"
+run_test "メモリ blobs" "bash tests/test_memory_blobs.sh"
 echo ""
 
 # 5. ログシステムテスト
 echo -e "${YELLOW}[5/7] ログシステム${NC}"
 run_test "構造化ログテスト" "python3 scripts/structured_logger.py test"
+run_test "構造化ログ 非同期書き込み" "LINES=200 bash tests/test_structured_logger_async.sh"
+run_test "構造化ログ シリアライザ互換" "bash tests/test_log_serializer.sh"
+run_test "構造化ログ ローテーション" "LINES=500 bash tests/test_log_rotation.sh"
+run_test "構造化ログ 索引" "ROUNDS=4 bash tests/test_log_index.sh"
+run_test "構造化ログ 並列スキャン" "bash tests/test_log_scan.sh"
+run_test "構造化ログ 追跡" "LINES=300 bash tests/test_log_follow.sh"
+run_test "構造化ログ アーカイブ" "bash tests/test_log_archive.sh"
+run_test "構造化ログ ストア" "bash tests/test_log_store.sh"
 run_test "ログローテーションスクリプト" "test -x scripts/log_rotation.sh"
 echo ""
 
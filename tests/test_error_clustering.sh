@@ -0,0 +1,110 @@
+#!/bin/bash
+
+# CCTeam エラーループ検出 類似度モードのテスト
+# 毎回少しずつ変わるスタックトレースを同じループとして数えられることを確認
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+PROCESSES=${PROCESSES:-8}
+CHECKS=${CHECKS:-50}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 エラーループ検出 類似度モードテスト${NC}"
+echo "=========================="
+
+FAILED=0
+cd "$WORK_DIR"
+
+check() {
+    # check <説明> <python の結果が OK なら成功>
+    local name=$1 result=$2
+    if [ "${result%% *}" = "OK" ]; then
+        echo -e "${GREEN}✅ $name: ${result#OK }${NC}"
+    else
+        echo -e "${RED}❌ $name: $result${NC}"
+        FAILED=1
+    fi
+}
+
+# 1. 変異させたトレースバックのコーパスで precision / recall
+RESULT=$(python3 - "$SCRIPT_DIR" <<'PY'
+import sys
+sys.path.insert(0, sys.argv[1])
+from bench_error_loop import _mutated_tracebacks, _pair_scores, cluster_corpus
+
+corpus = _mutated_tracebacks(families=80, per_family=25)
+truth = [family for family, _ in corpus]
+exact = _pair_scores(truth, cluster_corpus(corpus))
+fuzzy = _pair_scores(truth, cluster_corpus(corpus, threshold=0.6))
+summary = (f"precision={fuzzy['precision']:.3f} recall={fuzzy['recall']:.3f} "
+           f"(完全一致 recall={exact['recall']:.3f})")
+ok = fuzzy["precision"] >= 0.95 and fuzzy["recall"] >= 0.95 and exact["recall"] < 0.5
+print(("OK " if ok else "NG ") + summary)
+PY
+)
+check "クラスタリング精度" "$RESULT"
+
+# 2. 完全一致では検出できないループを類似度モードで検出
+RESULT=$(python3 - "$SCRIPT_DIR" <<'PY'
+import sys
+sys.path.insert(0, sys.argv[1])
+from bench_error_loop import _mutated_tracebacks
+from error_loop_detector import ErrorClusterer, ErrorLoopDetector
+
+texts = [text for family, text in _mutated_tracebacks(families=5, per_family=10) if family == 0][:3]
+detected = {}
+for mode, clusterer in (("exact", None), ("similarity", ErrorClusterer(0.6))):
+    detector = ErrorLoopDetector(threshold=3, log_dir=f"logs_{mode}", clusterer=clusterer)
+    detector._send_stop_command = lambda agent: None
+    detected[mode] = [detector.check_error("worker1", text) for text in texts]
+ok = detected["exact"] == [False] * 3 and detected["similarity"] == [False, False, True]
+print(("OK " if ok else "NG ") + f"exact={detected['exact']} similarity={detected['similarity']}")
+PY
+)
+check "ループ検出" "$RESULT"
+
+# 3. 複数プロセスがそれぞれ別の変異を報告しても1つのクラスタに数える（途中で書き直しも起こす）
+for p in $(seq 1 "$PROCESSES"); do
+    CCTEAM_ERROR_SIMILARITY=0.6 python3 - "$SCRIPT_DIR" "$p" "$CHECKS" > /dev/null 2>&1 <<'PY' &
+import sys
+sys.path.insert(0, sys.argv[1])
+from bench_error_loop import _mutated_tracebacks
+from error_loop_detector import ErrorLoopDetector
+
+ErrorLoopDetector.COMPACT_MIN_LINES = 50
+process, checks = int(sys.argv[2]), int(sys.argv[3])
+texts = [text for family, text in _mutated_tracebacks(families=2, per_family=process * checks) if family == 0]
+detector = ErrorLoopDetector(threshold=10**9, batch_size=1)
+for text in texts[-checks:]:
+    detector.check_error("worker1", text)
+PY
+done
+wait
+
+RESULT=$(CCTEAM_ERROR_SIMILARITY=0.6 python3 - "$SCRIPT_DIR" "$((PROCESSES * CHECKS))" <<'PY'
+import sys
+sys.path.insert(0, sys.argv[1])
+from error_loop_detector import ErrorLoopDetector
+
+detector = ErrorLoopDetector(threshold=10**9)
+counts = {key: len(stamps) for key, stamps in detector.error_history.items()}
+ok = list(counts.values()) == [int(sys.argv[2])]
+print(("OK " if ok else "NG ") + f"{len(counts)} cluster(s), counts={sorted(counts.values())}")
+PY
+)
+check "プロセス間で同じクラスタ" "$RESULT"
+
+echo ""
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi
@@ -0,0 +1,101 @@
+#!/bin/bash
+
+# CCTeam エラーループ検出 同時実行ストレステスト
+# 多数のプロセスが同じ履歴に同時に check しても件数が失われないことを確認
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+PROCESSES=${PROCESSES:-16}
+CHECKS=${CHECKS:-200}
+CLI_CHECKS=${CLI_CHECKS:-4}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 エラーループ検出 同時実行テスト (${PROCESSES} processes)${NC}"
+echo "=========================="
+
+TOTAL=$((PROCESSES * CHECKS))
+FAILED=0
+
+# 1. ErrorLoopDetector を直接使用（閾値 = 総件数 → 全プロセスで1回だけ検出されるはず）
+cd "$WORK_DIR"
+for p in $(seq 1 "$PROCESSES"); do
+    python3 - "$SCRIPT_DIR" "$TOTAL" "$CHECKS" > "result_$p.txt" 2>/dev/null <<'EOF' &
+import sys
+sys.path.insert(0, sys.argv[1])
+from error_loop_detector import ErrorLoopDetector
+
+# 書き直し（compact）も同時実行中に起こす
+ErrorLoopDetector.COMPACT_MIN_LINES = 500
+detector = ErrorLoopDetector(threshold=int(sys.argv[2]), batch_size=1)
+detector._send_stop_command = lambda agent: None
+detected = 0
+for n in range(int(sys.argv[3])):
+    # 共有キー1つと、プロセス間で交互に重なるキー
+    detected += detector.check_error("worker1", "ConnectionError: shared failure")
+    detector.check_error("worker2", f"TimeoutError: job {n % 5}")
+print(detected)
+EOF
+done
+wait
+
+COUNTS=$(python3 - "$SCRIPT_DIR" <<'EOF'
+import sys
+sys.path.insert(0, sys.argv[1])
+from error_loop_detector import ErrorLoopDetector
+
+detector = ErrorLoopDetector(threshold=10**9)
+counts = sorted(len(stamps) for stamps in detector.error_history.values())
+print(" ".join(map(str, counts)))
+EOF
+)
+DETECTED=$(cat result_*.txt | awk '{s += $1} END {print s}')
+EXPECTED="$((TOTAL / 5)) $((TOTAL / 5)) $((TOTAL / 5)) $((TOTAL / 5)) $((TOTAL / 5)) $TOTAL"
+
+if [ "$COUNTS" = "$EXPECTED" ]; then
+    echo -e "${GREEN}✅ 件数一致: $COUNTS${NC}"
+else
+    echo -e "${RED}❌ 件数不一致: $COUNTS (期待値: $EXPECTED)${NC}"
+    FAILED=1
+fi
+
+if [ "$DETECTED" = "1" ]; then
+    echo -e "${GREEN}✅ ループ検出はちょうど1回${NC}"
+else
+    echo -e "${RED}❌ ループ検出回数: $DETECTED (期待値: 1)${NC}"
+    FAILED=1
+fi
+
+# 2. CLI を同時に起動（1プロセス1チェック）
+rm -rf logs
+for p in $(seq 1 "$PROCESSES"); do
+    (
+        for n in $(seq 1 "$CLI_CHECKS"); do
+            python3 "$SCRIPT_DIR/error_loop_detector.py" check --agent boss \
+                --error "ModuleNotFoundError: No module named 'x'" --threshold 100000 > /dev/null
+        done
+    ) &
+done
+wait
+
+LINES=$(wc -l < logs/error_loops.jsonl | tr -d ' ')
+if [ "$LINES" = "$((PROCESSES * CLI_CHECKS))" ]; then
+    echo -e "${GREEN}✅ CLI 同時実行: $LINES 件すべて記録${NC}"
+else
+    echo -e "${RED}❌ CLI 同時実行: $LINES 件 (期待値: $((PROCESSES * CLI_CHECKS)))${NC}"
+    FAILED=1
+fi
+
+echo ""
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi
@@ -0,0 +1,147 @@
+#!/bin/bash
+
+# CCTeam ログアーカイブテスト
+# 列指向アーカイブ（compact）からエントリを元どおりに戻せること、
+# アーカイブを使った LogAnalyzer の結果が JSONL だけを読んだ結果と一致すること（JSONL セグメントを削除した後も）、
+# 集計では必要な列・行グループだけを読むことを確認
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+ENTRIES=${ENTRIES:-4000}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 ログアーカイブテスト${NC}"
+echo "=========================="
+
+cd "$WORK_DIR"
+RESULT=$(python3 - "$SCRIPT_DIR" "$ENTRIES" <<'PY' 2>/dev/null
+import datetime, json, os, random, sys
+sys.path.insert(0, sys.argv[1])
+import log_archive
+from log_archive import compact, open_archive
+from log_index import new_totals
+from log_segments import LogRotator, iter_lines, load_manifest
+from log_serializer import get_serializer
+from structured_logger import LogAnalyzer
+
+# 小さいセグメントでも複数の行グループに分かれるようにする
+log_archive.GROUP_ROWS = 500
+entries = int(sys.argv[2])
+random.seed(24)
+serializer = get_serializer()
+rotator = LogRotator("logs", max_bytes=0)
+os.makedirs("logs", exist_ok=True)
+now = datetime.datetime.now()
+problems = []
+
+def entry(n, agent):
+    """2日分を順不同で（message / caller なし、小数部なしの timestamp、文字列でない値を混ぜる）"""
+    timestamp = (now - datetime.timedelta(seconds=random.uniform(0, 172800))).isoformat()
+    e = {"timestamp": timestamp if n % 13 else timestamp[:19],
+         "level": random.choice(["INFO", "WARNING", "ERROR", "CRITICAL"]),
+         "agent": agent or random.choice(["boss", "worker1", "作業者"]),
+         "message": f"message {n}" if n % 7 else None,
+         "caller": {"file": "worker.py", "function": random.choice(["run", "fetch"]), "line": n % 9}}
+    if n % 11 == 0:
+        del e["caller"]
+        e["message"] = {"nested": n}
+    if n % 4:
+        e["error"] = {"type": random.choice(["ValueError", "KeyError"]), "traceback": ["line"]}
+    if n % 3:
+        e["context"] = {"n": n}
+    return e
+
+for r in range(4):
+    with open("logs/errors_all.jsonl", "ab") as f, open("logs/worker1_structured.jsonl", "ab") as g:
+        for n in range(entries // 4):
+            f.write(serializer.dumps(entry(n, None)))
+            g.write(serializer.dumps(entry(n, "worker1")))
+        f.write(b"not json\n")
+    if r < 3:
+        for path in ("logs/errors_all.jsonl", "logs/worker1_structured.jsonl"):
+            rotator.rotate(path, force=True)
+        rotator.drain()
+
+def results():
+    out = {}
+    for hours in (None, 1, 24):
+        time_range = hours * 3600 if hours else None
+        for options in ({}, {"indexed": False}, {"workers": 2}):
+            analyzer = LogAnalyzer(**options)
+            out[(hours, str(options))] = (analyzer.analyze_errors(time_range),
+                                          analyzer.get_agent_activity("worker1", time_range))
+    out["search"] = LogAnalyzer().search(6 * 3600, agent="worker1", level="ERROR")
+    return out
+
+expected = results()
+expected_jsonl = {key: (LogAnalyzer(indexed=False, archive=False).analyze_errors(key[0] and key[0] * 3600),
+                        LogAnalyzer(indexed=False, archive=False).get_agent_activity("worker1", key[0] and key[0] * 3600))
+                  for key in expected if key != "search"}
+decoded = {}
+for name in ("errors_all.jsonl", "worker1_structured.jsonl"):
+    decoded[name] = [json.loads(line) for line in iter_lines(f"logs/{name}") if line != b"not json\n"]
+
+archived = compact("logs")
+if len(archived) != 6:
+    problems.append(f"archived {len(archived)} segments")
+
+# 元のエントリに戻せる
+restored = []
+for segment in load_manifest("logs")["errors_all.jsonl"]["segments"]:
+    with open_archive(f"logs/segments/{segment['archive']}") as archive:
+        restored.extend(archive.entries())
+live = [json.loads(line) for line in open("logs/errors_all.jsonl", "rb") if line != b"not json\n"]
+if restored + live != decoded["errors_all.jsonl"]:
+    problems.append("restored entries differ")
+
+# 列の刈り込み・行グループの読み飛ばし
+segment = load_manifest("logs")["errors_all.jsonl"]["segments"][0]
+with open_archive(f"logs/segments/{segment['archive']}") as archive:
+    archive.aggregate(new_totals())
+    pruned = archive.bytes_read
+    message_bytes = sum(g["columns"][c][1] for g in archive.footer["groups"] for c in ("message", "extra"))
+    if pruned + message_bytes > os.path.getsize(archive.path):
+        problems.append(f"column pruning: read {pruned} bytes")
+    archive.bytes_read = 0
+    archive.aggregate(new_totals(), agent="nobody")
+    cutoff = max(g["max"] for g in archive.footer["groups"])
+    archive.aggregate(new_totals(), cutoff=cutoff)
+    if archive.bytes_read:
+        problems.append(f"predicate pushdown: read {archive.bytes_read} bytes")
+
+for prune in (False, True):
+    if prune:
+        # アーカイブ済みのセグメントは作り直さない
+        if compact("logs"):
+            problems.append("compacted twice")
+        for name in ("errors_all.jsonl", "worker1_structured.jsonl"):
+            for segment in load_manifest("logs")[name]["segments"]:
+                os.remove(f"logs/segments/{segment['file']}")
+    actual = results()
+    for key, value in expected.items():
+        if actual[key] != value:
+            problems.append(f"prune={prune} {key}")
+        if key != "search" and value != expected_jsonl[key]:
+            problems.append(f"archive vs jsonl {key}")
+print(("NG " + ", ".join(problems[:5])) if problems
+      else f"OK {len(decoded['errors_all.jsonl']) + len(decoded['worker1_structured.jsonl']):,} entries, "
+           f"{len(archived)} segments archived")
+PY
+)
+
+echo ""
+if [ "${RESULT%% *}" = "OK" ]; then
+    echo -e "${GREEN}✅ アーカイブと JSONL の結果が一致: ${RESULT#OK }${NC}"
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    echo -e "${RED}❌ $RESULT${NC}"
+    exit 1
+fi
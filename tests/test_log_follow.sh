@@ -0,0 +1,105 @@
+#!/bin/bash
+
+# CCTeam ログ追跡（follow）テスト
+# 追跡中に書かれたエントリを、頻繁なローテーションをまたいでも取りこぼし・重複なく集計し、
+# スナップショット（標準出力の JSON とソケット）に反映することを確認（inotify とポーリングの両方）
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+LINES=${LINES:-600}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 ログ追跡テスト${NC}"
+echo "=========================="
+
+FAILED=0
+cd "$WORK_DIR"
+
+for MODE in inotify poll; do
+    rm -rf logs && mkdir logs
+    # 追跡前からあるログは集計に含めない
+    echo '{"timestamp":"2000-01-01T00:00:00","level":"ERROR","agent":"old","error":{"type":"OldError"}}' \
+        > logs/old_structured.jsonl
+    FLAG=$([ "$MODE" = "poll" ] && echo "--poll" || echo "")
+    python3 "$SCRIPT_DIR/structured_logger.py" follow $FLAG --interval 0.5 --window 600 \
+        --socket "$WORK_DIR/follow.sock" > snapshots.jsonl 2> /dev/null &
+    FOLLOW_PID=$!
+    sleep 1
+
+    # 4KB ごとにローテーション、エラー3件に1件（エージェントごとに LINES 件）
+    CCTEAM_LOG_ROTATE_SIZE=4K python3 - "$SCRIPT_DIR" "$LINES" > /dev/null 2>&1 <<'PY'
+import sys
+sys.path.insert(0, sys.argv[1])
+from structured_logger import StructuredLogger
+
+lines = int(sys.argv[2])
+loggers = [StructuredLogger(agent) for agent in ("old", "worker1", "worker2")]
+for n in range(lines):
+    for logger in loggers:
+        if n % 3 == 0:
+            logger.error(f"failed {n}", (ValueError if n % 2 else KeyError)(f"bad {n}"))
+        else:
+            logger.info(f"done {n}")
+PY
+    sleep 2
+    SOCKET=$(python3 -c "
+import socket, sys
+s = socket.socket(socket.AF_UNIX)
+s.connect(sys.argv[1])
+print(s.makefile().read().strip())" "$WORK_DIR/follow.sock")
+    kill "$FOLLOW_PID"
+    wait "$FOLLOW_PID" || true
+
+    RESULT=$(python3 - "$LINES" "$MODE" "$SOCKET" "$SCRIPT_DIR" <<'PY'
+import json, sys
+
+lines, mode, socket_snapshot = int(sys.argv[1]), sys.argv[2], json.loads(sys.argv[3])
+sys.path.insert(0, sys.argv[4])
+from log_segments import load_manifest
+with open("snapshots.jsonl") as f:
+    snapshot = json.loads(f.read().splitlines()[-1])
+errors = len(range(0, lines, 3))
+expected = {agent: errors for agent in ("old", "worker1", "worker2")}
+problems = []
+if snapshot["mode"] != mode:
+    problems.append(f"mode {snapshot['mode']}")
+if snapshot["entries"] != lines * 3:
+    problems.append(f"entries {snapshot['entries']} != {lines * 3}")
+if snapshot["errors_by_agent"] != expected:
+    problems.append(f"errors {snapshot['errors_by_agent']}")
+types = dict(snapshot["top_error_types"])
+if types != {"KeyError": (errors + 1) // 2 * 3, "ValueError": errors // 2 * 3}:
+    problems.append(f"types {types}")
+# 追跡中に作られたセグメントの数と一致する（ポーリングの間隔内に複数回ローテーションされても）
+rotated = sum(f["segments"][-1]["seq"] for name, f in load_manifest("logs").items()
+              if name.endswith("_structured.jsonl") and f.get("segments"))
+if snapshot["rotations"] != rotated or rotated < 3:
+    problems.append(f"rotations {snapshot['rotations']} != {rotated}")
+if socket_snapshot["entries"] != snapshot["entries"]:
+    problems.append(f"socket entries {socket_snapshot['entries']}")
+print(("NG " + ", ".join(problems)) if problems
+      else f"OK {snapshot['entries']:,} entries, {snapshot['errors']} errors, {snapshot['rotations']} rotations")
+PY
+)
+    if [ "${RESULT%% *}" = "OK" ]; then
+        echo -e "${GREEN}✅ $MODE: ${RESULT#OK }${NC}"
+    else
+        echo -e "${RED}❌ $MODE: $RESULT${NC}"
+        FAILED=1
+    fi
+done
+
+echo ""
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi
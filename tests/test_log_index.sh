@@ -0,0 +1,93 @@
+#!/bin/bash
+
+# CCTeam ログ索引テスト
+# 索引を使った LogAnalyzer の結果が全行を読んだ結果と一致すること、
+# 2回目以降は追記された分だけを読むことを確認（ローテーション・前後した timestamp を含む）
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+ROUNDS=${ROUNDS:-6}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 ログ索引テスト${NC}"
+echo "=========================="
+
+cd "$WORK_DIR"
+RESULT=$(python3 - "$SCRIPT_DIR" "$ROUNDS" <<'PY' 2>/dev/null
+import datetime, os, random, sys
+sys.path.insert(0, sys.argv[1])
+from log_index import LogIndex
+from log_segments import LogRotator, index_file
+from log_serializer import get_serializer
+from structured_logger import LogAnalyzer
+
+rounds = int(sys.argv[2])
+random.seed(21)
+serializer = get_serializer()
+rotator = LogRotator("logs", max_bytes=0)
+log_file = "logs/errors_all.jsonl"
+os.makedirs("logs", exist_ok=True)
+now = datetime.datetime.now()
+problems = []
+written = 0
+
+def append(count, newest):
+    """newest 秒前までの3時間分を、書き込み順に数秒前後させながら追記"""
+    global written
+    with open(log_file, "ab") as f:
+        for n in range(count):
+            age = newest + (count - n) * 10800 / count + random.uniform(-5, 5)
+            entry = {"timestamp": (now - datetime.timedelta(seconds=age)).isoformat(),
+                     "level": random.choice(["ERROR", "CRITICAL"]),
+                     "agent": random.choice(["boss", "worker1", "worker2"]),
+                     "message": "failed"}
+            if n % 7:
+                entry["error"] = {"type": random.choice(["ValueError", "KeyError", "OSError"])}
+            f.write(serializer.dumps(entry))
+            written += 1
+        f.write(b"not json\n")
+
+for r in range(rounds):
+    append(3000, newest=(rounds - r) * 10800)
+    if r % 2:
+        rotator.rotate(log_file, force=True)
+        rotator.drain()
+    for hours in (None, 1, 4, 13, 24):
+        time_range = hours * 3600 if hours else None
+        indexed = LogAnalyzer(indexed=True).analyze_errors(time_range)
+        scanned = LogAnalyzer(indexed=False).analyze_errors(time_range)
+        if indexed != scanned:
+            problems.append(f"round {r} hours {hours}: {indexed['total']} != {scanned['total']}")
+    if LogAnalyzer().analyze_errors()["total"] != written:
+        problems.append(f"round {r}: total != {written}")
+
+# 追記分だけを読む
+append(100, newest=0)
+LogAnalyzer().analyze_errors(3600)
+size = os.path.getsize(log_file)
+append(100, newest=0)
+index = LogIndex(index_file(log_file))
+with open(log_file, "rb") as f:
+    index.refresh(f)
+if index.scanned != os.path.getsize(log_file) - size:
+    problems.append(f"incremental: scanned {index.scanned} bytes")
+print(("NG " + ", ".join(problems[:5])) if problems else f"OK {written:,} entries, {rounds} rounds")
+PY
+)
+
+echo ""
+if [ "${RESULT%% *}" = "OK" ]; then
+    echo -e "${GREEN}✅ 索引と全行読み込みの結果が一致: ${RESULT#OK }${NC}"
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    echo -e "${RED}❌ $RESULT${NC}"
+    exit 1
+fi
@@ -0,0 +1,99 @@
+#!/bin/bash
+
+# CCTeam 構造化ログ ローテーション同時実行テスト
+# 複数プロセスが同じ errors_all.jsonl に書きながらローテーションしても、
+# 行が失われず・重複せず・壊れず、LogAnalyzer がセグメントをまたいで全件を数えることを確認
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+PROCESSES=${PROCESSES:-6}
+LINES=${LINES:-2000}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 構造化ログ ローテーション同時実行テスト (${PROCESSES} processes)${NC}"
+echo "=========================="
+
+FAILED=0
+cd "$WORK_DIR"
+
+check() {
+    # check <説明> <python の結果が OK なら成功>
+    local name=$1 result=$2
+    if [ "${result%% *}" = "OK" ]; then
+        echo -e "${GREEN}✅ $name: ${result#OK }${NC}"
+    else
+        echo -e "${RED}❌ $name: $result${NC}"
+        FAILED=1
+    fi
+}
+
+# 奇数番目のプロセスは同期書き込み、偶数番目は非同期書き込み（64KB でローテーション）
+for p in $(seq 1 "$PROCESSES"); do
+    ASYNC=$((p % 2 == 0 ? 1 : 0))
+    CCTEAM_LOG_ASYNC=$ASYNC CCTEAM_LOG_ROTATE_SIZE=64K python3 - "$SCRIPT_DIR" "$p" "$LINES" > /dev/null 2>&1 <<'PY' &
+import sys
+sys.path.insert(0, sys.argv[1])
+from structured_logger import StructuredLogger
+
+process, lines = int(sys.argv[2]), int(sys.argv[3])
+logger = StructuredLogger(f"agent{process}")
+for n in range(lines):
+    logger.error("failed", ValueError(f"bad {n}"), {"process": process, "n": n})
+PY
+done
+wait
+
+RESULT=$(python3 - "$SCRIPT_DIR" "$PROCESSES" "$LINES" <<'PY' 2>/dev/null
+import json, sys
+sys.path.insert(0, sys.argv[1])
+from log_segments import iter_lines, load_manifest
+
+processes, lines = int(sys.argv[2]), int(sys.argv[3])
+problems = []
+seen = set()
+for line in iter_lines("logs/errors_all.jsonl"):
+    entry = json.loads(line)
+    key = (entry["context"]["process"], entry["context"]["n"])
+    if key in seen:
+        problems.append(f"duplicate {key}")
+    seen.add(key)
+if len(seen) != processes * lines:
+    problems.append(f"errors_all: {len(seen)} lines")
+segments = load_manifest("logs").get("errors_all.jsonl", {}).get("segments", [])
+if len(segments) < 2 or not all(s.get("compressed") for s in segments):
+    problems.append(f"segments: {len(segments)}, compressed: {sum(bool(s.get('compressed')) for s in segments)}")
+print(("NG " + ", ".join(problems[:5])) if problems
+      else f"OK {len(seen):,} lines in {len(segments)} segments + active file")
+PY
+)
+check "errors_all.jsonl の行の完全性" "$RESULT"
+
+RESULT=$(python3 - "$SCRIPT_DIR" "$PROCESSES" "$LINES" <<'PY' 2>/dev/null
+import sys
+sys.path.insert(0, sys.argv[1])
+from structured_logger import LogAnalyzer
+
+processes, lines = int(sys.argv[2]), int(sys.argv[3])
+analyzer = LogAnalyzer()
+errors = analyzer.analyze_errors(3600)
+activity = [analyzer.get_agent_activity(f"agent{p}")["total"] for p in range(1, processes + 1)]
+ok = errors["total"] == processes * lines and activity == [lines] * processes
+print(("OK " if ok else "NG ") + f"analyze_errors={errors['total']:,}, per agent={sorted(set(activity))}")
+PY
+)
+check "セグメントをまたいだ分析" "$RESULT"
+
+echo ""
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi
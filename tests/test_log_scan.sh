@@ -0,0 +1,91 @@
+#!/bin/bash
+
+# CCTeam ログ並列スキャンテスト
+# mmap した並列スキャン（チャンク分割・バイト列での絞り込み）の結果が
+# 全行を読んだ analyze_errors / 1件ずつデコードした結果と一致することを確認（セグメント・壊れた行を含む）
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+ENTRIES=${ENTRIES:-20000}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 ログ並列スキャンテスト${NC}"
+echo "=========================="
+
+cd "$WORK_DIR"
+RESULT=$(python3 - "$SCRIPT_DIR" "$ENTRIES" <<'PY' 2>/dev/null
+import datetime, json, os, random, sys
+sys.path.insert(0, sys.argv[1])
+import log_scan
+from log_segments import LogRotator, iter_lines
+from log_serializer import get_serializer
+from structured_logger import LogAnalyzer
+
+# 小さいファイルでも複数のチャンク・プロセスに分かれるようにする
+log_scan.MIN_CHUNK_BYTES = 64 * 1024
+entries = int(sys.argv[2])
+random.seed(22)
+serializer = get_serializer()
+rotator = LogRotator("logs", max_bytes=0)
+os.makedirs("logs", exist_ok=True)
+now = datetime.datetime.now()
+agents = ["boss", "worker1", "worker2", "作業者"]
+problems = []
+
+def append(path, count):
+    """2日分を順不同で追記（stdlib json の書式・壊れた行を混ぜる）"""
+    with open(path, "ab") as f:
+        for n in range(count):
+            entry = {"timestamp": (now - datetime.timedelta(seconds=random.uniform(0, 172800))).isoformat(),
+                     "level": random.choice(["INFO", "WARNING", "ERROR", "CRITICAL"]),
+                     "agent": random.choice(agents),
+                     "message": "ERROR in worker1"}
+            if n % 4:
+                entry["error"] = {"type": random.choice(["ValueError", "KeyError"])}
+            f.write(serializer.dumps(entry) if n % 3 else (json.dumps(entry) + "\n").encode())
+        f.write(b"not json\n")
+
+for r in range(3):
+    append("logs/errors_all.jsonl", entries // 3)
+    append("logs/mixed_structured.jsonl", entries // 3)
+    if r < 2:
+        for path in ("logs/errors_all.jsonl", "logs/mixed_structured.jsonl"):
+            rotator.rotate(path, force=True)
+        rotator.drain()
+
+for hours in (None, 1, 24):
+    time_range = hours * 3600 if hours else None
+    expected = LogAnalyzer(indexed=False).analyze_errors(time_range)
+    for workers in (1, 3):
+        if LogAnalyzer(workers=workers).analyze_errors(time_range) != expected:
+            problems.append(f"analyze_errors hours={hours} workers={workers}")
+
+cutoff = LogAnalyzer._cutoff(6 * 3600)
+decoded = [json.loads(line) for line in iter_lines("logs/mixed_structured.jsonl") if line != b"not json\n"]
+for agent in (None, "worker1", "作業者"):
+    for level in (None, "ERROR"):
+        expected = sum(1 for e in decoded if e["timestamp"] > cutoff
+                       and agent in (None, e["agent"]) and level in (None, e["level"]))
+        totals, _ = log_scan.scan(["logs/mixed_structured.jsonl"], cutoff, agent=agent, level=level, workers=2)
+        if totals["total"] != expected:
+            problems.append(f"agent={agent} level={level}: {totals['total']} != {expected}")
+print(("NG " + ", ".join(problems[:5])) if problems else f"OK {entries * 2:,} entries")
+PY
+)
+
+echo ""
+if [ "${RESULT%% *}" = "OK" ]; then
+    echo -e "${GREEN}✅ 並列スキャンと全行読み込みの結果が一致: ${RESULT#OK }${NC}"
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    echo -e "${RED}❌ $RESULT${NC}"
+    exit 1
+fi
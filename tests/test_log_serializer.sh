@@ -0,0 +1,164 @@
+#!/bin/bash
+
+# CCTeam 構造化ログ シリアライザ互換テスト
+# どのシリアライザで書いても標準 json で同じ内容に読め、LogAnalyzer の結果も一致することを確認
+# 集計用のフィールドの型が合わない行は、どのシリアライザ・どの集計経路でも同じように読み飛ばすことを確認
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 構造化ログ シリアライザ互換テスト${NC}"
+echo "=========================="
+
+cd "$WORK_DIR"
+RESULT=$(python3 - "$SCRIPT_DIR" <<'PY' 2>/dev/null
+import json, sys
+sys.path.insert(0, sys.argv[1])
+from log_serializer import available_serializers
+from structured_logger import LogAnalyzer, StructuredLogger
+
+# 日本語・数値キー・64bit を超える整数・入れ子を含むコンテキスト
+context = {"メッセージ": "こんにちは", 1: "int key", "big": 2 ** 70, "nested": {"list": [1, 2.5, None, True]}}
+problems, results = [], {}
+for name in available_serializers():
+    log_dir = f"logs_{name}"
+    logger = StructuredLogger("agent", log_dir=log_dir, serializer=name)
+    for n in range(20):
+        try:
+            raise KeyError(f"missing {n}") if n % 2 else ValueError(f"bad {n}")
+        except Exception as e:
+            logger.error("失敗", e, context)
+        logger.info("情報", context)
+    with open(f"{log_dir}/agent_structured.jsonl", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    expected = json.loads(json.dumps(context, ensure_ascii=False))
+    if len(entries) != 40 or any(e["context"] != expected for e in entries):
+        problems.append(f"{name}: content differs")
+    analyzer = LogAnalyzer(log_dir, serializer=name)
+    results[name] = (analyzer.analyze_errors(3600), analyzer.get_agent_activity("agent", 3600))
+    for r in results[name]:
+        for e in r["recent"]:
+            e.pop("timestamp"), e.pop("caller")
+
+baseline = results["json"]
+for name, result in results.items():
+    if result != baseline:
+        problems.append(f"{name}: analyzer results differ from json")
+if baseline[0]["by_type"] != {"ValueError": 10, "KeyError": 10}:
+    problems.append(f"by_type: {baseline[0]['by_type']}")
+print(("NG " + ", ".join(problems)) if problems else f"OK {', '.join(results)}")
+PY
+)
+RESULT=$(echo "$RESULT" | tail -n 1)  # ロガーのコンソール出力を除く
+
+FAILED=0
+echo ""
+if [ "${RESULT%% *}" = "OK" ]; then
+    echo -e "${GREEN}✅ 全シリアライザで同じ内容: ${RESULT#OK }${NC}"
+else
+    echo -e "${RED}❌ $RESULT${NC}"
+    FAILED=1
+fi
+
+# 2. 型の合わない行（timestamp が数値・null、level / agent / error.type がリスト・オブジェクト、error が文字列）
+RESULT=$(python3 - "$SCRIPT_DIR" <<'PY' 2>/dev/null
+import datetime, json, os, subprocess, sys
+sys.path.insert(0, sys.argv[1])
+from log_archive import compact
+from log_follow import LogFollower
+from log_segments import LogRotator
+from log_serializer import available_serializers, get_serializer
+from structured_logger import LogAnalyzer
+
+now = datetime.datetime.now().isoformat()
+good = [{"timestamp": now, "level": "ERROR", "agent": "agent", "message": "ok", "error": {"type": "ValueError"}},
+        {"timestamp": now, "level": "INFO", "agent": "agent", "message": "ok"},
+        {"timestamp": now, "level": "CRITICAL", "agent": "agent", "error": None}]
+bad = [{"timestamp": 12345}, {"timestamp": None, "level": "ERROR", "agent": "agent"},
+       {"timestamp": now, "level": ["ERROR"], "agent": "agent"},
+       {"timestamp": now, "level": "ERROR", "agent": {"name": "agent"}},
+       {"timestamp": now, "level": "ERROR", "agent": "agent", "error": {"type": ["KeyError"]}},
+       {"timestamp": now, "level": "ERROR", "agent": "agent", "error": "KeyError"}, [1, 2]]
+lines = lambda entries: "".join(json.dumps(e) + "\n" for e in entries)
+problems = []
+
+for name in available_serializers():
+    serializer = get_serializer(name)
+    for entry in bad:
+        try:
+            serializer.summarize(lines([entry]).encode())
+            problems.append(f"{name}: accepted {entry}")
+        except serializer.decode_errors:
+            pass
+
+# 正しい行だけのログと、型の合わない行を混ぜたログで結果が一致する
+for log_dir, entries in (("clean", good * 3), ("logs", good + bad + good + bad[::-1] + good)):
+    os.makedirs(log_dir, exist_ok=True)
+    for file in ("errors_all.jsonl", "agent_structured.jsonl"):
+        with open(f"{log_dir}/{file}", "w") as f:
+            f.write(lines(entries))
+
+def results(log_dir, name, **options):
+    analyzer = LogAnalyzer(log_dir, serializer=name, **options)
+    return [analyzer.analyze_errors(time_range) for time_range in (None, 3600)] + \
+           [analyzer.get_agent_activity("agent", time_range) for time_range in (None, 3600)]
+
+modes = ({}, {"indexed": False}, {"workers": 2}, {"sql": True})
+for step in ("live", "archived"):
+    if step == "archived":
+        for log_dir in ("clean", "logs"):
+            rotator = LogRotator(log_dir, max_bytes=0)
+            for file in ("errors_all.jsonl", "agent_structured.jsonl"):
+                rotator.rotate(f"{log_dir}/{file}", force=True)
+            rotator.drain()
+            compact(log_dir, prune=True)
+    for name in available_serializers():
+        for options in modes:
+            expected, actual = results("clean", name, **options), results("logs", name, **options)
+            if actual != expected:
+                problems.append(f"{step} {name} {options}")
+        total = results("logs", name)[0]["total"]
+        if total != len(good) * 3:
+            problems.append(f"{step} {name}: {total} entries")
+
+for hours in ([], ["--hours", "1"]):
+    run = subprocess.run([sys.executable, f"{sys.argv[1]}/structured_logger.py", "analyze", *hours],
+                         capture_output=True, text=True)
+    if run.returncode != 0:
+        problems.append(f"analyze {hours}: {run.stderr.strip().splitlines()[-1:]}")
+
+for name in available_serializers():
+    follower = LogFollower("logs", serializer=name, poll=True)
+    with open("logs/agent_structured.jsonl", "a") as f:
+        f.write(lines(bad + good))
+    follower.poll_once()
+    snapshot = follower.snapshot()
+    follower.close()
+    if (snapshot["entries"], snapshot["errors"]) != (3, 2):
+        problems.append(f"follow {name}: {snapshot['entries']} entries, {snapshot['errors']} errors")
+print(("NG " + ", ".join(problems[:5])) if problems
+      else f"OK {len(bad)} kinds of bad lines skipped by {', '.join(available_serializers())}")
+PY
+)
+
+if [ "${RESULT%% *}" = "OK" ]; then
+    echo -e "${GREEN}✅ 型の合わない行はどの集計経路でも読み飛ばす: ${RESULT#OK }${NC}"
+else
+    echo -e "${RED}❌ $RESULT${NC}"
+    FAILED=1
+fi
+
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi
@@ -0,0 +1,208 @@
+#!/bin/bash
+
+# CCTeam ログストアテスト
+# SQLite への取り込みを繰り返しても（書き込み途中の行・ローテーション・アーカイブ後の JSONL 削除をまたいでも）
+# 行の取りこぼし・重複がなく、SQL での analyze_errors / get_agent_activity が JSONL を読んだ結果と一致し、
+# query サブコマンドで任意の集計ができることを確認
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+ENTRIES=${ENTRIES:-3000}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 ログストアテスト${NC}"
+echo "=========================="
+
+FAILED=0
+cd "$WORK_DIR"
+
+check() {
+    # check <説明> <python の結果が OK なら成功>
+    local name=$1 result=$2
+    if [ "${result%% *}" = "OK" ]; then
+        echo -e "${GREEN}✅ $name: ${result#OK }${NC}"
+    else
+        echo -e "${RED}❌ $name: $result${NC}"
+        FAILED=1
+    fi
+}
+
+# 1. 取り込みを繰り返しながら追記・ローテーション・アーカイブ（JSONL 削除）する
+RESULT=$(python3 - "$SCRIPT_DIR" "$ENTRIES" <<'PY' 2>/dev/null
+import datetime, json, os, random, sys
+sys.path.insert(0, sys.argv[1])
+from log_archive import compact
+from log_segments import LogRotator
+from log_store import LogStore
+from structured_logger import LogAnalyzer
+
+entries = int(sys.argv[2])
+random.seed(25)
+rotator = LogRotator("logs", max_bytes=0)
+os.makedirs("logs", exist_ok=True)
+now = datetime.datetime.now()
+paths = ("logs/errors_all.jsonl", "logs/worker1_structured.jsonl", "logs/作業者_structured.jsonl")
+written = {path: 0 for path in paths}
+problems = []
+
+def write(count, partial=False):
+    """2日分を順不同で追記（壊れた行・書き込み途中の行を混ぜる）"""
+    for path in paths:
+        with open(path, "ab") as f:
+            if partial is None:
+                f.write(b'el": "INFO", "message": "partial"}\n')  # 前回の書き込み途中の行の続き
+                written[path] += 1
+            for n in range(count):
+                entry = {"timestamp": (now - datetime.timedelta(seconds=random.uniform(0, 172800))).isoformat(),
+                         "level": random.choice(["INFO", "WARNING", "ERROR", "CRITICAL"]),
+                         "agent": random.choice(["boss", "worker1", "作業者"]),
+                         "message": f"message {n}",
+                         "caller": {"file": "worker.py", "function": random.choice(["run", "fetch"]), "line": n}}
+                if n % 3:
+                    entry["error"] = {"type": random.choice(["ValueError", "KeyError"])}
+                if n % 17 == 0:
+                    del entry["caller"]
+                f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode())
+            written[path] += count
+            f.write(b"not json\n")
+            if partial:
+                f.write(b'{"timestamp": "2000-01-01T00:00:00", "lev')
+
+def rotate():
+    for path in paths:
+        rotator.rotate(path, force=True)
+    rotator.drain()
+
+def verify(step):
+    with LogStore("logs") as store:
+        store.ingest()
+        for path in paths:
+            name = os.path.basename(path)
+            table = "errors" if name == "errors_all.jsonl" else "entries"
+            _, [(rows,)] = store.query(f"SELECT count(*) FROM {table} WHERE source = ?", [name])
+            if rows != written[path]:
+                problems.append(f"{step} {name}: {rows} rows != {written[path]}")
+        if any(store.ingest().values()):
+            problems.append(f"{step}: ingested twice")
+    for hours in (None, 1, 24):
+        time_range = hours * 3600 if hours else None
+        expected = LogAnalyzer(indexed=False)
+        actual = LogAnalyzer(sql=True)
+        if actual.analyze_errors(time_range) != expected.analyze_errors(time_range):
+            problems.append(f"{step} analyze_errors hours={hours}")
+        for agent in ("worker1", "作業者"):
+            if actual.get_agent_activity(agent, time_range) != expected.get_agent_activity(agent, time_range):
+                problems.append(f"{step} get_agent_activity {agent} hours={hours}")
+
+step = entries // 6
+write(step)
+verify("first")
+write(step, partial=True)
+verify("partial line")
+write(step, partial=None)
+rotate()
+write(step)
+rotate()
+write(step)
+verify("rotated")
+write(step)
+verify("before compact")
+write(step)
+rotate()
+compact("logs", prune=True)
+verify("pruned")
+print(("NG " + ", ".join(problems[:5])) if problems else f"OK {sum(written.values()):,} entries, 5 runs")
+PY
+)
+check "取り込みの取りこぼし・重複なし、SQL の集計が JSONL と一致" "$RESULT"
+
+# 2. query サブコマンド（エラー数 / 1時間 / エージェント / 呼び出し元の関数）
+OUTPUT=$(python3 "$SCRIPT_DIR/structured_logger.py" query \
+    "SELECT substr(timestamp, 1, 13) AS hour, agent, caller_function, count(*) AS errors FROM entries
+     WHERE level IN ('ERROR', 'CRITICAL') GROUP BY hour, agent, caller_function" 2>/dev/null)
+RESULT=$(python3 - "$SCRIPT_DIR" "$OUTPUT" <<'PY'
+import sys
+sys.path.insert(0, sys.argv[1])
+from structured_logger import LogAnalyzer
+
+lines = sys.argv[2].splitlines()
+total = sum(int(line.split()[-1]) for line in lines[2:])
+expected = sum(LogAnalyzer(indexed=False).get_agent_activity(agent)["by_level"].get(level, 0)
+               for agent in ("worker1", "作業者") for level in ("ERROR", "CRITICAL"))
+ok = lines[0].split() == ["hour", "agent", "caller_function", "errors"] and total == expected
+print(("OK " if ok else "NG ") + f"{len(lines) - 2} groups, {total:,} errors (expected {expected:,})")
+PY
+)
+check "query サブコマンド" "$RESULT"
+
+# 3. timestamp / level / agent が null・文字列以外の行は他の集計経路と同じく飛ばす（ファイル全体は失敗しない）
+RESULT=$(python3 - "$SCRIPT_DIR" <<'PY' 2>/dev/null
+import json, os, sys
+sys.path.insert(0, sys.argv[1])
+from log_store import LogStore
+from structured_logger import LogAnalyzer
+
+os.makedirs("logs_null", exist_ok=True)
+with open("logs_null/odd_structured.jsonl", "w") as f:
+    f.write('{"timestamp": null, "level": null, "agent": null, "message": "nulls"}\n')
+    f.write('{"timestamp": 1, "level": ["ERROR"], "agent": {"name": "x"}, "message": "objects"}\n')
+    f.write('{"timestamp": "2000-01-01T00:00:00", "level": "INFO", "agent": "odd", "message": "ok"}\n')
+with LogStore("logs_null") as store:
+    added = store.ingest()
+    _, rows = store.query("SELECT timestamp, level, agent FROM entries ORDER BY id")
+activity = LogAnalyzer("logs_null", sql=True).get_agent_activity("odd")
+expected = [("2000-01-01T00:00:00", "INFO", "odd")]
+ok = added == {"odd_structured.jsonl": 1} and rows == expected and activity["by_level"] == {"INFO": 1}
+print(("OK " if ok else "NG ") + f"{added}, {rows}, {activity['by_level']}")
+PY
+)
+check "null・文字列以外の timestamp / level / agent" "$RESULT"
+
+if python3 "$SCRIPT_DIR/structured_logger.py" query "SELEC 1" > /dev/null 2>&1; then
+    check "不正な SQL" "NG exit status 0"
+else
+    check "不正な SQL" "OK exit status 1"
+fi
+
+# 4. query では書き込みの文を拒否する（取り込み済みの行と ingest_state がずれない）
+BEFORE=$(python3 "$SCRIPT_DIR/structured_logger.py" query "SELECT count(*) FROM entries" 2>/dev/null | tail -n 1)
+WRITES=0
+for statement in "DELETE FROM entries" "UPDATE ingest_state SET offset = 0" "DROP TABLE errors"; do
+    if python3 "$SCRIPT_DIR/structured_logger.py" query "$statement" > /dev/null 2>&1; then
+        WRITES=$((WRITES + 1))
+    fi
+done
+RESULT=$(python3 - "$SCRIPT_DIR" "$BEFORE" "$WRITES" <<'PY' 2>/dev/null
+import sqlite3, sys
+sys.path.insert(0, sys.argv[1])
+from log_store import LogStore
+
+with LogStore("logs") as store:
+    try:
+        store.query("INSERT INTO entries (source, timestamp, level, agent) VALUES ('x', '', 'INFO', 'x')")
+        rejected = False
+    except sqlite3.OperationalError:
+        rejected = True
+    _, [(rows,)] = store.query("SELECT count(*) FROM entries")
+    added = sum(store.ingest().values())
+ok = rejected and sys.argv[3] == "0" and str(rows) == sys.argv[2].strip() and added == 0
+print(("OK " if ok else "NG ") + f"{sys.argv[3]} CLI writes succeeded, API rejected={rejected}, "
+      f"{rows:,} rows (before {sys.argv[2].strip()}), re-ingested {added}")
+PY
+)
+check "書き込みの文を拒否" "$RESULT"
+
+echo ""
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi
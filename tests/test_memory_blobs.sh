@@ -0,0 +1,138 @@
+#!/bin/bash
+
+# CCTeam メモリ blobs テスト
+# 同じ本文は保存経路（単発・一括・バッファ・インポート）によらず1つの blob を共有し、
+# 圧縮した本文も読み出し・検索・コンテキスト・エクスポートで元の本文に戻ること、
+# UDF を登録していない接続（sqlite3 コマンド等）からも行の追加・削除ができることを確認
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+COPIES=${COPIES:-50}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 メモリ blobs テスト${NC}"
+echo "=========================="
+
+FAILED=0
+cd "$WORK_DIR"
+
+check() {
+    # check <説明> <python の結果が OK なら成功>
+    local name=$1 result=$2
+    if [ "${result%% *}" = "OK" ]; then
+        echo -e "${GREEN}✅ $name: ${result#OK }${NC}"
+    else
+        echo -e "${RED}❌ $name: $result${NC}"
+        FAILED=1
+    fi
+}
+
+# 1. 重複排除と圧縮・展開
+RESULT=$(python3 - "$SCRIPT_DIR" "$COPIES" <<'PY' 2>&1 || true
+import json, sys
+sys.path.insert(0, sys.argv[1])
+from memory_manager import CCTeamMemoryManager
+
+copies = int(sys.argv[2])
+long_text = "ビルドログ: " + "コンパイル成功 compile ok\n" * 60
+small_text = "short note"
+problems = []
+memory = CCTeamMemoryManager("memory.db", buffer_size=10, buffer_max_age=60)
+memory.verbose = False
+for n in range(copies):
+    memory.save_conversation(f"worker{n % 3 + 1}", long_text)
+memory.save_conversations_bulk({"agent": "boss", "message": text} for text in (long_text, small_text))
+memory.save_conversation("boss", small_text)
+memory.export_memory_stream("export.jsonl")
+imported = CCTeamMemoryManager("imported.db")
+imported.verbose = False
+imported.import_memory_stream("export.jsonl")
+imported.import_memory_stream("export.jsonl")
+
+for label, db in (("saved", memory), ("imported", imported)):
+    codecs = sorted((codec or "raw", size) for codec, size in db.conn.execute("SELECT codec, size FROM blobs"))
+    expected = [("raw", len(small_text)), ("zlib", len(long_text.encode()))]
+    if codecs != expected:
+        problems.append(f"{label}: blobs {codecs}")
+    window = db.get_context_window(limit=copies + 10)
+    contents = [e["content"] for e in window]
+    if len(window) != copies + 3 or contents.count(long_text) != copies + 1 or contents.count(small_text) != 2:
+        problems.append(f"{label}: {len(window)} rows read back")
+    found = db.get_relevant_memories("コンパイル成功", limit=5)
+    if [r["content"] for r in found] != [long_text]:
+        problems.append(f"{label}: search {len(found)}")
+    context = db.build_context("worker1", 10000, "compile")
+    if [e["content"] for e in context["entries"]] != [long_text]:
+        problems.append(f"{label}: context {[e['content'][:10] for e in context['entries']]}")
+    stats = db._get_statistics()["blobs"]
+    if stats["count"] != 2 or stats["saved_bytes"] <= len(long_text.encode()) * copies:
+        problems.append(f"{label}: stats {stats}")
+with open("export.jsonl", encoding="utf-8") as f:
+    exported = [json.loads(line)["data"]["content"] for line in f if '"table": "conversations"' in line]
+if exported.count(long_text) != copies + 1:
+    problems.append(f"export has {exported.count(long_text)} long bodies")
+print(("NG " + ", ".join(problems)) if problems
+      else f"OK {copies + 3} rows share 2 blobs (1 zlib, 1 raw) after save and import, bodies read back intact")
+PY
+)
+check "重複排除と展開" "$RESULT"
+
+# 2. 圧縮の設定が異なる接続・UDF のない接続からの読み書き
+RESULT=$(python3 - "$SCRIPT_DIR" <<'PY' 2>&1 || true
+import sqlite3, sys
+sys.path.insert(0, sys.argv[1])
+from memory_manager import CCTeamMemoryManager
+
+long_text = "deploy report " * 100
+problems = []
+# 非圧縮で開いた接続も zlib で書かれた本文を読め、同じ本文は既存の blob を使う
+with CCTeamMemoryManager("mixed.db") as zlib_memory:
+    zlib_memory.verbose = False
+    zlib_memory.save_conversation("worker2", long_text)
+plain = CCTeamMemoryManager("mixed.db", compression=None)
+plain.verbose = False
+plain.save_conversation("worker1", "uncompressed " + long_text)
+plain.save_conversation("worker3", long_text)
+codecs = dict(plain.conn.execute("SELECT size, codec FROM blobs"))
+if codecs != {len(long_text): "zlib", len(long_text) + 13: None}:
+    problems.append(f"codecs {codecs}")
+if [e["content"] for e in plain.get_context_window(agent="worker3")] != [long_text]:
+    problems.append("zlib body not readable without compression")
+# UDF を登録していない接続（sqlite3 コマンド等）でも行を追加・削除できる
+raw = sqlite3.connect("mixed.db")
+try:
+    raw.execute("INSERT INTO conversations (session_id, agent_name, message_type, content) "
+                "VALUES ('manual', 'ops', 'system', 'manual maintenance note')")
+    raw.execute("DELETE FROM conversations WHERE agent_name IN ('worker2', 'worker3')")
+    raw.commit()
+except sqlite3.Error as e:
+    problems.append(f"raw connection: {e}")
+memory = CCTeamMemoryManager("mixed.db")
+memory.verbose = False
+if [r["content"] for r in memory.get_relevant_memories("maintenance")] != ["manual maintenance note"]:
+    problems.append("manual row not searchable")
+if [r["content"] for r in memory.get_relevant_memories("uncompressed")] != ["uncompressed " + long_text]:
+    problems.append("uncompressed row not searchable")
+window = [e["content"] for e in memory.get_context_window(limit=10)]
+if window != ["uncompressed " + long_text, "manual maintenance note"]:
+    problems.append(f"window {[text[:20] for text in window]}")
+print(("NG " + ", ".join(problems)) if problems
+      else "OK mixed codecs read back, writes without the UDF succeed and are searchable")
+PY
+)
+check "圧縮設定・UDF のない接続" "$RESULT"
+
+echo ""
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi
@@ -0,0 +1,160 @@
+#!/bin/bash
+
+# CCTeam メモリ compact テスト
+# 保持期間切れの行がセッション要約に畳み込まれてアーカイブDBへ移り（本体の行・索引・参照されない blob は消え）、
+# compact 後も本体→アーカイブの順で検索できること（compact 前から開いていた接続・別プロセスからも）を確認
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+ROWS=${ROWS:-400}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 メモリ compact テスト${NC}"
+echo "=========================="
+
+FAILED=0
+cd "$WORK_DIR"
+export CCTEAM_MEMORY_DB="$WORK_DIR/memory/ccteam_memory.db"
+
+check() {
+    # check <説明> <python の結果が OK なら成功>
+    local name=$1 result=$2
+    if [ "${result%% *}" = "OK" ]; then
+        echo -e "${GREEN}✅ $name: ${result#OK }${NC}"
+    else
+        echo -e "${RED}❌ $name: $result${NC}"
+        FAILED=1
+    fi
+}
+
+# 古い行（200日前: worker は期限切れ、boss は保持）と新しい行を作る
+python3 - "$SCRIPT_DIR" "$ROWS" <<'PY'
+import sys
+sys.path.insert(0, sys.argv[1])
+from memory_manager import CCTeamMemoryManager
+
+rows = int(sys.argv[2])
+with CCTeamMemoryManager() as memory:
+    memory.verbose = False
+    memory.save_conversations_bulk(
+        {"agent": ("worker1", "worker2", "boss")[n % 3],
+         "message": f"legacy migration {n} " + ("details " * 80 if n % 10 == 0 else "")}
+        for n in range(rows)
+    )
+    memory.conn.execute("UPDATE conversations SET timestamp = datetime('now', '-200 days'), "
+                        "session_id = 'old' || (id % 2)")
+    # 本体に残る行と同じ本文（blob を共有）
+    memory.save_conversations_bulk([{"agent": "worker1", "message": "legacy migration 1 "},
+                                    {"agent": "worker1", "message": "current release notes"}])
+PY
+
+# 1. compact の結果（本体から消え、アーカイブへ移り、要約が残る）
+RESULT=$(python3 - "$SCRIPT_DIR" "$ROWS" <<'PY' 2>&1 || true
+import sqlite3, sys
+sys.path.insert(0, sys.argv[1])
+from memory_manager import CCTeamMemoryManager
+
+rows = int(sys.argv[2])
+expired = rows - len(range(2, rows, 3))
+# compact 前から開いている接続（別プロセスのエージェント相当）
+before = CCTeamMemoryManager()
+before.verbose = False
+before.get_relevant_memories("legacy migration")
+memory = CCTeamMemoryManager()
+memory.verbose = False
+result = memory.compact(retention_days=90, agent_retention={"boss": 365})
+problems = []
+if (result["archived"], result["deleted"], result["summaries"]) != (expired, expired, 4):
+    problems.append(f"result {result}")
+conn = memory.conn
+remaining = conn.execute("""
+    SELECT COUNT(*) FROM conversations WHERE agent_name != 'boss' AND message_type != 'session_summary'
+""").fetchone()[0]
+if remaining != 2:
+    problems.append(f"{remaining} worker rows left")
+# 本体の索引から外れ、参照されない blob は消える（本体に残る行と共有する blob は残る）
+indexed = conn.execute(
+    "SELECT COUNT(*) FROM main.conversations_fts WHERE conversations_fts MATCH '\"legacy\"'").fetchone()[0]
+boss = len(range(2, rows, 3))
+if indexed != boss + 1 + 4:
+    problems.append(f"{indexed} main index entries for legacy (expected {boss + 5})")
+orphans = conn.execute("""
+    SELECT COUNT(*) FROM blobs WHERE NOT EXISTS (SELECT 1 FROM conversations c WHERE c.context_hash = blobs.hash)
+""").fetchone()[0]
+if orphans or not conn.execute(
+        "SELECT 1 FROM conversation_texts WHERE content = 'legacy migration 1 '").fetchone():
+    problems.append(f"{orphans} orphan blobs")
+# アーカイブには本文を展開して格納する
+archive = sqlite3.connect(memory.archive_path)
+archived = archive.execute("SELECT COUNT(*), COUNT(DISTINCT agent_name), SUM(content = '') FROM conversations").fetchone()
+if archived != (expired, 2, 0):
+    problems.append(f"archive {archived}")
+summary = conn.execute("SELECT metadata FROM conversations WHERE message_type = 'session_summary'").fetchall()
+if len(summary) != 4:
+    problems.append(f"{len(summary)} summaries")
+# compact 前から開いていた接続もアーカイブを検索する
+if not any(r["relevance"] == "archive_match" for r in before.get_relevant_memories("details", limit=rows)):
+    problems.append("connection opened before compact does not search the archive")
+# もう一度実行しても何も変わらない
+again = memory.compact(retention_days=90, agent_retention={"boss": 365})
+if (again["archived"], again["deleted"], again["summaries"]) != (0, 0, 0):
+    problems.append(f"second compact {again}")
+if archive.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] != expired:
+    problems.append("archive rows duplicated")
+print(("NG " + ", ".join(problems)) if problems
+      else f"OK {expired} rows archived into 4 session summaries, no orphan blobs, second run is a no-op")
+PY
+)
+check "compact とアーカイブ" "$RESULT"
+
+# 2. compact 後の検索（本体で足りない分をアーカイブから、別プロセスからも）
+RESULT=$(python3 - "$SCRIPT_DIR" "$ROWS" <<'PY' 2>&1 || true
+import os, subprocess, sys
+sys.path.insert(0, sys.argv[1])
+from memory_manager import CCTeamMemoryManager
+
+rows = int(sys.argv[2])
+problems = []
+memory = CCTeamMemoryManager()
+memory.verbose = False
+# details を含む行のうち boss の行は本体に、それ以外はアーカイブにある（本体には抜粋を含む要約行もある）
+details = [n for n in range(0, rows, 10)]
+archived = len([n for n in details if n % 3 != 2])
+in_main = memory.conn.execute("SELECT COUNT(*) FROM conversation_texts WHERE content LIKE '%details%'").fetchone()[0]
+found = memory.get_relevant_memories("details", limit=rows)
+relevance = [r["relevance"] for r in found]
+if relevance != ["keyword_match"] * in_main + ["archive_match"] * archived:
+    problems.append(f"{relevance.count('keyword_match')} main + {relevance.count('archive_match')} archive "
+                    f"(expected {in_main} + {archived}, main first)")
+if any(r["agent"] == "boss" for r in found if r["relevance"] == "archive_match"):
+    problems.append("boss rows archived")
+# 本体だけで足りる検索はアーカイブを見ない
+if any(r["relevance"] == "archive_match" for r in memory.get_relevant_memories("details", limit=in_main)):
+    problems.append("archive searched although main had enough rows")
+# 要約行は本体で検索できる
+if not memory.get_relevant_memories("messages", limit=10):
+    problems.append("session summaries not searchable")
+run = subprocess.run([sys.executable, os.path.join(sys.argv[1], "memory_manager.py"), "search",
+                      "--query", "details", "--limit", str(rows)], capture_output=True, text=True)
+if run.returncode != 0 or run.stdout.count("(archive_match)") != archived:
+    problems.append(f"cli search exit {run.returncode}, {run.stdout.count('(archive_match)')} archive matches")
+print(("NG " + ", ".join(problems)) if problems
+      else f"OK {in_main} main + {archived} archived matches for details, main rows ranked first")
+PY
+)
+check "アーカイブの検索" "$RESULT"
+
+echo ""
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi
@@ -0,0 +1,152 @@
+#!/bin/bash
+
+# CCTeam メモリ コンテキストテスト
+# iter_conversations の before_id によるページングが、同じ時刻の行や id 順と時刻順が食い違う行があっても
+# (timestamp, id) の新しい順に取りこぼし・重複なく進み、途中で追加された行でページがずれないこと、
+# build_context のキャッシュが同じ要求には結果を使い回し、書き込み（別の接続・バッファ経由も含む）や compact の後は
+# 組み立て直すことを確認
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+ROWS=${ROWS:-600}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 メモリ コンテキストテスト${NC}"
+echo "=========================="
+
+FAILED=0
+cd "$WORK_DIR"
+
+check() {
+    # check <説明> <python の結果が OK なら成功>
+    local name=$1 result=$2
+    if [ "${result%% *}" = "OK" ]; then
+        echo -e "${GREEN}✅ $name: ${result#OK }${NC}"
+    else
+        echo -e "${RED}❌ $name: $result${NC}"
+        FAILED=1
+    fi
+}
+
+# 1. before_id によるページング
+RESULT=$(python3 - "$SCRIPT_DIR" "$ROWS" <<'PY' 2>&1 || true
+import itertools, sys
+sys.path.insert(0, sys.argv[1])
+from memory_manager import CCTeamMemoryManager
+
+rows = int(sys.argv[2])
+memory = CCTeamMemoryManager("memory.db")
+memory.verbose = False
+# 一括保存した行は同じ時刻になる。一部はインポートした行のように id より古い時刻にする
+memory.save_conversations_bulk({"agent": f"worker{n % 3 + 1}", "message": f"message {n}"} for n in range(rows))
+memory.conn.execute("UPDATE conversations SET timestamp = '2026-01-0' || (id % 5 + 1) || ' 00:00:00' "
+                    "WHERE id % 4 = 0")
+
+
+def expected(agent=None):
+    query = "SELECT id FROM conversations" + (" WHERE agent_name = ?" if agent else "")
+    return [row[0] for row in memory.conn.execute(query + " ORDER BY timestamp DESC, id DESC",
+                                                  (agent,) if agent else ())]
+
+
+def walk(agent=None, page=50, page_size=200):
+    """前ページの最後の id を before_id に渡して全ページを読む"""
+    ids, before_id = [], None
+    while True:
+        chunk = [e["id"] for e in itertools.islice(
+            memory.iter_conversations(agent=agent, before_id=before_id, page_size=page_size), page)]
+        if not chunk:
+            return ids
+        ids.extend(chunk)
+        before_id = chunk[-1]
+
+
+problems = []
+for agent, page, page_size in ((None, 50, 200), (None, 64, 7), ("worker2", 33, 10), ("worker3", rows, 200)):
+    ids = walk(agent, page, page_size)
+    if ids != expected(agent):
+        problems.append(f"{agent} page {page}/{page_size}: {len(ids)} ids, {len(set(ids))} unique")
+
+# 途中で追加された行（より新しい）は読み進めているページに入らない
+first = [e["id"] for e in itertools.islice(memory.iter_conversations(), 100)]
+memory.save_conversations_bulk({"agent": "worker1", "message": f"late {n}"} for n in range(20))
+rest = [e["id"] for e in memory.iter_conversations(before_id=first[-1])]
+if first + rest != expected()[20:]:
+    problems.append(f"pages shifted after inserts: {len(first) + len(rest)} ids")
+if list(memory.iter_conversations(before_id=10 ** 9)):
+    problems.append("unknown before_id returned rows")
+print(("NG " + ", ".join(problems)) if problems
+      else f"OK {rows} rows paged in (timestamp, id) order for 4 page sizes and agent filters")
+PY
+)
+check "before_id によるページング" "$RESULT"
+
+# 2. build_context のキャッシュと書き込み後の無効化
+RESULT=$(python3 - "$SCRIPT_DIR" <<'PY' 2>&1 || true
+import sys
+sys.path.insert(0, sys.argv[1])
+from memory_manager import CCTeamMemoryManager
+
+memory = CCTeamMemoryManager("context.db", buffer_size=100, buffer_max_age=60)
+memory.verbose = False
+other = CCTeamMemoryManager("context.db")
+other.verbose = False
+memory.save_conversations_bulk({"agent": f"worker{n % 2 + 1}", "message": f"deploy step {n} " + "x" * 40}
+                               for n in range(30))
+problems = []
+hit_count = 0
+
+
+def build(label, expect_hit):
+    global hit_count
+    hits = memory.context_cache_info()["hits"]
+    context = memory.build_context("worker1", 120, "deploy")
+    hit = memory.context_cache_info()["hits"] > hits
+    hit_count += hit
+    if hit != expect_hit:
+        problems.append(f"{label}: {'miss' if expect_hit else 'hit'}")
+    if context["tokens"] > 120 or any(e["agent"] != "worker1" for e in context["entries"] if "agent" in e):
+        problems.append(f"{label}: {context['tokens']} tokens, agents {[e.get('agent') for e in context['entries']]}")
+    return [e["content"] for e in context["entries"]]
+
+
+build("first", False)
+build("repeat", True)
+# バッファ内の保存（未書き込み）も反映される
+memory.save_conversation("worker1", "deploy buffered message")
+if "deploy buffered message" not in build("buffered save", False):
+    problems.append("buffered save missing")
+build("repeat after buffered save", True)
+# 別の接続（別プロセス相当）からの保存
+other.save_conversation("worker1", "deploy from other connection")
+if "deploy from other connection" not in build("other connection", False):
+    problems.append("other connection save missing")
+# 関連する記憶に含まれるプロジェクトコンテキスト
+other.save_project_context("CCTeam", "release", {"note": "deploy freeze"})
+build("project context", False)
+# 他のエージェントの保存でも組み立て直すが、結果にはそのエージェントの対話を含めない
+memory.save_conversation("worker2", "deploy worker2 only")
+if "deploy worker2 only" in build("other agent", False):
+    problems.append("other agent entry included")
+memory.compact(retention_days=0, agent_retention={"worker1": 365, "worker2": 365}, vacuum=False)
+build("after compact", False)
+print(("NG " + ", ".join(problems)) if problems
+      else f"OK {hit_count} hits for repeated requests, rebuilt after each write and compact")
+PY
+)
+check "build_context のキャッシュ無効化" "$RESULT"
+
+echo ""
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi
@@ -0,0 +1,139 @@
+#!/bin/bash
+
+# CCTeam メモリデーモンテスト
+# デーモン経由の SAVE の直後に SEARCH / LOAD / CONTEXT で読めること、停止時にキューを書き切ること、
+# デーモン不在（ソケットがない）時は memory_client.py が直接モードで保存・検索することを確認
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+SAVES=${SAVES:-300}
+WORK_DIR=$(mktemp -d)
+DAEMON_PID=""
+trap '[ -n "$DAEMON_PID" ] && kill "$DAEMON_PID" 2>/dev/null; rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 メモリデーモンテスト${NC}"
+echo "=========================="
+
+FAILED=0
+cd "$WORK_DIR"
+export CCTEAM_MEMORY_DB="$WORK_DIR/memory/ccteam_memory.db"
+export CCTEAM_MEMORY_SOCKET="$WORK_DIR/memory/ccteam_memory.sock"
+
+check() {
+    # check <説明> <python の結果が OK なら成功>
+    local name=$1 result=$2
+    if [ "${result%% *}" = "OK" ]; then
+        echo -e "${GREEN}✅ $name: ${result#OK }${NC}"
+    else
+        echo -e "${RED}❌ $name: $result${NC}"
+        FAILED=1
+    fi
+}
+
+python3 "$SCRIPT_DIR/memory_manager.py" serve > daemon.log 2>&1 &
+DAEMON_PID=$!
+for _ in $(seq 1 50); do
+    python3 "$SCRIPT_DIR/memory_client.py" ping > /dev/null 2>&1 && break
+    sleep 0.1
+done
+
+# 1. SAVE の直後の読み取りに反映される（別の接続からの読み取りも含む）
+RESULT=$(python3 - "$SCRIPT_DIR" "$SAVES" <<'PY' 2>&1 || true
+import sys
+sys.path.insert(0, sys.argv[1])
+from memory_client import MemoryClient
+
+saves = int(sys.argv[2])
+problems = []
+with MemoryClient(timeout=10) as writer, MemoryClient(timeout=10) as reader:
+    for n in range(saves):
+        writer.save(f"worker{n % 3 + 1}", f"タスク task{n:05d} を完了 status\tok\nline {n}", "user", {"n": n})
+        if n % 50 == 49:
+            found = reader.search(f"task{n:05d}", limit=5)
+            if [r["content"].split()[1] for r in found] != [f"task{n:05d}"]:
+                problems.append(f"search after save {n}: {len(found)} results")
+    recent = reader.load(limit=saves, agent="worker1")
+    if len(recent) != len(range(0, saves, 3)):
+        problems.append(f"load worker1 {len(recent)}")
+    # タブ・改行を含む本文とメタデータもそのまま戻る
+    last = recent[-1]
+    n = (saves - 1) // 3 * 3
+    if last["content"] != f"タスク task{n:05d} を完了 status\tok\nline {n}" or last["metadata"] != {"n": n}:
+        problems.append(f"load content {last!r}")
+    context = reader.context("worker2", 200, "完了")
+    if not context["entries"] or any(e["agent"] != "worker2" for e in context["entries"]):
+        problems.append(f"context {context}")
+    stats = reader.stats()
+    if stats["total_conversations"] != saves:
+        problems.append(f"stats {stats['total_conversations']}")
+print(("NG " + ", ".join(problems)) if problems
+      else f"OK {saves} saves, search/load/context/stats see every save")
+PY
+)
+check "SAVE / SEARCH の往復" "$RESULT"
+
+# 2. CLI 経由の保存と、停止時のキューの書き出し（ソケットを消して終了する）
+for n in 1 2 3; do
+    python3 "$SCRIPT_DIR/memory_client.py" save --agent boss --message "cli message $n" > /dev/null
+done
+SEARCH=$(python3 "$SCRIPT_DIR/memory_client.py" search --query "cli message")
+kill -TERM "$DAEMON_PID"
+wait "$DAEMON_PID" || true
+DAEMON_PID=""
+RESULT=$(python3 - "$SCRIPT_DIR" "$SAVES" "$SEARCH" <<'PY' 2>&1 || true
+import json, os, sqlite3, sys
+
+saves, search = int(sys.argv[2]), json.loads(sys.argv[3])
+problems = []
+if len(search) != 3:
+    problems.append(f"cli search {len(search)}")
+if os.path.exists(os.environ["CCTEAM_MEMORY_SOCKET"]):
+    problems.append("socket left behind")
+rows = sqlite3.connect(os.environ["CCTEAM_MEMORY_DB"]).execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+if rows != saves + 3:
+    problems.append(f"{rows} rows != {saves + 3}")
+print(("NG " + ", ".join(problems)) if problems else f"OK {rows} rows written, socket removed")
+PY
+)
+check "CLI 経由の保存と停止" "$RESULT"
+
+# 3. デーモン不在時は直接モード（同じDBに保存され、検索もできる）
+RESULT=$(python3 - "$SCRIPT_DIR" "$SAVES" <<'PY' 2>&1 || true
+import json, os, subprocess, sys
+
+script_dir, saves = sys.argv[1], int(sys.argv[2])
+client = os.path.join(script_dir, "memory_client.py")
+problems = []
+for socket_path in (os.environ["CCTEAM_MEMORY_SOCKET"], "missing/dir/ccteam_memory.sock"):
+    run = subprocess.run([sys.executable, client, "ping", "--socket", socket_path], capture_output=True)
+    if run.returncode != 1:
+        problems.append(f"ping {socket_path} exit {run.returncode}")
+    run = subprocess.run([sys.executable, client, "save", "--socket", socket_path, "--agent", "worker3",
+                          "--message", f"direct {socket_path}"], capture_output=True, text=True)
+    if run.returncode != 0:
+        problems.append(f"save exit {run.returncode}: {run.stderr.strip()}")
+run = subprocess.run([sys.executable, client, "search", "--query", "direct"], capture_output=True, text=True)
+found = json.loads(run.stdout) if run.returncode == 0 else []
+run = subprocess.run([sys.executable, client, "stats"], capture_output=True, text=True)
+total = json.loads(run.stdout)["total_conversations"] if run.returncode == 0 else None
+if len(found) != 2 or total != saves + 5:
+    problems.append(f"search {len(found)}, total {total}")
+print(("NG " + ", ".join(problems)) if problems
+      else f"OK saved and searched without a daemon ({total} rows)")
+PY
+)
+check "デーモン不在時の直接モード" "$RESULT"
+
+echo ""
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi
@@ -0,0 +1,143 @@
+#!/bin/bash
+
+# CCTeam メモリ エクスポート/インポートテスト
+# export_memory_stream → import_memory_stream で全テーブルが元のDBと一致し（再インポートしても重複しない）、
+# ウォーターマークによる差分エクスポートを順に取り込んでも一致することを確認
+# （インポートは SQLite 3.32 より前のパラメータ数の上限 999 でも動くこと）
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+ROWS=${ROWS:-1500}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 メモリ エクスポート/インポートテスト${NC}"
+echo "=========================="
+
+FAILED=0
+cd "$WORK_DIR"
+
+check() {
+    # check <説明> <python の結果が OK なら成功>
+    local name=$1 result=$2
+    if [ "${result%% *}" = "OK" ]; then
+        echo -e "${GREEN}✅ $name: ${result#OK }${NC}"
+    else
+        echo -e "${RED}❌ $name: $result${NC}"
+        FAILED=1
+    fi
+}
+
+cat > common.py <<'PY'
+import sqlite3, sys
+sys.path.insert(0, sys.argv[1])
+from memory_manager import CCTeamMemoryManager
+
+
+def open_memory(path):
+    memory = CCTeamMemoryManager(path)
+    memory.verbose = False
+    # SQLite 3.32 より前の SQLITE_MAX_VARIABLE_NUMBER
+    memory.conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    return memory
+
+
+def add_rows(memory, start, count):
+    memory.save_conversations_bulk(
+        {"agent": f"worker{n % 3 + 1}", "message_type": "user" if n % 2 else "assistant",
+         # 長い本文は圧縮、同じ本文は1つの blob を共有する
+         "message": f"row{n:05d} " + ("report " * 100 if n % 5 == 0 else "done") if n % 7 else "同じ本文",
+         "metadata": {"n": n} if n % 4 == 0 else None}
+        for n in range(start, start + count)
+    )
+    memory.save_project_context("CCTeam", "spec", {"version": start}, importance=0.7)
+    memory.learn_pattern("error", {"error_type": f"E{start % 2}"}, start % 3 == 0)
+
+
+def snapshot(memory):
+    conn = memory.conn
+    return {
+        "conversations": conn.execute("""
+            SELECT id, session_id, timestamp, agent_name, message_type, content, metadata
+            FROM conversation_texts ORDER BY id
+        """).fetchall(),
+        "project_contexts": conn.execute("SELECT * FROM project_contexts ORDER BY id").fetchall(),
+        "learned_patterns": conn.execute("""
+            SELECT pattern_type, pattern_key, pattern_data, success_rate, usage_count, last_used
+            FROM learned_patterns ORDER BY pattern_type, pattern_key
+        """).fetchall(),
+    }
+PY
+
+# 1. 全件のエクスポート（gzip）とインポート、同じファイルの再インポート
+RESULT=$(python3 - "$SCRIPT_DIR" "$ROWS" <<'PY' 2>&1 || true
+import sys
+from common import add_rows, open_memory, snapshot
+
+rows = int(sys.argv[2])
+source = open_memory("source.db")
+add_rows(source, 0, rows)
+exported = source.export_memory_stream("full.jsonl.gz")
+target = open_memory("target.db")
+problems = []
+for attempt in range(2):
+    imported = target.import_memory_stream("full.jsonl.gz")
+    if imported != exported["rows"]:
+        problems.append(f"attempt {attempt}: imported {imported} != exported {exported['rows']}")
+    if snapshot(target) != snapshot(source):
+        problems.append(f"attempt {attempt}: tables differ")
+    # 全文検索の索引にも1回だけ登録される
+    hits = target.conn.execute(
+        "SELECT COUNT(*) FROM conversations_fts WHERE conversations_fts MATCH '\"row00010\"'"
+    ).fetchone()[0]
+    if hits != 1:
+        problems.append(f"attempt {attempt}: {hits} index entries for row00010")
+blobs = [m.conn.execute("SELECT COUNT(*), COUNT(codec) FROM blobs").fetchone() for m in (source, target)]
+if blobs[0] != blobs[1]:
+    problems.append(f"blobs {blobs}")
+print(("NG " + ", ".join(problems)) if problems
+      else f"OK {sum(exported['rows'].values()):,} rows, re-import adds nothing, {blobs[1][0]} blobs "
+           f"({blobs[1][1]} compressed)")
+PY
+)
+check "全件のエクスポート/インポート" "$RESULT"
+
+# 2. ウォーターマークで差分だけを順に取り込む
+RESULT=$(python3 - "$SCRIPT_DIR" "$ROWS" <<'PY' 2>&1 || true
+import sys
+from common import add_rows, open_memory, snapshot
+
+rows = int(sys.argv[2])
+source = open_memory("incremental_source.db")
+target = open_memory("incremental_target.db")
+problems = []
+counts = []
+for round_, added in enumerate((rows, 40, 0, 1)):
+    if added:
+        add_rows(source, round_ * rows, added)
+    exported = source.export_memory_stream(f"delta{round_}.jsonl", watermark_path="export.wm")
+    counts.append(exported["rows"]["conversations"])
+    target.import_memory_stream(f"delta{round_}.jsonl")
+    if exported["rows"]["conversations"] != added or exported["rows"]["project_contexts"] != (1 if added else 0):
+        problems.append(f"round {round_}: exported {exported['rows']} after adding {added}")
+    if snapshot(target) != snapshot(source):
+        problems.append(f"round {round_}: tables differ")
+print(("NG " + ", ".join(problems)) if problems
+      else f"OK conversations per delta {counts}, target matches the source after each import")
+PY
+)
+check "ウォーターマークによる差分" "$RESULT"
+
+echo ""
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi
@@ -0,0 +1,173 @@
+#!/bin/bash
+
+# CCTeam メモリ マイグレーションテスト
+# バージョン管理前（user_version 0）のベースラインのDBを開くと v5 まで移行し、
+# 重複した learned_patterns が1行に統合され、既存の対話履歴が blobs に移っても読み出し・検索できることを確認
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 メモリ マイグレーションテスト${NC}"
+echo "=========================="
+
+FAILED=0
+cd "$WORK_DIR"
+
+check() {
+    # check <説明> <python の結果が OK なら成功>
+    local name=$1 result=$2
+    if [ "${result%% *}" = "OK" ]; then
+        echo -e "${GREEN}✅ $name: ${result#OK }${NC}"
+    else
+        echo -e "${RED}❌ $name: $result${NC}"
+        FAILED=1
+    fi
+}
+
+# ベースラインのスキーマ（マイグレーション導入前の memory_manager.py が作っていたもの）
+python3 - <<'PY'
+import hashlib, json, sqlite3
+
+key = hashlib.md5(b"error_type:ImportError").hexdigest()[:16]
+db = sqlite3.connect("baseline.db")
+db.executescript("""
+    CREATE TABLE conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        agent_name TEXT NOT NULL,
+        message_type TEXT NOT NULL,
+        content TEXT NOT NULL,
+        context_hash TEXT,
+        metadata JSON
+    );
+    CREATE TABLE project_contexts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        project_name TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        context_type TEXT NOT NULL,
+        content JSON NOT NULL,
+        importance_score REAL DEFAULT 0.5
+    );
+    CREATE TABLE learned_patterns (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pattern_type TEXT NOT NULL,
+        pattern_data JSON NOT NULL,
+        success_rate REAL,
+        usage_count INTEGER DEFAULT 0,
+        last_used DATETIME
+    );
+    CREATE INDEX idx_session ON conversations(session_id);
+    CREATE INDEX idx_timestamp ON conversations(timestamp);
+    CREATE INDEX idx_agent ON conversations(agent_name);
+    CREATE INDEX idx_project ON project_contexts(project_name);
+""")
+messages = [
+    ("worker1", "データベースの接続エラーを修正しました"),
+    ("worker2", "deployment pipeline finished"),
+    ("boss", "long report " + "lorem ipsum dolor sit amet " * 40),
+    ("worker1", "データベースの接続エラーを修正しました"),
+]
+db.executemany(
+    "INSERT INTO conversations (session_id, timestamp, agent_name, message_type, content, context_hash) "
+    "VALUES ('s1', ?, ?, 'user', ?, ?)",
+    [(f"2026-01-01 00:00:0{n}", agent, text, hashlib.md5(text.encode()).hexdigest())
+     for n, (agent, text) in enumerate(messages)],
+)
+db.execute("INSERT INTO project_contexts (project_name, context_type, content) VALUES ('CCTeam', 'spec', ?)",
+           (json.dumps({"summary": "authentication service"}),))
+# 同時更新で重複したパターン（2行）とキーのないパターン
+data = json.dumps({"error_type": "ImportError", "key": key})
+db.executemany(
+    "INSERT INTO learned_patterns (pattern_type, pattern_data, success_rate, usage_count, last_used) "
+    "VALUES (?, ?, ?, ?, ?)",
+    [("error", data, 1.0, 2, "2026-01-01 00:00:00"),
+     ("error", data, 0.0, 3, "2026-01-02 00:00:00"),
+     ("error", json.dumps({"error_type": "KeyError"}), 0.5, 1, None)],
+)
+db.commit()
+PY
+
+# 1. v5 への移行と重複パターンの統合
+RESULT=$(python3 - "$SCRIPT_DIR" <<'PY' 2>&1 || true
+import hashlib, sys
+sys.path.insert(0, sys.argv[1])
+from memory_manager import CCTeamMemoryManager
+
+key = hashlib.md5(b"error_type:ImportError").hexdigest()[:16]
+memory = CCTeamMemoryManager("baseline.db")
+memory.verbose = False
+problems = []
+conn = memory.conn
+version = conn.execute("PRAGMA user_version").fetchone()[0]
+if version != CCTeamMemoryManager.SCHEMA_VERSION:
+    problems.append(f"user_version {version}")
+indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+if "idx_agent_timestamp" not in indexes or "idx_agent" in indexes or "idx_pattern_key" not in indexes:
+    problems.append(f"indexes {sorted(indexes)}")
+patterns = conn.execute(
+    "SELECT id, pattern_key, success_rate, usage_count, last_used FROM learned_patterns ORDER BY id"
+).fetchall()
+if patterns != [(1, key, 0.4, 5, "2026-01-02 00:00:00"), (3, None, 0.5, 1, None)]:
+    problems.append(f"patterns {patterns}")
+# 統合した行は一意キーで更新される（IntegrityError にならない）
+memory.learn_pattern("error", {"error_type": "ImportError"}, True)
+merged = conn.execute("SELECT usage_count, round(success_rate, 4) FROM learned_patterns WHERE id = 1").fetchone()
+if merged != (6, 0.5):
+    problems.append(f"learn_pattern {merged}")
+if conn.execute("SELECT COUNT(*) FROM learned_patterns").fetchone()[0] != 2:
+    problems.append("learn_pattern added a row")
+memory.close()
+print(("NG " + ", ".join(problems)) if problems
+      else f"OK user_version {version}, 2 duplicate patterns merged (usage 5, success 0.4)")
+PY
+)
+check "v5 への移行とパターンの統合" "$RESULT"
+
+# 2. 既存の対話履歴は blobs に移り、読み出し・全文検索できる（開き直しても再移行しない）
+RESULT=$(python3 - "$SCRIPT_DIR" <<'PY' 2>&1 || true
+import hashlib, sys
+sys.path.insert(0, sys.argv[1])
+from memory_manager import CCTeamMemoryManager
+
+problems = []
+for attempt in range(2):
+    with CCTeamMemoryManager("baseline.db") as memory:
+        memory.verbose = False
+        conn = memory.conn
+        inline = conn.execute("SELECT COUNT(*) FROM conversations WHERE content != ''").fetchone()[0]
+        blobs, compressed = conn.execute("SELECT COUNT(*), COUNT(codec) FROM blobs").fetchone()
+        if inline or (blobs, compressed) != (3, 1):
+            problems.append(f"attempt {attempt}: {inline} inline rows, {blobs} blobs ({compressed} compressed)")
+        # 本文はベースラインで記録した context_hash（元の本文の MD5）と一致する
+        hashes = dict(conn.execute("SELECT id, context_hash FROM conversations"))
+        window = memory.get_context_window(limit=10)
+        if ([e["agent"] for e in window] != ["worker1", "worker2", "boss", "worker1"]
+                or any(hashlib.md5(e["content"].encode()).hexdigest() != hashes[e["id"]] for e in window)):
+            problems.append(f"attempt {attempt}: window {[(e['agent'], e['content'][:20]) for e in window]}")
+        # 同一内容の2行（接続エラー）は1件にまとめて返す
+        for query in ("接続エラー", "pipeline", "dolor", "authentication"):
+            found = memory.get_relevant_memories(query)
+            if len(found) != 1:
+                problems.append(f"attempt {attempt}: {query} -> {len(found)}")
+print(("NG " + ", ".join(problems)) if problems
+      else "OK 4 rows moved to 3 blobs (1 compressed), search finds migrated rows, reopen is a no-op")
+PY
+)
+check "既存の対話履歴の移行" "$RESULT"
+
+echo ""
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi
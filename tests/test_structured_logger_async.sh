@@ -0,0 +1,112 @@
+#!/bin/bash
+
+# CCTeam 構造化ログ 非同期書き込みテスト
+# 終了時に書き出されること、行が壊れないこと、drop ポリシーの件数が合うことを確認
+
+set -euo pipefail
+
+# カラー定義
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/scripts"
+PROCESSES=${PROCESSES:-4}
+THREADS=${THREADS:-4}
+LINES=${LINES:-2000}
+WORK_DIR=$(mktemp -d)
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo -e "${BLUE}🧪 構造化ログ 非同期書き込みテスト${NC}"
+echo "=========================="
+
+FAILED=0
+cd "$WORK_DIR"
+
+check() {
+    # check <説明> <python の結果が OK なら成功>
+    local name=$1 result=$2
+    if [ "${result%% *}" = "OK" ]; then
+        echo -e "${GREEN}✅ $name: ${result#OK }${NC}"
+    else
+        echo -e "${RED}❌ $name: $result${NC}"
+        FAILED=1
+    fi
+}
+
+# 1. 複数プロセス・複数スレッドから flush せずに終了（atexit で書き出されるはず）
+for p in $(seq 1 "$PROCESSES"); do
+    CCTEAM_LOG_ASYNC=1 python3 - "$SCRIPT_DIR" "$p" "$THREADS" "$LINES" > /dev/null 2>&1 <<'PY' &
+import sys, threading
+sys.path.insert(0, sys.argv[1])
+from structured_logger import StructuredLogger
+
+process, threads, lines = int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+logger = StructuredLogger(f"agent{process}")
+
+def work(thread):
+    for n in range(lines):
+        logger.error("failed", context={"process": process, "thread": thread, "n": n, "pad": "x" * (n % 300)})
+
+workers = [threading.Thread(target=work, args=(t,)) for t in range(threads)]
+for worker in workers:
+    worker.start()
+for worker in workers:
+    worker.join()
+PY
+done
+wait
+
+RESULT=$(python3 - "$SCRIPT_DIR" "$PROCESSES" "$THREADS" "$LINES" <<'PY'
+import json, sys
+sys.path.insert(0, sys.argv[1])
+from log_segments import iter_lines
+
+processes, threads, lines = map(int, sys.argv[2:])
+problems = []
+# 既定の 10M を超えるのでローテーション済みのセグメントも古い順に読む
+for p in range(1, processes + 1):
+    entries = [json.loads(line) for line in iter_lines(f"logs/agent{p}_structured.jsonl")]
+    if len(entries) != threads * lines:
+        problems.append(f"agent{p}: {len(entries)} lines")
+    # スレッドごとの順序が保たれている
+    for t in range(threads):
+        ns = [e["context"]["n"] for e in entries if e["context"]["thread"] == t]
+        if ns != sorted(ns):
+            problems.append(f"agent{p} thread{t}: out of order")
+# 全プロセスが追記する errors_all.jsonl も行が混ざらない
+shared = [json.loads(line) for line in iter_lines("logs/errors_all.jsonl")]
+if len(shared) != processes * threads * lines:
+    problems.append(f"errors_all: {len(shared)} lines")
+print(("NG " + ", ".join(problems[:5])) if problems else f"OK {len(shared):,} lines, all valid JSON")
+PY
+)
+check "終了時の書き出しと行の完全性" "$RESULT"
+
+# 2. drop ポリシー: 書き込まれた行 + 破棄した行 = 呼び出し回数
+RESULT=$(python3 - "$SCRIPT_DIR" <<'PY' 2>/dev/null
+import sys
+sys.path.insert(0, sys.argv[1])
+from structured_logger import LogWriter, StructuredLogger
+
+writer = LogWriter(queue_size=1, overflow="drop")
+logger = StructuredLogger("dropper", log_dir="logs_drop", writer=writer)
+total = 5000
+for n in range(total):
+    logger.info(f"line {n}")
+logger.flush()
+lines = sum(1 for _ in open("logs_drop/dropper_structured.jsonl"))
+ok = writer.dropped > 0 and lines + writer.dropped == total
+print(("OK " if ok else "NG ") + f"{lines:,} written + {writer.dropped:,} dropped = {total:,}")
+PY
+)
+RESULT=$(echo "$RESULT" | tail -n 1)  # ロガーのコンソール出力を除く
+check "drop ポリシー" "$RESULT"
+
+echo ""
+if [ "$FAILED" = "0" ]; then
+    echo -e "${BLUE}テスト完了！${NC}"
+else
+    exit 1
+fi